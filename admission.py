@@ -0,0 +1,85 @@
+# Contrôle d'admission des recherches coûteuses
+# Au-delà d'un nombre de recherches simultanées, les suivantes attendent
+# un court instant dans une file, puis sont refusées avec un message "réessayez".
+import threading
+import time
+from contextlib import contextmanager
+
+
+class RechercheRefusee(Exception):
+    """Levée quand une recherche n'a pas obtenu de place dans le délai d'attente"""
+
+
+class LimiteurRecherches:
+    """Limite le nombre de recherches lourdes exécutées en même temps (par worker)"""
+
+    def __init__(self, max_simultanees=2, attente_max_s=2.0, reessayer_apres_s=5):
+        self.max_simultanees = max_simultanees
+        self.attente_max_s = attente_max_s
+        # Valeur de l'en-tête Retry-After renvoyé aux recherches refusées
+        self.reessayer_apres_s = reessayer_apres_s
+        self._places = threading.BoundedSemaphore(max_simultanees)
+        self._lock = threading.Lock()
+        # Métriques de la file d'attente
+        self._en_cours = 0
+        self._en_attente = 0
+        self._admises = 0
+        self._admises_apres_attente = 0
+        self._rejetees = 0
+        self._attente_totale_s = 0.0
+        self._attente_max_observee_s = 0.0
+
+    @contextmanager
+    def admettre(self):
+        """
+        Réserve une place pour la durée d'une recherche
+
+        Raises:
+            RechercheRefusee: aucune place libérée pendant attente_max_s
+        """
+        debut = time.monotonic()
+        # Chemin rapide : une place est libre, pas de file d'attente
+        admise = self._places.acquire(blocking=False)
+        if not admise:
+            with self._lock:
+                self._en_attente += 1
+            try:
+                admise = self._places.acquire(timeout=self.attente_max_s)
+            finally:
+                with self._lock:
+                    self._en_attente -= 1
+
+        attente = time.monotonic() - debut
+        with self._lock:
+            if not admise:
+                self._rejetees += 1
+            else:
+                self._en_cours += 1
+                self._admises += 1
+                if attente > 0.001:
+                    self._admises_apres_attente += 1
+                self._attente_totale_s += attente
+                self._attente_max_observee_s = max(self._attente_max_observee_s, attente)
+        if not admise:
+            raise RechercheRefusee()
+
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._en_cours -= 1
+            self._places.release()
+
+    def statistiques(self):
+        """Métriques de la file d'attente depuis le démarrage du worker"""
+        with self._lock:
+            return {
+                'max_simultanees': self.max_simultanees,
+                'en_cours': self._en_cours,
+                'en_attente': self._en_attente,
+                'admises': self._admises,
+                'admises_apres_attente': self._admises_apres_attente,
+                'rejetees': self._rejetees,
+                'attente_moyenne_ms': round(self._attente_totale_s / self._admises * 1000, 1) if self._admises else 0.0,
+                'attente_max_ms': round(self._attente_max_observee_s * 1000, 1),
+            }
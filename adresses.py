@@ -0,0 +1,159 @@
+"""
+Code postal et département des propriétaires
+
+L'adresse est saisie en texte libre ("12 Rue de Paris, 75001 Paris"). Le code postal
+et le département en sont extraits et stockés dans des colonnes indexées de
+proprietaires : les recherches et statistiques régionales utilisent l'index au lieu
+de parcourir les adresses avec LIKE.
+
+Pour une base créée avant ces colonnes :
+    python adresses.py --migrer          # ajoute colonnes et index, puis remplit les lignes existantes
+    python adresses.py --remplir         # (re)calcule code postal et département de toutes les lignes
+"""
+import argparse
+import logging
+import re
+import sys
+
+logger = logging.getLogger(__name__)
+
+_CODE_POSTAL = re.compile(r"\b(\d{5})\b")
+
+# Colonnes ajoutées à proprietaires (même définition que setup_complete.sql)
+MIGRATION_PROPRIETAIRES = [
+    "ALTER TABLE proprietaires ADD COLUMN code_postal CHAR(5)",
+    "ALTER TABLE proprietaires ADD COLUMN departement VARCHAR(3)",
+    "CREATE INDEX idx_proprietaire_code_postal ON proprietaires (code_postal)",
+    "CREATE INDEX idx_proprietaire_departement ON proprietaires (departement, nom, prenom)",
+]
+
+
+def code_postal_depuis_adresse(adresse):
+    """Code postal (5 chiffres) d'une adresse postale, ou None"""
+    codes = _CODE_POSTAL.findall(adresse or '')
+    # Le code postal précède la ville, en fin d'adresse
+    return codes[-1] if codes else None
+
+
+def departement_depuis_code_postal(code_postal):
+    """
+    Département d'un code postal
+
+    Deux premiers chiffres ; trois pour l'outre-mer (971 à 989) ;
+    2A (20000-20199) ou 2B (20200-20999) pour la Corse.
+    """
+    if not code_postal:
+        return None
+    if code_postal.startswith(('97', '98')):
+        return code_postal[:3]
+    if code_postal.startswith('20'):
+        return '2A' if code_postal < '20200' else '2B'
+    return code_postal[:2]
+
+
+def localiser_adresse(adresse):
+    """
+    Code postal et département d'une adresse
+
+    Returns:
+        tuple: (code_postal, departement), (None, None) si l'adresse n'a pas de code postal
+    """
+    code_postal = code_postal_depuis_adresse(adresse)
+    return code_postal, departement_depuis_code_postal(code_postal)
+
+
+def est_departement(valeur):
+    """Indique si la valeur est un numéro de département (75, 2A, 971) plutôt qu'un début de code postal"""
+    if valeur in ('2A', '2B'):
+        return True
+    if not valeur.isdigit():
+        return False
+    # "20" n'est pas un département (Corse : 2A et 2B)
+    return (len(valeur) == 2 and valeur not in ('00', '20')) or (len(valeur) == 3 and valeur[:2] in ('97', '98'))
+
+
+def migrer(db):
+    """
+    Ajoute code_postal, departement et leurs index à proprietaires s'ils manquent
+
+    Returns:
+        bool: True si la table a les colonnes à l'issue de la migration
+    """
+    colonnes = set(db.colonnes('proprietaires'))
+    if not colonnes:
+        logger.error("Table proprietaires introuvable")
+        return False
+    if {'code_postal', 'departement'} <= colonnes:
+        return True
+    for instruction in MIGRATION_PROPRIETAIRES:
+        if not db.execute_query(instruction):
+            return False
+    logger.info("Colonnes code_postal et departement ajoutées à proprietaires")
+    return True
+
+
+def remplir(db, lot=5000, seulement_vides=False, progression=None):
+    """
+    Calcule code postal et département des propriétaires existants, par lots
+
+    Les lignes sont parcourues dans l'ordre de la clé primaire (WHERE id > dernier id),
+    chaque lot est mis à jour en une requête par lots.
+
+    Args:
+        db: Database
+        lot: Lignes lues et mises à jour par lot
+        seulement_vides: Ne traiter que les lignes sans code postal
+        progression: Fonction appelée après chaque lot avec la fraction traitée (0 à 1)
+
+    Returns:
+        int: Nombre de lignes mises à jour
+    """
+    condition = "AND code_postal IS NULL " if seulement_vides else ""
+    mises_a_jour = 0
+    dernier_id = 0
+    if progression:
+        id_max = (db.fetch_one("SELECT MAX(id) AS id FROM proprietaires") or {}).get('id') or 0
+    while True:
+        lignes = db.fetch_all(f"SELECT id, adresse FROM proprietaires WHERE id > %s {condition}"
+                              f"ORDER BY id LIMIT %s", (dernier_id, lot))
+        if not lignes:
+            break
+        dernier_id = lignes[-1]['id']
+        valeurs = [localiser_adresse(ligne['adresse']) + (ligne['id'],) for ligne in lignes]
+        if db.execute_many("UPDATE proprietaires SET code_postal=%s, departement=%s WHERE id=%s", valeurs) is False:
+            raise RuntimeError(f"Échec de la mise à jour des propriétaires après l'id {dernier_id}")
+        mises_a_jour += len(valeurs)
+        logger.info(f"{mises_a_jour} propriétaires mis à jour (dernier id {dernier_id})")
+        if progression and id_max:
+            progression(min(dernier_id / id_max, 1))
+    return mises_a_jour
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    action = parser.add_mutually_exclusive_group(required=True)
+    action.add_argument('--migrer', action='store_true', help="Ajouter les colonnes manquantes puis remplir")
+    action.add_argument('--remplir', action='store_true', help="Recalculer toutes les lignes")
+    parser.add_argument('--lot', type=int, default=5000, help="Lignes par lot")
+    args = parser.parse_args()
+
+    from config import charger_configuration, configurer_logging
+    from database import Database
+    charger_configuration()
+    configurer_logging()
+
+    db = Database()
+    if args.migrer and not migrer(db):
+        print("Migration impossible (voir le journal)")
+        return 1
+    try:
+        nombre = remplir(db, args.lot, seulement_vides=args.migrer)
+    except RuntimeError as e:
+        print(f"Erreur : {e}")
+        return 1
+    print(f"{nombre} propriétaires mis à jour")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
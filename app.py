@@ -1,136 +1,293 @@
 # Importation des modules Flask pour les routes, templates et gestion des requêtes
-from flask import Flask, render_template, request, redirect, url_for, flash
+from flask import Flask, render_template, request, redirect, url_for, flash, current_app, jsonify, make_response, session
+# Proxy vers la base de données de l'application courante
+from werkzeug.local import LocalProxy
 # Protection CSRF (Cross-Site Request Forgery)
 from flask_wtf.csrf import CSRFProtect
 # Fonction pour échapper les caractères HTML (sécurité)
 from markupsafe import escape
-# Module de gestion de la base de données
-from database import Database
-# Fonctions de génération de numéros pour cartes grises et plaques
+# Module de gestion de la base de données (mysql.connector n'est importé qu'à la première connexion)
+from database import Database, ERREUR_DELAI_DEPASSE
+# Configuration (.env) et logging, initialisés à la création de l'application
+from config import charger_configuration, configurer_logging
+# Fonctions de génération de numéros utilisées par les routes
 from numero_generator import (
-    generer_prochain_numero_carte_grise,
-    generer_prochain_numero_plaque,
     formater_numero_plaque,
-    generer_numero_serie,
     generer_numero_carte_grise_depuis_db,
     generer_numero_plaque_unique_depuis_db,
     generer_numero_serie_depuis_db
 )
+# Catalogue de référence (modèles, données techniques) et préchauffage des workers
+from catalogue import CatalogueModeles, DONNEES_TECHNIQUES_REF, DONNEES_TECHNIQUES_REF_EDITION
+from prechauffage import demarrer_prechauffage, desactiver_prechauffage, etat_prechauffage
+# Contrôle d'admission des recherches coûteuses
+from admission import LimiteurRecherches, RechercheRefusee
+# Code postal et département extraits de l'adresse des propriétaires
+from adresses import est_departement, localiser_adresse
+from controles import COLONNES_CONTROLES, synchroniser_controles, lister_controles_a_venir, compter_controles_a_venir
+# Recherche de plaques par lots (lecteurs automatiques de plaques)
+from plaques import LOT_PLAQUES_MAX, CachePlaques, SuiviLots, rechercher_plaques
+# Filtres de Bloom des plaques et VIN existants (vérifications d'unicité sans requête)
+from unicite import FiltresUnicite
+# Modification d'une carte : colonnes modifiées seulement, contrôle de version
+from modifications import ConflitVersion, calculer_modifications, enregistrer_modifications
+from transferts import transferer_cartes
+# Cartes grises archivées (expirées), incluses dans les recherches sur demande
+from archivage import TABLE_ARCHIVE, source_cartes
+from travaux import (
+    TYPES_TRAVAUX, STATUTS_FINAUX, creer_travail, lire_travail, lister_travaux, annuler_travail,
+    demarrer_executeur
+)
 import os
-from datetime import datetime
+import time
+from datetime import date
+
+# Protection CSRF (protection contre les attaques cross-site), attachée à l'application dans create_app
+csrf = CSRFProtect()
+
+# Base de données de l'application courante
+# Chaque worker crée sa propre instance (et son pool) dans create_app
+db = LocalProxy(lambda: current_app.extensions['database'])
+
+
+def catalogue():
+    """Cache des modèles de l'application courante"""
+    return current_app.extensions['catalogue']
+
+
+def cache_plaques():
+    """Cache des plaques lues de l'application courante"""
+    return current_app.extensions['cache_plaques']
+
+
+def filtres_unicite():
+    """Filtres de Bloom des plaques et VIN de l'application courante"""
+    return current_app.extensions['filtres_unicite']
+
+
+# Recherches qui parcourent toute la table : soumises au contrôle d'admission
+RECHERCHES_LOURDES = {'critere_complexe', 'marque', 'departements'}
+
+# Durée maximale d'exécution de chaque type de recherche côté MySQL (millisecondes)
+# Surchargeable par variable d'environnement, ex: SEARCH_TIMEOUT_MS_MARQUE=5000
+DELAIS_RECHERCHE_MS = {
+    'nom': 2000,
+    'plaque': 2000,
+    'vin': 2000,
+    'marque': 5000,
+    'critere_complexe': 5000,
+    'departement': 2000,
+    'departements': 5000,
+    # Lot de plaques (API des lecteurs de plaques) : une requête IN sur l'index unique
+    'lot_plaques': 500,
+}
+
+# Colonnes lues par chaque vue (celles de son gabarit) au lieu de cg.* : les listes longues
+# sont lues en lignes compactes (voir lignes.py), accessibles par nom dans les gabarits
+COLONNES_ACCUEIL = """
+    cg.id, cg.numero_carte_grise, cg.numero_immatriculation, cg.numero_serie, cg.date_immat_actuelle,
+    cg.categorie_permis, cg.puissance_chevaux, cg.carburant_energie, cg.poids_vide_kg, cg.poids_max_kg,
+    cg.emission_co2_g_km, cg.couleur_principale, cg.date_validite_certificat, cg.date_prochain_controle,
+    cg.classe_environnementale, p.nom, p.prenom, mo.modele, ma.nom AS marque_nom
+"""
+COLONNES_RESULTATS = """
+    cg.id, cg.numero_carte_grise, cg.numero_immatriculation, cg.emission_co2_g_km,
+    p.nom, p.prenom, mo.modele, ma.nom AS marque_nom
+"""
+COLONNES_EDITION = """
+    cg.id, cg.version, cg.numero_carte_grise, cg.numero_immatriculation, cg.numero_serie, cg.modele_id,
+    cg.date_premiere_immat, cg.categorie_permis, cg.carburant_energie, cg.poids_vide_kg, cg.poids_max_kg,
+    cg.places_assises, cg.places_debout, cg.cylindree_cm3, cg.puissance_chevaux, cg.puissance_administrative_cv,
+    cg.emission_co2_g_km, cg.classe_environnementale, cg.niveau_sonore_db, cg.vitesse_max_moteur_rpm,
+    cg.couleur_principale, cg.date_fin_validite, cg.date_validite_certificat, cg.date_premier_controle,
+    cg.date_controle_2, cg.date_controle_3, cg.date_prochain_controle,
+    p.nom, p.prenom, p.adresse, mo.modele, ma.nom AS marque_nom
+"""
+
+# Liste des contrôles techniques à venir : période par défaut (jours) et taille de page
+JOURS_CONTROLES = 30
+TAILLE_PAGE_CONTROLES = 50
+
+
+def delai_recherche_ms(search_type):
+    """Durée maximale d'exécution d'un type de recherche (millisecondes)"""
+    defaut = DELAIS_RECHERCHE_MS.get(search_type, 2000)
+    return int(os.getenv(f'SEARCH_TIMEOUT_MS_{str(search_type).upper()}', defaut))
+
+
+def create_app(config=None):
+    """
+    Crée et configure une application Flask (une par worker)
+
+    Args:
+        config: Dictionnaire de configuration qui surcharge les valeurs par défaut
+
+    Returns:
+        L'application Flask prête à servir les requêtes
+    """
+    charger_configuration()
+    configurer_logging()
+
+    app = Flask(__name__)
+    # Configuration par défaut depuis les variables d'environnement
+    app.config.update(
+        # Clé secrète pour les sessions (CSRF, etc.)
+        SECRET_KEY=os.getenv('SECRET_KEY', os.urandom(24).hex()),
+        # Une connexion par thread du worker
+        DB_POOL_SIZE=int(os.getenv('DB_POOL_SIZE', os.getenv('WEB_THREADS', '4'))),
+        # Préchauffage du worker au démarrage (connexions, catalogue, générateurs de numéros)
+        WARMUP=os.getenv('WARMUP', 'True').lower() == 'true',
+        # Threads qui exécutent les travaux en arrière-plan dans ce worker (0 : travaux.py travailleur)
+        TRAVAUX_THREADS=int(os.getenv('TRAVAUX_THREADS', '1')),
+        # Filtres de Bloom des plaques et VIN, construits en arrière-plan au démarrage du worker
+        FILTRES_UNICITE=os.getenv('FILTRES_UNICITE', 'True').lower() == 'true',
+    )
+    if config:
+        app.config.update(config)
+
+    # Activation de la protection CSRF
+    csrf.init_app(app)
+
+    # Ressources propres au worker : la base de données et son pool de connexions
+    # Le pool est ouvert paresseusement à la première requête, donc après le fork
+    app.extensions['database'] = Database(pool_size=app.config['DB_POOL_SIZE'])
+    app.extensions['catalogue'] = CatalogueModeles()
+    app.extensions['limiteur_recherches'] = LimiteurRecherches(
+        max_simultanees=int(os.getenv('SEARCH_MAX_SIMULTANEES', '2')),
+        attente_max_s=float(os.getenv('SEARCH_ATTENTE_MAX', '2')),
+    )
+    # Durées des lots de plaques, comparées à l'objectif de latence
+    app.extensions['suivi_plaques'] = SuiviLots(objectif_ms=float(os.getenv('PLAQUES_OBJECTIF_MS', '50')))
+    # Plaques lues par les lots (LRU du worker, Redis partagé si PLAQUES_CACHE_REDIS_URL)
+    app.extensions['cache_plaques'] = CachePlaques()
+    # Sans construction (FILTRES_UNICITE=False), les filtres restent vides : tout est vérifié en base
+    app.extensions['filtres_unicite'] = FiltresUnicite()
+
+    app.before_request(before_request)
+    app.after_request(after_request)
+    app.teardown_appcontext(teardown_db)
+    _enregistrer_routes(app)
+
+    # Le préchauffage tourne en arrière-plan : /healthz répond tout de suite,
+    # /readyz seulement une fois le worker prêt
+    if app.config['WARMUP']:
+        demarrer_prechauffage(app)
+    else:
+        desactiver_prechauffage(app)
+    if app.config['FILTRES_UNICITE']:
+        app.extensions['filtres_unicite'].demarrer(app)
+    # Travaux longs (reconstructions, relances) : hors des requêtes, nombre limité en parallèle
+    app.extensions['travaux'] = demarrer_executeur(app.config['TRAVAUX_THREADS'],
+                                                   cache_plaques=app.extensions['cache_plaques'])
+    return app
+
+
+def _enregistrer_routes(app):
+    """Déclare les routes de l'application"""
+    app.add_url_rule('/', 'index', index)
+    app.add_url_rule('/add', 'add_carte_grise', add_carte_grise, methods=['GET', 'POST'])
+    app.add_url_rule('/edit/<int:carte_id>', 'edit_carte_grise', edit_carte_grise, methods=['GET', 'POST'])
+    app.add_url_rule('/delete/<int:carte_id>', 'delete_carte_grise', delete_carte_grise, methods=['POST'])
+    app.add_url_rule('/search', 'search', search, methods=['GET', 'POST'])
+    app.add_url_rule('/controles', 'controles_a_venir', controles_a_venir)
+    app.add_url_rule('/jobs', 'liste_travaux', liste_travaux)
+    app.add_url_rule('/jobs', 'lancer_travail', lancer_travail, methods=['POST'])
+    app.add_url_rule('/jobs/<int:travail_id>', 'etat_travail', etat_travail)
+    app.add_url_rule('/jobs/<int:travail_id>/annuler', 'annulation_travail', annulation_travail, methods=['POST'])
+    app.add_url_rule('/api/cartes/transfert', 'transfert_cartes', transfert_cartes, methods=['POST'])
+    app.add_url_rule('/api/plaques/lot', 'lot_plaques', lot_plaques, methods=['POST'])
+    # API JSON : exemptée du jeton CSRF, elle refuse tout contenu qui n'est pas application/json
+    # (qu'un formulaire d'un autre site ne peut pas envoyer)
+    csrf.exempt(transfert_cartes)
+    csrf.exempt(lot_plaques)
+    app.add_url_rule('/healthz', 'healthz', healthz)
+    app.add_url_rule('/readyz', 'readyz', readyz)
+    app.add_url_rule('/metriques', 'metriques', metriques)
 
-# Création de l'application Flask
-app = Flask(__name__)
-# Configuration de la clé secrète pour les sessions (CSRF, etc.)
-app.secret_key = os.getenv('SECRET_KEY', os.urandom(24).hex())
 
-# Activation de la protection CSRF (protection contre les attaques cross-site)
-csrf = CSRFProtect(app)
+# Routes qui n'ont pas besoin d'une connexion à la base avant la requête
+ENDPOINTS_SANS_CONNEXION = {'static', 'healthz', 'readyz', 'metriques'}
+
+# Routes qui écrivent en POST : toutes leurs lectures (numéros à suivre, unicité du VIN)
+# doivent voir l'état à jour du primaire, pas celui d'une réplique en retard
+ENDPOINTS_ECRITURE = {'add_carte_grise', 'edit_carte_grise', 'delete_carte_grise', 'lancer_travail',
+                      'annulation_travail', 'transfert_cartes'}
 
-# Initialisation de la connexion à la base de données
-db = Database()
 
 # Hook exécuté avant chaque requête HTTP
-@app.before_request
 def before_request():
-    """Connexion à la base de données avant chaque requête"""
+    """Connexion à la base de données avant chaque requête (emprunt d'une connexion au pool)"""
+    db.nouvelle_requete()
+    if request.endpoint in ENDPOINTS_SANS_CONNEXION:
+        return
+    if db.replicas:
+        if request.method == 'POST' and request.endpoint in ENDPOINTS_ECRITURE:
+            db.epingler_primaire(float('inf'))
+        else:
+            # Lecture de ses propres écritures : la session qui vient d'écrire lit sur le
+            # primaire pendant la fenêtre, même si la requête arrive sur un autre worker
+            ecoule = time.time() - session.get('ecriture_a', 0)
+            if ecoule < db.fenetre_primaire:
+                db.epingler_primaire(db.fenetre_primaire - ecoule)
     if not db.connection or not db.connection.is_connected():
         if not db.connect():
             # 'flash' envoie un message temporaire à l'utilisateur (visible au prochain chargement de page)
             flash('Erreur de connexion à la base de données. Veuillez vérifier votre configuration.', 'error')
 
+def after_request(response):
+    """Mémorise dans la session l'heure de la dernière écriture (routage vers le primaire)"""
+    if db.replicas and db.a_ecrit:
+        session['ecriture_a'] = time.time()
+    return response
+
 # Hook exécuté après chaque requête HTTP
-@app.teardown_appcontext
 def teardown_db(exception=None):
-    """Ferme la connexion à la base de données après chaque requête"""
-    if db.connection and db.connection.is_connected():
-        db.connection.close()
+    """Rend la connexion à la base de données après chaque requête"""
+    db.disconnect()
+
+def healthz():
+    """Sonde de vivacité : le processus répond"""
+    return jsonify(statut='ok')
+
+def readyz():
+    """Sonde de disponibilité : préchauffage terminé et base de données joignable"""
+    etat = etat_prechauffage(current_app)
+    base_ok = db.ping()
+    pret = etat['termine'] and base_ok
+    return jsonify(pret=pret, prechauffage=etat, base_de_donnees=base_ok,
+                   disjoncteur=db.breaker.etat_courant(), lectures=db.etat_replicas()), (200 if pret else 503)
+
+def metriques():
+    """Métriques du worker : file d'attente des recherches lourdes, travaux en cours, lots de plaques"""
+    executeur = current_app.extensions.get('travaux')
+    return jsonify(pid=os.getpid(), recherches_lourdes=current_app.extensions['limiteur_recherches'].statistiques(),
+                   lectures=db.etat_replicas(), travaux=executeur.etat() if executeur else None,
+                   lots_plaques=current_app.extensions['suivi_plaques'].statistiques(),
+                   cache_plaques=cache_plaques().statistiques(),
+                   filtres_unicite=filtres_unicite().statistiques())
 
-@app.route('/')
 def index():
     """Page d'accueil - Affiche toutes les cartes grises"""
     # Requête avec jointures (JOIN) pour récupérer les infos liées :
     # - Le propriétaire (via proprietaires p)
     # - Le modèle du véhicule (via modeles mo)
     # - La marque (via marques ma)
-    query = """
-        SELECT cg.*, 
-               p.nom, p.prenom, p.adresse,
-               mo.modele, mo.type_vehicule,
-               ma.nom as marque_nom
+    query = f"""
+        SELECT {COLONNES_ACCUEIL}
         FROM cartes_grises cg
         JOIN proprietaires p ON cg.proprietaire_id = p.id
         JOIN modeles mo ON cg.modele_id = mo.id
         JOIN marques ma ON mo.marque_id = ma.id
         ORDER BY cg.date_immat_actuelle DESC
     """
-    cartes = db.fetch_all(query)
+    cartes = db.fetch_all(query, compact=True)
     return render_template('index.html', cartes=cartes)
 
-@app.route('/add', methods=['GET', 'POST'])
 def add_carte_grise():
     """Ajoute une nouvelle carte grise avec fonction d'auto-remplissage des caractéristiques"""
 
-    # Données techniques de référence pour chaque modèle
-    # Format: ID_MODELE: {'pv': poids_vide, 'pm': poids_max, 'permis': catégorie, 'pl': places, 'cyl': cylindrée, 'cv': chevaux, 'co2': émission}
-    DONNEES_TECHNIQUES_REF = {
-        # Honda
-        1: {'pv': 190, 'pm': 370, 'permis': 'A2', 'pl': 2, 'cyl': 471, 'cv': 48, 'co2': 80, 'classe': 'Euro 5', 'cv_admin': 6, 'pl_debout': 0, 'db': 95, 'rpm': 8500, 'carburant': 'Essence'},   # CB500F
-        2: {'pv': 201, 'pm': 390, 'permis': 'A', 'pl': 2, 'cyl': 999, 'cv': 217, 'co2': 160, 'classe': 'Euro 4', 'cv_admin': 15, 'pl_debout': 0, 'db': 105, 'rpm': 13000, 'carburant': 'Essence'},  # CBR1000RR
-        3: {'pv': 1300, 'pm': 1800, 'permis': 'B', 'pl': 5, 'cyl': 1498, 'cv': 182, 'co2': 128, 'classe': 'Euro 6d', 'cv_admin': 9, 'pl_debout': 0, 'db': 72, 'rpm': 6500, 'carburant': 'Essence'}, # Civic
-        4: {'pv': 1600, 'pm': 2200, 'permis': 'B', 'pl': 5, 'cyl': 1993, 'cv': 184, 'co2': 153, 'classe': 'Euro 6d', 'cv_admin': 10, 'pl_debout': 0, 'db': 75, 'rpm': 6000, 'carburant': 'Hybride'}, # CR-V
-        5: {'pv': 2800, 'pm': 4500, 'permis': 'C', 'pl': 3, 'cyl': 2999, 'cv': 150, 'co2': 210, 'classe': 'Euro 6', 'cv_admin': 12, 'pl_debout': 0, 'db': 78, 'rpm': 4500, 'carburant': 'Diesel'}, # NT400
-        6: {'pv': 2600, 'pm': 3500, 'permis': 'C', 'pl': 3, 'cyl': 2488, 'cv': 130, 'co2': 220, 'classe': 'Euro 6', 'cv_admin': 11, 'pl_debout': 0, 'db': 76, 'rpm': 4200, 'carburant': 'Diesel'}, # Cabstar
-        # Peugeot
-        7: {'pv': 95, 'pm': 270, 'permis': 'A1', 'pl': 2, 'cyl': 49, 'cv': 4, 'co2': 45, 'classe': 'Euro 5', 'cv_admin': 1, 'pl_debout': 0, 'db': 82, 'rpm': 8000, 'carburant': 'Essence'},     # Kisbee
-        8: {'pv': 280, 'pm': 450, 'permis': 'A', 'pl': 2, 'cyl': 399, 'cv': 36, 'co2': 89, 'classe': 'Euro 5', 'cv_admin': 5, 'pl_debout': 0, 'db': 88, 'rpm': 7500, 'carburant': 'Essence'},    # Metropolis
-        9: {'pv': 1050, 'pm': 1550, 'permis': 'B', 'pl': 5, 'cyl': 1199, 'cv': 100, 'co2': 102, 'classe': 'Euro 6d', 'cv_admin': 7, 'pl_debout': 0, 'db': 70, 'rpm': 6200, 'carburant': 'Essence'}, # 208
-        10: {'pv': 1500, 'pm': 2100, 'permis': 'B', 'pl': 7, 'cyl': 1598, 'cv': 180, 'co2': 140, 'classe': 'Euro 6d', 'cv_admin': 9, 'pl_debout': 0, 'db': 73, 'rpm': 6000, 'carburant': 'Diesel'},# 5008
-        11: {'pv': 2100, 'pm': 4400, 'permis': 'C', 'pl': 3, 'cyl': 2179, 'cv': 140, 'co2': 230, 'classe': 'Euro 6', 'cv_admin': 11, 'pl_debout': 0, 'db': 77, 'rpm': 4000, 'carburant': 'Diesel'},# Boxer
-        12: {'pv': 1800, 'pm': 3100, 'permis': 'C', 'pl': 3, 'cyl': 1997, 'cv': 145, 'co2': 190, 'classe': 'Euro 6', 'cv_admin': 10, 'pl_debout': 0, 'db': 75, 'rpm': 4500, 'carburant': 'Diesel'},# Expert
-       
-       # RENAULT (IDs 13 à 18)
-        13: {'pv': 120, 'pm': 300, 'permis': 'A1', 'pl': 2, 'cyl': 124, 'cv': 11, 'co2': 55, 'classe': 'Euro 5', 'cv_admin': 2, 'pl_debout': 0, 'db': 85, 'rpm': 9000, 'couleur': 'Rouge', 'carburant': 'Essence'},     # Full 125
-        14: {'pv': 160, 'pm': 340, 'permis': 'A2', 'pl': 2, 'cyl': 395, 'cv': 30, 'co2': 75, 'classe': 'Euro 5', 'cv_admin': 4, 'pl_debout': 0, 'db': 90, 'rpm': 8000, 'couleur': 'Jaune', 'carburant': 'Essence'},     # Sport 400
-        15: {'pv': 1100, 'pm': 1600, 'permis': 'B', 'pl': 5, 'cyl': 999, 'cv': 90, 'co2': 110, 'classe': 'Euro 6d', 'cv_admin': 6, 'pl_debout': 0, 'db': 69, 'rpm': 6500, 'couleur': 'Gris', 'carburant': 'Essence'},   # Clio
-        16: {'pv': 1400, 'pm': 1950, 'permis': 'B', 'pl': 5, 'cyl': 1332, 'cv': 140, 'co2': 130, 'classe': 'Euro 6d', 'cv_admin': 8, 'pl_debout': 0, 'db': 71, 'rpm': 6200, 'couleur': 'Bleu', 'carburant': 'Hybride'}, # Austral
-        17: {'pv': 2200, 'pm': 3500, 'permis': 'C', 'pl': 3, 'cyl': 2299, 'cv': 135, 'co2': 240, 'classe': 'Euro 6', 'cv_admin': 11, 'pl_debout': 0, 'db': 76, 'rpm': 4200, 'couleur': 'Jaune', 'carburant': 'Diesel'}, # Master
-        18: {'pv': 2400, 'pm': 4500, 'permis': 'C', 'pl': 3, 'cyl': 2488, 'cv': 140, 'co2': 250, 'classe': 'Euro 6', 'cv_admin': 12, 'pl_debout': 0, 'db': 78, 'rpm': 4000, 'couleur': 'Blanc', 'carburant': 'Diesel'}, # Maxity
-
-       # MERCEDES (19-24)
-        19: {'pv': 130, 'pm': 310, 'permis': 'A1', 'pl': 2, 'cyl': 125, 'cv': 12, 'co2': 60, 'classe': 'Euro 5', 'cv_admin': 2, 'pl_debout': 0, 'db': 83, 'rpm': 9500, 'couleur': 'Argent', 'carburant': 'Essence'},   # Citan Scooter
-        20: {'pv': 210, 'pm': 400, 'permis': 'A', 'pl': 2, 'cyl': 998, 'cv': 200, 'co2': 155, 'classe': 'Euro 4', 'cv_admin': 14, 'pl_debout': 0, 'db': 102, 'rpm': 12500, 'couleur': 'Noir', 'carburant': 'Essence'},  # Vision GT
-        21: {'pv': 1350, 'pm': 1900, 'permis': 'B', 'pl': 5, 'cyl': 1461, 'cv': 116, 'co2': 120, 'classe': 'Euro 6d', 'cv_admin': 7, 'pl_debout': 0, 'db': 68, 'rpm': 6800, 'couleur': 'Noir', 'carburant': 'Essence'}, # Classe A
-        22: {'pv': 1800, 'pm': 2400, 'permis': 'B', 'pl': 5, 'cyl': 1993, 'cv': 190, 'co2': 160, 'classe': 'Euro 6d', 'cv_admin': 10, 'pl_debout': 0, 'db': 74, 'rpm': 6200, 'couleur': 'Argent', 'carburant': 'Diesel'}, # GLC
-        23: {'pv': 2600, 'pm': 5000, 'permis': 'C', 'pl': 3, 'cyl': 2143, 'cv': 163, 'co2': 215, 'classe': 'Euro 6', 'cv_admin': 13, 'pl_debout': 0, 'db': 79, 'rpm': 4500, 'couleur': 'Argent', 'carburant': 'Diesel'}, # Sprinter 5t
-        24: {'pv': 2900, 'pm': 4800, 'permis': 'C', 'pl': 3, 'cyl': 4250, 'cv': 170, 'co2': 230, 'classe': 'Euro 6', 'cv_admin': 14, 'pl_debout': 0, 'db': 81, 'rpm': 3800, 'couleur': 'Blanc', 'carburant': 'Diesel'}, # Vario
-
-        # IVECO (25-30)
-        25: {'pv': 150, 'pm': 330, 'permis': 'A2', 'pl': 2, 'cyl': 300, 'cv': 28, 'co2': 70, 'classe': 'Euro 5', 'cv_admin': 3, 'pl_debout': 0, 'db': 87, 'rpm': 8500, 'couleur': 'Orange', 'carburant': 'Essence'},    # Daily Moto
-        26: {'pv': 220, 'pm': 420, 'permis': 'A', 'pl': 2, 'cyl': 1100, 'cv': 210, 'co2': 165, 'classe': 'Euro 4', 'cv_admin': 15, 'pl_debout': 0, 'db': 106, 'rpm': 12000, 'couleur': 'Orange', 'carburant': 'Essence'},   # Turbo Bike
-        27: {'pv': 2000, 'pm': 2800, 'permis': 'B', 'pl': 5, 'cyl': 2998, 'cv': 176, 'co2': 200, 'classe': 'Euro 6', 'cv_admin': 10, 'pl_debout': 0, 'db': 76, 'rpm': 5500, 'couleur': 'Vert', 'carburant': 'Diesel'}, # Massif
-        28: {'pv': 1900, 'pm': 2600, 'permis': 'B', 'pl': 5, 'cyl': 2500, 'cv': 150, 'co2': 190, 'classe': 'Euro 6', 'cv_admin': 9, 'pl_debout': 0, 'db': 74, 'rpm': 5800, 'couleur': 'Bleu', 'carburant': 'Diesel'}, # Campagnola
-        29: {'pv': 2200, 'pm': 3500, 'permis': 'C', 'pl': 3, 'cyl': 2300, 'cv': 140, 'co2': 225, 'classe': 'Euro 6', 'cv_admin': 11, 'pl_debout': 0, 'db': 77, 'rpm': 4300, 'couleur': 'Blanc', 'carburant': 'Diesel'}, # Daily 35C
-        30: {'pv': 2500, 'pm': 5000, 'permis': 'C', 'pl': 3, 'cyl': 2998, 'cv': 180, 'co2': 245, 'classe': 'Euro 6', 'cv_admin': 13, 'pl_debout': 0, 'db': 80, 'rpm': 4000, 'couleur': 'Rouge', 'carburant': 'Diesel'}, # Daily 50C
-
-        # FORD (31-36)
-        31: {'pv': 115, 'pm': 290, 'permis': 'A1', 'pl': 2, 'cyl': 125, 'cv': 10, 'co2': 50, 'classe': 'Euro 5', 'cv_admin': 2, 'pl_debout': 0, 'db': 84, 'rpm': 9200, 'couleur': 'Bleu', 'carburant': 'Essence'},    # Street 125
-        32: {'pv': 170, 'pm': 360, 'permis': 'A2', 'pl': 2, 'cyl': 450, 'cv': 35, 'co2': 78, 'classe': 'Euro 5', 'cv_admin': 4, 'pl_debout': 0, 'db': 89, 'rpm': 8200, 'couleur': 'Vert', 'carburant': 'Essence'},    # Ranger Bike
-        33: {'pv': 1150, 'pm': 1650, 'permis': 'B', 'pl': 5, 'cyl': 999, 'cv': 95, 'co2': 115, 'classe': 'Euro 6d', 'cv_admin': 6, 'pl_debout': 0, 'db': 70, 'rpm': 6400, 'couleur': 'Vert', 'carburant': 'Essence'},   # Fiesta
-        34: {'pv': 1300, 'pm': 1850, 'permis': 'B', 'pl': 5, 'cyl': 1498, 'cv': 120, 'co2': 125, 'classe': 'Euro 6d', 'cv_admin': 8, 'pl_debout': 0, 'db': 72, 'rpm': 6300, 'couleur': 'Gris', 'carburant': 'Essence'}, # Focus
-        35: {'pv': 2100, 'pm': 3500, 'permis': 'C', 'pl': 3, 'cyl': 1995, 'cv': 130, 'co2': 210, 'classe': 'Euro 6', 'cv_admin': 10, 'pl_debout': 0, 'db': 75, 'rpm': 4600, 'couleur': 'Blanc', 'carburant': 'Diesel'}, # Transit 350
-        36: {'pv': 2800, 'pm': 4700, 'permis': 'C', 'pl': 3, 'cyl': 1995, 'cv': 170, 'co2': 245, 'classe': 'Euro 6', 'cv_admin': 12, 'pl_debout': 0, 'db': 78, 'rpm': 4400, 'couleur': 'Bleu', 'carburant': 'Diesel'}, # Transit 470
-    }
-
-
     # Récupération des modèles de véhicules pour le menu déroulant (Nécessaire pour GET et POST)
-    query_modeles = """
-        SELECT m.id, m.modele, m.type_vehicule, ma.nom as marque_nom
-        FROM modeles m
-        JOIN marques ma ON m.marque_id = ma.id
-        ORDER BY ma.nom, m.modele
-    """
-    modeles = db.fetch_all(query_modeles)
+    modeles = catalogue().modeles(db)
 
     prefilled_data = None
     form_data = request.form
@@ -190,6 +347,7 @@ def add_carte_grise():
                 vitesse_max_moteur_rpm = request.form.get('vitesse_max_moteur_rpm')
                 date_fin_validite = request.form.get('date_fin_validite')
                 date_premier_controle = request.form.get('date_premier_controle')
+                date_prochain_controle = request.form.get('date_prochain_controle')
                 date_controle_2 = request.form.get('date_controle_2')
                 date_controle_3 = request.form.get('date_controle_3')
                 couleur_principale = str(escape(request.form.get('couleur_principale', '').strip()))
@@ -204,8 +362,9 @@ def add_carte_grise():
                 proprietaire = db.fetch_one(query_prop, (nom, prenom, adresse))
                 
                 if not proprietaire:
-                    insert_prop = "INSERT INTO proprietaires (nom, prenom, adresse) VALUES (%s, %s, %s)"
-                    proprietaire_id = db.execute_query(insert_prop, (nom, prenom, adresse))
+                    # Code postal et département extraits de l'adresse (colonnes indexées)
+                    insert_prop = "INSERT INTO proprietaires (nom, prenom, adresse, code_postal, departement) VALUES (%s, %s, %s, %s, %s)"
+                    proprietaire_id = db.execute_query(insert_prop, (nom, prenom, adresse) + localiser_adresse(adresse))
                 else:
                     proprietaire_id = proprietaire['id']
 
@@ -215,7 +374,7 @@ def add_carte_grise():
                 numero_carte = generer_numero_carte_grise_depuis_db(db)
                 
                 # Génération du prochain numéro de plaque d'immatriculation
-                numero_plaque = generer_numero_plaque_unique_depuis_db(db)
+                numero_plaque = generer_numero_plaque_unique_depuis_db(db, filtre=filtres_unicite())
                 
                 if not numero_plaque:
                     flash('Erreur: Impossible de générer un numéro de plaque unique!', 'error')
@@ -238,13 +397,15 @@ def add_carte_grise():
                 if numero_serie.strip():
                     # Utiliser le VIN fourni par l'utilisateur
                     # Vérifier qu'il n'existe pas déjà
-                    existing_vin = db.fetch_one("SELECT id FROM cartes_grises WHERE numero_serie=%s", (numero_serie,))
+                    existing_vin = filtres_unicite().existe('vins', numero_serie, lambda: db.fetch_one(
+                        "SELECT id FROM cartes_grises WHERE numero_serie=%s", (numero_serie,)))
                     if existing_vin:
                         flash('Ce numéro VIN existe déjà dans la base de données!', 'error')
                         return redirect(url_for('add_carte_grise'))
                 else:
                     # Générer automatiquement le VIN
-                    numero_serie = generer_numero_serie_depuis_db(db, modele_info['numero_fabricant'], date_premiere_immat)
+                    numero_serie = generer_numero_serie_depuis_db(db, modele_info['numero_fabricant'], date_premiere_immat,
+                                                                  archive=TABLE_ARCHIVE)
                 
                 # Insertion de la nouvelle carte grise en base de données
                 insert_carte = """
@@ -256,8 +417,8 @@ def add_carte_grise():
                         places_assises, places_debout, emission_co2_g_km,
                         classe_environnementale, niveau_sonore_db, vitesse_max_moteur_rpm,
                         couleur_principale, date_fin_validite, date_premier_controle, 
-                        date_controle_2, date_controle_3
-                    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                        date_controle_2, date_controle_3, date_prochain_controle
+                    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
                 """
                 params = (
                     numero_carte, numero_plaque, date_premiere_immat,
@@ -277,12 +438,23 @@ def add_carte_grise():
                     date_fin_validite if date_fin_validite else None,
                     date_premier_controle if date_premier_controle else None,
                     date_controle_2 if date_controle_2 else None,
-                    date_controle_3 if date_controle_3 else None
+                    date_controle_3 if date_controle_3 else None,
+                    date_prochain_controle if date_prochain_controle else None
                 )
                 
-                if db.execute_query(insert_carte, params):
+                carte_id = db.execute_query(insert_carte, params)
+                if carte_id:
+                    # Copie des dates dans la table indexée des contrôles techniques
+                    synchroniser_controles(db, carte_id)
+                    # La plaque a pu être lue (inconnue) avant sa création
+                    cache_plaques().invalider(numero_plaque)
+                    filtres_unicite().ajouter('plaques', numero_plaque)
+                    filtres_unicite().ajouter('vins', numero_serie)
                     flash(f'Carte grise créée avec succès! Numéro: {numero_carte}, Plaque: {formater_numero_plaque(numero_plaque)}', 'success')
                     return redirect(url_for('index'))
+                elif db.fetch_one("SELECT id FROM cartes_grises WHERE numero_serie=%s", (numero_serie,)):
+                    # VIN enregistré par un autre worker depuis la construction de ses filtres
+                    flash('Ce numéro VIN existe déjà dans la base de données!', 'error')
                 else:
                     flash('Erreur lors de la création de la carte grise!', 'error')
         
@@ -290,95 +462,35 @@ def add_carte_grise():
                 flash(f'Erreur: {str(e)}', 'error')
     
     # Récupération des modèles pour le menu déroulant
-    modeles = db.fetch_all("""
-        SELECT m.id, m.modele, m.type_vehicule, ma.nom as marque_nom, c.nom as categorie_nom
-        FROM modeles m
-        JOIN marques ma ON m.marque_id = ma.id
-        JOIN categories_vehicule c ON m.categorie_id = c.id
-        ORDER BY ma.nom, m.modele
-    """)
+    modeles = catalogue().modeles(db, avec_categorie=True)
     
     return render_template('add.html', modeles=modeles)
 
-@app.route('/edit/<int:carte_id>', methods=['GET', 'POST'])
+def _carte_a_modifier(carte_id):
+    """Carte grise affichée par le formulaire de modification (colonnes de COLONNES_EDITION)"""
+    return db.fetch_one(f"""
+        SELECT {COLONNES_EDITION}
+        FROM cartes_grises cg
+        JOIN proprietaires p ON cg.proprietaire_id = p.id
+        JOIN modeles mo ON cg.modele_id = mo.id
+        JOIN marques ma ON mo.marque_id = ma.id
+        WHERE cg.id = %s
+    """, (carte_id,))
+
+def _reafficher_modification(carte_id, modeles, statut):
+    """Formulaire de modification rouvert sur la carte actuelle (et sa version), avec ce code HTTP"""
+    carte = _carte_a_modifier(carte_id)
+    if not carte:
+        flash('Carte grise introuvable!', 'error')
+        return redirect(url_for('index'))
+    return render_template('edit.html', carte=carte, modeles=modeles, prefilled=None, selected_modele_id=None,
+                           date_today=date.today()), statut
+
 def edit_carte_grise(carte_id):
     """Modification d'une carte grise existante"""
     
-    # Données techniques de référence (same as add route)
-    DONNEES_TECHNIQUES_REF = {
-        # Honda
-        1: {'pv': 190, 'pm': 370, 'permis': 'A2', 'pl': 2, 'cyl': 471, 'cv': 48, 'co2': 80, 'classe': 'Euro 5', 'cv_admin': 6, 'pl_debout': 0, 'db': 95, 'rpm': 8500, 'couleur': 'Rouge'},
-        2: {'pv': 201, 'pm': 390, 'permis': 'A', 'pl': 2, 'cyl': 999, 'cv': 217, 'co2': 160, 'classe': 'Euro 4', 'cv_admin': 15, 'pl_debout': 0, 'db': 105, 'rpm': 13000, 'couleur': 'Noir'},
-        3: {'pv': 1300, 'pm': 1800, 'permis': 'B', 'pl': 5, 'cyl': 1498, 'cv': 182, 'co2': 128, 'classe': 'Euro 6d', 'cv_admin': 9, 'pl_debout': 0, 'db': 72, 'rpm': 6500, 'couleur': 'Blanc'},
-        4: {'pv': 1600, 'pm': 2200, 'permis': 'B', 'pl': 5, 'cyl': 1993, 'cv': 184, 'co2': 153, 'classe': 'Euro 6d', 'cv_admin': 10, 'pl_debout': 0, 'db': 75, 'rpm': 6000, 'couleur': 'Gris'},
-        5: {'pv': 2800, 'pm': 4500, 'permis': 'C', 'pl': 3, 'cyl': 2999, 'cv': 150, 'co2': 210, 'classe': 'Euro 6', 'cv_admin': 12, 'pl_debout': 0, 'db': 78, 'rpm': 4500, 'couleur': 'Blanc'},
-        6: {'pv': 2600, 'pm': 3500, 'permis': 'C', 'pl': 3, 'cyl': 2488, 'cv': 130, 'co2': 220, 'classe': 'Euro 6', 'cv_admin': 11, 'pl_debout': 0, 'db': 76, 'rpm': 4200, 'couleur': 'Blanc'},
-        # Peugeot
-        7: {'pv': 95, 'pm': 270, 'permis': 'A1', 'pl': 2, 'cyl': 49, 'cv': 4, 'co2': 45, 'classe': 'Euro 5', 'cv_admin': 1, 'pl_debout': 0, 'db': 82, 'rpm': 8000, 'couleur': 'Bleu'},
-        8: {'pv': 280, 'pm': 450, 'permis': 'A', 'pl': 2, 'cyl': 399, 'cv': 36, 'co2': 89, 'classe': 'Euro 5', 'cv_admin': 5, 'pl_debout': 0, 'db': 88, 'rpm': 7500, 'couleur': 'Argent'},
-        9: {'pv': 1050, 'pm': 1550, 'permis': 'B', 'pl': 5, 'cyl': 1199, 'cv': 100, 'co2': 102, 'classe': 'Euro 6d', 'cv_admin': 7, 'pl_debout': 0, 'db': 70, 'rpm': 6200, 'couleur': 'Bleu'},
-        10: {'pv': 1500, 'pm': 2100, 'permis': 'B', 'pl': 7, 'cyl': 1598, 'cv': 180, 'co2': 140, 'classe': 'Euro 6d', 'cv_admin': 9, 'pl_debout': 0, 'db': 73, 'rpm': 6000, 'couleur': 'Noir'},
-        11: {'pv': 2100, 'pm': 4400, 'permis': 'C', 'pl': 3, 'cyl': 2179, 'cv': 140, 'co2': 230, 'classe': 'Euro 6', 'cv_admin': 11, 'pl_debout': 0, 'db': 77, 'rpm': 4000, 'couleur': 'Blanc'},
-        12: {'pv': 1800, 'pm': 3100, 'permis': 'C', 'pl': 3, 'cyl': 1997, 'cv': 145, 'co2': 190, 'classe': 'Euro 6', 'cv_admin': 10, 'pl_debout': 0, 'db': 75, 'rpm': 4500, 'couleur': 'Gris'},
-        # RENAULT (IDs 13 à 18)
-        13: {'pv': 120, 'pm': 300, 'permis': 'A1', 'pl': 2, 'cyl': 124, 'cv': 11, 'co2': 55, 'classe': 'Euro 5', 'cv_admin': 2, 'pl_debout': 0, 'db': 85, 'rpm': 9000, 'couleur': 'Rouge'},
-        14: {'pv': 160, 'pm': 340, 'permis': 'A2', 'pl': 2, 'cyl': 395, 'cv': 30, 'co2': 75, 'classe': 'Euro 5', 'cv_admin': 4, 'pl_debout': 0, 'db': 90, 'rpm': 8000, 'couleur': 'Jaune'},
-        15: {'pv': 1100, 'pm': 1600, 'permis': 'B', 'pl': 5, 'cyl': 999, 'cv': 90, 'co2': 110, 'classe': 'Euro 6d', 'cv_admin': 6, 'pl_debout': 0, 'db': 69, 'rpm': 6500, 'couleur': 'Gris'},
-        16: {'pv': 1400, 'pm': 1950, 'permis': 'B', 'pl': 5, 'cyl': 1332, 'cv': 140, 'co2': 130, 'classe': 'Euro 6d', 'cv_admin': 8, 'pl_debout': 0, 'db': 71, 'rpm': 6200, 'couleur': 'Bleu'},
-        17: {'pv': 2200, 'pm': 3500, 'permis': 'C', 'pl': 3, 'cyl': 2299, 'cv': 135, 'co2': 240, 'classe': 'Euro 6', 'cv_admin': 11, 'pl_debout': 0, 'db': 76, 'rpm': 4200, 'couleur': 'Jaune'},
-        18: {'pv': 2400, 'pm': 4500, 'permis': 'C', 'pl': 3, 'cyl': 2488, 'cv': 140, 'co2': 250, 'classe': 'Euro 6', 'cv_admin': 12, 'pl_debout': 0, 'db': 78, 'rpm': 4000, 'couleur': 'Blanc'},
-        # MERCEDES (19-24)
-        19: {'pv': 130, 'pm': 310, 'permis': 'A1', 'pl': 2, 'cyl': 125, 'cv': 12, 'co2': 60, 'classe': 'Euro 5', 'cv_admin': 2, 'pl_debout': 0, 'db': 83, 'rpm': 9500, 'couleur': 'Argent'},
-        20: {'pv': 210, 'pm': 400, 'permis': 'A', 'pl': 2, 'cyl': 998, 'cv': 200, 'co2': 155, 'classe': 'Euro 4', 'cv_admin': 14, 'pl_debout': 0, 'db': 102, 'rpm': 12500, 'couleur': 'Noir'},
-        21: {'pv': 1350, 'pm': 1900, 'permis': 'B', 'pl': 5, 'cyl': 1461, 'cv': 116, 'co2': 120, 'classe': 'Euro 6d', 'cv_admin': 7, 'pl_debout': 0, 'db': 68, 'rpm': 6800, 'couleur': 'Noir'},
-        22: {'pv': 1800, 'pm': 2400, 'permis': 'B', 'pl': 5, 'cyl': 1993, 'cv': 190, 'co2': 160, 'classe': 'Euro 6d', 'cv_admin': 10, 'pl_debout': 0, 'db': 74, 'rpm': 6200, 'couleur': 'Argent'},
-        23: {'pv': 2600, 'pm': 5000, 'permis': 'C', 'pl': 3, 'cyl': 2143, 'cv': 163, 'co2': 215, 'classe': 'Euro 6', 'cv_admin': 13, 'pl_debout': 0, 'db': 79, 'rpm': 4500, 'couleur': 'Argent'},
-        24: {'pv': 2900, 'pm': 4800, 'permis': 'C', 'pl': 3, 'cyl': 4250, 'cv': 170, 'co2': 230, 'classe': 'Euro 6', 'cv_admin': 14, 'pl_debout': 0, 'db': 81, 'rpm': 3800, 'couleur': 'Blanc'},
-        # IVECO (25-30)
-        25: {'pv': 150, 'pm': 330, 'permis': 'A2', 'pl': 2, 'cyl': 300, 'cv': 28, 'co2': 70, 'classe': 'Euro 5', 'cv_admin': 3, 'pl_debout': 0, 'db': 87, 'rpm': 8500, 'couleur': 'Orange'},
-        26: {'pv': 220, 'pm': 420, 'permis': 'A', 'pl': 2, 'cyl': 1100, 'cv': 210, 'co2': 165, 'classe': 'Euro 4', 'cv_admin': 15, 'pl_debout': 0, 'db': 106, 'rpm': 12000, 'couleur': 'Orange'},
-        27: {'pv': 2000, 'pm': 2800, 'permis': 'B', 'pl': 5, 'cyl': 2998, 'cv': 176, 'co2': 200, 'classe': 'Euro 6', 'cv_admin': 10, 'pl_debout': 0, 'db': 76, 'rpm': 5500, 'couleur': 'Vert'},
-        28: {'pv': 1900, 'pm': 2600, 'permis': 'B', 'pl': 5, 'cyl': 2500, 'cv': 150, 'co2': 190, 'classe': 'Euro 6', 'cv_admin': 9, 'pl_debout': 0, 'db': 74, 'rpm': 5800, 'couleur': 'Bleu'},
-        29: {'pv': 2200, 'pm': 3500, 'permis': 'C', 'pl': 3, 'cyl': 2300, 'cv': 140, 'co2': 225, 'classe': 'Euro 6', 'cv_admin': 11, 'pl_debout': 0, 'db': 77, 'rpm': 4300, 'couleur': 'Blanc'},
-        30: {'pv': 2500, 'pm': 5000, 'permis': 'C', 'pl': 3, 'cyl': 2998, 'cv': 180, 'co2': 245, 'classe': 'Euro 6', 'cv_admin': 13, 'pl_debout': 0, 'db': 80, 'rpm': 4000, 'couleur': 'Rouge'},
-        # FORD (31-36)
-        31: {'pv': 115, 'pm': 290, 'permis': 'A1', 'pl': 2, 'cyl': 125, 'cv': 10, 'co2': 50, 'classe': 'Euro 5', 'cv_admin': 2, 'pl_debout': 0, 'db': 84, 'rpm': 9200, 'couleur': 'Bleu'},
-        32: {'pv': 170, 'pm': 360, 'permis': 'A2', 'pl': 2, 'cyl': 450, 'cv': 35, 'co2': 78, 'classe': 'Euro 5', 'cv_admin': 4, 'pl_debout': 0, 'db': 89, 'rpm': 8200, 'couleur': 'Vert'},
-        33: {'pv': 1150, 'pm': 1650, 'permis': 'B', 'pl': 5, 'cyl': 999, 'cv': 95, 'co2': 115, 'classe': 'Euro 6d', 'cv_admin': 6, 'pl_debout': 0, 'db': 70, 'rpm': 6400, 'couleur': 'Vert'},
-        34: {'pv': 1300, 'pm': 1850, 'permis': 'B', 'pl': 5, 'cyl': 1498, 'cv': 120, 'co2': 125, 'classe': 'Euro 6d', 'cv_admin': 8, 'pl_debout': 0, 'db': 72, 'rpm': 6300, 'couleur': 'Gris'},
-        35: {'pv': 2100, 'pm': 3500, 'permis': 'C', 'pl': 3, 'cyl': 1995, 'cv': 130, 'co2': 210, 'classe': 'Euro 6', 'cv_admin': 10, 'pl_debout': 0, 'db': 75, 'rpm': 4600, 'couleur': 'Blanc'},
-        36: {'pv': 2800, 'pm': 4700, 'permis': 'C', 'pl': 3, 'cyl': 1995, 'cv': 170, 'co2': 245, 'classe': 'Euro 6', 'cv_admin': 12, 'pl_debout': 0, 'db': 78, 'rpm': 4400, 'couleur': 'Bleu'},
-    
-        19: {'pv': 130, 'pm': 310, 'permis': 'A1', 'pl': 2, 'cyl': 125, 'cv': 12, 'co2': 60, 'classe': 'Euro 5', 'cv_admin': 2, 'pl_debout': 0, 'db': 83, 'rpm': 9500},
-        20: {'pv': 210, 'pm': 400, 'permis': 'A', 'pl': 2, 'cyl': 998, 'cv': 200, 'co2': 155, 'classe': 'Euro 4', 'cv_admin': 14, 'pl_debout': 0, 'db': 102, 'rpm': 12500},
-        21: {'pv': 1350, 'pm': 1900, 'permis': 'B', 'pl': 5, 'cyl': 1461, 'cv': 116, 'co2': 120, 'classe': 'Euro 6d', 'cv_admin': 7, 'pl_debout': 0, 'db': 68, 'rpm': 6800},
-        22: {'pv': 1800, 'pm': 2400, 'permis': 'B', 'pl': 5, 'cyl': 1993, 'cv': 190, 'co2': 160, 'classe': 'Euro 6d', 'cv_admin': 10, 'pl_debout': 0, 'db': 74, 'rpm': 6200},
-        23: {'pv': 2600, 'pm': 5000, 'permis': 'C', 'pl': 3, 'cyl': 2143, 'cv': 163, 'co2': 215, 'classe': 'Euro 6', 'cv_admin': 13, 'pl_debout': 0, 'db': 79, 'rpm': 4500},
-        24: {'pv': 2900, 'pm': 4800, 'permis': 'C', 'pl': 3, 'cyl': 4250, 'cv': 170, 'co2': 230, 'classe': 'Euro 6', 'cv_admin': 14, 'pl_debout': 0, 'db': 81, 'rpm': 3800},
-        # IVECO (25-30)
-        25: {'pv': 150, 'pm': 330, 'permis': 'A2', 'pl': 2, 'cyl': 300, 'cv': 28, 'co2': 70, 'classe': 'Euro 5', 'cv_admin': 3, 'pl_debout': 0, 'db': 87, 'rpm': 8500},
-        26: {'pv': 220, 'pm': 420, 'permis': 'A', 'pl': 2, 'cyl': 1100, 'cv': 210, 'co2': 165, 'classe': 'Euro 4', 'cv_admin': 15, 'pl_debout': 0, 'db': 106, 'rpm': 12000},
-        27: {'pv': 2000, 'pm': 2800, 'permis': 'B', 'pl': 5, 'cyl': 2998, 'cv': 176, 'co2': 200, 'classe': 'Euro 6', 'cv_admin': 10, 'pl_debout': 0, 'db': 76, 'rpm': 5500},
-        28: {'pv': 1900, 'pm': 2600, 'permis': 'B', 'pl': 5, 'cyl': 2500, 'cv': 150, 'co2': 190, 'classe': 'Euro 6', 'cv_admin': 9, 'pl_debout': 0, 'db': 74, 'rpm': 5800},
-        29: {'pv': 2200, 'pm': 3500, 'permis': 'C', 'pl': 3, 'cyl': 2300, 'cv': 140, 'co2': 225, 'classe': 'Euro 6', 'cv_admin': 11, 'pl_debout': 0, 'db': 77, 'rpm': 4300},
-        30: {'pv': 2500, 'pm': 5000, 'permis': 'C', 'pl': 3, 'cyl': 2998, 'cv': 180, 'co2': 245, 'classe': 'Euro 6', 'cv_admin': 13, 'pl_debout': 0, 'db': 80, 'rpm': 4000},
-        # FORD (31-36)
-        31: {'pv': 115, 'pm': 290, 'permis': 'A1', 'pl': 2, 'cyl': 125, 'cv': 10, 'co2': 50, 'classe': 'Euro 5', 'cv_admin': 2, 'pl_debout': 0, 'db': 84, 'rpm': 9200},
-        32: {'pv': 170, 'pm': 360, 'permis': 'A2', 'pl': 2, 'cyl': 450, 'cv': 35, 'co2': 78, 'classe': 'Euro 5', 'cv_admin': 4, 'pl_debout': 0, 'db': 89, 'rpm': 8200},
-        33: {'pv': 1150, 'pm': 1650, 'permis': 'B', 'pl': 5, 'cyl': 999, 'cv': 95, 'co2': 115, 'classe': 'Euro 6d', 'cv_admin': 6, 'pl_debout': 0, 'db': 70, 'rpm': 6400},
-        34: {'pv': 1300, 'pm': 1850, 'permis': 'B', 'pl': 5, 'cyl': 1498, 'cv': 120, 'co2': 125, 'classe': 'Euro 6d', 'cv_admin': 8, 'pl_debout': 0, 'db': 72, 'rpm': 6300},
-        35: {'pv': 2100, 'pm': 3500, 'permis': 'C', 'pl': 3, 'cyl': 1995, 'cv': 130, 'co2': 210, 'classe': 'Euro 6', 'cv_admin': 10, 'pl_debout': 0, 'db': 75, 'rpm': 4600},
-        36: {'pv': 2800, 'pm': 4700, 'permis': 'C', 'pl': 3, 'cyl': 1995, 'cv': 170, 'co2': 245, 'classe': 'Euro 6', 'cv_admin': 12, 'pl_debout': 0, 'db': 78, 'rpm': 4400},
-    }
-    
     # Récupération des modèles
-    query_modeles = """
-        SELECT m.id, m.modele, m.type_vehicule, ma.nom as marque_nom
-        FROM modeles m
-        JOIN marques ma ON m.marque_id = ma.id
-        ORDER BY ma.nom, m.modele
-    """
-    modeles = db.fetch_all(query_modeles)
+    modeles = catalogue().modeles(db)
     
     prefilled_data = None
     selected_modele_id = None
@@ -386,8 +498,8 @@ def edit_carte_grise(carte_id):
     if request.method == 'POST':
         if 'btn_load' in request.form and 'modele_id' in request.form:
             modele_id = request.form.get('modele_id')
-            if modele_id and int(modele_id) in DONNEES_TECHNIQUES_REF:
-                ref = DONNEES_TECHNIQUES_REF[int(modele_id)]
+            if modele_id and int(modele_id) in DONNEES_TECHNIQUES_REF_EDITION:
+                ref = DONNEES_TECHNIQUES_REF_EDITION[int(modele_id)]
                 prefilled_data = {
                     'poids_vide': ref.get('pv'),
                     'poids_max': ref.get('pm'),
@@ -407,19 +519,11 @@ def edit_carte_grise(carte_id):
                 selected_modele_id = modele_id
             
             # Récupération des données de la carte grise pour l'affichage
-            carte = db.fetch_one("""
-                SELECT cg.*, 
-                       p.nom, p.prenom, p.adresse,
-                       mo.modele, mo.type_vehicule,
-                       ma.nom as marque_nom
-                FROM cartes_grises cg
-                JOIN proprietaires p ON cg.proprietaire_id = p.id
-                JOIN modeles mo ON cg.modele_id = mo.id
-                JOIN marques ma ON mo.marque_id = ma.id
-                WHERE cg.id = %s
-            """, (carte_id,))
+            carte = _carte_a_modifier(carte_id)
             
-            return render_template('edit.html', carte=carte, modeles=modeles, prefilled=prefilled_data, selected_modele_id=selected_modele_id)
+            # La version reste celle de l'ouverture du formulaire
+            return render_template('edit.html', carte=carte, modeles=modeles, prefilled=prefilled_data, selected_modele_id=selected_modele_id,
+                                   version=request.form.get('version', type=int))
         
         try:
             # Récupération des données du formulaire
@@ -451,104 +555,253 @@ def edit_carte_grise(carte_id):
             if not all([nom, prenom, adresse, modele_id, date_premiere_immat, categorie_permis]):
                 flash('Les champs nom, prénom, adresse, modèle, date et catégorie de permis sont obligatoires!', 'error')
                 return redirect(url_for('edit_carte_grise', carte_id=carte_id))
+            # Version de la carte à l'ouverture du formulaire : sans elle, aucune modification
+            # concurrente ne peut être détectée (ce n'est pas un conflit, le formulaire est incomplet)
+            version = request.form.get('version', type=int)
+            if version is None:
+                flash('Formulaire incomplet (version de la carte absente ou invalide) : '
+                      'vos modifications n\'ont pas été enregistrées. Rechargez le formulaire puis recommencez.', 'error')
+                return _reafficher_modification(carte_id, modeles, 400)
             
-            # Vérification ou création du propriétaire
+            # Carte telle qu'elle est en base : seules les colonnes qui en diffèrent sont écrites
+            carte_actuelle = db.fetch_one("SELECT * FROM cartes_grises WHERE id=%s", (carte_id,))
+            if not carte_actuelle:
+                flash('Carte grise introuvable!', 'error')
+                return redirect(url_for('index'))
+
+            # Propriétaire existant, ou créé avec la mise à jour de la carte (même transaction) :
+            # un conflit de version ou un VIN en double ne laisse pas de propriétaire orphelin
             query_prop = "SELECT id FROM proprietaires WHERE nom=%s AND prenom=%s AND adresse=%s"
             proprietaire = db.fetch_one(query_prop, (nom, prenom, adresse))
-            
-            if not proprietaire:
-                insert_prop = "INSERT INTO proprietaires (nom, prenom, adresse) VALUES (%s, %s, %s)"
-                proprietaire_id = db.execute_query(insert_prop, (nom, prenom, adresse))
-            else:
-                proprietaire_id = proprietaire['id']
-            
-            # Vérification du VIN (ne doit pas exister pour d'autres véhicules)
-            if numero_serie.strip():
-                existing_vin = db.fetch_one("SELECT id FROM cartes_grises WHERE numero_serie=%s AND id!=%s", (numero_serie, carte_id))
+            nouveau_proprietaire = None if proprietaire else (nom, prenom, adresse) + localiser_adresse(adresse)
+
+            modifications = calculer_modifications(carte_actuelle, {
+                'modele_id': modele_id,
+                'date_premiere_immat': date_premiere_immat, 'numero_serie': numero_serie,
+                'categorie_permis': categorie_permis, 'carburant_energie': carburant_energie,
+                'poids_vide_kg': poids_vide, 'poids_max_kg': poids_max,
+                'places_assises': places_assises, 'places_debout': places_debout,
+                'cylindree_cm3': cylindree, 'puissance_chevaux': puissance_chevaux,
+                'puissance_administrative_cv': puissance_administrative_cv,
+                'emission_co2_g_km': emission_co2, 'classe_environnementale': classe_env,
+                'niveau_sonore_db': niveau_sonore_db, 'vitesse_max_moteur_rpm': vitesse_max_moteur_rpm,
+                'date_fin_validite': date_fin_validite, 'date_premier_controle': date_premier_controle,
+                'date_controle_2': date_controle_2, 'date_controle_3': date_controle_3,
+                **({'proprietaire_id': proprietaire['id']} if proprietaire else {}),
+            })
+            if not modifications and not nouveau_proprietaire:
+                flash('Aucune modification à enregistrer.', 'success')
+                return redirect(url_for('index'))
+
+            # Vérification du VIN (ne doit pas exister pour d'autres véhicules), s'il a changé
+            if modifications.get('numero_serie'):
+                existing_vin = filtres_unicite().existe('vins', modifications['numero_serie'], lambda: db.fetch_one(
+                    "SELECT id FROM cartes_grises WHERE numero_serie=%s AND id!=%s", (modifications['numero_serie'], carte_id)))
                 if existing_vin:
                     flash('Ce numéro VIN existe déjà pour un autre véhicule!', 'error')
                     return redirect(url_for('edit_carte_grise', carte_id=carte_id))
-            
-            # Mise à jour de la carte grise
-            update_query = """
-                UPDATE cartes_grises 
-                SET proprietaire_id=%s, modele_id=%s, date_premiere_immat=%s, numero_serie=%s, categorie_permis=%s,
-                    carburant_energie=%s, poids_vide_kg=%s, poids_max_kg=%s, places_assises=%s, places_debout=%s,
-                    cylindree_cm3=%s, puissance_chevaux=%s, puissance_administrative_cv=%s,
-                    emission_co2_g_km=%s, classe_environnementale=%s, niveau_sonore_db=%s,
-                    vitesse_max_moteur_rpm=%s, date_fin_validite=%s, date_premier_controle=%s,
-                    date_controle_2=%s, date_controle_3=%s
-                WHERE id=%s
-            """
-            params = (
-                proprietaire_id, modele_id, date_premiere_immat, numero_serie,
-                categorie_permis,
-                carburant_energie if carburant_energie else None,
-                poids_vide, poids_max,
-                places_assises if places_assises else None,
-                places_debout if places_debout else None,
-                cylindree if cylindree else None,
-                puissance_chevaux if puissance_chevaux else None,
-                puissance_administrative_cv if puissance_administrative_cv else None,
-                emission_co2 if emission_co2 else None,
-                classe_env if classe_env else None,
-                niveau_sonore_db if niveau_sonore_db else None,
-                vitesse_max_moteur_rpm if vitesse_max_moteur_rpm else None,
-                date_fin_validite if date_fin_validite else None,
-                date_premier_controle if date_premier_controle else None,
-                date_controle_2 if date_controle_2 else None,
-                date_controle_3 if date_controle_3 else None,
-                carte_id
-            )
-            
-            if db.execute_query(update_query, params):
-                flash('Carte grise mise à jour avec succès!', 'success')
-                return redirect(url_for('index'))
-            else:
-                flash('Erreur lors de la mise à jour!', 'error')
-        
+
+            # Mise à jour des seules colonnes modifiées, si personne n'a enregistré la carte entre-temps
+            try:
+                enregistrer_modifications(db, carte_id, version, modifications, nouveau_proprietaire)
+            except ConflitVersion:
+                flash('Cette carte grise a été modifiée par un autre agent depuis l\'ouverture du formulaire : '
+                      'vos modifications n\'ont pas été enregistrées. Vérifiez les valeurs actuelles puis recommencez.',
+                      'error')
+                return _reafficher_modification(carte_id, modeles, 409)
+            cache_plaques().invalider(carte_actuelle['numero_immatriculation'])
+            filtres_unicite().ajouter('vins', modifications.get('numero_serie'))
+            if set(modifications) & set(COLONNES_CONTROLES.values()):
+                synchroniser_controles(db, carte_id)
+            flash('Carte grise mise à jour avec succès!', 'success')
+            return redirect(url_for('index'))
+
         except Exception as e:
             flash(f'Erreur: {str(e)}', 'error')
     
     # Récupération des données de la carte grise
-    carte = db.fetch_one("""
-        SELECT cg.*, 
-               p.nom, p.prenom, p.adresse,
-               mo.modele, mo.type_vehicule,
-               ma.nom as marque_nom
-        FROM cartes_grises cg
-        JOIN proprietaires p ON cg.proprietaire_id = p.id
-        JOIN modeles mo ON cg.modele_id = mo.id
-        JOIN marques ma ON mo.marque_id = ma.id
-        WHERE cg.id = %s
-    """, (carte_id,))
+    carte = _carte_a_modifier(carte_id)
     
     if not carte:
         flash('Carte grise introuvable!', 'error')
         return redirect(url_for('index'))
     
-    # Import pour la date actuelle
-    from datetime import date
-    
     return render_template('edit.html', carte=carte, modeles=modeles, prefilled=prefilled_data, selected_modele_id=selected_modele_id, date_today=date.today())
 
-@app.route('/delete/<int:carte_id>', methods=['POST'])
 def delete_carte_grise(carte_id):
     """Suppression d'une carte grise"""
     # Note : On ne supprime pas le propriétaire, car il peut avoir d'autres véhicules.
+    carte = db.fetch_one("SELECT numero_immatriculation FROM cartes_grises WHERE id=%s", (carte_id,))
     query = "DELETE FROM cartes_grises WHERE id=%s"
     
     if db.execute_query(query, (carte_id,)):
+        if carte:
+            cache_plaques().invalider(carte['numero_immatriculation'])
         flash('Carte grise supprimée avec succès!', 'success')
     else:
         flash('Erreur lors de la suppression!', 'error')
     
     return redirect(url_for('index'))
 
-@app.route('/search', methods=['GET', 'POST'])
+def _executer_recherche(search_type, search_value, archives=False):
+    """
+    Exécute une recherche et retourne les lignes trouvées
+
+    Chaque type de recherche a une durée maximale d'exécution côté MySQL
+    (voir DELAIS_RECHERCHE_MS) : une recherche trop longue est interrompue par le serveur.
+    Avec archives, les cartes grises archivées sont aussi cherchées (archive_le renseigné).
+    """
+    delai = delai_recherche_ms(search_type)
+    cartes_grises = source_cartes(archives)
+    # Colonnes des listes de résultats ; archive_le n'existe que dans la source avec archives
+    colonnes = COLONNES_RESULTATS + (", cg.archive_le" if archives else "")
+
+    # Recherche par nom du propriétaire
+    if search_type == 'nom':
+        # Construction de la requête SQL avec jointures (JOIN)
+        # Les JOIN servent à récupérer les infos qui ne sont pas dans la table 'cartes_grises'
+        # (ex: le nom du propriétaire est dans la table 'proprietaires')
+        query = f"""
+            SELECT {colonnes}
+            FROM {cartes_grises} cg
+            JOIN proprietaires p ON cg.proprietaire_id = p.id
+            JOIN modeles mo ON cg.modele_id = mo.id
+            JOIN marques ma ON mo.marque_id = ma.id
+            WHERE p.nom LIKE %s
+            ORDER BY p.nom, p.prenom
+        """
+        # Injection du paramètre avec des jokers (%) pour le LIKE SQL
+        # f'%{valeur}%' signifie : "Contient cette valeur n'importe où"
+        return db.fetch_all(query, (f'%{search_value}%',), timeout_ms=delai, compact=True)
+
+    # Recherche par numéro de plaque
+    # Logique : L'utilisateur peut écrire AA-123-BB ou AA123BB, le code doit comprendre les deux.
+    elif search_type == 'plaque':
+        # 2. Normalisation (Nettoyage) en Python
+        # On retire les espaces et les tirets et on met tout en majuscules.
+        # Cela permet de comparer uniquement les caractères alphanumériques.
+        valeur_nettoyee = search_value.replace(' ', '').replace('-', '').strip().upper()
+
+        # La requête SQL est astucieuse : elle compare deux choses
+        # 1. La plaque telle qu'elle est stockée (avec tirets)
+        # 2. La plaque stockée SANS tirets (via REPLACE SQL) pour matcher la saisie nettoyée
+        query = f"""
+            SELECT {colonnes}
+            FROM {cartes_grises} cg
+            JOIN proprietaires p ON cg.proprietaire_id = p.id
+            JOIN modeles mo ON cg.modele_id = mo.id
+            JOIN marques ma ON mo.marque_id = ma.id
+            WHERE cg.numero_immatriculation LIKE %s
+            OR
+            REPLACE(cg.numero_immatriculation, '-', '') LIKE %s
+            ORDER BY cg.numero_immatriculation
+        """
+        param = f'%{valeur_nettoyee}%'
+        return db.fetch_all(query, (param, param), timeout_ms=delai, compact=True)
+
+    # Recherche par marque - (Ordre décroissant)
+    elif search_type == 'marque':
+        query = f"""
+            SELECT ma.nom as marque_nom, COUNT(*) as count
+            FROM {cartes_grises} cg
+            JOIN modeles mo ON cg.modele_id = mo.id
+            JOIN marques ma ON mo.marque_id = ma.id
+            GROUP BY ma.nom
+            ORDER BY count DESC
+        """
+        return db.fetch_all(query, timeout_ms=delai)
+
+    # Recherche par numéro VIN (numéro de série)
+    elif search_type == 'vin':
+        # Nettoyage de la valeur saisie : suppression des espaces
+        valeur_nettoyee = search_value.replace(' ', '').strip().upper()
+
+        query = f"""
+            SELECT {colonnes}
+            FROM {cartes_grises} cg
+            JOIN proprietaires p ON cg.proprietaire_id = p.id
+            JOIN modeles mo ON cg.modele_id = mo.id
+            JOIN marques ma ON mo.marque_id = ma.id
+            WHERE cg.numero_serie LIKE %s
+            ORDER BY cg.numero_serie
+        """
+        # Recherche partielle avec jokers pour permettre de chercher des fragments de VIN
+        param = f'%{valeur_nettoyee}%'
+        return db.fetch_all(query, (param,), timeout_ms=delai, compact=True)
+
+    # Lister le nombre de véhicules > X années avec pollution > Y
+    # Logique : L'utilisateur entre deux chiffres séparés par une virgule (ex: "10, 150")
+    # Le premier est l'âge minimum, le second le CO2 minimum.
+    elif search_type == 'critere_complexe':
+
+        # Valeurs par défaut (si l'utilisateur ne remplit rien)
+        age_min = 5
+        co2_min = 120
+
+        if ',' in search_value:
+            try:
+                parts = search_value.split(',')  # Divise "10, 150" en ["10", " 150"]
+                age_min = int(parts[0].strip())  # Convertit "10" en entier 10
+                co2_min = int(parts[1].strip())  # Convertit "150" en entier 150
+            except:
+                pass # On garde les valeurs par défaut si l'utilisateur écrit n'importe quoi
+
+                # L'instruction YEAR(CURRENT_DATE) - YEAR(date) permet de calculer l'âge
+        # directement dans la base de données, sans avoir à le faire en Python.
+        query = f"""
+            SELECT {colonnes},
+                   (YEAR(CURRENT_DATE) - YEAR(cg.date_premiere_immat)) as age_vehicule
+            FROM {cartes_grises} cg
+            JOIN proprietaires p ON cg.proprietaire_id = p.id
+            JOIN modeles mo ON cg.modele_id = mo.id
+            JOIN marques ma ON mo.marque_id = ma.id
+            WHERE (YEAR(CURRENT_DATE) - YEAR(cg.date_premiere_immat)) > %s
+              AND cg.emission_co2_g_km > %s
+            ORDER BY cg.emission_co2_g_km DESC
+        """
+        return db.fetch_all(query, (age_min, co2_min), timeout_ms=delai, compact=True)
+
+    # Recherche régionale : département (75, 2A, 971) ou début de code postal (750, 75011)
+    # Les colonnes departement et code_postal sont indexées : parcours d'une plage d'index
+    elif search_type == 'departement':
+        valeur_nettoyee = search_value.replace(' ', '').upper()
+        if est_departement(valeur_nettoyee):
+            condition, params = "p.departement = %s", (valeur_nettoyee,)
+        elif valeur_nettoyee.isdigit() and len(valeur_nettoyee) <= 5:
+            # Début de code postal : plage "750" -> 75000 à 75099 (utilisable par l'index avec MySQL et SQLite)
+            condition = "p.code_postal BETWEEN %s AND %s"
+            params = (valeur_nettoyee.ljust(5, '0'), valeur_nettoyee.ljust(5, '9'))
+        else:
+            flash('Indiquez un département (ex: 75, 2A, 971) ou un code postal (ex: 75011)', 'error')
+            return []
+        query = f"""
+            SELECT {colonnes}
+            FROM proprietaires p
+            JOIN {cartes_grises} cg ON cg.proprietaire_id = p.id
+            JOIN modeles mo ON cg.modele_id = mo.id
+            JOIN marques ma ON mo.marque_id = ma.id
+            WHERE {condition}
+            ORDER BY p.nom, p.prenom
+        """
+        return db.fetch_all(query, params, timeout_ms=delai, compact=True)
+
+    # Nombre de véhicules par département (parcours de l'index departement)
+    elif search_type == 'departements':
+        query = f"""
+            SELECT p.departement, COUNT(*) as count
+            FROM proprietaires p
+            JOIN {cartes_grises} cg ON cg.proprietaire_id = p.id
+            GROUP BY p.departement
+            ORDER BY count DESC
+        """
+        return db.fetch_all(query, timeout_ms=delai)
+
+    return []
+
 def search():
     """Recherche et filtrage des cartes grises"""
     cartes = []
+    archives = False
     
     # Vérification : On ne traite que si le formulaire a été envoyé (méthode POST)
     if request.method == 'POST':
@@ -560,119 +813,171 @@ def search():
         # .strip() est crucial : il nettoie les espaces invisibles avant et après la saisie
         # Exemple : Si l'utilisateur tape " Dupont ", cela devient "Dupont"
         search_value = request.form.get('search_value', '').strip()
-        
-        # Recherche par nom du propriétaire
-        if search_type == 'nom':
-            # Construction de la requête SQL avec jointures (JOIN)
-            # Les JOIN servent à récupérer les infos qui ne sont pas dans la table 'cartes_grises'
-            # (ex: le nom du propriétaire est dans la table 'proprietaires')
-            query = """
-                SELECT cg.*, p.nom, p.prenom, mo.modele, ma.nom as marque_nom
-                FROM cartes_grises cg
-                JOIN proprietaires p ON cg.proprietaire_id = p.id
-                JOIN modeles mo ON cg.modele_id = mo.id
-                JOIN marques ma ON mo.marque_id = ma.id
-                WHERE p.nom LIKE %s
-                ORDER BY p.nom, p.prenom
-            """
-            # Injection du paramètre avec des jokers (%) pour le LIKE SQL
-            # f'%{valeur}%' signifie : "Contient cette valeur n'importe où"
-            cartes = db.fetch_all(query, (f'%{search_value}%',))
-        
-        # Recherche par numéro de plaque
-        # Logique : L'utilisateur peut écrire AA-123-BB ou AA123BB, le code doit comprendre les deux.
-        elif search_type == 'plaque':
-            # 2. Normalisation (Nettoyage) en Python
-            # On retire les espaces et les tirets et on met tout en majuscules.
-            # Cela permet de comparer uniquement les caractères alphanumériques.
-            valeur_nettoyee = search_value.replace(' ', '').replace('-', '').strip().upper()
-
-            # La requête SQL est astucieuse : elle compare deux choses
-            # 1. La plaque telle qu'elle est stockée (avec tirets)
-            # 2. La plaque stockée SANS tirets (via REPLACE SQL) pour matcher la saisie nettoyée
-            query = """
-                SELECT cg.*, p.nom, p.prenom, mo.modele, ma.nom as marque_nom
-                FROM cartes_grises cg
-                JOIN proprietaires p ON cg.proprietaire_id = p.id
-                JOIN modeles mo ON cg.modele_id = mo.id
-                JOIN marques ma ON mo.marque_id = ma.id
-                WHERE cg.numero_immatriculation LIKE %s
-                OR
-                REPLACE(cg.numero_immatriculation, '-', '') LIKE %s
-                ORDER BY cg.numero_immatriculation
-            """
-            param = f'%{valeur_nettoyee}%'
-            cartes = db.fetch_all(query, (param, param))
-        
-        # Recherche par marque - (Ordre décroissant)
-        elif search_type == 'marque':
-            query = """
-                SELECT ma.nom as marque_nom, COUNT(*) as count
-                FROM cartes_grises cg
-                JOIN modeles mo ON cg.modele_id = mo.id
-                JOIN marques ma ON mo.marque_id = ma.id
-                GROUP BY ma.nom
-                ORDER BY count DESC
-            """
-            cartes = db.fetch_all(query)
-
-        # Recherche par numéro VIN (numéro de série)
-        elif search_type == 'vin':
-            # Nettoyage de la valeur saisie : suppression des espaces
-            valeur_nettoyee = search_value.replace(' ', '').strip().upper()
-            
-            query = """
-                SELECT cg.*, p.nom, p.prenom, mo.modele, ma.nom as marque_nom
-                FROM cartes_grises cg
-                JOIN proprietaires p ON cg.proprietaire_id = p.id
-                JOIN modeles mo ON cg.modele_id = mo.id
-                JOIN marques ma ON mo.marque_id = ma.id
-                WHERE cg.numero_serie LIKE %s
-                ORDER BY cg.numero_serie
-            """
-            # Recherche partielle avec jokers pour permettre de chercher des fragments de VIN
-            param = f'%{valeur_nettoyee}%'
-            cartes = db.fetch_all(query, (param,))
-
-        # Lister le nombre de véhicules > X années avec pollution > Y
-        # Logique : L'utilisateur entre deux chiffres séparés par une virgule (ex: "10, 150")
-        # Le premier est l'âge minimum, le second le CO2 minimum.
-        elif search_type == 'critere_complexe':
-
-            # Valeurs par défaut (si l'utilisateur ne remplit rien)
-            age_min = 5
-            co2_min = 120
-
-            if ',' in search_value:
-                try:
-                    parts = search_value.split(',')  # Divise "10, 150" en ["10", " 150"]
-                    age_min = int(parts[0].strip())  # Convertit "10" en entier 10
-                    co2_min = int(parts[1].strip())  # Convertit "150" en entier 150
-                except:
-                    pass # On garde les valeurs par défaut si l'utilisateur écrit n'importe quoi
-
-                    # L'instruction YEAR(CURRENT_DATE) - YEAR(date) permet de calculer l'âge
-            # directement dans la base de données, sans avoir à le faire en Python.
-            query = """
-                SELECT cg.*, p.nom, p.prenom, mo.modele, ma.nom as marque_nom,
-                       (YEAR(CURRENT_DATE) - YEAR(cg.date_premiere_immat)) as age_vehicule
-                FROM cartes_grises cg
-                JOIN proprietaires p ON cg.proprietaire_id = p.id
-                JOIN modeles mo ON cg.modele_id = mo.id
-                JOIN marques ma ON mo.marque_id = ma.id
-                WHERE (YEAR(CURRENT_DATE) - YEAR(cg.date_premiere_immat)) > %s
-                  AND cg.emission_co2_g_km > %s
-                ORDER BY cg.emission_co2_g_km DESC
-            """
-            cartes = db.fetch_all(query, (age_min, co2_min))
+        # Cartes archivées incluses seulement si la case est cochée
+        archives = request.form.get('archives') == '1'
+
+        if search_type in RECHERCHES_LOURDES or archives:
+            # Recherches lourdes (parcours de toute la table, ou des archives) : nombre limité en parallèle
+            limiteur = current_app.extensions['limiteur_recherches']
+            try:
+                with limiteur.admettre():
+                    cartes = _executer_recherche(search_type, search_value, archives)
+            except RechercheRefusee:
+                flash('Trop de recherches en cours. Veuillez réessayer dans quelques instants.', 'error')
+                reponse = make_response(render_template('search.html', cartes=[], archives=archives), 503)
+                reponse.headers['Retry-After'] = str(limiteur.reessayer_apres_s)
+                return reponse
+        else:
+            cartes = _executer_recherche(search_type, search_value)
+
+        if db.derniere_erreur == ERREUR_DELAI_DEPASSE:
+            flash('La recherche a dépassé le temps maximum autorisé. Veuillez affiner vos critères.', 'error')
+
     # Rendu final : on envoie la liste 'cartes' au template HTML
-    return render_template('search.html', cartes=cartes)
+    return render_template('search.html', cartes=cartes, archives=archives)
+
+def controles_a_venir():
+    """Contrôles techniques des prochains jours, par date, page par page"""
+    try:
+        jours = min(max(int(request.args.get('jours', JOURS_CONTROLES)), 1), 366)
+    except ValueError:
+        jours = JOURS_CONTROLES
+
+    # Curseur de la page suivante : "AAAA-MM-JJ.id" (dernier contrôle de la page précédente)
+    apres = None
+    if request.args.get('apres'):
+        try:
+            date_apres, id_apres = request.args['apres'].split('.')
+            apres = (date.fromisoformat(date_apres), int(id_apres))
+        except ValueError:
+            flash('Page demandée invalide, retour à la première page.', 'error')
+
+    controles, suivant = lister_controles_a_venir(db, jours, apres, TAILLE_PAGE_CONTROLES)
+    # Le total n'est affiché qu'en première page
+    total = compter_controles_a_venir(db, jours) if apres is None else None
+    curseur = f"{suivant[0]}.{suivant[1]}" if suivant else None
+    return render_template('controles.html', controles=controles, jours=jours, total=total,
+                           suivant=curseur, premiere_page=apres is None)
+
+def liste_travaux():
+    """Travaux en arrière-plan : lancement et suivi"""
+    return render_template('travaux.html', travaux=lister_travaux(db), types=TYPES_TRAVAUX,
+                           statuts_finaux=STATUTS_FINAUX)
+
+def lancer_travail():
+    """Enregistre un travail en arrière-plan et répond sans attendre son exécution"""
+    if request.is_json:
+        donnees = request.get_json(silent=True) or {}
+        nom_type, parametres = donnees.get('type_travail'), donnees.get('parametres') or {}
+    else:
+        nom_type = request.form.get('type_travail')
+        # Champs du formulaire renseignés (les autres gardent la valeur par défaut du travail)
+        parametres = {nom: request.form[nom].strip() for nom in ('debut', 'fin', 'motif', 'lot')
+                      if request.form.get(nom, '').strip()}
+    try:
+        if 'lot' in parametres:
+            parametres['lot'] = int(parametres['lot'])
+        travail_id = creer_travail(db, nom_type, parametres)
+    except (TypeError, ValueError) as e:
+        if request.is_json:
+            return jsonify(erreur=str(e)), 400
+        flash(f'Travail refusé : {e}', 'error')
+        return redirect(url_for('liste_travaux'))
+
+    if request.is_json:
+        if not travail_id:
+            return jsonify(erreur="Enregistrement du travail impossible"), 503
+        return jsonify(id=travail_id, statut='en_attente', url=url_for('etat_travail', travail_id=travail_id)), 202
+    if travail_id:
+        flash(f'Travail n° {travail_id} enregistré, exécution en arrière-plan.', 'success')
+    else:
+        flash("Erreur lors de l'enregistrement du travail!", 'error')
+    return redirect(url_for('liste_travaux'))
+
+def etat_travail(travail_id):
+    """État d'un travail (statut, progression, résultat) en JSON"""
+    travail = lire_travail(db, travail_id)
+    if not travail:
+        return jsonify(erreur='Travail introuvable'), 404
+    return jsonify(travail)
+
+def annulation_travail(travail_id):
+    """Annule un travail en attente, ou demande l'arrêt d'un travail en cours"""
+    travail = annuler_travail(db, travail_id)
+    if request.is_json:
+        return (jsonify(travail), 200) if travail else (jsonify(erreur='Travail introuvable'), 404)
+    if not travail:
+        flash('Travail introuvable!', 'error')
+    elif travail['statut'] == 'annule':
+        flash(f'Travail n° {travail_id} annulé.', 'success')
+    elif travail['annulation_demandee'] and travail['statut'] == 'en_cours':
+        flash(f"Arrêt du travail n° {travail_id} demandé.", 'success')
+    else:
+        flash(f"Le travail n° {travail_id} est déjà {travail['statut']}.", 'error')
+    return redirect(url_for('liste_travaux'))
+
+def transfert_cartes():
+    """Transfert de propriété d'un lot de cartes grises (API JSON, une seule transaction)"""
+    if not request.is_json:
+        return jsonify(erreur='Contenu JSON attendu (Content-Type: application/json)'), 415
+    donnees = request.get_json(silent=True)
+    if not isinstance(donnees, dict):
+        return jsonify(erreur='Corps JSON invalide'), 400
+    identifiants = donnees.get('cartes')
+    if not isinstance(identifiants, list) or not all(isinstance(i, str) for i in identifiants):
+        return jsonify(erreur='"cartes" doit être une liste de plaques ou de numéros de carte grise'), 400
+
+    # Même nettoyage que les formulaires d'ajout et de modification
+    proprietaire = donnees.get('proprietaire') if isinstance(donnees.get('proprietaire'), dict) else {}
+    proprietaire = {champ: str(escape(str(proprietaire.get(champ) or '').strip()))
+                    for champ in ('nom', 'prenom', 'adresse')}
+    try:
+        date_immat = date.fromisoformat(donnees['date_immat']) if donnees.get('date_immat') else None
+        proprietaire_id, resultats = transferer_cartes(db, identifiants, proprietaire, date_immat)
+    except (TypeError, ValueError) as e:
+        return jsonify(erreur=str(e)), 400
+    except ConnectionError as e:
+        return jsonify(erreur=str(e)), 503
+    except Exception as e:
+        # Erreur du moteur : la transaction est annulée, aucune carte n'a changé de propriétaire
+        return jsonify(erreur=f'Transfert annulé : {e}'), 500
+
+    transferees = [resultat['numero_immatriculation'] for resultat in resultats if resultat['statut'] == 'transferee']
+    cache_plaques().invalider(*transferees)
+    return jsonify(proprietaire_id=proprietaire_id, transferees=len(transferees), resultats=resultats)
+
+def lot_plaques():
+    """Recherche d'un lot de plaques (API JSON des lecteurs de plaques)"""
+    if not request.is_json:
+        return jsonify(erreur='Contenu JSON attendu (Content-Type: application/json)'), 415
+    donnees = request.get_json(silent=True)
+    plaques = donnees.get('plaques') if isinstance(donnees, dict) else None
+    if not isinstance(plaques, list) or not plaques or not all(isinstance(p, str) for p in plaques):
+        return jsonify(erreur='"plaques" doit être une liste non vide de numéros de plaque'), 400
+    if len(plaques) > LOT_PLAQUES_MAX:
+        return jsonify(erreur=f'Au plus {LOT_PLAQUES_MAX} plaques par lot'), 413
+
+    debut = time.perf_counter()
+    resultats = rechercher_plaques(db, plaques, delai_recherche_ms('lot_plaques'), cache=cache_plaques())
+    duree_ms = (time.perf_counter() - debut) * 1000
+    current_app.extensions['suivi_plaques'].noter(len(plaques), duree_ms)
+    if db.derniere_erreur == ERREUR_DELAI_DEPASSE:
+        return jsonify(erreur='Lot interrompu : durée maximale dépassée'), 504
+    if not resultats:
+        return jsonify(erreur='Base de données indisponible'), 503
+
+    trouvees = sum(1 for resultat in resultats if resultat['statut'] == 'trouvee')
+    reponse = jsonify(resultats=resultats, trouvees=trouvees, duree_ms=round(duree_ms, 1))
+    reponse.headers['Server-Timing'] = f'db;dur={duree_ms:.1f}'
+    return reponse
 
-# Point d'entrée de l'application
+# Point d'entrée de développement (serveur Flask mono-processus)
+# En production, utiliser gunicorn avec wsgi.py (voir gunicorn.conf.py)
 if __name__ == '__main__':
     # Configuration de mode debug, hôte et port depuis les variables d'environnement
+    charger_configuration()
     debug_mode = os.getenv('FLASK_DEBUG', 'False').lower() == 'true'
     host = os.getenv('FLASK_HOST', '127.0.0.1')
     port = int(os.getenv('FLASK_PORT', '5000'))
     # Lancement du serveur Flask
-    app.run(debug=debug_mode, host=host, port=port)
+    create_app().run(debug=debug_mode, host=host, port=port)
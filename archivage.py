@@ -0,0 +1,135 @@
+"""
+Archivage de l'historique : cartes grises expirées
+
+cartes_grises ne garde que les immatriculations en vigueur ; celles dont la fin de
+validité ou le certificat est dépassé depuis plus de ARCHIVAGE_CONSERVATION_J jours
+(365 par défaut) sont déplacées dans cartes_grises_archive, par lots (voir purge.py).
+Une carte remplacée par une plus récente du même véhicule n'est pas un motif à part :
+numero_serie est unique dans cartes_grises, les deux cartes n'y coexistent jamais.
+Les pages courantes (accueil, recherche par plaque, modification) ne lisent que la
+table active, ses index restent petits.
+
+L'archivage est un travail en arrière-plan planifié toutes les ARCHIVAGE_INTERVALLE_H
+heures (24 par défaut, 0 pour aucun) par les exécutants de travaux, ou lancé à la main :
+    python archivage.py                    # archive l'historique
+    python archivage.py --compter          # nombre de cartes à archiver
+    python archivage.py --conservation 730
+
+Les recherches incluent les cartes archivées sur demande seulement (source_cartes).
+"""
+import argparse
+import logging
+import os
+import sys
+from datetime import date, timedelta
+
+from purge import COLONNES_ARCHIVEES, compter, purger
+
+logger = logging.getLogger(__name__)
+
+TABLE_ARCHIVE = 'cartes_grises_archive'
+
+# Motifs d'archivage : nom -> critère de purge.CRITERES
+MOTIFS_ARCHIVAGE = {
+    'expirees': 'fin_validite_avant',
+    'certificat_expire': 'certificat_avant',
+}
+
+
+def conservation_jours():
+    """Jours de conservation dans la table active après expiration (ARCHIVAGE_CONSERVATION_J)"""
+    return int(os.getenv('ARCHIVAGE_CONSERVATION_J', '365'))
+
+
+def source_cartes(archives=False):
+    """
+    Table à interroger sous l'alias cg dans une recherche
+
+    Sans archives : cartes_grises. Avec : cartes_grises et cartes_grises_archive réunies
+    (UNION ALL), archive_le vaut NULL pour les cartes actives.
+    """
+    if not archives:
+        return 'cartes_grises'
+    colonnes = ', '.join(COLONNES_ARCHIVEES)
+    return (f"(SELECT {colonnes}, NULL AS archive_le FROM cartes_grises "
+            f"UNION ALL SELECT {colonnes}, archive_le FROM {TABLE_ARCHIVE})")
+
+
+def _limite(conservation_j, aujourd_hui=None):
+    return (aujourd_hui or date.today()) - timedelta(days=conservation_j)
+
+
+def compter_a_archiver(db, conservation_j=None, aujourd_hui=None):
+    """Cartes à archiver par motif (une carte aux deux dates dépassées compte deux fois)"""
+    conservation_j = conservation_jours() if conservation_j is None else conservation_j
+    limite = _limite(conservation_j, aujourd_hui)
+    return {motif: compter(db, {critere: limite}) for motif, critere in MOTIFS_ARCHIVAGE.items()}
+
+
+def archiver_historique(db, conservation_j=None, lot=500, pause_s=0.1, aujourd_hui=None, progression=None,
+                        invalider=None):
+    """
+    Déplace dans l'archive les cartes expirées depuis plus de conservation_j jours
+
+    Un parcours par lots de cartes_grises par motif ; relancer après une interruption
+    reprend où l'archivage s'était arrêté (les cartes déplacées ne sont plus parcourues).
+
+    Args:
+        db: Database
+        conservation_j (int): Jours de conservation (ARCHIVAGE_CONSERVATION_J par défaut)
+        lot, pause_s: Voir purge.purger
+        aujourd_hui (date): Date de référence (aujourd'hui par défaut)
+        progression: Fonction appelée avec la fraction traitée (0 à 1)
+        invalider: Fonction appelée avec les plaques archivées (voir purge.purger)
+
+    Returns:
+        dict: Cartes archivées par motif, date limite
+    """
+    conservation_j = conservation_jours() if conservation_j is None else conservation_j
+    limite = _limite(conservation_j, aujourd_hui)
+    resultat = {'limite': limite.isoformat()}
+    for rang, (motif, critere) in enumerate(MOTIFS_ARCHIVAGE.items()):
+        # Progression de ce parcours ramenée à sa part de l'archivage
+        suivi = ((lambda fraction, rang=rang: progression((rang + fraction) / len(MOTIFS_ARCHIVAGE)))
+                 if progression else None)
+        resultat[motif] = purger(db, {critere: limite}, 'archiver', lot, pause_s, progression=suivi,
+                                 invalider=invalider)['cartes']
+        logger.info(f"Archivage : {resultat[motif]} cartes grises {motif} avant le {limite}")
+    return resultat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--conservation', type=int, help="Jours de conservation après expiration "
+                                                           "(défaut : ARCHIVAGE_CONSERVATION_J ou 365)")
+    parser.add_argument('--lot', type=int, default=500, help="Cartes par transaction")
+    parser.add_argument('--pause', type=float, default=0.1, help="Pause entre deux lots (secondes)")
+    parser.add_argument('--compter', action='store_true', help="Compter les cartes à archiver, sans rien modifier")
+    args = parser.parse_args()
+
+    from config import charger_configuration, configurer_logging
+    from database import Database, Error
+    charger_configuration()
+    configurer_logging()
+    db = Database()
+    db.epingler_primaire(float('inf'))
+
+    if args.compter:
+        for motif, nombre in compter_a_archiver(db, args.conservation).items():
+            print(f"{motif} : {'?' if nombre is None else nombre}")
+        return 0
+    from plaques import CachePlaques
+    try:
+        # Hors de l'application, seul le magasin partagé du cache de plaques est invalidé (Redis)
+        resultat = archiver_historique(db, args.conservation, args.lot, args.pause,
+                                       invalider=CachePlaques().invalider)
+    except (RuntimeError, ValueError, ConnectionError) + Error as e:
+        print(f"Erreur : {e}")
+        return 1
+    print(f"{resultat['expirees']} cartes expirées et {resultat['certificat_expire']} cartes au certificat expiré "
+          f"avant le {resultat['limite']} archivées")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
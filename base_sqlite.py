@@ -0,0 +1,276 @@
+# Moteur SQLite embarqué derrière l'interface de Database
+# Utilisé pour les tests et benchmarks sans serveur MySQL, ou un poste isolé hors ligne
+# (DB_BACKEND=sqlite). Les requêtes de l'application restent écrites en dialecte MySQL :
+# elles sont traduites ici (paramètres %s, YEAR(), indications d'optimiseur).
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import date, datetime
+from functools import lru_cache
+
+from database import ERREUR_DELAI_DEPASSE
+
+RACINE = os.path.dirname(os.path.abspath(__file__))
+SCHEMA_PAR_DEFAUT = os.path.join(RACINE, 'setup_complete.sql')
+
+# Types DATE / TIMESTAMP : mêmes objets Python que mysql.connector (date, datetime)
+sqlite3.register_adapter(date, lambda jour: jour.isoformat())
+sqlite3.register_adapter(datetime, lambda instant: instant.isoformat(' '))
+sqlite3.register_converter('DATE', lambda valeur: date.fromisoformat(valeur.decode()[:10]))
+sqlite3.register_converter('TIMESTAMP', lambda valeur: datetime.fromisoformat(valeur.decode()))
+
+# Codes d'erreur SQLite qui signalent un fichier inutilisable (et non une requête fautive)
+_ERREURS_FICHIER = {
+    getattr(sqlite3, nom, None)
+    for nom in ('SQLITE_CANTOPEN', 'SQLITE_IOERR', 'SQLITE_NOTADB', 'SQLITE_CORRUPT', 'SQLITE_FULL')
+} - {None}
+
+_CHAINE = re.compile(r"('(?:[^']|'')*')")
+_INDICATION = re.compile(r"/\*\+\s*MAX_EXECUTION_TIME\((\d+)\)\s*\*/\s*")
+_ANNEE = re.compile(r"\bYEAR\(([^()]*)\)", re.IGNORECASE)
+_FONCTIONS = [
+    (re.compile(r"\bCURDATE\(\)", re.IGNORECASE), 'CURRENT_DATE'),
+    (re.compile(r"\bNOW\(\)", re.IGNORECASE), 'CURRENT_TIMESTAMP'),
+]
+
+
+@lru_cache(maxsize=512)
+def traduire_requete(query):
+    """
+    Traduit une requête écrite pour MySQL en SQL compris par SQLite
+
+    - paramètres %s -> ?
+    - YEAR(x) -> CAST(strftime('%Y', x) AS INTEGER) ; CURDATE(), NOW()
+    - indication /*+ MAX_EXECUTION_TIME(n) */ retirée (appliquée par le curseur)
+    REPLACE(), SUBSTRING(), LIKE et CURRENT_DATE existent tels quels dans SQLite.
+    Le texte des chaînes littérales n'est jamais modifié.
+
+    Returns:
+        (requête traduite, durée maximale en ms ou None)
+    """
+    delai = None
+    correspondance = _INDICATION.search(query)
+    if correspondance:
+        delai = int(correspondance.group(1))
+        query = _INDICATION.sub('', query, count=1)
+
+    morceaux = _CHAINE.split(query)
+    for i in range(0, len(morceaux), 2):
+        morceau = morceaux[i].replace('%s', '?').replace('%%', '%')
+        # CURDATE() d'abord : YEAR(CURDATE()) devient YEAR(CURRENT_DATE), sans parenthèses imbriquées
+        for motif, remplacement in _FONCTIONS:
+            morceau = motif.sub(remplacement, morceau)
+        morceau = _ANNEE.sub(r"CAST(strftime('%Y', \1) AS INTEGER)", morceau)
+        morceaux[i] = morceau
+    return ''.join(morceaux), delai
+
+
+_TABLE = re.compile(r"CREATE TABLE\s+(IF NOT EXISTS\s+)?(\w+)\s*\((.*?)\)\s*(?:ENGINE|DEFAULT CHARSET)[^;]*;", re.DOTALL | re.IGNORECASE)
+_INDEX_EN_LIGNE = re.compile(r"^\s*(UNIQUE\s+)?(?:INDEX|KEY)\s+(\w+)\s*\(([^)]*)\)\s*,?\s*$", re.IGNORECASE)
+
+
+def _traduire_table(correspondance):
+    si_absente, table, corps = correspondance.groups()
+    si_absente = 'IF NOT EXISTS ' if si_absente else ''
+    colonnes, index = [], []
+    for ligne in corps.strip('\n').split('\n'):
+        index_en_ligne = _INDEX_EN_LIGNE.match(ligne)
+        if index_en_ligne:
+            unique, nom, champs = index_en_ligne.groups()
+            index.append(f"CREATE {'UNIQUE ' if unique else ''}INDEX {si_absente}{nom} ON {table} ({champs});")
+        elif ligne.strip():
+            colonnes.append(ligne.rstrip())
+    # La dernière colonne conservée ne doit pas se terminer par une virgule
+    colonnes[-1] = colonnes[-1].rstrip(',')
+    corps = '\n'.join(colonnes)
+    corps = re.sub(r"\bINT\s+AUTO_INCREMENT\s+PRIMARY\s+KEY", 'INTEGER PRIMARY KEY AUTOINCREMENT', corps, flags=re.IGNORECASE)
+    corps = re.sub(r"\s+ON UPDATE CURRENT_TIMESTAMP", '', corps, flags=re.IGNORECASE)
+    return f"CREATE TABLE {si_absente}{table} (\n{corps}\n);\n" + '\n'.join(index)
+
+
+def traduire_schema(script):
+    """
+    Traduit un script de création MySQL (setup_complete.sql) pour SQLite
+
+    - suppression de DROP/CREATE DATABASE et USE
+    - AUTO_INCREMENT -> INTEGER PRIMARY KEY AUTOINCREMENT, options ENGINE/CHARSET retirées
+    - INDEX déclarés dans CREATE TABLE -> CREATE INDEX séparés
+    Les INSERT sont repris tels quels.
+
+    Returns:
+        list: Instructions SQL à exécuter dans l'ordre
+    """
+    script = re.sub(r"^\s*(DROP DATABASE|CREATE DATABASE|USE)\b[^;]*;", '', script, flags=re.IGNORECASE | re.MULTILINE)
+    script = _TABLE.sub(_traduire_table, script)
+
+    instructions, courante = [], ''
+    for ligne in script.splitlines(keepends=True):
+        if not courante and (not ligne.strip() or ligne.lstrip().startswith('--')):
+            continue
+        courante += ligne
+        if sqlite3.complete_statement(courante):
+            instructions.append(courante.strip())
+            courante = ''
+    return instructions
+
+
+def erreur_de_connexion(erreur):
+    """Indique si l'erreur SQLite vient du fichier de base (et non de la requête)"""
+    if isinstance(erreur, sqlite3.ProgrammingError):
+        # Connexion fermée
+        return 'closed' in str(erreur)
+    return getattr(erreur, 'sqlite_errorcode', None) in _ERREURS_FICHIER
+
+
+class CurseurSQLite:
+    """Curseur au comportement de mysql.connector : lignes en dictionnaires, requêtes MySQL traduites"""
+
+    def __init__(self, connexion, dictionary=False):
+        self._connexion = connexion
+        self._curseur = connexion.sqlite.cursor()
+        self._limite = None
+        if dictionary:
+            self._curseur.row_factory = lambda curseur, ligne: {
+                colonne[0]: valeur for colonne, valeur in zip(curseur.description, ligne)
+            }
+
+    def _appeler(self, methode, *arguments):
+        try:
+            return methode(*arguments)
+        except sqlite3.Error as e:
+            # Même convention que mysql.connector : code d'erreur dans errno
+            interrompue = self._limite is not None and 'interrupted' in str(e)
+            e.errno = ERREUR_DELAI_DEPASSE if interrompue else getattr(e, 'sqlite_errorcode', None)
+            self._terminer()
+            raise
+
+    def _terminer(self):
+        """Retire la limite de durée de la requête en cours"""
+        if self._limite is not None:
+            self._limite = None
+            self._connexion.sqlite.set_progress_handler(None, 0)
+
+    def _executer(self, methode, query, params):
+        query, delai = traduire_requete(query)
+        self._terminer()
+        if delai:
+            limite = self._limite = time.monotonic() + delai / 1000
+            # Appelé toutes les 1000 instructions de la machine virtuelle SQLite, jusqu'à la
+            # fin de la lecture des résultats : une valeur non nulle interrompt la requête
+            self._connexion.sqlite.set_progress_handler(lambda: time.monotonic() > limite, 1000)
+        self._appeler(methode, query, params)
+
+    def execute(self, query, params=None):
+        self._executer(self._curseur.execute, query, tuple(params) if params else ())
+
+    def executemany(self, query, rows):
+        self._executer(self._curseur.executemany, query, rows)
+
+    def fetchall(self):
+        lignes = self._appeler(self._curseur.fetchall)
+        self._terminer()
+        return lignes
+
+    def fetchone(self):
+        ligne = self._appeler(self._curseur.fetchone)
+        self._terminer()
+        return ligne
+
+    @property
+    def description(self):
+        return self._curseur.description
+
+    @property
+    def lastrowid(self):
+        return self._curseur.lastrowid
+
+    @property
+    def rowcount(self):
+        return self._curseur.rowcount
+
+    def close(self):
+        self._terminer()
+        self._curseur.close()
+
+
+class ConnexionSQLite:
+    """Connexion SQLite exposant les méthodes de mysql.connector utilisées par Database"""
+
+    def __init__(self, sqlite):
+        self.sqlite = sqlite
+        self._fermee = False
+
+    def cursor(self, dictionary=False, buffered=False):
+        return CurseurSQLite(self, dictionary=dictionary)
+
+    def start_transaction(self):
+        # IMMEDIATE : verrou d'écriture pris dès le début (pas d'échec en cours de transaction)
+        self.sqlite.execute('BEGIN IMMEDIATE')
+
+    def commit(self):
+        self.sqlite.commit()
+
+    def rollback(self):
+        self.sqlite.rollback()
+
+    def is_connected(self):
+        return not self._fermee
+
+    def close(self):
+        self._fermee = True
+        self.sqlite.close()
+
+
+# Bases en mémoire : une connexion reste ouverte pour que la base survive
+# à la fermeture des connexions des threads
+_bases_memoire = {}
+_verrou_initialisation = threading.Lock()
+
+
+def _initialiser(sqlite, schema):
+    """Crée le schéma et les données initiales si la base est vide (une seule fois, même à plusieurs processus)"""
+    if sqlite.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='cartes_grises'").fetchone():
+        return
+    with _verrou_initialisation:
+        # BEGIN IMMEDIATE : un seul processus à la fois initialise le fichier
+        sqlite.execute('BEGIN IMMEDIATE')
+        try:
+            if not sqlite.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='cartes_grises'").fetchone():
+                with open(schema, encoding='utf-8') as f:
+                    for instruction in traduire_schema(f.read()):
+                        sqlite.execute(instruction)
+            sqlite.commit()
+        except BaseException:
+            sqlite.rollback()
+            raise
+
+
+def connecter(chemin, schema=SCHEMA_PAR_DEFAUT, delai=10):
+    """
+    Ouvre une connexion SQLite (le fichier et son schéma sont créés au premier usage)
+
+    Args:
+        chemin: Fichier de la base, ou ':memory:' pour une base en mémoire partagée par les threads
+        schema: Script MySQL de création traduit à l'initialisation
+        delai: Attente maximale d'un verrou d'écriture (secondes)
+
+    Returns:
+        ConnexionSQLite
+    """
+    options = {'timeout': delai, 'detect_types': sqlite3.PARSE_DECLTYPES, 'check_same_thread': False}
+    if chemin == ':memory:':
+        uri = f"file:carte_grise_{os.getpid()}?mode=memory&cache=shared"
+        with _verrou_initialisation:
+            if uri not in _bases_memoire:
+                _bases_memoire[uri] = sqlite3.connect(uri, uri=True, **options)
+        sqlite = sqlite3.connect(uri, uri=True, **options)
+    else:
+        sqlite = sqlite3.connect(chemin, **options)
+        # Journal WAL : les lectures ne bloquent pas l'écriture (plusieurs workers)
+        sqlite.execute('PRAGMA journal_mode=WAL')
+        sqlite.execute('PRAGMA synchronous=NORMAL')
+    sqlite.execute('PRAGMA foreign_keys=ON')
+    _initialiser(sqlite, schema)
+    return ConnexionSQLite(sqlite)
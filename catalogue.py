@@ -0,0 +1,176 @@
+# Catalogue de référence : modèles de véhicules et données techniques
+# Chargé une fois par worker (au préchauffage) au lieu d'être reconstruit à chaque requête
+import os
+import threading
+import time
+
+# Données techniques de référence pour chaque modèle (formulaire d'ajout)
+# Format: ID_MODELE: {'pv': poids_vide, 'pm': poids_max, 'permis': catégorie, 'pl': places, 'cyl': cylindrée, 'cv': chevaux, 'co2': émission}
+DONNEES_TECHNIQUES_REF = {
+    # Honda
+    1: {'pv': 190, 'pm': 370, 'permis': 'A2', 'pl': 2, 'cyl': 471, 'cv': 48, 'co2': 80, 'classe': 'Euro 5', 'cv_admin': 6, 'pl_debout': 0, 'db': 95, 'rpm': 8500, 'carburant': 'Essence'},   # CB500F
+    2: {'pv': 201, 'pm': 390, 'permis': 'A', 'pl': 2, 'cyl': 999, 'cv': 217, 'co2': 160, 'classe': 'Euro 4', 'cv_admin': 15, 'pl_debout': 0, 'db': 105, 'rpm': 13000, 'carburant': 'Essence'},  # CBR1000RR
+    3: {'pv': 1300, 'pm': 1800, 'permis': 'B', 'pl': 5, 'cyl': 1498, 'cv': 182, 'co2': 128, 'classe': 'Euro 6d', 'cv_admin': 9, 'pl_debout': 0, 'db': 72, 'rpm': 6500, 'carburant': 'Essence'}, # Civic
+    4: {'pv': 1600, 'pm': 2200, 'permis': 'B', 'pl': 5, 'cyl': 1993, 'cv': 184, 'co2': 153, 'classe': 'Euro 6d', 'cv_admin': 10, 'pl_debout': 0, 'db': 75, 'rpm': 6000, 'carburant': 'Hybride'}, # CR-V
+    5: {'pv': 2800, 'pm': 4500, 'permis': 'C', 'pl': 3, 'cyl': 2999, 'cv': 150, 'co2': 210, 'classe': 'Euro 6', 'cv_admin': 12, 'pl_debout': 0, 'db': 78, 'rpm': 4500, 'carburant': 'Diesel'}, # NT400
+    6: {'pv': 2600, 'pm': 3500, 'permis': 'C', 'pl': 3, 'cyl': 2488, 'cv': 130, 'co2': 220, 'classe': 'Euro 6', 'cv_admin': 11, 'pl_debout': 0, 'db': 76, 'rpm': 4200, 'carburant': 'Diesel'}, # Cabstar
+    # Peugeot
+    7: {'pv': 95, 'pm': 270, 'permis': 'A1', 'pl': 2, 'cyl': 49, 'cv': 4, 'co2': 45, 'classe': 'Euro 5', 'cv_admin': 1, 'pl_debout': 0, 'db': 82, 'rpm': 8000, 'carburant': 'Essence'},     # Kisbee
+    8: {'pv': 280, 'pm': 450, 'permis': 'A', 'pl': 2, 'cyl': 399, 'cv': 36, 'co2': 89, 'classe': 'Euro 5', 'cv_admin': 5, 'pl_debout': 0, 'db': 88, 'rpm': 7500, 'carburant': 'Essence'},    # Metropolis
+    9: {'pv': 1050, 'pm': 1550, 'permis': 'B', 'pl': 5, 'cyl': 1199, 'cv': 100, 'co2': 102, 'classe': 'Euro 6d', 'cv_admin': 7, 'pl_debout': 0, 'db': 70, 'rpm': 6200, 'carburant': 'Essence'}, # 208
+    10: {'pv': 1500, 'pm': 2100, 'permis': 'B', 'pl': 7, 'cyl': 1598, 'cv': 180, 'co2': 140, 'classe': 'Euro 6d', 'cv_admin': 9, 'pl_debout': 0, 'db': 73, 'rpm': 6000, 'carburant': 'Diesel'},# 5008
+    11: {'pv': 2100, 'pm': 4400, 'permis': 'C', 'pl': 3, 'cyl': 2179, 'cv': 140, 'co2': 230, 'classe': 'Euro 6', 'cv_admin': 11, 'pl_debout': 0, 'db': 77, 'rpm': 4000, 'carburant': 'Diesel'},# Boxer
+    12: {'pv': 1800, 'pm': 3100, 'permis': 'C', 'pl': 3, 'cyl': 1997, 'cv': 145, 'co2': 190, 'classe': 'Euro 6', 'cv_admin': 10, 'pl_debout': 0, 'db': 75, 'rpm': 4500, 'carburant': 'Diesel'},# Expert
+
+    # RENAULT (IDs 13 à 18)
+    13: {'pv': 120, 'pm': 300, 'permis': 'A1', 'pl': 2, 'cyl': 124, 'cv': 11, 'co2': 55, 'classe': 'Euro 5', 'cv_admin': 2, 'pl_debout': 0, 'db': 85, 'rpm': 9000, 'couleur': 'Rouge', 'carburant': 'Essence'},     # Full 125
+    14: {'pv': 160, 'pm': 340, 'permis': 'A2', 'pl': 2, 'cyl': 395, 'cv': 30, 'co2': 75, 'classe': 'Euro 5', 'cv_admin': 4, 'pl_debout': 0, 'db': 90, 'rpm': 8000, 'couleur': 'Jaune', 'carburant': 'Essence'},     # Sport 400
+    15: {'pv': 1100, 'pm': 1600, 'permis': 'B', 'pl': 5, 'cyl': 999, 'cv': 90, 'co2': 110, 'classe': 'Euro 6d', 'cv_admin': 6, 'pl_debout': 0, 'db': 69, 'rpm': 6500, 'couleur': 'Gris', 'carburant': 'Essence'},   # Clio
+    16: {'pv': 1400, 'pm': 1950, 'permis': 'B', 'pl': 5, 'cyl': 1332, 'cv': 140, 'co2': 130, 'classe': 'Euro 6d', 'cv_admin': 8, 'pl_debout': 0, 'db': 71, 'rpm': 6200, 'couleur': 'Bleu', 'carburant': 'Hybride'}, # Austral
+    17: {'pv': 2200, 'pm': 3500, 'permis': 'C', 'pl': 3, 'cyl': 2299, 'cv': 135, 'co2': 240, 'classe': 'Euro 6', 'cv_admin': 11, 'pl_debout': 0, 'db': 76, 'rpm': 4200, 'couleur': 'Jaune', 'carburant': 'Diesel'}, # Master
+    18: {'pv': 2400, 'pm': 4500, 'permis': 'C', 'pl': 3, 'cyl': 2488, 'cv': 140, 'co2': 250, 'classe': 'Euro 6', 'cv_admin': 12, 'pl_debout': 0, 'db': 78, 'rpm': 4000, 'couleur': 'Blanc', 'carburant': 'Diesel'}, # Maxity
+
+    # MERCEDES (19-24)
+    19: {'pv': 130, 'pm': 310, 'permis': 'A1', 'pl': 2, 'cyl': 125, 'cv': 12, 'co2': 60, 'classe': 'Euro 5', 'cv_admin': 2, 'pl_debout': 0, 'db': 83, 'rpm': 9500, 'couleur': 'Argent', 'carburant': 'Essence'},   # Citan Scooter
+    20: {'pv': 210, 'pm': 400, 'permis': 'A', 'pl': 2, 'cyl': 998, 'cv': 200, 'co2': 155, 'classe': 'Euro 4', 'cv_admin': 14, 'pl_debout': 0, 'db': 102, 'rpm': 12500, 'couleur': 'Noir', 'carburant': 'Essence'},  # Vision GT
+    21: {'pv': 1350, 'pm': 1900, 'permis': 'B', 'pl': 5, 'cyl': 1461, 'cv': 116, 'co2': 120, 'classe': 'Euro 6d', 'cv_admin': 7, 'pl_debout': 0, 'db': 68, 'rpm': 6800, 'couleur': 'Noir', 'carburant': 'Essence'}, # Classe A
+    22: {'pv': 1800, 'pm': 2400, 'permis': 'B', 'pl': 5, 'cyl': 1993, 'cv': 190, 'co2': 160, 'classe': 'Euro 6d', 'cv_admin': 10, 'pl_debout': 0, 'db': 74, 'rpm': 6200, 'couleur': 'Argent', 'carburant': 'Diesel'}, # GLC
+    23: {'pv': 2600, 'pm': 5000, 'permis': 'C', 'pl': 3, 'cyl': 2143, 'cv': 163, 'co2': 215, 'classe': 'Euro 6', 'cv_admin': 13, 'pl_debout': 0, 'db': 79, 'rpm': 4500, 'couleur': 'Argent', 'carburant': 'Diesel'}, # Sprinter 5t
+    24: {'pv': 2900, 'pm': 4800, 'permis': 'C', 'pl': 3, 'cyl': 4250, 'cv': 170, 'co2': 230, 'classe': 'Euro 6', 'cv_admin': 14, 'pl_debout': 0, 'db': 81, 'rpm': 3800, 'couleur': 'Blanc', 'carburant': 'Diesel'}, # Vario
+
+    # IVECO (25-30)
+    25: {'pv': 150, 'pm': 330, 'permis': 'A2', 'pl': 2, 'cyl': 300, 'cv': 28, 'co2': 70, 'classe': 'Euro 5', 'cv_admin': 3, 'pl_debout': 0, 'db': 87, 'rpm': 8500, 'couleur': 'Orange', 'carburant': 'Essence'},    # Daily Moto
+    26: {'pv': 220, 'pm': 420, 'permis': 'A', 'pl': 2, 'cyl': 1100, 'cv': 210, 'co2': 165, 'classe': 'Euro 4', 'cv_admin': 15, 'pl_debout': 0, 'db': 106, 'rpm': 12000, 'couleur': 'Orange', 'carburant': 'Essence'},   # Turbo Bike
+    27: {'pv': 2000, 'pm': 2800, 'permis': 'B', 'pl': 5, 'cyl': 2998, 'cv': 176, 'co2': 200, 'classe': 'Euro 6', 'cv_admin': 10, 'pl_debout': 0, 'db': 76, 'rpm': 5500, 'couleur': 'Vert', 'carburant': 'Diesel'}, # Massif
+    28: {'pv': 1900, 'pm': 2600, 'permis': 'B', 'pl': 5, 'cyl': 2500, 'cv': 150, 'co2': 190, 'classe': 'Euro 6', 'cv_admin': 9, 'pl_debout': 0, 'db': 74, 'rpm': 5800, 'couleur': 'Bleu', 'carburant': 'Diesel'}, # Campagnola
+    29: {'pv': 2200, 'pm': 3500, 'permis': 'C', 'pl': 3, 'cyl': 2300, 'cv': 140, 'co2': 225, 'classe': 'Euro 6', 'cv_admin': 11, 'pl_debout': 0, 'db': 77, 'rpm': 4300, 'couleur': 'Blanc', 'carburant': 'Diesel'}, # Daily 35C
+    30: {'pv': 2500, 'pm': 5000, 'permis': 'C', 'pl': 3, 'cyl': 2998, 'cv': 180, 'co2': 245, 'classe': 'Euro 6', 'cv_admin': 13, 'pl_debout': 0, 'db': 80, 'rpm': 4000, 'couleur': 'Rouge', 'carburant': 'Diesel'}, # Daily 50C
+
+    # FORD (31-36)
+    31: {'pv': 115, 'pm': 290, 'permis': 'A1', 'pl': 2, 'cyl': 125, 'cv': 10, 'co2': 50, 'classe': 'Euro 5', 'cv_admin': 2, 'pl_debout': 0, 'db': 84, 'rpm': 9200, 'couleur': 'Bleu', 'carburant': 'Essence'},    # Street 125
+    32: {'pv': 170, 'pm': 360, 'permis': 'A2', 'pl': 2, 'cyl': 450, 'cv': 35, 'co2': 78, 'classe': 'Euro 5', 'cv_admin': 4, 'pl_debout': 0, 'db': 89, 'rpm': 8200, 'couleur': 'Vert', 'carburant': 'Essence'},    # Ranger Bike
+    33: {'pv': 1150, 'pm': 1650, 'permis': 'B', 'pl': 5, 'cyl': 999, 'cv': 95, 'co2': 115, 'classe': 'Euro 6d', 'cv_admin': 6, 'pl_debout': 0, 'db': 70, 'rpm': 6400, 'couleur': 'Vert', 'carburant': 'Essence'},   # Fiesta
+    34: {'pv': 1300, 'pm': 1850, 'permis': 'B', 'pl': 5, 'cyl': 1498, 'cv': 120, 'co2': 125, 'classe': 'Euro 6d', 'cv_admin': 8, 'pl_debout': 0, 'db': 72, 'rpm': 6300, 'couleur': 'Gris', 'carburant': 'Essence'}, # Focus
+    35: {'pv': 2100, 'pm': 3500, 'permis': 'C', 'pl': 3, 'cyl': 1995, 'cv': 130, 'co2': 210, 'classe': 'Euro 6', 'cv_admin': 10, 'pl_debout': 0, 'db': 75, 'rpm': 4600, 'couleur': 'Blanc', 'carburant': 'Diesel'}, # Transit 350
+    36: {'pv': 2800, 'pm': 4700, 'permis': 'C', 'pl': 3, 'cyl': 1995, 'cv': 170, 'co2': 245, 'classe': 'Euro 6', 'cv_admin': 12, 'pl_debout': 0, 'db': 78, 'rpm': 4400, 'couleur': 'Bleu', 'carburant': 'Diesel'}, # Transit 470
+}
+
+
+# Données techniques de référence du formulaire de modification
+DONNEES_TECHNIQUES_REF_EDITION = {
+    # Honda
+    1: {'pv': 190, 'pm': 370, 'permis': 'A2', 'pl': 2, 'cyl': 471, 'cv': 48, 'co2': 80, 'classe': 'Euro 5', 'cv_admin': 6, 'pl_debout': 0, 'db': 95, 'rpm': 8500, 'couleur': 'Rouge'},
+    2: {'pv': 201, 'pm': 390, 'permis': 'A', 'pl': 2, 'cyl': 999, 'cv': 217, 'co2': 160, 'classe': 'Euro 4', 'cv_admin': 15, 'pl_debout': 0, 'db': 105, 'rpm': 13000, 'couleur': 'Noir'},
+    3: {'pv': 1300, 'pm': 1800, 'permis': 'B', 'pl': 5, 'cyl': 1498, 'cv': 182, 'co2': 128, 'classe': 'Euro 6d', 'cv_admin': 9, 'pl_debout': 0, 'db': 72, 'rpm': 6500, 'couleur': 'Blanc'},
+    4: {'pv': 1600, 'pm': 2200, 'permis': 'B', 'pl': 5, 'cyl': 1993, 'cv': 184, 'co2': 153, 'classe': 'Euro 6d', 'cv_admin': 10, 'pl_debout': 0, 'db': 75, 'rpm': 6000, 'couleur': 'Gris'},
+    5: {'pv': 2800, 'pm': 4500, 'permis': 'C', 'pl': 3, 'cyl': 2999, 'cv': 150, 'co2': 210, 'classe': 'Euro 6', 'cv_admin': 12, 'pl_debout': 0, 'db': 78, 'rpm': 4500, 'couleur': 'Blanc'},
+    6: {'pv': 2600, 'pm': 3500, 'permis': 'C', 'pl': 3, 'cyl': 2488, 'cv': 130, 'co2': 220, 'classe': 'Euro 6', 'cv_admin': 11, 'pl_debout': 0, 'db': 76, 'rpm': 4200, 'couleur': 'Blanc'},
+    # Peugeot
+    7: {'pv': 95, 'pm': 270, 'permis': 'A1', 'pl': 2, 'cyl': 49, 'cv': 4, 'co2': 45, 'classe': 'Euro 5', 'cv_admin': 1, 'pl_debout': 0, 'db': 82, 'rpm': 8000, 'couleur': 'Bleu'},
+    8: {'pv': 280, 'pm': 450, 'permis': 'A', 'pl': 2, 'cyl': 399, 'cv': 36, 'co2': 89, 'classe': 'Euro 5', 'cv_admin': 5, 'pl_debout': 0, 'db': 88, 'rpm': 7500, 'couleur': 'Argent'},
+    9: {'pv': 1050, 'pm': 1550, 'permis': 'B', 'pl': 5, 'cyl': 1199, 'cv': 100, 'co2': 102, 'classe': 'Euro 6d', 'cv_admin': 7, 'pl_debout': 0, 'db': 70, 'rpm': 6200, 'couleur': 'Bleu'},
+    10: {'pv': 1500, 'pm': 2100, 'permis': 'B', 'pl': 7, 'cyl': 1598, 'cv': 180, 'co2': 140, 'classe': 'Euro 6d', 'cv_admin': 9, 'pl_debout': 0, 'db': 73, 'rpm': 6000, 'couleur': 'Noir'},
+    11: {'pv': 2100, 'pm': 4400, 'permis': 'C', 'pl': 3, 'cyl': 2179, 'cv': 140, 'co2': 230, 'classe': 'Euro 6', 'cv_admin': 11, 'pl_debout': 0, 'db': 77, 'rpm': 4000, 'couleur': 'Blanc'},
+    12: {'pv': 1800, 'pm': 3100, 'permis': 'C', 'pl': 3, 'cyl': 1997, 'cv': 145, 'co2': 190, 'classe': 'Euro 6', 'cv_admin': 10, 'pl_debout': 0, 'db': 75, 'rpm': 4500, 'couleur': 'Gris'},
+    # RENAULT (IDs 13 à 18)
+    13: {'pv': 120, 'pm': 300, 'permis': 'A1', 'pl': 2, 'cyl': 124, 'cv': 11, 'co2': 55, 'classe': 'Euro 5', 'cv_admin': 2, 'pl_debout': 0, 'db': 85, 'rpm': 9000, 'couleur': 'Rouge'},
+    14: {'pv': 160, 'pm': 340, 'permis': 'A2', 'pl': 2, 'cyl': 395, 'cv': 30, 'co2': 75, 'classe': 'Euro 5', 'cv_admin': 4, 'pl_debout': 0, 'db': 90, 'rpm': 8000, 'couleur': 'Jaune'},
+    15: {'pv': 1100, 'pm': 1600, 'permis': 'B', 'pl': 5, 'cyl': 999, 'cv': 90, 'co2': 110, 'classe': 'Euro 6d', 'cv_admin': 6, 'pl_debout': 0, 'db': 69, 'rpm': 6500, 'couleur': 'Gris'},
+    16: {'pv': 1400, 'pm': 1950, 'permis': 'B', 'pl': 5, 'cyl': 1332, 'cv': 140, 'co2': 130, 'classe': 'Euro 6d', 'cv_admin': 8, 'pl_debout': 0, 'db': 71, 'rpm': 6200, 'couleur': 'Bleu'},
+    17: {'pv': 2200, 'pm': 3500, 'permis': 'C', 'pl': 3, 'cyl': 2299, 'cv': 135, 'co2': 240, 'classe': 'Euro 6', 'cv_admin': 11, 'pl_debout': 0, 'db': 76, 'rpm': 4200, 'couleur': 'Jaune'},
+    18: {'pv': 2400, 'pm': 4500, 'permis': 'C', 'pl': 3, 'cyl': 2488, 'cv': 140, 'co2': 250, 'classe': 'Euro 6', 'cv_admin': 12, 'pl_debout': 0, 'db': 78, 'rpm': 4000, 'couleur': 'Blanc'},
+    # MERCEDES (19-24)
+    19: {'pv': 130, 'pm': 310, 'permis': 'A1', 'pl': 2, 'cyl': 125, 'cv': 12, 'co2': 60, 'classe': 'Euro 5', 'cv_admin': 2, 'pl_debout': 0, 'db': 83, 'rpm': 9500, 'couleur': 'Argent'},
+    20: {'pv': 210, 'pm': 400, 'permis': 'A', 'pl': 2, 'cyl': 998, 'cv': 200, 'co2': 155, 'classe': 'Euro 4', 'cv_admin': 14, 'pl_debout': 0, 'db': 102, 'rpm': 12500, 'couleur': 'Noir'},
+    21: {'pv': 1350, 'pm': 1900, 'permis': 'B', 'pl': 5, 'cyl': 1461, 'cv': 116, 'co2': 120, 'classe': 'Euro 6d', 'cv_admin': 7, 'pl_debout': 0, 'db': 68, 'rpm': 6800, 'couleur': 'Noir'},
+    22: {'pv': 1800, 'pm': 2400, 'permis': 'B', 'pl': 5, 'cyl': 1993, 'cv': 190, 'co2': 160, 'classe': 'Euro 6d', 'cv_admin': 10, 'pl_debout': 0, 'db': 74, 'rpm': 6200, 'couleur': 'Argent'},
+    23: {'pv': 2600, 'pm': 5000, 'permis': 'C', 'pl': 3, 'cyl': 2143, 'cv': 163, 'co2': 215, 'classe': 'Euro 6', 'cv_admin': 13, 'pl_debout': 0, 'db': 79, 'rpm': 4500, 'couleur': 'Argent'},
+    24: {'pv': 2900, 'pm': 4800, 'permis': 'C', 'pl': 3, 'cyl': 4250, 'cv': 170, 'co2': 230, 'classe': 'Euro 6', 'cv_admin': 14, 'pl_debout': 0, 'db': 81, 'rpm': 3800, 'couleur': 'Blanc'},
+    # IVECO (25-30)
+    25: {'pv': 150, 'pm': 330, 'permis': 'A2', 'pl': 2, 'cyl': 300, 'cv': 28, 'co2': 70, 'classe': 'Euro 5', 'cv_admin': 3, 'pl_debout': 0, 'db': 87, 'rpm': 8500, 'couleur': 'Orange'},
+    26: {'pv': 220, 'pm': 420, 'permis': 'A', 'pl': 2, 'cyl': 1100, 'cv': 210, 'co2': 165, 'classe': 'Euro 4', 'cv_admin': 15, 'pl_debout': 0, 'db': 106, 'rpm': 12000, 'couleur': 'Orange'},
+    27: {'pv': 2000, 'pm': 2800, 'permis': 'B', 'pl': 5, 'cyl': 2998, 'cv': 176, 'co2': 200, 'classe': 'Euro 6', 'cv_admin': 10, 'pl_debout': 0, 'db': 76, 'rpm': 5500, 'couleur': 'Vert'},
+    28: {'pv': 1900, 'pm': 2600, 'permis': 'B', 'pl': 5, 'cyl': 2500, 'cv': 150, 'co2': 190, 'classe': 'Euro 6', 'cv_admin': 9, 'pl_debout': 0, 'db': 74, 'rpm': 5800, 'couleur': 'Bleu'},
+    29: {'pv': 2200, 'pm': 3500, 'permis': 'C', 'pl': 3, 'cyl': 2300, 'cv': 140, 'co2': 225, 'classe': 'Euro 6', 'cv_admin': 11, 'pl_debout': 0, 'db': 77, 'rpm': 4300, 'couleur': 'Blanc'},
+    30: {'pv': 2500, 'pm': 5000, 'permis': 'C', 'pl': 3, 'cyl': 2998, 'cv': 180, 'co2': 245, 'classe': 'Euro 6', 'cv_admin': 13, 'pl_debout': 0, 'db': 80, 'rpm': 4000, 'couleur': 'Rouge'},
+    # FORD (31-36)
+    31: {'pv': 115, 'pm': 290, 'permis': 'A1', 'pl': 2, 'cyl': 125, 'cv': 10, 'co2': 50, 'classe': 'Euro 5', 'cv_admin': 2, 'pl_debout': 0, 'db': 84, 'rpm': 9200, 'couleur': 'Bleu'},
+    32: {'pv': 170, 'pm': 360, 'permis': 'A2', 'pl': 2, 'cyl': 450, 'cv': 35, 'co2': 78, 'classe': 'Euro 5', 'cv_admin': 4, 'pl_debout': 0, 'db': 89, 'rpm': 8200, 'couleur': 'Vert'},
+    33: {'pv': 1150, 'pm': 1650, 'permis': 'B', 'pl': 5, 'cyl': 999, 'cv': 95, 'co2': 115, 'classe': 'Euro 6d', 'cv_admin': 6, 'pl_debout': 0, 'db': 70, 'rpm': 6400, 'couleur': 'Vert'},
+    34: {'pv': 1300, 'pm': 1850, 'permis': 'B', 'pl': 5, 'cyl': 1498, 'cv': 120, 'co2': 125, 'classe': 'Euro 6d', 'cv_admin': 8, 'pl_debout': 0, 'db': 72, 'rpm': 6300, 'couleur': 'Gris'},
+    35: {'pv': 2100, 'pm': 3500, 'permis': 'C', 'pl': 3, 'cyl': 1995, 'cv': 130, 'co2': 210, 'classe': 'Euro 6', 'cv_admin': 10, 'pl_debout': 0, 'db': 75, 'rpm': 4600, 'couleur': 'Blanc'},
+    36: {'pv': 2800, 'pm': 4700, 'permis': 'C', 'pl': 3, 'cyl': 1995, 'cv': 170, 'co2': 245, 'classe': 'Euro 6', 'cv_admin': 12, 'pl_debout': 0, 'db': 78, 'rpm': 4400, 'couleur': 'Bleu'},
+
+    19: {'pv': 130, 'pm': 310, 'permis': 'A1', 'pl': 2, 'cyl': 125, 'cv': 12, 'co2': 60, 'classe': 'Euro 5', 'cv_admin': 2, 'pl_debout': 0, 'db': 83, 'rpm': 9500},
+    20: {'pv': 210, 'pm': 400, 'permis': 'A', 'pl': 2, 'cyl': 998, 'cv': 200, 'co2': 155, 'classe': 'Euro 4', 'cv_admin': 14, 'pl_debout': 0, 'db': 102, 'rpm': 12500},
+    21: {'pv': 1350, 'pm': 1900, 'permis': 'B', 'pl': 5, 'cyl': 1461, 'cv': 116, 'co2': 120, 'classe': 'Euro 6d', 'cv_admin': 7, 'pl_debout': 0, 'db': 68, 'rpm': 6800},
+    22: {'pv': 1800, 'pm': 2400, 'permis': 'B', 'pl': 5, 'cyl': 1993, 'cv': 190, 'co2': 160, 'classe': 'Euro 6d', 'cv_admin': 10, 'pl_debout': 0, 'db': 74, 'rpm': 6200},
+    23: {'pv': 2600, 'pm': 5000, 'permis': 'C', 'pl': 3, 'cyl': 2143, 'cv': 163, 'co2': 215, 'classe': 'Euro 6', 'cv_admin': 13, 'pl_debout': 0, 'db': 79, 'rpm': 4500},
+    24: {'pv': 2900, 'pm': 4800, 'permis': 'C', 'pl': 3, 'cyl': 4250, 'cv': 170, 'co2': 230, 'classe': 'Euro 6', 'cv_admin': 14, 'pl_debout': 0, 'db': 81, 'rpm': 3800},
+    # IVECO (25-30)
+    25: {'pv': 150, 'pm': 330, 'permis': 'A2', 'pl': 2, 'cyl': 300, 'cv': 28, 'co2': 70, 'classe': 'Euro 5', 'cv_admin': 3, 'pl_debout': 0, 'db': 87, 'rpm': 8500},
+    26: {'pv': 220, 'pm': 420, 'permis': 'A', 'pl': 2, 'cyl': 1100, 'cv': 210, 'co2': 165, 'classe': 'Euro 4', 'cv_admin': 15, 'pl_debout': 0, 'db': 106, 'rpm': 12000},
+    27: {'pv': 2000, 'pm': 2800, 'permis': 'B', 'pl': 5, 'cyl': 2998, 'cv': 176, 'co2': 200, 'classe': 'Euro 6', 'cv_admin': 10, 'pl_debout': 0, 'db': 76, 'rpm': 5500},
+    28: {'pv': 1900, 'pm': 2600, 'permis': 'B', 'pl': 5, 'cyl': 2500, 'cv': 150, 'co2': 190, 'classe': 'Euro 6', 'cv_admin': 9, 'pl_debout': 0, 'db': 74, 'rpm': 5800},
+    29: {'pv': 2200, 'pm': 3500, 'permis': 'C', 'pl': 3, 'cyl': 2300, 'cv': 140, 'co2': 225, 'classe': 'Euro 6', 'cv_admin': 11, 'pl_debout': 0, 'db': 77, 'rpm': 4300},
+    30: {'pv': 2500, 'pm': 5000, 'permis': 'C', 'pl': 3, 'cyl': 2998, 'cv': 180, 'co2': 245, 'classe': 'Euro 6', 'cv_admin': 13, 'pl_debout': 0, 'db': 80, 'rpm': 4000},
+    # FORD (31-36)
+    31: {'pv': 115, 'pm': 290, 'permis': 'A1', 'pl': 2, 'cyl': 125, 'cv': 10, 'co2': 50, 'classe': 'Euro 5', 'cv_admin': 2, 'pl_debout': 0, 'db': 84, 'rpm': 9200},
+    32: {'pv': 170, 'pm': 360, 'permis': 'A2', 'pl': 2, 'cyl': 450, 'cv': 35, 'co2': 78, 'classe': 'Euro 5', 'cv_admin': 4, 'pl_debout': 0, 'db': 89, 'rpm': 8200},
+    33: {'pv': 1150, 'pm': 1650, 'permis': 'B', 'pl': 5, 'cyl': 999, 'cv': 95, 'co2': 115, 'classe': 'Euro 6d', 'cv_admin': 6, 'pl_debout': 0, 'db': 70, 'rpm': 6400},
+    34: {'pv': 1300, 'pm': 1850, 'permis': 'B', 'pl': 5, 'cyl': 1498, 'cv': 120, 'co2': 125, 'classe': 'Euro 6d', 'cv_admin': 8, 'pl_debout': 0, 'db': 72, 'rpm': 6300},
+    35: {'pv': 2100, 'pm': 3500, 'permis': 'C', 'pl': 3, 'cyl': 1995, 'cv': 130, 'co2': 210, 'classe': 'Euro 6', 'cv_admin': 10, 'pl_debout': 0, 'db': 75, 'rpm': 4600},
+    36: {'pv': 2800, 'pm': 4700, 'permis': 'C', 'pl': 3, 'cyl': 1995, 'cv': 170, 'co2': 245, 'classe': 'Euro 6', 'cv_admin': 12, 'pl_debout': 0, 'db': 78, 'rpm': 4400},
+}
+
+
+class CatalogueModeles:
+    """Cache par worker de la liste des modèles (menus déroulants des formulaires)"""
+
+    def __init__(self, duree_vie=None):
+        # Durée de vie du cache en secondes (la table modeles change rarement)
+        self.duree_vie = float(duree_vie if duree_vie is not None else os.getenv('CATALOGUE_TTL', '300'))
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def modeles(self, db, avec_categorie=False):
+        """
+        Retourne la liste des modèles avec leur marque (et leur catégorie si demandé)
+
+        Args:
+            db: Objet de connexion à la base de données
+            avec_categorie (bool): Inclure le nom de la catégorie du véhicule
+
+        Returns:
+            Liste de dictionnaires (id, modele, type_vehicule, marque_nom[, categorie_nom])
+        """
+        entree = self._cache.get(avec_categorie)
+        if entree and time.monotonic() - entree[0] < self.duree_vie:
+            return entree[1]
+
+        if avec_categorie:
+            query = """
+                SELECT m.id, m.modele, m.type_vehicule, ma.nom as marque_nom, c.nom as categorie_nom
+                FROM modeles m
+                JOIN marques ma ON m.marque_id = ma.id
+                JOIN categories_vehicule c ON m.categorie_id = c.id
+                ORDER BY ma.nom, m.modele
+            """
+        else:
+            query = """
+                SELECT m.id, m.modele, m.type_vehicule, ma.nom as marque_nom
+                FROM modeles m
+                JOIN marques ma ON m.marque_id = ma.id
+                ORDER BY ma.nom, m.modele
+            """
+        modeles = db.fetch_all(query)
+        # Une liste vide signale une erreur de base de données : on ne la met pas en cache
+        if modeles:
+            with self._lock:
+                self._cache[avec_categorie] = (time.monotonic(), modeles)
+        return modeles
+
+    def vider(self):
+        """Vide le cache (prochain appel relu depuis la base)"""
+        with self._lock:
+            self._cache.clear()
@@ -0,0 +1,20 @@
+# Configuration de l'application, chargée à la demande
+# Aucun effet de bord à l'import : le fichier .env et le logging ne sont
+# initialisés qu'au premier besoin (création de l'application, connexion...)
+import logging
+
+_configuration_chargee = False
+
+
+def charger_configuration():
+    """Charge les variables d'environnement du fichier .env (une seule fois)"""
+    global _configuration_chargee
+    if not _configuration_chargee:
+        from dotenv import load_dotenv
+        load_dotenv()
+        _configuration_chargee = True
+
+
+def configurer_logging(niveau=logging.INFO):
+    """Configure le logging (enregistrement des événements) s'il ne l'est pas déjà"""
+    logging.basicConfig(level=niveau, format='%(asctime)s - %(levelname)s - %(message)s')
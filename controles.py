@@ -0,0 +1,194 @@
+"""
+Dates de contrôle technique (table controles_techniques)
+
+Les dates de contrôle de cartes_grises sont réparties dans des colonnes
+(date_premier_controle, date_controle_2 ... date_controle_7, date_prochain_controle),
+ce qui impose de parcourir toute la table pour trouver les contrôles d'une période.
+La table controles_techniques en garde une copie à raison d'une ligne par date et par
+véhicule, indexée par date : la liste des contrôles à venir lit une plage de l'index.
+
+Les colonnes de cartes_grises restent la référence (formulaires) : la table est
+resynchronisée à chaque enregistrement d'une carte, et reconstruite par lots au besoin :
+    python controles.py --migrer     # crée la table si elle manque, puis la remplit
+    python controles.py --remplir    # reconstruit toute la table
+"""
+import argparse
+import logging
+import sys
+from datetime import date, timedelta
+
+logger = logging.getLogger(__name__)
+
+# Rang de chaque colonne de date ; 0 = prochain contrôle (prioritaire si deux colonnes ont la même date)
+COLONNES_CONTROLES = {
+    0: 'date_prochain_controle',
+    1: 'date_premier_controle',
+    2: 'date_controle_2',
+    3: 'date_controle_3',
+    4: 'date_controle_4',
+    5: 'date_controle_5',
+    6: 'date_controle_6',
+    7: 'date_controle_7',
+}
+
+# Même définition que setup_complete.sql
+SCHEMA_CONTROLES = """
+CREATE TABLE IF NOT EXISTS controles_techniques (
+    carte_grise_id INT NOT NULL,
+    date_controle DATE NOT NULL,
+    rang TINYINT NOT NULL,
+    PRIMARY KEY (carte_grise_id, date_controle),
+    FOREIGN KEY (carte_grise_id) REFERENCES cartes_grises(id) ON DELETE CASCADE,
+    INDEX idx_controle_date (date_controle, carte_grise_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+"""
+
+
+def requete_remplissage(condition):
+    """
+    INSERT ... SELECT des dates de contrôle des cartes grises qui vérifient la condition
+
+    Une ligne par date distincte d'un véhicule (rang le plus petit si plusieurs colonnes
+    portent la même date). La condition porte sur cartes_grises et est répétée pour
+    chaque colonne : ses paramètres sont à fournir len(COLONNES_CONTROLES) fois.
+    """
+    selections = '\n            UNION ALL '.join(
+        f"SELECT id AS carte_grise_id, {colonne} AS date_controle, {rang} AS rang "
+        f"FROM cartes_grises WHERE {colonne} IS NOT NULL AND {condition}"
+        for rang, colonne in COLONNES_CONTROLES.items())
+    return f"""
+        INSERT INTO controles_techniques (carte_grise_id, date_controle, rang)
+        SELECT carte_grise_id, date_controle, MIN(rang)
+        FROM ({selections}) dates
+        GROUP BY carte_grise_id, date_controle
+    """
+
+
+def synchroniser_controles(db, carte_id):
+    """Recopie les dates de contrôle d'une carte grise dans controles_techniques"""
+    if not db.execute_query("DELETE FROM controles_techniques WHERE carte_grise_id=%s", (carte_id,)):
+        return False
+    return db.execute_query(requete_remplissage("id = %s"), (carte_id,) * len(COLONNES_CONTROLES))
+
+
+def remplir_plage(db, id_apres, id_jusqu_a):
+    """Reconstruit les contrôles des cartes d'identifiant compris dans ]id_apres, id_jusqu_a]"""
+    if not db.execute_query("DELETE FROM controles_techniques WHERE carte_grise_id > %s AND carte_grise_id <= %s",
+                            (id_apres, id_jusqu_a)):
+        return False
+    return db.execute_query(requete_remplissage("id > %s AND id <= %s"),
+                            (id_apres, id_jusqu_a) * len(COLONNES_CONTROLES))
+
+
+def remplir(db, lot=20000, progression=None):
+    """
+    Reconstruit toute la table, par plages d'identifiants de cartes grises
+
+    Args:
+        db: Database
+        lot: Cartes grises par plage
+        progression: Fonction appelée après chaque plage avec la fraction traitée (0 à 1)
+
+    Returns:
+        int: Nombre de lignes de controles_techniques
+    """
+    dernier = (db.fetch_one("SELECT MAX(id) AS id FROM cartes_grises") or {}).get('id') or 0
+    for debut in range(0, dernier, lot):
+        if not remplir_plage(db, debut, debut + lot):
+            raise RuntimeError(f"Échec du remplissage des contrôles des cartes {debut + 1} à {debut + lot}")
+        logger.info(f"Contrôles des cartes 1 à {min(debut + lot, dernier)} enregistrés")
+        if progression:
+            progression(min(debut + lot, dernier) / dernier)
+    return (db.fetch_one("SELECT COUNT(*) AS n FROM controles_techniques") or {}).get('n')
+
+
+def migrer(db):
+    """Crée la table controles_techniques si elle n'existe pas"""
+    if db.backend == 'sqlite':
+        from base_sqlite import traduire_schema
+        instructions = traduire_schema(SCHEMA_CONTROLES)
+    else:
+        instructions = [SCHEMA_CONTROLES]
+    return all(db.execute_query(instruction) for instruction in instructions)
+
+
+def lister_controles_a_venir(db, jours=30, apres=None, taille_page=50, aujourd_hui=None):
+    """
+    Contrôles techniques prévus dans les prochains jours, par date croissante
+
+    Pagination par clé (date, carte) : la page suivante reprend après le dernier
+    élément de la précédente, sans OFFSET. Chaque page lit une plage de l'index
+    idx_controle_date.
+
+    Args:
+        db: Database
+        jours: Taille de la période, à partir d'aujourd'hui
+        apres: (date, carte_grise_id) du dernier contrôle de la page précédente, ou None
+        taille_page: Contrôles par page
+        aujourd_hui: Date de début (aujourd'hui par défaut)
+
+    Returns:
+        tuple: (lignes, curseur de la page suivante ou None)
+    """
+    debut = aujourd_hui or date.today()
+    fin = debut + timedelta(days=jours)
+    # Première page : tous les contrôles du jour de départ (carte_grise_id > 0)
+    date_apres, id_apres = apres or (debut, 0)
+    lignes = db.fetch_all("""
+        SELECT ct.date_controle, ct.rang, cg.id, cg.numero_carte_grise, cg.numero_immatriculation,
+               p.nom, p.prenom, p.adresse, mo.modele, ma.nom as marque_nom
+        FROM controles_techniques ct
+        JOIN cartes_grises cg ON ct.carte_grise_id = cg.id
+        JOIN proprietaires p ON cg.proprietaire_id = p.id
+        JOIN modeles mo ON cg.modele_id = mo.id
+        JOIN marques ma ON mo.marque_id = ma.id
+        WHERE ct.date_controle >= %s AND ct.date_controle <= %s
+          AND (ct.date_controle > %s OR ct.carte_grise_id > %s)
+        ORDER BY ct.date_controle, ct.carte_grise_id
+        LIMIT %s
+    """, (date_apres, fin, date_apres, id_apres, taille_page + 1))
+    # Une ligne de plus que la page : indique s'il reste des contrôles
+    suivant = None
+    if len(lignes) > taille_page:
+        lignes = lignes[:taille_page]
+        suivant = (lignes[-1]['date_controle'], lignes[-1]['id'])
+    return lignes, suivant
+
+
+def compter_controles_a_venir(db, jours=30, aujourd_hui=None):
+    """Nombre de contrôles prévus dans les prochains jours (lecture de l'index seul)"""
+    debut = aujourd_hui or date.today()
+    resultat = db.fetch_one(
+        "SELECT COUNT(*) AS n FROM controles_techniques WHERE date_controle >= %s AND date_controle <= %s",
+        (debut, debut + timedelta(days=jours)))
+    return resultat['n'] if resultat else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    action = parser.add_mutually_exclusive_group(required=True)
+    action.add_argument('--migrer', action='store_true', help="Créer la table si elle manque, puis la remplir")
+    action.add_argument('--remplir', action='store_true', help="Reconstruire toute la table")
+    parser.add_argument('--lot', type=int, default=20000, help="Cartes grises par lot")
+    args = parser.parse_args()
+
+    from config import charger_configuration, configurer_logging
+    from database import Database
+    charger_configuration()
+    configurer_logging()
+
+    db = Database()
+    if args.migrer and not migrer(db):
+        print("Création de la table impossible (voir le journal)")
+        return 1
+    try:
+        nombre = remplir(db, args.lot)
+    except RuntimeError as e:
+        print(f"Erreur : {e}")
+        return 1
+    print(f"{nombre} contrôles techniques enregistrés")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,91 +1,553 @@
-# Modules pour la connexion MySQL et gestion des erreurs
-import mysql.connector
-from mysql.connector import Error
 import os
-from dotenv import load_dotenv
+import random
+import threading
+import time
 import logging
+from contextlib import contextmanager
+from config import charger_configuration
+from lignes import lignes_compactes
 
-# Chargement des variables d'environnement depuis le fichier .env
-load_dotenv()
-
-# Configuration du logging (enregistrement des événements)
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Modules pour la connexion MySQL (ou SQLite) et gestion des erreurs
+# Importés à la première connexion (voir _importer_mysql) : l'import de
+# mysql.connector est coûteux et inutile tant qu'aucune requête n'est faite
+mysql = None
+pooling = None
+base_sqlite = None
+# Exceptions des moteurs chargés (tuple utilisable dans un except)
+Error = ()
+
+
+def _importer_mysql():
+    """Importe mysql.connector au premier usage"""
+    global mysql, Error, pooling
+    if mysql is None:
+        import mysql.connector
+        from mysql.connector import pooling as _pooling
+        Error = Error + (mysql.connector.Error,)
+        pooling = _pooling
+
+
+def _importer_sqlite():
+    """Importe le moteur SQLite embarqué au premier usage"""
+    global base_sqlite, Error
+    if base_sqlite is None:
+        import sqlite3
+        import base_sqlite as _base_sqlite
+        Error = Error + (sqlite3.Error,)
+        base_sqlite = _base_sqlite
+
+
+def _erreur_de_connexion(erreur):
+    """Indique si l'erreur vient de la connexion (serveur injoignable, connexion perdue)
+    plutôt que de la requête elle-même (syntaxe, contrainte d'unicité...)"""
+    if mysql is None or not isinstance(erreur, mysql.connector.Error):
+        return base_sqlite.erreur_de_connexion(erreur)
+    if isinstance(erreur, mysql.connector.errors.PoolError):
+        return False
+    if isinstance(erreur, (mysql.connector.errors.InterfaceError, mysql.connector.errors.OperationalError)):
+        return True
+    # Erreurs du client MySQL (CR_*) : 2003 serveur injoignable, 2006 serveur parti, 2013 connexion perdue...
+    return erreur.errno is not None and 2000 <= erreur.errno < 3000
+
+
+# Code d'erreur MySQL : requête interrompue par MAX_EXECUTION_TIME
+ERREUR_DELAI_DEPASSE = 3024
+
+
+def limiter_duree(query, timeout_ms):
+    """
+    Ajoute à un SELECT l'indication MySQL MAX_EXECUTION_TIME : le serveur
+    interrompt la requête au-delà de timeout_ms millisecondes
+
+    Args:
+        query: Requête SELECT
+        timeout_ms: Durée maximale d'exécution en millisecondes (None = illimitée)
+
+    Returns:
+        La requête avec l'indication d'optimiseur
+    """
+    if not timeout_ms:
+        return query
+    debut = query.upper().index('SELECT') + len('SELECT')
+    return f"{query[:debut]} /*+ MAX_EXECUTION_TIME({int(timeout_ms)}) */{query[debut:]}"
+
+
+class CircuitBreaker:
+    """
+    Disjoncteur de la base de données
+
+    - fermé : les requêtes passent ; après `seuil_echecs` échecs de connexion consécutifs il s'ouvre
+    - ouvert : les requêtes échouent immédiatement, sans toucher au réseau, pendant un délai
+      qui double à chaque ouverture consécutive (backoff exponentiel plafonné, avec un peu d'aléa)
+    - semi-ouvert : à l'expiration du délai, une seule requête sonde la base ;
+      succès -> fermé, échec -> de nouveau ouvert avec un délai plus long
+    """
+
+    FERME = 'ferme'
+    OUVERT = 'ouvert'
+    SEMI_OUVERT = 'semi_ouvert'
+
+    def __init__(self, seuil_echecs=3, delai_initial=1.0, delai_max=30.0):
+        self.seuil_echecs = seuil_echecs
+        self.delai_initial = delai_initial
+        self.delai_max = delai_max
+        self.etat = self.FERME
+        self.echecs_consecutifs = 0
+        self.ouvertures_consecutives = 0
+        self.reouverture_a = 0.0
+        self._sonde_en_cours = False
+        self._lock = threading.Lock()
+
+    def autoriser(self):
+        """Indique si une tentative d'accès à la base peut avoir lieu"""
+        with self._lock:
+            if self.etat == self.FERME:
+                return True
+            if self.etat == self.OUVERT and time.monotonic() >= self.reouverture_a:
+                self.etat = self.SEMI_OUVERT
+                self._sonde_en_cours = False
+            if self.etat == self.SEMI_OUVERT and not self._sonde_en_cours:
+                # Une seule sonde à la fois ; les autres requêtes échouent immédiatement
+                self._sonde_en_cours = True
+                return True
+            return False
+
+    def succes(self):
+        """Enregistre un accès réussi : le disjoncteur se referme"""
+        with self._lock:
+            if self.etat != self.FERME:
+                logger.info("Base de données de nouveau disponible, disjoncteur refermé")
+            self.etat = self.FERME
+            self.echecs_consecutifs = 0
+            self.ouvertures_consecutives = 0
+            self._sonde_en_cours = False
+
+    def echec(self):
+        """Enregistre un échec de connexion"""
+        with self._lock:
+            self.echecs_consecutifs += 1
+            if self.etat == self.SEMI_OUVERT or self.echecs_consecutifs >= self.seuil_echecs:
+                self._ouvrir()
+
+    def abandon(self):
+        """Tentative terminée sans verdict sur l'état de la base (ex: pool saturé)"""
+        with self._lock:
+            self._sonde_en_cours = False
+
+    def _ouvrir(self):
+        self.ouvertures_consecutives += 1
+        delai = min(self.delai_initial * 2 ** (self.ouvertures_consecutives - 1), self.delai_max)
+        # Aléa de ±10 % pour que les workers ne sondent pas tous en même temps
+        delai *= random.uniform(0.9, 1.1)
+        self.etat = self.OUVERT
+        self._sonde_en_cours = False
+        self.reouverture_a = time.monotonic() + delai
+        logger.warning(f"Base de données indisponible, disjoncteur ouvert pour {delai:.1f} s")
+
+    def etat_courant(self):
+        """État du disjoncteur (pour les sondes de santé)"""
+        with self._lock:
+            return {
+                'etat': self.etat,
+                'echecs_consecutifs': self.echecs_consecutifs,
+                'reouverture_dans_s': round(max(0.0, self.reouverture_a - time.monotonic()), 1)
+                if self.etat == self.OUVERT else 0.0,
+            }
+
+
+class Transaction:
+    """
+    Requêtes d'une transaction ouverte par Database.transaction()
+
+    Contrairement aux méthodes de Database, les erreurs sont levées (la transaction
+    est alors annulée en entier) et rien n'est validé avant la fin du bloc.
+    """
+
+    def __init__(self, connection):
+        self._connection = connection
+        # Identifiant de la dernière ligne insérée par execute()
+        self.lastrowid = None
+
+    def execute(self, query, params=None):
+        """Exécute une requête de modification ; retourne le nombre de lignes affectées"""
+        cursor = self._connection.cursor(buffered=False)
+        try:
+            cursor.execute(query, params or ())
+            self.lastrowid = cursor.lastrowid
+            return cursor.rowcount
+        finally:
+            cursor.close()
+
+    def execute_many(self, query, rows):
+        """Exécute une requête de modification pour chaque ligne ; retourne le nombre de lignes affectées"""
+        cursor = self._connection.cursor(buffered=False)
+        try:
+            cursor.executemany(query, rows)
+            return cursor.rowcount
+        finally:
+            cursor.close()
+
+    def fetch_all(self, query, params=None):
+        """Lignes du résultat (dictionnaires), lues dans la transaction"""
+        cursor = self._connection.cursor(dictionary=True, buffered=True)
+        try:
+            cursor.execute(query, params or ())
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+
+    def fetch_one(self, query, params=None):
+        """Première ligne du résultat, ou None"""
+        lignes = self.fetch_all(query, params)
+        return lignes[0] if lignes else None
+
+
 class Database:
     """Classe de gestion de la connexion et des opérations sur la base de données"""
     
-    def __init__(self):
+    def __init__(self, pool_size=None, backend=None, chemin_sqlite=None, host=None, port=None, replicas=None,
+                 database=None):
+        # Chargement du fichier .env au premier usage
+        charger_configuration()
+        # Moteur : 'mysql' (serveur) ou 'sqlite' (fichier local, sans serveur)
+        self.backend = (backend or os.getenv('DB_BACKEND', 'mysql')).lower()
+        self.chemin_sqlite = chemin_sqlite or os.getenv(
+            'DB_SQLITE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'carte_grise.sqlite3'))
         # Récupération des paramètres de connexion depuis les variables d'environnement
-        self.host = os.getenv('DB_HOST', 'localhost')
+        self.host = host or os.getenv('DB_HOST', 'localhost')
         self.user = os.getenv('DB_USER', 'root')
         self.password = os.getenv('DB_PASSWORD', '')
-        self.database = os.getenv('DB_NAME', 'carte_grise_db')
-        self.port = int(os.getenv('DB_PORT', '3306'))
-        self.connection = None
+        self.database = database or os.getenv('DB_NAME', 'carte_grise_db')
+        self.port = int(port or os.getenv('DB_PORT', '3306'))
+        # Taille du pool de connexions (0 = une connexion directe, sans pool)
+        # Le pool est créé au premier connect(), donc après le fork du worker
+        self.pool_size = int(pool_size if pool_size is not None else os.getenv('DB_POOL_SIZE', '0'))
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        # Chaque thread du worker utilise sa propre connexion
+        self._local = threading.local()
+        # Délai de connexion (et de lecture réseau en mode pur Python), en secondes
+        self.connect_timeout = int(os.getenv('DB_CONNECT_TIMEOUT', '10'))
+        # Disjoncteur partagé par tous les threads du worker
+        self.breaker = CircuitBreaker(
+            seuil_echecs=int(os.getenv('DB_BREAKER_SEUIL', '3')),
+            delai_initial=float(os.getenv('DB_BREAKER_DELAI', '1')),
+            delai_max=float(os.getenv('DB_BREAKER_DELAI_MAX', '30'))
+        )
+        # Répliques en lecture (DB_REPLICA_HOSTS=hote1:3306,hote2) : mêmes identifiants que le primaire
+        if replicas is None:
+            replicas = [
+                Database(pool_size=self.pool_size, backend=self.backend, host=hote, port=port or None, replicas=[],
+                         database=self.database)
+                for hote, _, port in (h.strip().partition(':') for h in os.getenv('DB_REPLICA_HOSTS', '').split(','))
+                if hote
+            ]
+        self.replicas = replicas
+        # Lecture de ses propres écritures : après une écriture, les lectures restent
+        # sur le primaire pendant cette fenêtre (secondes)
+        self.fenetre_primaire = float(os.getenv('DB_REPLICA_FENETRE_S', '5'))
+        # Une réplique en retard de plus de retard_max secondes est écartée
+        self.retard_max = float(os.getenv('DB_REPLICA_RETARD_MAX_S', '5'))
+        self.intervalle_verification = float(os.getenv('DB_REPLICA_VERIFICATION_S', '5'))
+        self._replicas_verifiees_a = 0.0
+        self._verification_lock = threading.Lock()
+        self._routage_lock = threading.Lock()
+        self._prochaine_replica = 0
+        self.lectures = {'primaire': 0, 'replicas': 0, 'basculements': 0}
+        # État de santé, renseigné quand l'instance sert de réplique
+        self.replica_saine = True
+        self.retard_s = None
+
+    @property
+    def connection(self):
+        """Connexion du thread courant (None si aucune)"""
+        return getattr(self._local, 'connection', None)
+
+    @connection.setter
+    def connection(self, value):
+        self._local.connection = value
+
+    @property
+    def derniere_erreur(self):
+        """Code d'erreur MySQL de la dernière requête du thread courant (None si succès)"""
+        return getattr(self._local, 'derniere_erreur', None)
+
+    def _parametres_connexion(self):
+        """Paramètres communs à la connexion directe et au pool"""
+        return {
+            'host': self.host,
+            'user': self.user,
+            'password': self.password,
+            'database': self.database,
+            'port': self.port,
+            'use_pure': True,  # Utilise l'implémentation pure Python (compatible avec tous les OS)
+            'autocommit': False,  # Les transactions doivent être validées manuellement
+            'connection_timeout': self.connect_timeout,
+            'get_warnings': False,
+            'raise_on_warnings': False
+        }
+
+    def _obtenir_pool(self):
+        """Crée le pool de connexions du worker au premier appel"""
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = pooling.MySQLConnectionPool(
+                        pool_name=f"carte_grise_{os.getpid()}",
+                        pool_size=self.pool_size,
+                        # Pas de reset à la restitution : on garde les variables de session
+                        pool_reset_session=False,
+                        **self._parametres_connexion()
+                    )
+                    logger.info(f"Pool de {self.pool_size} connexions MySQL créé (pid {os.getpid()})")
+        return self._pool
     
     def connect(self):
-        """Établit la connexion à la base de données MySQL"""
+        """Établit la connexion à la base de données MySQL (ou l'emprunte au pool)"""
+        if self.backend == 'sqlite':
+            return self._connecter_sqlite()
+        _importer_mysql()
+        # Disjoncteur ouvert : échec immédiat, sans attendre le délai de connexion
+        if not self.breaker.autoriser():
+            logger.debug("Disjoncteur ouvert, connexion refusée")
+            return False
         try:
-            self.connection = mysql.connector.connect(
-                host=self.host,
-                user=self.user,
-                password=self.password,
-                database=self.database,
-                port=self.port,
-                use_pure=True,  # Utilise l'implémentation pure Python (compatible avec tous les OS)
-                autocommit=False,  # Les transactions doivent être validées manuellement
-                connection_timeout=30,
-                get_warnings=False,
-                raise_on_warnings=False
-            )
+            if self.pool_size > 0:
+                self.connection = self._obtenir_pool().get_connection()
+            else:
+                self.connection = mysql.connector.connect(**self._parametres_connexion())
             # Configuration des variables de session pour gérer les délais d'inactivité
-            if self.connection.is_connected():
-                cursor = self.connection.cursor()
-                cursor.execute("SET SESSION wait_timeout=28800")  # 8 heures
-                cursor.execute("SET SESSION interactive_timeout=28800")
-                cursor.close()
-                logger.info("Connexion réussie à la base de données MySQL")
-                return True
+            cursor = self.connection.cursor()
+            cursor.execute("SET SESSION wait_timeout=28800, interactive_timeout=28800")  # 8 heures
+            cursor.close()
+            self.breaker.succes()
+            logger.debug("Connexion réussie à la base de données MySQL")
+            return True
         except Error as e:
+            if _erreur_de_connexion(e):
+                self.breaker.echec()
+            else:
+                # Pool saturé : la base n'est pas en cause
+                self.breaker.abandon()
             logger.error(f"Erreur lors de la connexion à MySQL: {e}")
+            self.disconnect()
             return False
     
+    def _connecter_sqlite(self):
+        """Ouvre la connexion SQLite du thread (base et schéma créés au premier usage)"""
+        _importer_sqlite()
+        if not self.breaker.autoriser():
+            logger.debug("Disjoncteur ouvert, connexion refusée")
+            return False
+        try:
+            self.connection = base_sqlite.connecter(self.chemin_sqlite, delai=self.connect_timeout)
+            self.breaker.succes()
+            logger.debug(f"Connexion réussie à la base SQLite {self.chemin_sqlite}")
+            return True
+        except (Error + (OSError,)) as e:
+            self.breaker.echec()
+            logger.error(f"Erreur lors de l'ouverture de la base SQLite: {e}")
+            self.disconnect()
+            return False
+
     def _ensure_connection(self):
         """Vérifie que la connexion est active et la rétablit si nécessaire"""
         try:
             if not self.connection:
-                logger.info("Pas de connexion, établissement de la connexion...")
+                logger.debug("Pas de connexion, établissement de la connexion...")
                 return self.connect()
             
-            # Test si la connexion est active
+            # Test si la connexion est active (is_connected envoie un ping au serveur)
+            # La reconnexion passe par connect(), donc par le disjoncteur :
+            # pas de nouvelles tentatives en boucle pendant une panne
             if not self.connection.is_connected():
                 logger.info("Connexion perdue, tentative de reconnexion...")
                 self.disconnect()
-                self.connection = None
-                return self.connect()
-            
-            # Ping supplémentaire pour vérifier l'état du serveur
-            try:
-                self.connection.ping(reconnect=True, attempts=3, delay=1)
-            except Error as e:
-                logger.warning(f"Ping échoué: {e}, reconnexion en cours...")
-                self.disconnect()
-                self.connection = None
                 return self.connect()
             
             return True
         except Error as e:
             logger.error(f"Erreur lors de la vérification de la connexion: {e}")
-            self.connection = None
+            self.disconnect()
             return self.connect()
     
     def disconnect(self):
-        """Ferme la connexion à la base de données"""
-        if self.connection and self.connection.is_connected():
-            self.connection.close()
-            logger.info("Connexion MySQL fermée")
+        """Ferme la connexion à la base de données (ou la rend au pool)"""
+        for replica in self.replicas:
+            replica.disconnect()
+        connection = self.connection
+        self.connection = None
+        if connection is None:
+            return
+        # Pas de is_connected() ici : sur un serveur injoignable il attendrait le délai réseau
+        # Une connexion du pool y est toujours rendue, même cassée (le pool la rétablira)
+        try:
+            connection.close()
+            logger.debug("Connexion MySQL fermée")
+        except Error as e:
+            logger.debug(f"Erreur lors de la fermeture de la connexion: {e}")
+
+    def _signaler_erreur(self, erreur):
+        """Après une erreur de requête : si la connexion est en cause, on la libère
+        et on prévient le disjoncteur ; sinon la connexion reste utilisable"""
+        if _erreur_de_connexion(erreur):
+            self.breaker.echec()
+            self.disconnect()
     
+    def ping(self):
+        """
+        Vérifie que la base de données répond (SELECT 1)
+
+        Returns:
+            True si la base est joignable, False sinon
+        """
+        if not self._ensure_connection():
+            return False
+        cursor = None
+        try:
+            cursor = self.connection.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchall()
+            return True
+        except Error as e:
+            logger.warning(f"La base de données ne répond pas: {e}")
+            self._signaler_erreur(e)
+            return False
+        finally:
+            if cursor:
+                try:
+                    cursor.close()
+                except Error:
+                    pass
+
+    # =========================
+    # Routage lecture / écriture entre le primaire et les répliques
+    # =========================
+
+    def nouvelle_requete(self):
+        """Réinitialise le routage du thread au début d'une requête HTTP"""
+        self._local.primaire_jusqu_a = 0.0
+        self._local.a_ecrit = False
+
+    def epingler_primaire(self, duree_s=None):
+        """
+        Envoie les lectures du thread courant au primaire
+
+        Args:
+            duree_s: Durée de l'épinglage (défaut : fenêtre de lecture après écriture)
+        """
+        duree_s = self.fenetre_primaire if duree_s is None else duree_s
+        self._local.primaire_jusqu_a = time.monotonic() + duree_s
+
+    @property
+    def a_ecrit(self):
+        """Indique si le thread courant a écrit depuis nouvelle_requete()"""
+        return getattr(self._local, 'a_ecrit', False)
+
+    def _noter_ecriture(self):
+        self._local.a_ecrit = True
+        if self.replicas:
+            self.epingler_primaire()
+
+    def _compter_lecture(self, cible):
+        with self._routage_lock:
+            self.lectures[cible] += 1
+
+    def retard_replication(self):
+        """
+        Retard de cette base (réplique) sur le primaire, en secondes
+
+        Returns:
+            Retard en secondes, ou None si la base est injoignable ou la réplication arrêtée
+        """
+        if self.backend == 'sqlite':
+            # Pas de réplication : seule la disponibilité compte
+            return 0.0 if self.ping() else None
+        # SHOW REPLICA STATUS depuis MySQL 8.0.22, SHOW SLAVE STATUS avant
+        for requete, colonne in (("SHOW REPLICA STATUS", 'Seconds_Behind_Source'),
+                                 ("SHOW SLAVE STATUS", 'Seconds_Behind_Master')):
+            statut = self.fetch_one(requete)
+            if self.connection is None:
+                return None
+            if self.derniere_erreur is None:
+                retard = statut.get(colonne) if statut else None
+                return float(retard) if retard is not None else None
+        return None
+
+    def verifier_replicas(self, forcer=False):
+        """Met à jour la santé et le retard des répliques (au plus une fois par intervalle)"""
+        if not self.replicas:
+            return
+        if not forcer and time.monotonic() - self._replicas_verifiees_a < self.intervalle_verification:
+            return
+        # Un seul thread vérifie ; les autres utilisent l'état précédent
+        if not self._verification_lock.acquire(blocking=False):
+            return
+        try:
+            for replica in self.replicas:
+                retard = replica.retard_replication()
+                saine = retard is not None and retard <= self.retard_max
+                if saine != replica.replica_saine:
+                    if saine:
+                        logger.info(f"Réplique {replica.host}:{replica.port} réintégrée (retard {retard:.0f} s)")
+                    else:
+                        logger.warning(f"Réplique {replica.host}:{replica.port} écartée (retard {retard})")
+                replica.replica_saine = saine
+                replica.retard_s = retard
+                # La connexion de vérification n'appartient à aucune requête
+                replica.disconnect()
+            self._replicas_verifiees_a = time.monotonic()
+        finally:
+            self._verification_lock.release()
+
+    def _choisir_replica(self):
+        """Réplique saine qui servira la lecture (tourniquet), ou None pour lire sur le primaire"""
+        if not self.replicas or time.monotonic() < getattr(self._local, 'primaire_jusqu_a', 0.0):
+            return None
+        self.verifier_replicas()
+        saines = [replica for replica in self.replicas if replica.replica_saine]
+        if not saines:
+            return None
+        with self._routage_lock:
+            self._prochaine_replica = (self._prochaine_replica + 1) % len(saines)
+            return saines[self._prochaine_replica]
+
+    def _lire(self, methode, query, params, timeout_ms, *options):
+        """
+        Exécute une lecture sur une réplique si possible
+
+        Returns:
+            (True, résultat) si une réplique a exécuté la requête, (False, None) sinon
+        """
+        replica = self._choisir_replica()
+        if replica is None:
+            if self.replicas:
+                self._compter_lecture('primaire')
+            return False, None
+        resultat = getattr(replica, methode)(query, params, timeout_ms, *options)
+        # Connexion conservée : la requête a été exécutée (avec ou sans erreur SQL)
+        if replica.connection is not None:
+            self._local.derniere_erreur = replica.derniere_erreur
+            self._compter_lecture('replicas')
+            return True, resultat
+        # Réplique injoignable : écartée jusqu'à la prochaine vérification, lecture sur le primaire
+        replica.replica_saine = False
+        self._compter_lecture('basculements')
+        return False, None
+
+    def etat_replicas(self):
+        """État du routage des lectures (pour /readyz et /metriques)"""
+        with self._routage_lock:
+            lectures = dict(self.lectures)
+        return {
+            'replicas': [{'hote': r.chemin_sqlite if r.backend == 'sqlite' else f"{r.host}:{r.port}",
+                          'saine': r.replica_saine, 'retard_s': r.retard_s,
+                          'disjoncteur': r.breaker.etat_courant()['etat']} for r in self.replicas],
+            'lectures': lectures,
+        }
+
     def execute_query(self, query, params=None):
         """
         Exécute une requête de modification (INSERT, UPDATE, DELETE)
@@ -95,9 +557,10 @@ class Database:
             params: Paramètres pour la requête (tuple)
             
         Returns:
-            ID de la dernière ligne insérée ou True si succès
+            ID de la dernière ligne insérée ou True si succès (False en cas d'erreur)
         """
-        self._ensure_connection()
+        if not self._ensure_connection():
+            return False
         cursor = None
         try:
             cursor = self.connection.cursor(buffered=False)
@@ -106,20 +569,21 @@ class Database:
             else:
                 cursor.execute(query)
             self.connection.commit()  # Validation de la transaction
+            self._noter_ecriture()
             last_id = cursor.lastrowid
             return last_id if last_id else True
         except Error as e:
             logger.error(f"Erreur lors de l'exécution de la requête: {e}")
+            if _erreur_de_connexion(e):
+                self._signaler_erreur(e)
+                return False
             try:
                 self.connection.rollback()  # Annule la transaction en cas d'erreur
             except Error as rollback_error:
                 logger.error(f"Erreur lors de l'annulation de la transaction: {rollback_error}")
                 # Force une reconnexion si l'annulation échoue
-                try:
-                    self.disconnect()
-                except:
-                    pass
-                self.connection = None
+                self.breaker.echec()
+                self.disconnect()
             return False
         finally:
             if cursor:
@@ -128,35 +592,119 @@ class Database:
                 except Error as e:
                     logger.error(f"Erreur lors de la fermeture du curseur: {e}")
     
-    def fetch_all(self, query, params=None):
+    def execute_many(self, query, rows):
+        """
+        Exécute une requête de modification pour une liste de lignes (insertion par lots)
+
+        Args:
+            query: Requête SQL à exécuter (INSERT ... VALUES (%s, ...))
+            rows: Liste de tuples de paramètres
+
+        Returns:
+            Nombre de lignes affectées (False en cas d'erreur)
+        """
+        if not self._ensure_connection():
+            return False
+        cursor = None
+        try:
+            cursor = self.connection.cursor(buffered=False)
+            cursor.executemany(query, rows)
+            self.connection.commit()
+            self._noter_ecriture()
+            return cursor.rowcount
+        except Error as e:
+            logger.error(f"Erreur lors de l'exécution de la requête par lots: {e}")
+            if _erreur_de_connexion(e):
+                self._signaler_erreur(e)
+                return False
+            try:
+                self.connection.rollback()
+            except Error as rollback_error:
+                logger.error(f"Erreur lors de l'annulation de la transaction: {rollback_error}")
+                self.breaker.echec()
+                self.disconnect()
+            return False
+        finally:
+            if cursor:
+                try:
+                    cursor.close()
+                except Error as e:
+                    logger.error(f"Erreur lors de la fermeture du curseur: {e}")
+
+    @contextmanager
+    def transaction(self):
+        """
+        Transaction sur le primaire : les requêtes du bloc sont validées ensemble, ou annulées
+
+            with db.transaction() as tx:
+                tx.execute("UPDATE ...", params)
+                tx.execute_many("UPDATE ...", lignes)
+
+        Une erreur dans le bloc annule toute la transaction puis est propagée.
+
+        Raises:
+            ConnectionError: Base de données indisponible (disjoncteur ouvert, connexion impossible)
+        """
+        if not self._ensure_connection():
+            raise ConnectionError("Base de données indisponible")
+        connection = self.connection
+        try:
+            # Termine l'éventuel instantané de lecture avant d'ouvrir la transaction
+            connection.rollback()
+            connection.start_transaction()
+            yield Transaction(connection)
+            connection.commit()
+            self._noter_ecriture()
+        except BaseException as e:
+            try:
+                connection.rollback()
+            except Error as rollback_error:
+                logger.error(f"Erreur lors de l'annulation de la transaction: {rollback_error}")
+                self.breaker.echec()
+                self.disconnect()
+            if isinstance(e, Error):
+                logger.error(f"Transaction annulée: {e}")
+                self._local.derniere_erreur = getattr(e, 'errno', None)
+                self._signaler_erreur(e)
+            raise
+
+    def fetch_all(self, query, params=None, timeout_ms=None, compact=False):
         """
         Exécute une requête SELECT et retourne tous les résultats
         
         Args:
             query: Requête SQL à exécuter
             params: Paramètres pour la requête (tuple)
+            timeout_ms: Durée maximale d'exécution côté serveur (millisecondes)
+            compact: Lignes compactes (tuples nommés, voir lignes.py) plutôt que des dictionnaires
             
         Returns:
-            Liste de dictionnaires contenant les résultats
+            Liste de dictionnaires (ou de lignes compactes) contenant les résultats (vide en cas d'erreur)
         """
-        self._ensure_connection()
+        # Lecture sur une réplique si possible (voir _choisir_replica)
+        lue, resultat = self._lire('fetch_all', query, params, timeout_ms, compact)
+        if lue:
+            return resultat
+        self._local.derniere_erreur = None
+        if not self._ensure_connection():
+            return []
+        query = limiter_duree(query, timeout_ms)
         cursor = None
         try:
-            cursor = self.connection.cursor(dictionary=True, buffered=True)
+            cursor = self.connection.cursor(dictionary=not compact, buffered=True)
             if params:
                 cursor.execute(query, params)
             else:
                 cursor.execute(query)
             result = cursor.fetchall()
+            if compact:
+                return lignes_compactes(cursor.description, result)
             return result
         except Error as e:
             logger.error(f"Erreur lors de la récupération des données: {e}")
-            # Force une reconnexion en cas d'erreur critique
-            try:
-                self.disconnect()
-            except:
-                pass
-            self.connection = None
+            self._local.derniere_erreur = getattr(e, 'errno', None)
+            # Reconnexion (via le disjoncteur) seulement si la connexion est en cause
+            self._signaler_erreur(e)
             return []
         finally:
             if cursor:
@@ -165,18 +713,26 @@ class Database:
                 except Error as e:
                     logger.error(f"Erreur lors de la fermeture du curseur: {e}")
     
-    def fetch_one(self, query, params=None):
+    def fetch_one(self, query, params=None, timeout_ms=None):
         """
         Exécute une requête SELECT et retourne un seul résultat
         
         Args:
             query: Requête SQL à exécuter
             params: Paramètres pour la requête (tuple)
+            timeout_ms: Durée maximale d'exécution côté serveur (millisecondes)
             
         Returns:
             Dictionnaire contenant le premier résultat ou None
         """
-        self._ensure_connection()
+        # Lecture sur une réplique si possible (voir _choisir_replica)
+        lue, resultat = self._lire('fetch_one', query, params, timeout_ms)
+        if lue:
+            return resultat
+        self._local.derniere_erreur = None
+        if not self._ensure_connection():
+            return None
+        query = limiter_duree(query, timeout_ms)
         cursor = None
         try:
             cursor = self.connection.cursor(dictionary=True, buffered=True)
@@ -188,12 +744,9 @@ class Database:
             return result
         except Error as e:
             logger.error(f"Erreur lors de la récupération des données: {e}")
-            # Force une reconnexion en cas d'erreur critique
-            try:
-                self.disconnect()
-            except:
-                pass
-            self.connection = None
+            self._local.derniere_erreur = getattr(e, 'errno', None)
+            # Reconnexion (via le disjoncteur) seulement si la connexion est en cause
+            self._signaler_erreur(e)
             return None
         finally:
             if cursor:
@@ -201,3 +754,16 @@ class Database:
                     cursor.close()
                 except Error as e:
                     logger.error(f"Erreur lors de la fermeture du curseur: {e}")
+
+    def colonnes(self, table):
+        """
+        Noms des colonnes d'une table, dans l'ordre de sa définition
+
+        Returns:
+            Liste des noms (vide si la table n'existe pas)
+        """
+        if self.backend == 'sqlite':
+            return [ligne['name'] for ligne in self.fetch_all(f"PRAGMA table_info({table})")]
+        return [ligne['name'] for ligne in self.fetch_all(
+            "SELECT COLUMN_NAME AS name FROM information_schema.COLUMNS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s ORDER BY ORDINAL_POSITION", (table,))]
@@ -0,0 +1,431 @@
+"""
+Générateur de flotte synthétique : propriétaires et cartes grises en grand nombre
+
+Les données suivent le catalogue de la base (table modeles) et les données
+techniques de référence (catalogue.DONNEES_TECHNIQUES_REF). Plaques, numéros de
+carte grise et VIN continuent les séquences existantes, dans les formats de
+numero_generator. Les ajouts faits ensuite par l'application restent donc uniques.
+
+Le travail est découpé en tranches indépendantes réparties sur plusieurs processus :
+- chaque tranche calcule directement ses numéros (numero_plaque_depuis_rang,
+  avancer_numero_carte_grise) sans parcourir les précédentes ;
+- les VIN sont numérotés par fabricant/mois sans trou : une première passe
+  compte les véhicules de chaque tranche par fabricant/mois, la seconde attribue
+  à chaque tranche une plage de numéros à la suite des tranches précédentes.
+
+Sorties :
+- fichiers TSV prêts pour LOAD DATA (--sortie DOSSIER) avec le script charger.sql ;
+- insertions par lots directement dans la base (--inserer).
+
+Usage :
+    python generateur_flotte.py --cartes 2000000 --sortie donnees_flotte --graine 42
+    cd donnees_flotte && mysql --local-infile=1 -u root -p carte_grise < charger.sql
+    python generateur_flotte.py --cartes 200000 --inserer --processus 4
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import time
+from collections import Counter
+from datetime import date, timedelta
+from multiprocessing import Pool
+
+from adresses import departement_depuis_code_postal
+from archivage import TABLE_ARCHIVE
+from catalogue import DONNEES_TECHNIQUES_REF
+from controles import remplir_plage, requete_remplissage
+from numero_generator import (
+    avancer_numero_carte_grise,
+    generer_numero_serie,
+    numero_plaque_depuis_rang,
+    NOMBRE_PLAQUES,
+    rang_numero_plaque
+)
+
+logger = logging.getLogger(__name__)
+
+NOMS = ['Martin', 'Bernard', 'Thomas', 'Petit', 'Robert', 'Richard', 'Durand', 'Dubois', 'Moreau',
+        'Laurent', 'Simon', 'Michel', 'Lefebvre', 'Leroy', 'Roux', 'David', 'Bertrand', 'Morel',
+        'Fournier', 'Girard', 'Bonnet', 'Dupont', 'Lambert', 'Fontaine', 'Rousseau', 'Vincent',
+        'Muller', 'Lefevre', 'Faure', 'Andre', 'Mercier', 'Blanc', 'Guerin', 'Boyer', 'Garnier']
+PRENOMS = ['Jean', 'Marie', 'Pierre', 'Sophie', 'Luc', 'Claire', 'Nicolas', 'Julie', 'Thomas',
+           'Camille', 'Antoine', 'Emma', 'Hugo', 'Léa', 'Louis', 'Chloé', 'Paul', 'Manon',
+           'Gabriel', 'Inès', 'Jules', 'Alice', 'Arthur', 'Lina', 'Raphaël', 'Sarah']
+# (code postal, ville, poids) : répartition approximative de la population
+VILLES = [('75001', 'Paris', 21), ('13001', 'Marseille', 9), ('69001', 'Lyon', 5), ('31000', 'Toulouse', 5),
+          ('06000', 'Nice', 3), ('44000', 'Nantes', 3), ('34000', 'Montpellier', 3), ('67000', 'Strasbourg', 3),
+          ('33000', 'Bordeaux', 3), ('59000', 'Lille', 2), ('35000', 'Rennes', 2), ('51100', 'Reims', 2),
+          ('42000', 'Saint-Étienne', 2), ('83000', 'Toulon', 2), ('38000', 'Grenoble', 2), ('21000', 'Dijon', 2),
+          ('49000', 'Angers', 1), ('30000', 'Nîmes', 1), ('63000', 'Clermont-Ferrand', 1), ('29200', 'Brest', 1)]
+RUES = ['Rue de la République', 'Avenue Victor Hugo', 'Rue Nationale', 'Boulevard Gambetta',
+        'Rue du Moulin', 'Place de la Mairie', 'Rue des Écoles', 'Avenue Jean Jaurès',
+        'Rue Pasteur', 'Rue de la Gare', 'Allée des Tilleuls', 'Chemin des Vignes']
+# Couleurs les plus fréquentes du parc français (pondérées)
+COULEURS = [('Gris', 30), ('Blanc', 25), ('Noir', 18), ('Bleu', 10), ('Rouge', 9), ('Argent', 5), ('Vert', 3)]
+# Part de chaque catégorie de permis dans le parc (voitures majoritaires)
+POIDS_PERMIS = {'B': 80, 'A': 4, 'A1': 4, 'A2': 4, 'C': 8}
+
+COLONNES_PROPRIETAIRES = ('id', 'nom', 'prenom', 'adresse', 'code_postal', 'departement')
+COLONNES_CARTES = (
+    'id', 'numero_carte_grise', 'numero_immatriculation', 'date_premiere_immat', 'date_immat_actuelle',
+    'proprietaire_id', 'est_conducteur', 'modele_id', 'numero_serie', 'poids_vide_kg', 'poids_max_kg',
+    'categorie_permis', 'carburant_energie', 'cylindree_cm3', 'puissance_chevaux', 'puissance_administrative_cv',
+    'places_assises', 'places_debout', 'emission_co2_g_km', 'classe_environnementale',
+    'niveau_sonore_db', 'vitesse_max_moteur_rpm', 'couleur_principale',
+    'date_premier_controle', 'date_prochain_controle',
+)
+
+
+# =========================
+# Plan de génération (calculé une fois, partagé par les processus)
+# =========================
+
+def preparer_plan(db, nb_cartes, nb_proprietaires, taille_tranche, graine):
+    """
+    Lit dans la base le catalogue et le point de départ de chaque séquence
+
+    Returns:
+        dict: paramètres de génération, transmis tels quels aux processus
+    """
+    modeles = db.fetch_all("""
+        SELECT m.id, ma.numero_fabricant
+        FROM modeles m
+        JOIN marques ma ON m.marque_id = ma.id
+        ORDER BY m.id
+    """)
+    modeles = [(m['id'], m['numero_fabricant']) for m in modeles if m['id'] in DONNEES_TECHNIQUES_REF]
+    if not modeles:
+        raise RuntimeError("Aucun modèle du catalogue en base : exécuter d'abord setup_complete.sql")
+
+    derniere = db.fetch_one("""
+        SELECT id, numero_carte_grise, numero_immatriculation FROM cartes_grises ORDER BY id DESC LIMIT 1
+    """)
+    rang_plaque = -1
+    if derniere:
+        rang_plaque = rang_numero_plaque(derniere['numero_immatriculation'])
+    if rang_plaque + nb_cartes >= NOMBRE_PLAQUES:
+        raise RuntimeError("Espace des plaques insuffisant pour ce nombre de cartes grises")
+
+    # VIN existants par fabricant/mois (préfixe de 10 caractères : PEU2026M01), archives comprises :
+    # comme generer_numero_serie_depuis_db, pour ne pas réattribuer le VIN d'un véhicule archivé
+    vin_existants = Counter()
+    for table in ('cartes_grises', TABLE_ARCHIVE):
+        # Table d'archive absente (base non migrée) : aucune ligne
+        for motif in db.fetch_all(f"""
+            SELECT SUBSTRING(numero_serie, 1, 10) AS motif, COUNT(*) AS count
+            FROM {table}
+            GROUP BY SUBSTRING(numero_serie, 1, 10)
+        """):
+            vin_existants[motif['motif']] += motif['count']
+    id_proprietaire = (db.fetch_one("SELECT MAX(id) AS id FROM proprietaires") or {}).get('id') or 0
+
+    return {
+        'graine': graine if graine is not None else random.randrange(2 ** 32),
+        'aujourd_hui': date.today(),
+        'modeles': modeles,
+        'nb_cartes': nb_cartes,
+        'nb_proprietaires': nb_proprietaires,
+        'taille_tranche': taille_tranche,
+        'premier_id_carte': (derniere['id'] if derniere else 0) + 1,
+        'premier_id_proprietaire': id_proprietaire + 1,
+        'dernier_numero_carte': derniere['numero_carte_grise'] if derniere else None,
+        'dernier_rang_plaque': rang_plaque,
+        'vin_existants': dict(vin_existants),
+    }
+
+
+def _tranches(total, taille):
+    return [(debut, min(taille, total - debut)) for debut in range(0, total, taille)]
+
+
+def _ponderation(plan):
+    """Modèles pondérés par la part de leur catégorie de permis dans le parc"""
+    poids = []
+    for modele_id, _fabricant in plan['modeles']:
+        permis = DONNEES_TECHNIQUES_REF[modele_id]['permis']
+        categorie = sum(1 for m, _f in plan['modeles'] if DONNEES_TECHNIQUES_REF[m]['permis'] == permis)
+        poids.append(POIDS_PERMIS.get(permis, 1) / categorie)
+    return poids
+
+
+def _tirer_vehicules(plan, debut, nombre):
+    """
+    Tire le modèle et la date de première immatriculation de chaque véhicule d'une tranche
+
+    Tirage reproductible (même graine, même tranche) : appelé une fois pour
+    compter les VIN par fabricant/mois, une seconde fois pour générer les lignes.
+    """
+    generateur = random.Random(f"{plan['graine']}-vehicules-{debut}")
+    poids = _ponderation(plan)
+    modeles = generateur.choices(plan['modeles'], weights=poids, k=nombre)
+    aujourd_hui = plan['aujourd_hui']
+    vehicules = []
+    for modele_id, fabricant in modeles:
+        # Âge du parc : loi gamma (moyenne d'environ 11 ans), plafonnée à 30 ans
+        age = min(generateur.gammavariate(2.0, 5.5), 30.0)
+        premiere_immat = aujourd_hui - timedelta(days=int(age * 365.25))
+        vehicules.append((modele_id, fabricant, premiere_immat))
+    return vehicules
+
+
+def _motif_vin(fabricant, jour):
+    return f"{fabricant}{jour.year}M{jour.month:02d}"
+
+
+def compter_motifs(arguments):
+    """Première passe : nombre de véhicules de la tranche par fabricant/mois"""
+    plan, debut, nombre = arguments
+    return debut, Counter(_motif_vin(fabricant, jour) for _m, fabricant, jour in _tirer_vehicules(plan, debut, nombre))
+
+
+def calculer_decalages_vin(plan, comptes):
+    """
+    Numéro de départ des VIN de chaque tranche, par fabricant/mois
+
+    Les tranches sont numérotées dans l'ordre, à la suite des VIN existants.
+    """
+    courant = Counter(plan['vin_existants'])
+    decalages = {}
+    for debut in sorted(comptes):
+        decalages[debut] = {motif: courant[motif] for motif in comptes[debut]}
+        courant.update(comptes[debut])
+    return decalages
+
+
+# =========================
+# Génération des lignes
+# =========================
+
+def generer_proprietaires(plan, debut, nombre):
+    """Lignes (id, nom, prenom, adresse, code_postal, departement) d'une tranche de propriétaires"""
+    generateur = random.Random(f"{plan['graine']}-proprietaires-{debut}")
+    villes = [(cp, ville) for cp, ville, _p in VILLES]
+    poids_villes = [p for _cp, _v, p in VILLES]
+    lignes = []
+    for i in range(nombre):
+        code_postal, ville = generateur.choices(villes, weights=poids_villes)[0]
+        adresse = f"{generateur.randint(1, 250)} {generateur.choice(RUES)}, {code_postal} {ville}"
+        lignes.append((plan['premier_id_proprietaire'] + debut + i, generateur.choice(NOMS),
+                       generateur.choice(PRENOMS), adresse, code_postal, departement_depuis_code_postal(code_postal)))
+    return lignes
+
+
+def _ajouter_annees(jour, annees):
+    try:
+        return jour.replace(year=jour.year + annees)
+    except ValueError:  # 29 février
+        return jour.replace(year=jour.year + annees, day=28)
+
+
+def generer_cartes(plan, debut, nombre, decalages_vin):
+    """Lignes de cartes grises d'une tranche (colonnes COLONNES_CARTES)"""
+    generateur = random.Random(f"{plan['graine']}-cartes-{debut}")
+    aujourd_hui = plan['aujourd_hui']
+    couleurs = [c for c, _p in COULEURS]
+    poids_couleurs = [p for _c, p in COULEURS]
+    compteurs_vin = Counter(decalages_vin)
+    numero_carte = avancer_numero_carte_grise(plan['dernier_numero_carte'], debut)
+
+    lignes = []
+    for i, (modele_id, fabricant, premiere_immat) in enumerate(_tirer_vehicules(plan, debut, nombre)):
+        ref = DONNEES_TECHNIQUES_REF[modele_id]
+        numero_carte = avancer_numero_carte_grise(numero_carte, 1)
+        numero_plaque = numero_plaque_depuis_rang(plan['dernier_rang_plaque'] + debut + i + 1)
+
+        motif = _motif_vin(fabricant, premiere_immat)
+        compteurs_vin[motif] += 1
+        numero_serie = generer_numero_serie(fabricant, premiere_immat.year, premiere_immat.month, compteurs_vin[motif])
+
+        # Environ 45 % des véhicules ont changé de propriétaire depuis la première immatriculation
+        immat_actuelle = premiere_immat
+        if generateur.random() < 0.45 and premiere_immat < aujourd_hui:
+            immat_actuelle = premiere_immat + timedelta(days=generateur.randrange((aujourd_hui - premiere_immat).days))
+
+        # Émissions : dispersion autour de la référence, en hausse avec l'âge du véhicule
+        co2 = ref.get('co2')
+        age = (aujourd_hui - premiere_immat).days / 365.25
+        if co2 is not None:
+            co2 = max(0, round(co2 * generateur.lognormvariate(0, 0.08) * (1 + 0.012 * age)))
+
+        # Contrôle technique : premier à 4 ans, puis tous les 2 ans
+        premier_controle = _ajouter_annees(premiere_immat, 4)
+        prochain_controle = premier_controle
+        while prochain_controle < aujourd_hui:
+            prochain_controle = _ajouter_annees(prochain_controle, 2)
+
+        lignes.append((
+            plan['premier_id_carte'] + debut + i, numero_carte, numero_plaque, premiere_immat, immat_actuelle,
+            plan['premier_id_proprietaire'] + generateur.randrange(plan['nb_proprietaires']), True,
+            modele_id, numero_serie, ref['pv'], ref['pm'],
+            ref['permis'], ref.get('carburant'), ref['cyl'], ref['cv'], ref.get('cv_admin'),
+            ref['pl'], ref.get('pl_debout', 0), co2, ref.get('classe'),
+            ref.get('db'), ref.get('rpm'),
+            ref.get('couleur') or generateur.choices(couleurs, weights=poids_couleurs)[0],
+            premier_controle, prochain_controle,
+        ))
+    return lignes
+
+
+# =========================
+# Sorties : fichiers LOAD DATA ou insertions par lots
+# =========================
+
+def _valeur_tsv(valeur):
+    if valeur is None:
+        return '\\N'
+    if valeur is True or valeur is False:
+        return '1' if valeur else '0'
+    return str(valeur).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n')
+
+
+def ecrire_tsv(chemin, lignes):
+    """Écrit les lignes au format par défaut de LOAD DATA (tabulations, \\N pour NULL)"""
+    with open(chemin, 'w', encoding='utf-8', newline='\n') as f:
+        for ligne in lignes:
+            f.write('\t'.join(_valeur_tsv(v) for v in ligne))
+            f.write('\n')
+
+
+def _requete_insertion(table, colonnes):
+    return f"INSERT INTO {table} ({', '.join(colonnes)}) VALUES ({', '.join(['%s'] * len(colonnes))})"
+
+
+# Connexion propre à chaque processus (une connexion MySQL ne se partage pas entre processus)
+_db_processus = None
+
+
+def _initialiser_processus():
+    global _db_processus
+    _db_processus = None
+
+
+def _inserer(table, colonnes, lignes, lot):
+    global _db_processus
+    if _db_processus is None:
+        from database import Database
+        _db_processus = Database()
+    requete = _requete_insertion(table, colonnes)
+    for i in range(0, len(lignes), lot):
+        if _db_processus.execute_many(requete, lignes[i:i + lot]) is False:
+            raise RuntimeError(f"Échec de l'insertion dans {table}")
+
+
+def traiter_tranche(arguments):
+    """Génère une tranche (propriétaires ou cartes grises) puis l'écrit ou l'insère"""
+    genre, plan, debut, nombre, decalages_vin, sortie, lot = arguments
+    if genre == 'proprietaires':
+        table, colonnes = 'proprietaires', COLONNES_PROPRIETAIRES
+        lignes = generer_proprietaires(plan, debut, nombre)
+    else:
+        table, colonnes = 'cartes_grises', COLONNES_CARTES
+        lignes = generer_cartes(plan, debut, nombre, decalages_vin)
+    if sortie:
+        ecrire_tsv(os.path.join(sortie, f"{table}_{debut // plan['taille_tranche']:05d}.tsv"), lignes)
+    else:
+        _inserer(table, colonnes, lignes, lot)
+        if genre == 'cartes_grises':
+            # Dates de contrôle de la tranche dans controles_techniques
+            premier_id = plan['premier_id_carte'] + debut
+            if not remplir_plage(_db_processus, premier_id - 1, premier_id + nombre - 1):
+                raise RuntimeError("Échec de l'insertion dans controles_techniques")
+    return genre, nombre
+
+
+def ecrire_script_chargement(sortie, plan):
+    """Script charger.sql : LOAD DATA de tous les fichiers, propriétaires d'abord"""
+    lignes = ['-- Chargement de la flotte synthétique (mysql --local-infile=1, depuis ce dossier)',
+              'SET foreign_key_checks = 0;', 'SET unique_checks = 0;']
+    for table, colonnes, total in (('proprietaires', COLONNES_PROPRIETAIRES, plan['nb_proprietaires']),
+                                   ('cartes_grises', COLONNES_CARTES, plan['nb_cartes'])):
+        for debut, _nombre in _tranches(total, plan['taille_tranche']):
+            fichier = f"{table}_{debut // plan['taille_tranche']:05d}.tsv"
+            lignes.append(f"LOAD DATA LOCAL INFILE '{fichier}' INTO TABLE {table} "
+                          f"CHARACTER SET utf8mb4 ({', '.join(colonnes)});")
+    # Dates de contrôle des cartes chargées (identifiants à la suite de la base de départ)
+    lignes.append(' '.join(requete_remplissage(f"id >= {plan['premier_id_carte']}").split()) + ';')
+    lignes += ['SET unique_checks = 1;', 'SET foreign_key_checks = 1;']
+    with open(os.path.join(sortie, 'charger.sql'), 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lignes) + '\n')
+
+
+def generer_flotte(db, nb_cartes, nb_proprietaires=None, graine=None, processus=None,
+                   sortie=None, taille_tranche=50000, lot=2000):
+    """
+    Génère une flotte synthétique dans des fichiers LOAD DATA (sortie) ou directement en base
+
+    Args:
+        db: Base de données servant de point de départ (catalogue, dernières séquences)
+        nb_cartes (int): Nombre de cartes grises
+        nb_proprietaires (int): Nombre de propriétaires (par défaut un pour trois véhicules)
+        graine (int): Graine aléatoire (données reproductibles pour une même base de départ)
+        processus (int): Nombre de processus (par défaut le nombre de CPU)
+        sortie (str): Dossier des fichiers TSV, ou None pour insérer en base
+        taille_tranche (int): Lignes générées par tâche
+        lot (int): Lignes par requête d'insertion
+
+    Returns:
+        dict: Nombre de lignes générées et durée
+    """
+    debut_chrono = time.perf_counter()
+    nb_proprietaires = nb_proprietaires or max(1, nb_cartes // 3)
+    # Les séquences (dernière plaque, derniers VIN) se lisent sur le primaire, jamais sur une réplique
+    db.epingler_primaire(float('inf'))
+    plan = preparer_plan(db, nb_cartes, nb_proprietaires, taille_tranche, graine)
+    # Les processus ouvrent leurs propres connexions
+    db.disconnect()
+    if sortie:
+        os.makedirs(sortie, exist_ok=True)
+
+    tranches_cartes = _tranches(nb_cartes, taille_tranche)
+    processus = processus or os.cpu_count()
+    with Pool(processes=processus, initializer=_initialiser_processus) as pool:
+        comptes = dict(pool.imap_unordered(compter_motifs, [(plan, d, n) for d, n in tranches_cartes]))
+        decalages = calculer_decalages_vin(plan, comptes)
+
+        # Propriétaires d'abord (clé étrangère des cartes grises)
+        taches = [('proprietaires', plan, d, n, None, sortie, lot) for d, n in _tranches(nb_proprietaires, taille_tranche)]
+        taches_cartes = [('cartes_grises', plan, d, n, decalages[d], sortie, lot) for d, n in tranches_cartes]
+        totaux = Counter()
+        for lot_taches in (taches, taches_cartes):
+            for genre, nombre in pool.imap_unordered(traiter_tranche, lot_taches):
+                totaux[genre] += nombre
+                logger.info(f"{genre} : {totaux[genre]} lignes générées")
+
+    if sortie:
+        ecrire_script_chargement(sortie, plan)
+    return {'proprietaires': totaux['proprietaires'], 'cartes_grises': totaux['cartes_grises'],
+            'duree_s': round(time.perf_counter() - debut_chrono, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cartes', type=int, required=True, help="Nombre de cartes grises à générer")
+    parser.add_argument('--proprietaires', type=int, default=None,
+                        help="Nombre de propriétaires (défaut : un pour trois cartes grises)")
+    parser.add_argument('--graine', type=int, default=None, help="Graine aléatoire (données reproductibles)")
+    parser.add_argument('--processus', type=int, default=os.cpu_count(), help="Processus de génération")
+    parser.add_argument('--tranche', type=int, default=50000, help="Lignes par tâche")
+    parser.add_argument('--lot', type=int, default=2000, help="Lignes par requête d'insertion")
+    sortie = parser.add_mutually_exclusive_group(required=True)
+    sortie.add_argument('--sortie', help="Dossier des fichiers TSV pour LOAD DATA")
+    sortie.add_argument('--inserer', action='store_true', help="Insérer directement dans la base")
+    args = parser.parse_args()
+
+    from config import charger_configuration, configurer_logging
+    from database import Database
+    charger_configuration()
+    configurer_logging()
+
+    resultat = generer_flotte(Database(), args.cartes, args.proprietaires, args.graine, args.processus,
+                              args.sortie, args.tranche, args.lot)
+    print(f"{resultat['proprietaires']} propriétaires et {resultat['cartes_grises']} cartes grises "
+          f"générés en {resultat['duree_s']} s")
+    if args.sortie:
+        print(f"Chargement : cd {args.sortie} && mysql --local-infile=1 -u <utilisateur> -p <base> < charger.sql")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
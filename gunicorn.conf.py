@@ -0,0 +1,53 @@
+# Configuration du serveur de production gunicorn
+# Usage : gunicorn -c gunicorn.conf.py wsgi:app
+#
+# - Rechargement gracieux : kill -HUP <pid du master> (les workers terminent leurs requêtes en cours)
+# - Ajout / retrait de workers à chaud : kill -TTIN / kill -TTOU <pid du master>
+# - Arrêt gracieux : kill -TERM <pid du master>
+import logging
+import multiprocessing
+import os
+
+from config import charger_configuration
+
+# Le master lit aussi le fichier .env (SECRET_KEY, WEB_*, DB_*), hérité par les workers
+charger_configuration()
+
+# Adresse d'écoute (mêmes variables que le serveur de développement)
+bind = f"{os.getenv('FLASK_HOST', '127.0.0.1')}:{os.getenv('FLASK_PORT', '5000')}"
+
+# Nombre de processus workers (préfork) et de threads par worker
+workers = int(os.getenv('WEB_WORKERS', str(multiprocessing.cpu_count() * 2 + 1)))
+# Transmis aux workers : sans Redis, le cache de plaques de chacun garde ses entrées peu de temps
+os.environ['WEB_WORKERS'] = str(workers)
+threads = int(os.getenv('WEB_THREADS', '4'))
+# Plusieurs threads par worker : worker gthread (les requêtes attendent surtout MySQL)
+worker_class = 'gthread' if threads > 1 else 'sync'
+
+# Recyclage des workers : redémarrage après N requêtes (limite les fuites mémoire)
+# Le jitter évite que tous les workers redémarrent en même temps
+max_requests = int(os.getenv('WEB_MAX_REQUESTS', '2000'))
+max_requests_jitter = int(os.getenv('WEB_MAX_REQUESTS_JITTER', '200'))
+
+# Délais : requête bloquée, arrêt gracieux et keep-alive
+timeout = int(os.getenv('WEB_TIMEOUT', '30'))
+graceful_timeout = int(os.getenv('WEB_GRACEFUL_TIMEOUT', '30'))
+keepalive = int(os.getenv('WEB_KEEPALIVE', '5'))
+
+# L'application est créée dans chaque worker après le fork :
+# aucune connexion MySQL n'est partagée entre processus
+preload_app = False
+
+# Une connexion MySQL par thread dans le pool de chaque worker
+os.environ.setdefault('DB_POOL_SIZE', str(threads))
+
+# La clé secrète doit être identique dans tous les workers (sessions et jetons CSRF)
+if not os.getenv('SECRET_KEY'):
+    logging.getLogger('gunicorn.error').warning(
+        "SECRET_KEY non définie : clé temporaire générée, les sessions seront perdues au redémarrage"
+    )
+    os.environ['SECRET_KEY'] = os.urandom(24).hex()
+
+accesslog = os.getenv('WEB_ACCESS_LOG', None)
+errorlog = '-'
+loglevel = os.getenv('WEB_LOG_LEVEL', 'info')
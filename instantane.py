@@ -0,0 +1,378 @@
+"""
+Instantané des cartes grises en fichier projeté en mémoire (terminaux de contrôle, bornes hors ligne)
+
+Les services satellites qui ne font que des recherches par plaque, VIN ou numéro de
+carte grise lisent un fichier exporté depuis la base au lieu d'interroger MySQL :
+    python instantane.py cartes.idx --exporter
+    python instantane.py cartes.idx --exporter-delta cartes.delta
+    python instantane.py cartes.idx --delta cartes.delta --chercher AB-123-CD 2026AA00011
+
+Le fichier contient un enregistrement de taille fixe par carte (véhicule, couleur,
+titulaire, dates de validité et de contrôle) et trois index triés (plaque, numéro de
+carte grise, VIN) -> rang de l'enregistrement. Le lecteur (Instantane) projette le
+fichier en mémoire (mmap) et cherche par dichotomie directement dans les pages du
+fichier : rien n'est chargé à l'ouverture, un nouveau processus répond aussitôt et
+plusieurs processus partagent les mêmes pages du cache du système.
+
+Le delta contient les cartes ajoutées, modifiées (colonne version) ou supprimées depuis
+l'export de l'instantané. Il est cumulatif : chaque export de delta remplace le précédent,
+le lecteur n'en applique qu'un. Quand il grossit, réexporter l'instantané complet.
+"""
+import logging
+import mmap
+import os
+import struct
+import sys
+import time
+from datetime import date
+
+logger = logging.getLogger(__name__)
+
+MAGIQUE_INSTANTANE = b'CGINST01'
+MAGIQUE_DELTA = b'CGDELT01'
+
+# En-tête : magique, nombre d'enregistrements, identifiant maximal, date d'export (horodatage),
+# décalages des enregistrements et des index plaque, carte, VIN
+EN_TETE = struct.Struct('<8sIIdQQQQ')
+
+# Enregistrement : id, version, plaque, numéro de carte, VIN, véhicule, couleur, titulaire,
+# fin de validité, validité du certificat, prochain contrôle (dates en jours ordinaux, 0 si absente)
+ENREGISTREMENT = struct.Struct('<II9s20s30s40s24s64sIII')
+
+# Index : nom -> (champ de l'enregistrement, largeur de la clé)
+INDEX = {
+    'plaque': (2, 9),
+    'carte': (3, 20),
+    'vin': (4, 30),
+}
+
+# En-tête du delta : magique, date d'export de l'instantané de base, nombre d'entrées
+EN_TETE_DELTA = struct.Struct('<8sdI')
+# Entrée du delta : 1 si la carte est supprimée, puis l'enregistrement (id seul significatif)
+SUPPRIMEE = struct.Struct('<B')
+
+REQUETE_CARTES = """
+    SELECT cg.id, cg.version, cg.numero_immatriculation, cg.numero_carte_grise, cg.numero_serie,
+           ma.nom AS marque, mo.modele, cg.couleur_principale, p.nom, p.prenom,
+           cg.date_fin_validite, cg.date_validite_certificat, cg.date_prochain_controle
+    FROM cartes_grises cg
+    JOIN proprietaires p ON cg.proprietaire_id = p.id
+    JOIN modeles mo ON cg.modele_id = mo.id
+    JOIN marques ma ON mo.marque_id = ma.id
+"""
+
+
+def normaliser_cle(valeur):
+    """Clé d'index : sans séparateurs, en majuscules ("ab-123-cd" -> "AB123CD")"""
+    return ''.join(c for c in str(valeur).upper() if c.isalnum())
+
+
+def _texte(valeur, largeur):
+    # Tronqué à la largeur du champ ; un caractère coupé est ignoré à la lecture
+    return (valeur or '').encode('utf-8')[:largeur]
+
+
+def _jour(valeur):
+    return valeur.toordinal() if valeur else 0
+
+
+def _cle(valeur, largeur):
+    return normaliser_cle(valeur).encode('ascii', 'ignore')[:largeur].ljust(largeur, b'\0')
+
+
+def _empaqueter(ligne):
+    return ENREGISTREMENT.pack(
+        ligne['id'], ligne['version'] or 0,
+        _cle(ligne['numero_immatriculation'], 9), _cle(ligne['numero_carte_grise'], 20), _cle(ligne['numero_serie'], 30),
+        _texte(f"{ligne['marque']} {ligne['modele']}", 40), _texte(ligne['couleur_principale'], 24),
+        _texte(f"{ligne['nom']} {ligne['prenom']}", 64),
+        _jour(ligne['date_fin_validite']), _jour(ligne['date_validite_certificat']),
+        _jour(ligne['date_prochain_controle']),
+    )
+
+
+def _deballer(donnees, decalage=0):
+    champs = ENREGISTREMENT.unpack_from(donnees, decalage)
+
+    def texte(valeur):
+        return valeur.rstrip(b'\0').decode('utf-8', 'ignore')
+
+    def jour(valeur):
+        return date.fromordinal(valeur).isoformat() if valeur else None
+
+    return {
+        'id': champs[0], 'version': champs[1],
+        'plaque': texte(champs[2]), 'numero_carte_grise': texte(champs[3]), 'numero_serie': texte(champs[4]),
+        'vehicule': texte(champs[5]), 'couleur': texte(champs[6]) or None, 'titulaire': texte(champs[7]),
+        'fin_validite': jour(champs[8]), 'validite_certificat': jour(champs[9]), 'prochain_controle': jour(champs[10]),
+    }
+
+
+def _parcourir(db, lot):
+    """Lignes de REQUETE_CARTES par lots, dans l'ordre de la clé primaire"""
+    dernier = 0
+    while True:
+        lignes = db.fetch_all(REQUETE_CARTES + " WHERE cg.id > %s ORDER BY cg.id LIMIT %s", (dernier, lot))
+        if db.derniere_erreur or db.connection is None:
+            raise ConnectionError(f"Lecture des cartes grises impossible : {db.derniere_erreur}")
+        if not lignes:
+            return
+        yield from lignes
+        dernier = lignes[-1]['id']
+
+
+def exporter_instantane(db, chemin, lot=5000):
+    """
+    Écrit l'instantané de toutes les cartes grises (fichier remplacé d'un coup)
+
+    Les lecteurs qui ont déjà ouvert l'ancien fichier continuent de le lire.
+
+    Raises:
+        ConnectionError: Lecture impossible (le fichier existant est conservé)
+
+    Returns:
+        int: Nombre de cartes exportées
+    """
+    cles = {nom: [] for nom in INDEX}
+    nombre, id_max = 0, 0
+    temporaire = chemin + '.tmp'
+    with open(temporaire, 'wb') as fichier:
+        fichier.write(b'\0' * EN_TETE.size)
+        for ligne in _parcourir(db, lot):
+            enregistrement = _empaqueter(ligne)
+            fichier.write(enregistrement)
+            champs = ENREGISTREMENT.unpack(enregistrement)
+            for nom, (champ, _) in INDEX.items():
+                cles[nom].append((champs[champ], nombre))
+            nombre += 1
+            id_max = ligne['id']
+
+        decalages = []
+        for nom, (_, largeur) in INDEX.items():
+            decalages.append(fichier.tell())
+            entree = struct.Struct(f'<{largeur}sI')
+            fichier.writelines(entree.pack(cle, rang) for cle, rang in sorted(cles[nom]))
+        fichier.seek(0)
+        fichier.write(EN_TETE.pack(MAGIQUE_INSTANTANE, nombre, id_max, time.time(), EN_TETE.size, *decalages))
+    os.replace(temporaire, chemin)
+    logger.info(f"Instantané {chemin} : {nombre} cartes grises")
+    return nombre
+
+
+class Delta:
+    """Modifications d'un delta, gardées en mémoire (petites devant l'instantané)"""
+
+    def __init__(self, chemin):
+        with open(chemin, 'rb') as fichier:
+            donnees = fichier.read()
+        magique, self.base_exportee_le, nombre = EN_TETE_DELTA.unpack_from(donnees)
+        if magique != MAGIQUE_DELTA:
+            raise ValueError(f"{chemin} n'est pas un delta d'instantané")
+        # Identifiants modifiés ou supprimés : leur enregistrement de l'instantané est périmé
+        self.identifiants = set()
+        self.cles = {nom: {} for nom in INDEX}
+        taille = SUPPRIMEE.size + ENREGISTREMENT.size
+        for decalage in range(EN_TETE_DELTA.size, EN_TETE_DELTA.size + nombre * taille, taille):
+            carte = _deballer(donnees, decalage + SUPPRIMEE.size)
+            self.identifiants.add(carte['id'])
+            if not SUPPRIMEE.unpack_from(donnees, decalage)[0]:
+                for nom, cle in (('plaque', carte['plaque']), ('carte', carte['numero_carte_grise']),
+                                 ('vin', carte['numero_serie'])):
+                    self.cles[nom][cle] = carte
+        self.nombre = nombre
+
+
+class Instantane:
+    """
+    Lecteur d'instantané : recherche par dichotomie dans le fichier projeté en mémoire
+
+    Utilisable dans un bloc with. Les résultats sont des dict (dates ISO), None si la
+    carte est inconnue (ou supprimée d'après le delta).
+    """
+
+    def __init__(self, chemin, delta=None):
+        self._fichier = open(chemin, 'rb')
+        try:
+            self._memoire = mmap.mmap(self._fichier.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._fichier.close()
+            raise ValueError(f"{chemin} est vide")
+        magique, self.nombre, self.id_max, self.exporte_le, self._enregistrements, *decalages = \
+            EN_TETE.unpack_from(self._memoire)
+        if magique != MAGIQUE_INSTANTANE:
+            self.fermer()
+            raise ValueError(f"{chemin} n'est pas un instantané de cartes grises")
+        self._index = {nom: (decalage, largeur) for (nom, (_, largeur)), decalage in zip(INDEX.items(), decalages)}
+        self.delta = None
+        if delta:
+            self.appliquer_delta(delta)
+
+    def appliquer_delta(self, chemin):
+        """Remplace le delta appliqué (il doit avoir été exporté contre cet instantané)"""
+        delta = Delta(chemin)
+        if delta.base_exportee_le != self.exporte_le:
+            raise ValueError(f"{chemin} n'a pas été exporté contre cet instantané")
+        self.delta = delta
+
+    def _chercher(self, nom, valeur):
+        cle = normaliser_cle(valeur)
+        if self.delta and cle in self.delta.cles[nom]:
+            return self.delta.cles[nom][cle]
+        debut, largeur = self._index[nom]
+        cherchee = cle.encode('ascii', 'ignore')[:largeur].ljust(largeur, b'\0')
+        taille = largeur + 4
+        bas, haut = 0, self.nombre
+        while bas < haut:
+            milieu = (bas + haut) // 2
+            position = debut + milieu * taille
+            lue = self._memoire[position:position + largeur]
+            if lue < cherchee:
+                bas = milieu + 1
+            elif lue > cherchee:
+                haut = milieu
+            else:
+                rang = struct.unpack_from('<I', self._memoire, position + largeur)[0]
+                carte = _deballer(self._memoire, self._enregistrements + rang * ENREGISTREMENT.size)
+                if self.delta and carte['id'] in self.delta.identifiants:
+                    return None
+                return carte
+        return None
+
+    def par_plaque(self, plaque):
+        return self._chercher('plaque', plaque)
+
+    def par_numero_carte(self, numero):
+        return self._chercher('carte', numero)
+
+    def par_vin(self, vin):
+        return self._chercher('vin', vin)
+
+    def chercher(self, identifiant):
+        """Carte désignée par sa plaque, son numéro de carte grise ou son VIN"""
+        for nom in INDEX:
+            carte = self._chercher(nom, identifiant)
+            if carte:
+                return carte
+        return None
+
+    def versions(self):
+        """Identifiant -> version de chaque carte de l'instantané (export du delta)"""
+        return dict(
+            struct.unpack_from('<II', self._memoire, self._enregistrements + rang * ENREGISTREMENT.size)
+            for rang in range(self.nombre)
+        )
+
+    def fermer(self):
+        self._memoire.close()
+        self._fichier.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fermer()
+
+
+def exporter_delta(db, chemin_instantane, chemin_delta, lot=20000):
+    """
+    Écrit le delta entre l'instantané et la base : cartes ajoutées, modifiées ou supprimées
+
+    Seuls (id, version) de toutes les cartes sont lus ; les cartes complètes ne sont lues
+    que pour les cartes ajoutées ou modifiées.
+
+    Raises:
+        ConnectionError: Lecture impossible (le delta existant est conservé)
+
+    Returns:
+        dict: Nombre de cartes ajoutées ou modifiées, supprimées
+    """
+    with Instantane(chemin_instantane) as instantane:
+        exporte_le = instantane.exporte_le
+        connues = instantane.versions()
+
+    changees = []
+    dernier = 0
+    while True:
+        lignes = db.fetch_all("SELECT id, version FROM cartes_grises WHERE id > %s ORDER BY id LIMIT %s",
+                              (dernier, lot))
+        if db.derniere_erreur or db.connection is None:
+            raise ConnectionError(f"Lecture des cartes grises impossible : {db.derniere_erreur}")
+        if not lignes:
+            break
+        for ligne in lignes:
+            if connues.pop(ligne['id'], None) != ligne['version']:
+                changees.append(ligne['id'])
+        dernier = lignes[-1]['id']
+    # Restent les cartes de l'instantané absentes de la base
+    supprimees = sorted(connues)
+
+    entrees = []
+    for debut in range(0, len(changees), 1000):
+        identifiants = changees[debut:debut + 1000]
+        lignes = db.fetch_all(REQUETE_CARTES + f" WHERE cg.id IN ({', '.join(['%s'] * len(identifiants))})",
+                              tuple(identifiants))
+        if db.derniere_erreur or db.connection is None:
+            raise ConnectionError(f"Lecture des cartes grises impossible : {db.derniere_erreur}")
+        entrees.extend(SUPPRIMEE.pack(0) + _empaqueter(ligne) for ligne in lignes)
+    vide = {'id': 0, 'version': 0, 'numero_immatriculation': '', 'numero_carte_grise': '', 'numero_serie': '',
+            'marque': '', 'modele': '', 'couleur_principale': None, 'nom': '', 'prenom': '',
+            'date_fin_validite': None, 'date_validite_certificat': None, 'date_prochain_controle': None}
+    entrees.extend(SUPPRIMEE.pack(1) + _empaqueter(dict(vide, id=carte_id)) for carte_id in supprimees)
+
+    temporaire = chemin_delta + '.tmp'
+    with open(temporaire, 'wb') as fichier:
+        fichier.write(EN_TETE_DELTA.pack(MAGIQUE_DELTA, exporte_le, len(entrees)))
+        fichier.writelines(entrees)
+    os.replace(temporaire, chemin_delta)
+    resultat = {'modifiees': len(entrees) - len(supprimees), 'supprimees': len(supprimees)}
+    logger.info(f"Delta {chemin_delta} : {resultat['modifiees']} cartes ajoutées ou modifiées, "
+                f"{resultat['supprimees']} supprimées")
+    return resultat
+
+
+def main():
+    # Importé ici : les lecteurs n'ont pas à payer l'import d'argparse
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('instantane', help="Fichier de l'instantané")
+    action = parser.add_mutually_exclusive_group(required=True)
+    action.add_argument('--exporter', action='store_true', help="Exporter l'instantané complet depuis la base")
+    action.add_argument('--exporter-delta', metavar='DELTA', help="Exporter le delta depuis l'instantané")
+    action.add_argument('--chercher', nargs='+', metavar='IDENTIFIANT',
+                        help="Chercher des plaques, numéros de carte grise ou VIN dans l'instantané")
+    parser.add_argument('--delta', help="Delta à appliquer pour --chercher")
+    parser.add_argument('--lot', type=int, default=5000, help="Cartes grises lues par requête")
+    args = parser.parse_args()
+
+    from config import charger_configuration, configurer_logging
+    charger_configuration()
+    configurer_logging()
+
+    try:
+        if args.chercher:
+            debut = time.perf_counter()
+            with Instantane(args.instantane, args.delta) as instantane:
+                for identifiant in args.chercher:
+                    carte = instantane.chercher(identifiant)
+                    print(f"{identifiant} : {carte if carte else 'inconnue'}")
+            print(f"{len(args.chercher)} recherches en {(time.perf_counter() - debut) * 1000:.1f} ms "
+                  f"(ouverture comprise)")
+            return 0
+
+        from database import Database
+        db = Database()
+        db.epingler_primaire(float('inf'))
+        if args.exporter:
+            print(f"{exporter_instantane(db, args.instantane, args.lot)} cartes grises exportées")
+        else:
+            resultat = exporter_delta(db, args.instantane, args.exporter_delta)
+            print(f"{resultat['modifiees']} cartes ajoutées ou modifiées, {resultat['supprimees']} supprimées")
+    except (ConnectionError, OSError, ValueError) as e:
+        print(f"Erreur : {e}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,326 @@
+"""
+Instantané en colonnes des cartes grises pour les analyses hors base
+
+Les analyses lourdes (CO2 par âge, marque ou carburant, répartition des poids et
+puissances) lisent un export en colonnes au lieu d'interroger la base de production :
+    python instantane_colonnes.py analyses/ --exporter      # export complet
+    python instantane_colonnes.py analyses/ --ajouter       # cartes ajoutées depuis le dernier export
+    python instantane_colonnes.py analyses/ --decrire       # colonnes, lignes, CO2 moyen par carburant
+
+Le dossier contient un fichier binaire par colonne (entiers de taille fixe, dans l'ordre
+de cartes_grises.id), les dictionnaires des colonnes texte (le fichier de la colonne
+contient le code de chaque valeur, 0 pour NULL) et meta.json (types, nombre de lignes,
+dernier identifiant exporté). Les dates sont des jours ordinaux (date.toordinal(), 0 pour
+NULL), les nombres absents valent -1.
+
+InstantaneColonnes projette les fichiers en mémoire : tableaux NumPy (numpy.memmap) si
+NumPy est installé, memoryview sinon ; l'ouverture ne lit rien.
+
+--ajouter reprend après le dernier identifiant exporté : les modifications et suppressions
+de cartes déjà exportées ne sont vues qu'au prochain export complet.
+"""
+import json
+import logging
+import mmap
+import os
+import shutil
+import sys
+import time
+from array import array
+
+logger = logging.getLogger(__name__)
+
+# Colonnes exportées : nom -> (expression SQL, type)
+# Type : code de array ('I' entier non signé, 'i' entier signé), 'date' ou 'texte' (dictionnaire)
+COLONNES = {
+    'id': ('cg.id', 'I'),
+    'modele_id': ('cg.modele_id', 'I'),
+    'marque_id': ('mo.marque_id', 'I'),
+    'marque': ('ma.nom', 'texte'),
+    'modele': ('mo.modele', 'texte'),
+    'type_vehicule': ('mo.type_vehicule', 'texte'),
+    'carburant': ('cg.carburant_energie', 'texte'),
+    'classe_environnementale': ('cg.classe_environnementale', 'texte'),
+    'categorie_permis': ('cg.categorie_permis', 'texte'),
+    'couleur': ('cg.couleur_principale', 'texte'),
+    'departement': ('p.departement', 'texte'),
+    'date_premiere_immat': ('cg.date_premiere_immat', 'date'),
+    'date_fin_validite': ('cg.date_fin_validite', 'date'),
+    'emission_co2_g_km': ('cg.emission_co2_g_km', 'i'),
+    'poids_vide_kg': ('cg.poids_vide_kg', 'i'),
+    'poids_max_kg': ('cg.poids_max_kg', 'i'),
+    'puissance_chevaux': ('cg.puissance_chevaux', 'i'),
+    'puissance_administrative_cv': ('cg.puissance_administrative_cv', 'i'),
+    'cylindree_cm3': ('cg.cylindree_cm3', 'i'),
+    'places_assises': ('cg.places_assises', 'i'),
+    'niveau_sonore_db': ('cg.niveau_sonore_db', 'i'),
+}
+
+# Code array stocké pour chaque type
+CODES_TYPES = {'I': 'I', 'i': 'i', 'date': 'i', 'texte': 'I'}
+
+# Valeur d'un nombre absent (NULL)
+VALEUR_ABSENTE = -1
+
+FICHIER_META = 'meta.json'
+
+
+def _requete():
+    expressions = ', '.join(f"{expression} AS {nom}" for nom, (expression, _) in COLONNES.items())
+    return f"""
+        SELECT {expressions}
+        FROM cartes_grises cg
+        JOIN proprietaires p ON cg.proprietaire_id = p.id
+        JOIN modeles mo ON cg.modele_id = mo.id
+        JOIN marques ma ON mo.marque_id = ma.id
+        WHERE cg.id > %s
+        ORDER BY cg.id
+        LIMIT %s
+    """
+
+
+def _chemin_colonne(dossier, nom):
+    return os.path.join(dossier, f"{nom}.bin")
+
+
+def _chemin_dictionnaire(dossier, nom):
+    return os.path.join(dossier, f"{nom}.dict.json")
+
+
+def _ecrire_json(chemin, donnees):
+    # Remplacé d'un coup : un lecteur ne voit jamais un fichier à moitié écrit
+    with open(chemin + '.tmp', 'w', encoding='utf-8') as fichier:
+        json.dump(donnees, fichier, ensure_ascii=False)
+    os.replace(chemin + '.tmp', chemin)
+
+
+def _lire_json(chemin):
+    with open(chemin, encoding='utf-8') as fichier:
+        return json.load(fichier)
+
+
+def _ajouter_lignes(db, dossier, meta, lot):
+    """Ajoute aux fichiers des colonnes les cartes d'identifiant supérieur au dernier exporté"""
+    # Des lignes écrites après le dernier meta.json (export interrompu) sont retirées
+    for nom, (_, type_colonne) in COLONNES.items():
+        with open(_chemin_colonne(dossier, nom), 'ab') as fichier:
+            fichier.truncate(meta['lignes'] * array(CODES_TYPES[type_colonne]).itemsize)
+    dictionnaires = {}
+    for nom, (_, type_colonne) in COLONNES.items():
+        if type_colonne == 'texte':
+            valeurs = _lire_json(_chemin_dictionnaire(dossier, nom)) if meta['lignes'] else [None]
+            dictionnaires[nom] = {valeur: code for code, valeur in enumerate(valeurs)}
+
+    fichiers = {nom: open(_chemin_colonne(dossier, nom), 'ab') for nom in COLONNES}
+    ajoutees = 0
+    try:
+        while True:
+            lignes = db.fetch_all(_requete(), (meta['dernier_id'], lot))
+            if db.derniere_erreur or db.connection is None:
+                raise ConnectionError(f"Lecture des cartes grises impossible : {db.derniere_erreur}")
+            if not lignes:
+                break
+            for nom, (_, type_colonne) in COLONNES.items():
+                if type_colonne == 'texte':
+                    codes = dictionnaires[nom]
+                    valeurs = [codes.setdefault(ligne[nom], len(codes)) for ligne in lignes]
+                elif type_colonne == 'date':
+                    valeurs = [ligne[nom].toordinal() if ligne[nom] else 0 for ligne in lignes]
+                else:
+                    valeurs = [VALEUR_ABSENTE if ligne[nom] is None else ligne[nom] for ligne in lignes]
+                array(CODES_TYPES[type_colonne], valeurs).tofile(fichiers[nom])
+            ajoutees += len(lignes)
+            meta['dernier_id'] = lignes[-1]['id']
+    finally:
+        for fichier in fichiers.values():
+            fichier.close()
+
+    # Dictionnaires puis meta.json : les nouvelles lignes ne sont visibles qu'une fois tout écrit
+    for nom, codes in dictionnaires.items():
+        _ecrire_json(_chemin_dictionnaire(dossier, nom), list(codes))
+    meta['lignes'] += ajoutees
+    meta['exporte_le'] = time.time()
+    _ecrire_json(os.path.join(dossier, FICHIER_META), meta)
+    return ajoutees
+
+
+def exporter_colonnes(db, dossier, lot=20000):
+    """
+    Exporte toutes les cartes grises en colonnes (le dossier existant est remplacé à la fin)
+
+    Raises:
+        ConnectionError: Lecture impossible (le dossier existant est conservé)
+
+    Returns:
+        int: Nombre de lignes exportées
+    """
+    temporaire = dossier.rstrip(os.sep) + '.tmp'
+    shutil.rmtree(temporaire, ignore_errors=True)
+    os.makedirs(temporaire)
+    meta = {
+        'colonnes': {nom: {'type': type_colonne, 'code': CODES_TYPES[type_colonne]}
+                     for nom, (_, type_colonne) in COLONNES.items()},
+        'ordre_octets': sys.byteorder,
+        'lignes': 0,
+        'dernier_id': 0,
+    }
+    for nom in COLONNES:
+        open(_chemin_colonne(temporaire, nom), 'wb').close()
+    nombre = _ajouter_lignes(db, temporaire, meta, lot)
+
+    ancien = dossier.rstrip(os.sep) + '.ancien'
+    if os.path.exists(dossier):
+        os.replace(dossier, ancien)
+    os.replace(temporaire, dossier)
+    shutil.rmtree(ancien, ignore_errors=True)
+    logger.info(f"Instantané en colonnes {dossier} : {nombre} cartes grises")
+    return nombre
+
+
+def ajouter_colonnes(db, dossier, lot=20000):
+    """
+    Ajoute à un export existant les cartes créées depuis (identifiant supérieur au dernier exporté)
+
+    Returns:
+        int: Nombre de lignes ajoutées
+    """
+    meta = _lire_json(os.path.join(dossier, FICHIER_META))
+    if set(meta['colonnes']) != set(COLONNES):
+        raise ValueError(f"Les colonnes de {dossier} ne sont plus celles de l'export : exporter à nouveau")
+    nombre = _ajouter_lignes(db, dossier, meta, lot)
+    logger.info(f"Instantané en colonnes {dossier} : {nombre} cartes grises ajoutées")
+    return nombre
+
+
+class InstantaneColonnes:
+    """
+    Lecteur d'un export en colonnes : fichiers projetés en mémoire, à la demande
+
+    instantane['emission_co2_g_km'] : tableau NumPy (memoryview sans NumPy) de meta['lignes'] valeurs
+    instantane.dictionnaire('carburant') : valeurs des codes de la colonne (code 0 : NULL)
+    """
+
+    def __init__(self, dossier):
+        self.dossier = dossier
+        self.meta = _lire_json(os.path.join(dossier, FICHIER_META))
+        if self.meta['ordre_octets'] != sys.byteorder:
+            raise ValueError(f"{dossier} a été exporté sur une machine d'un autre ordre d'octets")
+        self.lignes = self.meta['lignes']
+        self._colonnes = {}
+        self._projections = []
+        try:
+            import numpy
+        except ImportError:
+            numpy = None
+        self._numpy = numpy
+
+    def __getitem__(self, nom):
+        if nom not in self._colonnes:
+            if nom not in self.meta['colonnes']:
+                raise KeyError(nom)
+            code = self.meta['colonnes'][nom]['code']
+            chemin = _chemin_colonne(self.dossier, nom)
+            if self._numpy is not None:
+                self._colonnes[nom] = self._numpy.memmap(chemin, dtype=self._numpy.dtype(code), mode='r',
+                                                          shape=(self.lignes,)) if self.lignes else \
+                    self._numpy.empty(0, dtype=self._numpy.dtype(code))
+            elif self.lignes:
+                with open(chemin, 'rb') as fichier:
+                    projection = mmap.mmap(fichier.fileno(), 0, access=mmap.ACCESS_READ)
+                self._projections.append(projection)
+                self._colonnes[nom] = memoryview(projection)[:self.lignes * array(code).itemsize].cast(code)
+            else:
+                self._colonnes[nom] = memoryview(array(code))
+        return self._colonnes[nom]
+
+    def dictionnaire(self, nom):
+        return _lire_json(_chemin_dictionnaire(self.dossier, nom))
+
+    def moyenne_par(self, valeur, groupe):
+        """
+        Moyenne d'une colonne numérique par valeur d'une colonne texte (valeurs absentes ignorées)
+
+        Returns:
+            dict: Valeur du groupe -> (nombre, moyenne)
+        """
+        valeurs, codes = self[valeur], self[groupe]
+        libelles = self.dictionnaire(groupe)
+        if self._numpy is not None:
+            presentes = valeurs != VALEUR_ABSENTE
+            nombres = self._numpy.bincount(codes[presentes], minlength=len(libelles))
+            sommes = self._numpy.bincount(codes[presentes], weights=valeurs[presentes], minlength=len(libelles))
+            totaux = zip(nombres.tolist(), sommes.tolist())
+        else:
+            nombres, sommes = [0] * len(libelles), [0] * len(libelles)
+            for montant, code in zip(valeurs, codes):
+                if montant != VALEUR_ABSENTE:
+                    nombres[code] += 1
+                    sommes[code] += montant
+            totaux = zip(nombres, sommes)
+        return {libelle: (nombre, somme / nombre) for libelle, (nombre, somme) in zip(libelles, totaux) if nombre}
+
+    def fermer(self):
+        for colonne in self._colonnes.values():
+            if isinstance(colonne, memoryview):
+                colonne.release()
+        self._colonnes.clear()
+        for projection in self._projections:
+            try:
+                projection.close()
+            except BufferError:
+                # Une vue est encore utilisée par l'appelant : la projection sera libérée avec elle
+                pass
+        self._projections.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fermer()
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('dossier', help="Dossier de l'export")
+    action = parser.add_mutually_exclusive_group(required=True)
+    action.add_argument('--exporter', action='store_true', help="Export complet depuis la base")
+    action.add_argument('--ajouter', action='store_true', help="Ajouter les cartes créées depuis le dernier export")
+    action.add_argument('--decrire', action='store_true', help="Afficher l'export et le CO2 moyen par carburant")
+    parser.add_argument('--lot', type=int, default=20000, help="Cartes grises lues par requête")
+    args = parser.parse_args()
+
+    from config import charger_configuration, configurer_logging
+    charger_configuration()
+    configurer_logging()
+
+    try:
+        if args.decrire:
+            debut = time.perf_counter()
+            with InstantaneColonnes(args.dossier) as instantane:
+                print(f"{instantane.lignes} lignes, dernier identifiant {instantane.meta['dernier_id']}, "
+                      f"{'NumPy' if instantane._numpy else 'memoryview'}")
+                for nom, description in instantane.meta['colonnes'].items():
+                    print(f"  {nom} : {description['type']}")
+                for carburant, (nombre, moyenne) in sorted(instantane.moyenne_par('emission_co2_g_km',
+                                                                                  'carburant').items()):
+                    print(f"CO2 moyen {carburant} : {moyenne:.1f} g/km ({nombre} véhicules)")
+            print(f"Analyse en {(time.perf_counter() - debut) * 1000:.1f} ms (ouverture comprise)")
+            return 0
+
+        from database import Database
+        db = Database()
+        db.epingler_primaire(float('inf'))
+        if args.exporter:
+            print(f"{exporter_colonnes(db, args.dossier, args.lot)} cartes grises exportées")
+        else:
+            print(f"{ajouter_colonnes(db, args.dossier, args.lot)} cartes grises ajoutées")
+    except (ConnectionError, OSError, ValueError) as e:
+        print(f"Erreur : {e}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,54 @@
+"""
+Lignes compactes pour les longues listes de résultats
+
+fetch_all rend par défaut un dictionnaire par ligne : chaque ligne porte sa propre table
+de hachage et ses références aux noms de colonnes. Avec compact=True, les lignes sont des
+tuples nommés (__slots__ vides) dont le type, avec les noms de colonnes, est partagé par
+toutes les lignes d'un même résultat. Les gabarits y accèdent par nom comme avant
+(carte.nom), le code aussi (carte['nom'], carte.get('nom')).
+"""
+from collections import namedtuple
+from functools import lru_cache
+
+
+@lru_cache(maxsize=256)
+def type_ligne(colonnes):
+    """
+    Type de ligne d'un résultat, créé une fois par liste de colonnes
+
+    Args:
+        colonnes (tuple): Noms des colonnes, dans l'ordre du SELECT
+    """
+    base = namedtuple('Ligne', colonnes, rename=True)
+
+    class Ligne(base):
+        __slots__ = ()
+        # Colonne -> position ; les noms hors colonnes (count, index...) ne sont pas des clés
+        _positions = {nom: position for position, nom in enumerate(base._fields)}
+
+        def __getitem__(self, cle):
+            if isinstance(cle, str):
+                try:
+                    cle = self._positions[cle]
+                except KeyError:
+                    raise KeyError(cle) from None
+            return super().__getitem__(cle)
+
+        def __contains__(self, cle):
+            # Comme un dictionnaire : 'departement' in ligne teste la colonne, pas les valeurs
+            return cle in self._positions
+
+        def get(self, cle, defaut=None):
+            position = self._positions.get(cle)
+            return defaut if position is None else super().__getitem__(position)
+
+        def keys(self):
+            return self._fields
+
+    return Ligne
+
+
+def lignes_compactes(description, lignes):
+    """Lignes (tuples) d'un curseur converties en lignes compactes (voir type_ligne)"""
+    Ligne = type_ligne(tuple(colonne[0] for colonne in description))
+    return list(map(Ligne._make, lignes))
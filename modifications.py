@@ -0,0 +1,152 @@
+"""
+Enregistrement des modifications d'une carte grise (formulaire /edit)
+
+Seules les colonnes dont la valeur change sont écrites : rien n'est écrit si le
+formulaire est renvoyé tel quel. La colonne version de cartes_grises est augmentée
+à chaque modification et vérifiée dans le WHERE de la mise à jour : si un autre agent
+a enregistré la carte depuis l'ouverture du formulaire, la modification est refusée
+au lieu d'écraser la sienne.
+
+Pour une base créée avant la colonne version :
+    python modifications.py --migrer
+"""
+import argparse
+import logging
+import sys
+from datetime import date
+
+logger = logging.getLogger(__name__)
+
+# Colonne ajoutée à cartes_grises (même définition que setup_complete.sql)
+MIGRATION_VERSION = [
+    "ALTER TABLE cartes_grises ADD COLUMN version INT NOT NULL DEFAULT 1",
+]
+
+# Colonnes modifiables depuis le formulaire, par type
+COLONNES_ENTIERES = {
+    'proprietaire_id', 'modele_id', 'poids_vide_kg', 'poids_max_kg', 'places_assises', 'places_debout',
+    'cylindree_cm3', 'puissance_chevaux', 'puissance_administrative_cv', 'emission_co2_g_km',
+    'niveau_sonore_db', 'vitesse_max_moteur_rpm',
+}
+COLONNES_DATES = {
+    'date_premiere_immat', 'date_fin_validite', 'date_premier_controle', 'date_controle_2',
+    'date_controle_3',
+}
+
+
+class ConflitVersion(Exception):
+    """La carte grise a été modifiée depuis la lecture de la version"""
+
+
+def migrer(db):
+    """
+    Ajoute la colonne version à cartes_grises si elle manque
+
+    Returns:
+        bool: True si la table a la colonne à l'issue de la migration
+    """
+    colonnes = db.colonnes('cartes_grises')
+    if not colonnes:
+        logger.error("Table cartes_grises introuvable")
+        return False
+    if 'version' in colonnes:
+        return True
+    for instruction in MIGRATION_VERSION:
+        if not db.execute_query(instruction):
+            return False
+    logger.info("Colonne version ajoutée à cartes_grises")
+    return True
+
+
+def convertir(colonne, valeur):
+    """
+    Valeur saisie (texte) convertie dans le type de la colonne, comme lue en base
+
+    Un champ vide vaut NULL.
+
+    Raises:
+        ValueError: Nombre ou date invalide
+    """
+    if valeur is None or str(valeur).strip() == '':
+        return None
+    if colonne in COLONNES_ENTIERES:
+        return int(valeur)
+    if colonne in COLONNES_DATES:
+        return valeur if isinstance(valeur, date) else date.fromisoformat(str(valeur).strip())
+    return str(valeur)
+
+
+def calculer_modifications(carte, valeurs):
+    """
+    Colonnes dont la valeur saisie diffère de la carte lue en base
+
+    Args:
+        carte (dict): Ligne de cartes_grises
+        valeurs (dict): Colonne -> valeur saisie (texte ou déjà convertie)
+
+    Returns:
+        dict: Colonne -> nouvelle valeur convertie, pour les seules colonnes modifiées
+    """
+    modifications = {}
+    for colonne, valeur in valeurs.items():
+        valeur = convertir(colonne, valeur)
+        if carte.get(colonne) != valeur:
+            modifications[colonne] = valeur
+    return modifications
+
+
+def enregistrer_modifications(db, carte_id, version, modifications, nouveau_proprietaire=None):
+    """
+    Écrit les colonnes modifiées si la carte est toujours à la version lue
+
+    Args:
+        db: Database
+        carte_id (int): Carte grise
+        version (int): Version de la carte lors de l'ouverture du formulaire
+        modifications (dict): Colonne -> valeur (voir calculer_modifications)
+        nouveau_proprietaire (tuple): (nom, prenom, adresse, code_postal, departement) d'un
+            propriétaire créé dans la même transaction, qui devient celui de la carte
+
+    Raises:
+        ConflitVersion: Carte modifiée (ou supprimée) depuis cette version (propriétaire non créé)
+        ConnectionError, erreur du moteur: rien n'est écrit
+
+    Returns:
+        int: Nouvelle version de la carte
+    """
+    if not modifications and not nouveau_proprietaire:
+        return version
+    with db.transaction() as tx:
+        if nouveau_proprietaire:
+            tx.execute("INSERT INTO proprietaires (nom, prenom, adresse, code_postal, departement) "
+                       "VALUES (%s, %s, %s, %s, %s)", nouveau_proprietaire)
+            modifications = dict(modifications, proprietaire_id=tx.lastrowid)
+        affectations = ', '.join(f"{colonne}=%s" for colonne in modifications)
+        lignes = tx.execute(f"UPDATE cartes_grises SET {affectations}, version=version+1 WHERE id=%s AND version=%s",
+                            tuple(modifications.values()) + (carte_id, version))
+        if not lignes:
+            # Levée dans la transaction : la création du propriétaire est annulée avec elle
+            raise ConflitVersion(f"Carte grise {carte_id} modifiée depuis la version {version}")
+    logger.info(f"Carte grise {carte_id} : {', '.join(modifications)} modifié(s) (version {version + 1})")
+    return version + 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--migrer', action='store_true', required=True, help="Ajouter la colonne version si elle manque")
+    parser.parse_args()
+
+    from config import charger_configuration, configurer_logging
+    from database import Database
+    charger_configuration()
+    configurer_logging()
+
+    if not migrer(Database()):
+        print("Migration impossible (voir le journal)")
+        return 1
+    print("Colonne version présente dans cartes_grises")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -55,6 +55,34 @@ def generer_prochain_numero_carte_grise(numero_actuel):
         return f"{annee}{lettres}{num:05d}"
 
 
+_CARTES_PAR_ANNEE = 26 * 26 * 100000
+
+
+def avancer_numero_carte_grise(numero_actuel, pas):
+    """
+    Retourne le numéro obtenu après `pas` appels à generer_prochain_numero_carte_grise
+
+    Calcul direct (sans boucle), utilisé pour attribuer des tranches de numéros
+    à des générateurs travaillant en parallèle.
+
+    Exemples:
+    - avancer_numero_carte_grise('2026AA00010', 1) -> '2026AA00011'
+    - avancer_numero_carte_grise('2026ZZ99999', 100001) -> '2027AB00000'
+    """
+    if not numero_actuel or len(numero_actuel) != 11:
+        if pas <= 0:
+            return numero_actuel
+        numero_actuel = generer_prochain_numero_carte_grise(numero_actuel)
+        pas -= 1
+
+    annee = int(numero_actuel[:4])
+    position = ((ord(numero_actuel[4]) - ord('A')) * 26 + (ord(numero_actuel[5]) - ord('A'))) * 100000
+    position += int(numero_actuel[6:]) + pas
+    annees, position = divmod(position, _CARTES_PAR_ANNEE)
+    lettres, chiffres = divmod(position, 100000)
+    return f"{annee + annees}{chr(ord('A') + lettres // 26)}{chr(ord('A') + lettres % 26)}{chiffres:05d}"
+
+
 def generer_prochain_numero_plaque(numero_actuel):
     """
     Génère le prochain numéro de plaque d'immatriculation
@@ -141,6 +169,65 @@ def generer_prochain_numero_plaque(numero_actuel):
     return f"{lettres_gauche}{chiffres}{lettres_droite}"
 
 
+# Taille de l'espace des plaques : la série AA commence à 100 (AA100AA),
+# les séries suivantes à 10 après le passage de 999 (voir generer_prochain_numero_plaque)
+_COMBINAISONS_LETTRES = 26 * 26
+_PLAQUES_SERIE_AA = 900 * _COMBINAISONS_LETTRES
+_PLAQUES_PAR_SERIE = 990 * _COMBINAISONS_LETTRES
+NOMBRE_PLAQUES = _PLAQUES_SERIE_AA + (_COMBINAISONS_LETTRES - 1) * _PLAQUES_PAR_SERIE
+
+
+def rang_numero_plaque(numero):
+    """
+    Retourne la position d'une plaque dans la séquence de generer_prochain_numero_plaque
+
+    AA100AA a le rang 0, sa suivante AA100AB le rang 1, etc.
+
+    Args:
+        numero (str): Numéro de plaque au format compact (ex: 'AB123CD')
+
+    Returns:
+        int: Rang de la plaque (0 <= rang < NOMBRE_PLAQUES)
+    """
+    serie = (ord(numero[0]) - ord('A')) * 26 + (ord(numero[1]) - ord('A'))
+    chiffres = int(numero[2:5])
+    lettres_droite = (ord(numero[5]) - ord('A')) * 26 + (ord(numero[6]) - ord('A'))
+    if serie == 0:
+        return (chiffres - 100) * _COMBINAISONS_LETTRES + lettres_droite
+    return (_PLAQUES_SERIE_AA + (serie - 1) * _PLAQUES_PAR_SERIE
+            + (chiffres - 10) * _COMBINAISONS_LETTRES + lettres_droite)
+
+
+def numero_plaque_depuis_rang(rang):
+    """
+    Retourne la plaque située au rang donné dans la séquence (inverse de rang_numero_plaque)
+
+    Permet de découper l'espace des plaques en tranches indépendantes
+    (génération en parallèle, vérifications) sans parcourir les plaques précédentes.
+
+    Args:
+        rang (int): Position dans la séquence, à partir de 0 (AA100AA)
+
+    Returns:
+        str: Numéro de plaque au format compact, ou None si le rang dépasse le maximum
+    """
+    if rang < 0 or rang >= NOMBRE_PLAQUES:
+        return None
+    if rang < _PLAQUES_SERIE_AA:
+        serie = 0
+        chiffres, lettres_droite = divmod(rang, _COMBINAISONS_LETTRES)
+        chiffres += 100
+    else:
+        serie, reste = divmod(rang - _PLAQUES_SERIE_AA, _PLAQUES_PAR_SERIE)
+        serie += 1
+        chiffres, lettres_droite = divmod(reste, _COMBINAISONS_LETTRES)
+        chiffres += 10
+    lg_1, lg_2 = divmod(serie, 26)
+    ld_1, ld_2 = divmod(lettres_droite, 26)
+    return (f"{chr(ord('A') + lg_1)}{chr(ord('A') + lg_2)}{chiffres:03d}"
+            f"{chr(ord('A') + ld_1)}{chr(ord('A') + ld_2)}")
+
+
 def formater_numero_plaque(numero):
     """
     Formate un numéro de plaque d'immatriculation avec espaces pour l'affichage
@@ -198,7 +285,7 @@ def generer_numero_serie(numero_fabricant, annee, mois, numero_vehicule):
 # (Déplacées depuis app.py lignes 210-285)
 # =========================
 
-def generer_numero_carte_grise_depuis_db(db):
+def generer_numero_carte_grise_depuis_db(db, table='cartes_grises'):
     """
     Génère le prochain numéro de carte grise en interrogeant la base de données
     
@@ -207,18 +294,19 @@ def generer_numero_carte_grise_depuis_db(db):
     
     Args:
         db: Objet de connexion à la base de données
+        table: Table portant la séquence (annuaire_cartes pour une base répartie, voir sharding.py)
         
     Returns:
         str: Prochain numéro de carte grise
     """
-    last_carte = db.fetch_one("SELECT numero_carte_grise FROM cartes_grises ORDER BY id DESC LIMIT 1")
+    last_carte = db.fetch_one(f"SELECT numero_carte_grise FROM {table} ORDER BY id DESC LIMIT 1")
     if last_carte and last_carte.get('numero_carte_grise'):
         return generer_prochain_numero_carte_grise(last_carte['numero_carte_grise'])
     else:
         return generer_prochain_numero_carte_grise(None)
 
 
-def generer_numero_plaque_unique_depuis_db(db):
+def generer_numero_plaque_unique_depuis_db(db, table='cartes_grises', filtre=None):
     """
     Génère un numéro de plaque unique en vérifiant les collisions dans la base de données
     
@@ -227,11 +315,14 @@ def generer_numero_plaque_unique_depuis_db(db):
     
     Args:
         db: Objet de connexion à la base de données
+        table: Table portant la séquence (annuaire_cartes pour une base répartie, voir sharding.py)
+        filtre: FiltresUnicite du worker (unicite.py) : une plaque absente du filtre
+            n'est pas vérifiée en base
         
     Returns:
         str: Numéro de plaque unique ou None si impossible
     """
-    last_plaque = db.fetch_one("SELECT numero_immatriculation FROM cartes_grises ORDER BY id DESC LIMIT 1")
+    last_plaque = db.fetch_one(f"SELECT numero_immatriculation FROM {table} ORDER BY id DESC LIMIT 1")
     if last_plaque and last_plaque.get('numero_immatriculation'):
         numero_plaque = generer_prochain_numero_plaque(last_plaque['numero_immatriculation'])
     else:
@@ -243,7 +334,8 @@ def generer_numero_plaque_unique_depuis_db(db):
     
     while numero_plaque:
         # Vérification si cette plaque existe déjà
-        existing = db.fetch_one("SELECT id FROM cartes_grises WHERE numero_immatriculation=%s", (numero_plaque,))
+        lire = lambda: db.fetch_one(f"SELECT id FROM {table} WHERE numero_immatriculation=%s", (numero_plaque,))
+        existing = filtre.existe('plaques', numero_plaque, lire) if filtre else lire()
         if not existing:  # Plaque unique trouvée
             return numero_plaque
         
@@ -257,7 +349,7 @@ def generer_numero_plaque_unique_depuis_db(db):
     return None
 
 
-def generer_numero_serie_depuis_db(db, numero_fabricant, date_premiere_immat):
+def generer_numero_serie_depuis_db(db, numero_fabricant, date_premiere_immat, table='cartes_grises', archive=None):
     """
     Génère automatiquement le numéro VIN en comptant les véhicules existants
     
@@ -268,6 +360,9 @@ def generer_numero_serie_depuis_db(db, numero_fabricant, date_premiere_immat):
         db: Objet de connexion à la base de données
         numero_fabricant (str): Code fabricant (ex: 'PEU', 'REN')
         date_premiere_immat (str): Date au format 'YYYY-MM-DD'
+        table: Table où compter les VIN (annuaire_cartes pour une base répartie)
+        archive: Table d'archive dont les VIN sont aussi comptés (cartes_grises_archive),
+            pour ne pas réattribuer le VIN d'un véhicule archivé
         
     Returns:
         str: Numéro VIN généré automatiquement
@@ -277,13 +372,17 @@ def generer_numero_serie_depuis_db(db, numero_fabricant, date_premiere_immat):
     date_obj = datetime.strptime(date_premiere_immat, '%Y-%m-%d')
     
     # Comptage des véhicules immatriculés pour ce fabricant/mois
-    count_query = """
-        SELECT COUNT(*) as count FROM cartes_grises 
+    count_query = f"""
+        SELECT COUNT(*) as count FROM {table} 
         WHERE numero_serie LIKE %s
     """
     pattern = f"{numero_fabricant}{date_obj.year}M{date_obj.month:02d}%"
     count_result = db.fetch_one(count_query, (pattern,))
     numero_vehicule = (count_result['count'] + 1) if count_result and count_result.get('count') is not None else 1
+    if archive:
+        # Table absente (base non migrée) : aucun véhicule archivé
+        archives = db.fetch_one(f"SELECT COUNT(*) as count FROM {archive} WHERE numero_serie LIKE %s", (pattern,))
+        numero_vehicule += (archives or {}).get('count') or 0
     
     return generer_numero_serie(
         numero_fabricant,
@@ -0,0 +1,405 @@
+"""
+Recherche de plaques par lots (lecteurs automatiques de plaques, contrôles routiers)
+
+Les lecteurs envoient plusieurs dizaines de plaques par seconde. Au lieu d'une recherche
+/search par plaque (LIKE et page HTML), POST /api/plaques/lot reçoit un lot de plaques
+et les retrouve en une requête (liste IN sur l'index unique de numero_immatriculation).
+Chaque plaque reçoit un enregistrement compact : véhicule, titulaire, dates de validité
+et de contrôle technique, alertes (validité ou contrôle dépassé).
+
+Un lot est limité à LOT_PLAQUES_MAX plaques. Sa requête a une durée maximale côté
+serveur (SEARCH_TIMEOUT_MS_LOT_PLAQUES) ; un lot plus lent que l'objectif
+(PLAQUES_OBJECTIF_MS) est journalisé et compté dans /metriques.
+
+Les mêmes véhicules repassent sans cesse aux points de contrôle : les plaques lues sont
+gardées dans un cache (CachePlaques), local au worker et éventuellement partagé par Redis,
+et seules les plaques absentes du cache sont cherchées en base. L'application invalide
+la plaque d'une carte grise à chaque création, modification, suppression ou transfert ;
+avec Redis, l'invalidation est vue par tous les workers à leur lecture suivante.
+"""
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+
+from transferts import normaliser_identifiant
+
+logger = logging.getLogger(__name__)
+
+# Nombre maximal de plaques par lot
+LOT_PLAQUES_MAX = 500
+
+# Format SIV compact : AB123CD
+_PLAQUE = re.compile(r"^[A-Z]{2}\d{3}[A-Z]{2}$")
+
+
+def _date(valeur):
+    return valeur.isoformat() if valeur else None
+
+
+def _resume(ligne):
+    """Résumé d'une carte grise trouvée, tel qu'il est gardé en cache (dates ISO)"""
+    return {
+        'vehicule': f"{ligne['marque']} {ligne['modele']}",
+        'couleur': ligne['couleur_principale'],
+        'titulaire': f"{ligne['nom']} {ligne['prenom']}",
+        'fin_validite': _date(ligne['date_fin_validite']),
+        'validite_certificat': _date(ligne['date_validite_certificat']),
+        'prochain_controle': _date(ligne['date_prochain_controle']),
+    }
+
+
+def _alertes(resume, aujourd_hui):
+    # Calculées à chaque lecture : une entrée en cache reste juste après minuit
+    jour = aujourd_hui.isoformat()
+    alertes = []
+    if resume['fin_validite'] and resume['fin_validite'] < jour:
+        alertes.append('validite_depassee')
+    if resume['prochain_controle'] and resume['prochain_controle'] < jour:
+        alertes.append('controle_depasse')
+    return alertes
+
+
+def rechercher_plaques(db, plaques, delai_ms=None, aujourd_hui=None, cache=None):
+    """
+    Retrouve un lot de plaques en une seule requête
+
+    Args:
+        db: Database
+        plaques: Plaques lues (tirets et espaces ignorés)
+        delai_ms: Durée maximale de la requête côté serveur
+        aujourd_hui (date): Date de référence des alertes
+        cache (CachePlaques): Plaques déjà lues ; seules les autres sont cherchées en base
+
+    Raises:
+        ValueError: Lot vide ou trop grand
+
+    Returns:
+        list: Un résultat par plaque, dans l'ordre reçu (statut trouvee, inconnue ou invalide) ;
+              liste vide si la requête a échoué (voir db.derniere_erreur)
+    """
+    if not plaques:
+        raise ValueError("Aucune plaque à rechercher")
+    if len(plaques) > LOT_PLAQUES_MAX:
+        raise ValueError(f"Au plus {LOT_PLAQUES_MAX} plaques par lot")
+    normalisees = [normaliser_identifiant(plaque) for plaque in plaques]
+    valides = list(dict.fromkeys(p for p in normalisees if _PLAQUE.match(p)))
+
+    # Plaque -> résumé, ou None pour une plaque inconnue ; générations lues avant la requête
+    generations = {}
+    resumes = cache.lire(valides, generations) if cache else {}
+    a_lire = [plaque for plaque in valides if plaque not in resumes]
+    if a_lire:
+        lignes = db.fetch_all(f"""
+            SELECT cg.numero_immatriculation, ma.nom AS marque, mo.modele, cg.couleur_principale,
+                   p.nom, p.prenom, cg.date_fin_validite, cg.date_validite_certificat, cg.date_prochain_controle
+            FROM cartes_grises cg
+            JOIN proprietaires p ON cg.proprietaire_id = p.id
+            JOIN modeles mo ON cg.modele_id = mo.id
+            JOIN marques ma ON mo.marque_id = ma.id
+            WHERE cg.numero_immatriculation IN ({', '.join(['%s'] * len(a_lire))})
+        """, tuple(a_lire), timeout_ms=delai_ms)
+        if db.derniere_erreur or db.connection is None:
+            return []
+        lues = dict.fromkeys(a_lire)
+        lues.update((ligne['numero_immatriculation'], _resume(ligne)) for ligne in lignes)
+        if cache:
+            cache.ecrire(lues, generations)
+        resumes.update(lues)
+
+    aujourd_hui = aujourd_hui or date.today()
+    resultats = []
+    for normalisee in normalisees:
+        resume = resumes.get(normalisee)
+        if resume:
+            resultats.append(dict(resume, plaque=normalisee, statut='trouvee', alertes=_alertes(resume, aujourd_hui)))
+        else:
+            resultats.append({'plaque': normalisee,
+                              'statut': 'inconnue' if _PLAQUE.match(normalisee) else 'invalide'})
+    return resultats
+
+
+class CachePlaques:
+    """
+    Cache plaque -> résumé de la carte grise (None : plaque inconnue)
+
+    Premier niveau : LRU borné propre au worker (PLAQUES_CACHE_TAILLE entrées).
+    Second niveau facultatif : magasin Redis partagé par les workers (PLAQUES_CACHE_REDIS_URL,
+    module redis requis). Une entrée expire après PLAQUES_CACHE_TTL secondes dans chaque niveau.
+
+    Chaque plaque a une génération locale au worker, changée à chaque invalidation : lire la
+    note avant la requête en base, ecrire ne garde pas un résumé dont la plaque a été invalidée
+    entre-temps (il peut être l'ancienne ligne). Avec Redis, chaque plaque a aussi une génération
+    partagée (valeur unique à chaque invalidation) ; une entrée porte celle lue avant la requête
+    qui l'a produite, et chaque lecture relit les générations (un MGET par lot) et écarte les
+    entrées d'une autre génération, dans les deux niveaux : l'invalidation faite par un worker
+    vaut pour les autres.
+
+    Sans magasin partagé, l'invalidation ne vaut que pour ce worker. Avec plusieurs workers
+    (WEB_WORKERS, fixé par gunicorn.conf.py), la durée de vie est alors ramenée à
+    PLAQUES_CACHE_TTL_LOCAL secondes (2 par défaut) : c'est le retard des autres workers.
+
+    Le retard reste borné par la durée de vie seulement pour :
+    - les écritures faites hors de l'application et des travaux (SQL direct) ;
+    - les workers sans Redis, ou pendant une indisponibilité de Redis (entrées locales servies
+      sans vérification de la génération partagée) ;
+    - une lecture sur un réplica en retard sur l'écriture invalidée.
+    """
+
+    # Préfixes des clés du magasin partagé : résumé ([génération, résumé]) et génération de la plaque
+    PREFIXE = 'carte_grise:resume:'
+    PREFIXE_GENERATION = 'carte_grise:generation:'
+    # Après une erreur Redis, le magasin partagé est ignoré pendant ce délai (secondes)
+    PAUSE_PARTAGE_S = 30
+    # Une génération survit aux entrées qui la portent d'au moins ce délai (lecture en base comprise)
+    MARGE_GENERATION_S = 3600
+    # Générations locales gardées (les plus anciennes oubliées : il faudrait autant d'invalidations
+    # pendant une seule lecture en base pour qu'un résumé périmé soit gardé)
+    GENERATIONS_LOCALES_MAX = 100000
+
+    def __init__(self, taille=None, duree_vie=None, url_partage=None):
+        self.taille = int(taille if taille is not None else os.getenv('PLAQUES_CACHE_TAILLE', '10000'))
+        self.duree_vie = float(duree_vie if duree_vie is not None else os.getenv('PLAQUES_CACHE_TTL', '60'))
+        url_partage = url_partage if url_partage is not None else os.getenv('PLAQUES_CACHE_REDIS_URL')
+        self._entrees = OrderedDict()
+        # Plaque -> génération locale (numéro de sa dernière invalidation dans ce worker)
+        self._generations = OrderedDict()
+        self._invalidations = 0
+        self._lock = threading.Lock()
+        self._lus_local = 0
+        self._lus_partage = 0
+        self._absents = 0
+        self._perimes = 0
+        self._partage = None
+        self._erreurs_partage = ()
+        self._partage_suspendu_jusqua = 0.0
+        if url_partage and self.taille > 0:
+            self._connecter_partage(url_partage)
+        if self._partage is None and int(os.getenv('WEB_WORKERS', '1')) > 1:
+            duree_vie_locale = float(os.getenv('PLAQUES_CACHE_TTL_LOCAL', '2'))
+            if self.duree_vie > duree_vie_locale:
+                logger.info(f"Cache de plaques sans magasin partagé et plusieurs workers : "
+                            f"durée de vie ramenée à {duree_vie_locale} s")
+                self.duree_vie = duree_vie_locale
+
+    def _connecter_partage(self, url):
+        try:
+            import redis
+        except ImportError:
+            logger.warning("PLAQUES_CACHE_REDIS_URL est défini mais le module redis n'est pas installé "
+                           "(pip install redis) : cache local seulement")
+            return
+        # Délais courts : un magasin partagé lent ne doit pas ralentir les lots
+        self._partage = redis.Redis.from_url(url, socket_timeout=0.05, socket_connect_timeout=0.05)
+        self._erreurs_partage = (redis.RedisError,)
+
+    def _partage_disponible(self):
+        return self._partage is not None and time.monotonic() >= self._partage_suspendu_jusqua
+
+    def _suspendre_partage(self, erreur):
+        self._partage_suspendu_jusqua = time.monotonic() + self.PAUSE_PARTAGE_S
+        logger.warning(f"Cache de plaques partagé indisponible ({erreur}), ignoré pendant {self.PAUSE_PARTAGE_S} s")
+
+    def _stocker(self, resumes, generations):
+        """
+        Garde les résumés dans le premier niveau, sauf ceux d'une plaque invalidée depuis la
+        lecture de ses générations (plaque -> (locale, partagée))
+
+        Returns:
+            dict: Résumés gardés
+        """
+        maintenant = time.monotonic()
+        gardes = {}
+        with self._lock:
+            for plaque, resume in resumes.items():
+                locale, partagee = generations.get(plaque, (0, None))
+                if self._generations.get(plaque, 0) != locale:
+                    self._perimes += 1
+                    continue
+                self._entrees[plaque] = (maintenant, partagee, resume)
+                self._entrees.move_to_end(plaque)
+                gardes[plaque] = resume
+            while len(self._entrees) > self.taille:
+                self._entrees.popitem(last=False)
+        return gardes
+
+    def lire(self, plaques, generations=None):
+        """
+        Résumés en cache des plaques demandées (plaques normalisées)
+
+        Args:
+            plaques: Plaques normalisées
+            generations (dict): Complété avec les générations actuelles de chaque plaque (locale,
+                                partagée), à repasser à ecrire pour les résumés lus ensuite en base
+
+        Returns:
+            dict: Plaque -> résumé ou None (inconnue) ; les plaques absentes du cache n'y sont pas
+        """
+        maintenant = time.monotonic()
+        locales = {}
+        with self._lock:
+            lues = {plaque: self._generations.get(plaque, 0) for plaque in plaques}
+            for plaque in plaques:
+                entree = self._entrees.get(plaque)
+                if entree is None:
+                    continue
+                if maintenant - entree[0] >= self.duree_vie:
+                    del self._entrees[plaque]
+                    continue
+                self._entrees.move_to_end(plaque)
+                locales[plaque] = entree
+
+        valeurs = None
+        if self._partage_disponible():
+            manquantes = [plaque for plaque in plaques if plaque not in locales]
+            try:
+                valeurs = self._partage.mget([self.PREFIXE_GENERATION + plaque for plaque in plaques]
+                                             + [self.PREFIXE + plaque for plaque in manquantes])
+            except self._erreurs_partage as e:
+                self._suspendre_partage(e)
+        if valeurs is None:
+            # Sans magasin partagé, seule la durée de vie borne le retard des entrées locales
+            if generations is not None:
+                generations.update((plaque, (locale, None)) for plaque, locale in lues.items())
+            trouves = {plaque: entree[2] for plaque, entree in locales.items()}
+            with self._lock:
+                self._lus_local += len(trouves)
+                self._absents += len(plaques) - len(trouves)
+            return trouves
+
+        actuelles = {plaque: valeur.decode() if valeur is not None else None
+                     for plaque, valeur in zip(plaques, valeurs)}
+        lues = {plaque: (locale, actuelles[plaque]) for plaque, locale in lues.items()}
+        if generations is not None:
+            generations.update(lues)
+        trouves = {plaque: entree[2] for plaque, entree in locales.items() if entree[1] == actuelles[plaque]}
+        perimees = [plaque for plaque in locales if plaque not in trouves]
+        partages = {}
+        for plaque, valeur in zip(manquantes, valeurs[len(plaques):]):
+            if valeur is None:
+                continue
+            generation, resume = json.loads(valeur)
+            if generation == actuelles[plaque]:
+                partages[plaque] = resume
+            else:
+                perimees.append(plaque)
+        with self._lock:
+            for plaque in perimees:
+                self._entrees.pop(plaque, None)
+        self._stocker(partages, lues)
+        trouves.update(partages)
+        with self._lock:
+            self._lus_local += len(trouves) - len(partages)
+            self._lus_partage += len(partages)
+            self._perimes += len(perimees)
+            self._absents += len(plaques) - len(trouves)
+        return trouves
+
+    def ecrire(self, resumes, generations=None):
+        """
+        Garde les résumés lus en base (plaque -> résumé ou None) dans les deux niveaux
+
+        Args:
+            generations (dict): Générations complétées par lire avant la lecture en base ; un résumé
+                                dont la plaque a été invalidée depuis n'est pas gardé
+        """
+        if self.taille <= 0 or not resumes:
+            return
+        generations = generations or {}
+        resumes = self._stocker(resumes, generations)
+        if resumes and self._partage_disponible():
+            # Un résumé invalidé entre ce tri et son écriture porte l'ancienne génération partagée
+            try:
+                with self._partage.pipeline(transaction=False) as pipeline:
+                    for plaque, resume in resumes.items():
+                        pipeline.set(self.PREFIXE + plaque,
+                                     json.dumps([generations.get(plaque, (0, None))[1], resume]),
+                                     ex=max(1, int(self.duree_vie)))
+                    pipeline.execute()
+            except self._erreurs_partage as e:
+                self._suspendre_partage(e)
+
+    def invalider(self, *plaques):
+        """
+        Invalide les plaques d'une carte grise créée, modifiée, supprimée, transférée ou archivée
+        (à appeler après la validation de l'écriture en base), pour tous les workers avec Redis
+        """
+        plaques = [normaliser_identifiant(plaque) for plaque in plaques if plaque]
+        if not plaques:
+            return
+        with self._lock:
+            for plaque in plaques:
+                self._entrees.pop(plaque, None)
+                self._invalidations += 1
+                self._generations[plaque] = self._invalidations
+                self._generations.move_to_end(plaque)
+            while len(self._generations) > self.GENERATIONS_LOCALES_MAX:
+                self._generations.popitem(last=False)
+        if self._partage is not None:
+            # Tentée même pendant une suspension : une entrée périmée ne doit pas survivre.
+            # Nouvelle génération unique (jamais une valeur déjà portée par une entrée) ; elle
+            # survit aux entrées qui portent l'ancienne, même écrites après cette invalidation
+            duree_generation = int(self.duree_vie) + self.MARGE_GENERATION_S
+            try:
+                with self._partage.pipeline(transaction=True) as pipeline:
+                    for plaque in plaques:
+                        pipeline.set(self.PREFIXE_GENERATION + plaque, os.urandom(8).hex(), ex=duree_generation)
+                    pipeline.delete(*[self.PREFIXE + plaque for plaque in plaques])
+                    pipeline.execute()
+            except self._erreurs_partage as e:
+                self._suspendre_partage(e)
+
+    def statistiques(self):
+        with self._lock:
+            lectures = self._lus_local + self._lus_partage + self._absents
+            return {
+                'taille': len(self._entrees),
+                'taille_max': self.taille,
+                'duree_vie_s': self.duree_vie,
+                'partage': self._partage is not None,
+                'lus_local': self._lus_local,
+                'lus_partage': self._lus_partage,
+                'absents': self._absents,
+                'perimes': self._perimes,
+                'taux_succes': round((lectures - self._absents) / lectures, 3) if lectures else None,
+            }
+
+
+class SuiviLots:
+    """Durées des lots de plaques d'un worker, comparées à l'objectif (métriques)"""
+
+    def __init__(self, objectif_ms=50):
+        self.objectif_ms = objectif_ms
+        self._lock = threading.Lock()
+        self._lots = 0
+        self._plaques = 0
+        self._lents = 0
+        self._duree_totale_ms = 0.0
+        self._duree_max_ms = 0.0
+
+    def noter(self, taille, duree_ms):
+        """Enregistre la durée d'un lot ; journalise un lot plus lent que l'objectif"""
+        lent = duree_ms > self.objectif_ms
+        with self._lock:
+            self._lots += 1
+            self._plaques += taille
+            self._lents += lent
+            self._duree_totale_ms += duree_ms
+            self._duree_max_ms = max(self._duree_max_ms, duree_ms)
+        if lent:
+            logger.warning(f"Lot de {taille} plaques traité en {duree_ms:.0f} ms (objectif {self.objectif_ms} ms)")
+
+    def statistiques(self):
+        with self._lock:
+            return {
+                'objectif_ms': self.objectif_ms,
+                'lots': self._lots,
+                'plaques': self._plaques,
+                'lots_lents': self._lents,
+                'duree_moyenne_ms': round(self._duree_totale_ms / self._lots, 1) if self._lots else None,
+                'duree_max_ms': round(self._duree_max_ms, 1),
+            }
@@ -0,0 +1,96 @@
+# Préchauffage d'un worker après son démarrage
+# Sans lui, les premières requêtes de chaque worker paient l'ouverture des connexions,
+# le chargement du catalogue et la première lecture des compteurs de numéros.
+import logging
+import threading
+import time
+
+from catalogue import DONNEES_TECHNIQUES_REF, DONNEES_TECHNIQUES_REF_EDITION
+from numero_generator import (
+    generer_numero_carte_grise_depuis_db,
+    generer_numero_plaque_unique_depuis_db
+)
+
+logger = logging.getLogger(__name__)
+
+# Délai maximal entre deux tentatives quand la base n'est pas joignable (secondes)
+DELAI_MAX_TENTATIVE = 30
+
+
+def _etat(app):
+    """État du préchauffage stocké dans l'application (créé au premier appel)"""
+    return app.extensions.setdefault('prechauffage', {'termine': False, 'tentatives': 0, 'duree_ms': None})
+
+
+def etat_prechauffage(app):
+    """Retourne l'état du préchauffage de l'application (copie)"""
+    etat = _etat(app)
+    return dict(etat)
+
+
+def prechauffer(app):
+    """
+    Prépare le worker à servir ses premières requêtes
+
+    1. Ouvre le pool de connexions MySQL (toutes les connexions sont créées avec le pool)
+    2. Charge la liste des modèles dans le cache du catalogue
+    3. Lit les derniers numéros de carte grise et de plaque (générateurs de numéros)
+
+    Args:
+        app: Application Flask à préchauffer
+
+    Returns:
+        True si le préchauffage a réussi, False sinon
+    """
+    etat = _etat(app)
+    etat['tentatives'] += 1
+    debut = time.perf_counter()
+    with app.app_context():
+        db = app.extensions['database']
+        try:
+            if not db.ping():
+                return False
+
+            # Catalogue : les deux variantes de la liste des modèles utilisées par les formulaires
+            catalogue = app.extensions['catalogue']
+            if not catalogue.modeles(db) or not catalogue.modeles(db, avec_categorie=True):
+                return False
+            logger.debug(f"Catalogue chargé : {len(DONNEES_TECHNIQUES_REF)} + "
+                         f"{len(DONNEES_TECHNIQUES_REF_EDITION)} fiches techniques")
+
+            # Générateurs de numéros : mêmes requêtes que lors d'un ajout (lecture seule)
+            generer_numero_carte_grise_depuis_db(db)
+            generer_numero_plaque_unique_depuis_db(db)
+        finally:
+            db.disconnect()
+
+    etat['duree_ms'] = round((time.perf_counter() - debut) * 1000, 1)
+    etat['termine'] = True
+    logger.info(f"Worker préchauffé en {etat['duree_ms']} ms")
+    return True
+
+
+def desactiver_prechauffage(app):
+    """Préchauffage désactivé (WARMUP=False) : le worker est prêt dès que la base répond"""
+    etat = _etat(app)
+    etat.update(termine=True, desactive=True)
+
+
+def demarrer_prechauffage(app):
+    """Lance le préchauffage en arrière-plan, en réessayant tant que la base est indisponible"""
+    def boucle():
+        delai = 1
+        while True:
+            try:
+                if prechauffer(app):
+                    return
+                logger.warning(f"Préchauffage impossible, nouvelle tentative dans {delai} s")
+            except Exception:
+                # Une erreur inattendue ne doit pas arrêter le thread : /readyz resterait en échec
+                logger.exception(f"Erreur pendant le préchauffage, nouvelle tentative dans {delai} s")
+            time.sleep(delai)
+            delai = min(delai * 2, DELAI_MAX_TENTATIVE)
+
+    thread = threading.Thread(target=boucle, name='prechauffage', daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,332 @@
+"""
+Purge ou archivage en masse des cartes grises qui vérifient des critères
+
+Un seul DELETE ... WHERE date_fin_validite < ... verrouille toutes les lignes concernées
+(et leurs contrôles techniques) jusqu'à la fin de l'opération, parfois plusieurs minutes.
+Ici les cartes sont traitées par lots, dans l'ordre de la clé primaire, chaque lot dans
+sa propre transaction courte, avec une pause entre deux lots :
+    python purge.py --fin-validite-avant 2015-01-01 --archiver
+    python purge.py --premiere-immat-avant 1990-01-01 --supprimer --lot 200 --pause 0.5
+    python purge.py --fin-validite-avant 2015-01-01 --compter
+
+Archiver déplace les cartes dans cartes_grises_archive (mêmes colonnes que cartes_grises,
+créée si elle manque) ; supprimer les efface. Leurs contrôles techniques sont supprimés
+avec elles (ON DELETE CASCADE), les propriétaires sont conservés. Dans les deux modes, la
+dernière carte créée reste : les numéros suivants sont calculés à partir d'elle.
+
+Avec --avancement FICHIER, le dernier identifiant traité est enregistré après chaque lot
+validé : une purge interrompue reprend après ce lot. Sans fichier, relancer la même
+commande suffit aussi, les cartes déjà traitées ne sont plus dans la table.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from datetime import date
+
+logger = logging.getLogger(__name__)
+
+# Critères de sélection : nom -> condition sur cartes_grises (combinés par AND)
+CRITERES = {
+    'fin_validite_avant': "date_fin_validite < %s",
+    'premiere_immat_avant': "date_premiere_immat < %s",
+    'immat_actuelle_avant': "date_immat_actuelle < %s",
+    'controle_avant': "date_prochain_controle < %s",
+    'certificat_avant': "date_validite_certificat < %s",
+}
+
+MODES = ('archiver', 'supprimer')
+
+# Colonnes de cartes_grises recopiées dans cartes_grises_archive
+COLONNES_ARCHIVEES = (
+    'id', 'numero_carte_grise', 'numero_immatriculation', 'date_premiere_immat', 'date_immat_actuelle',
+    'proprietaire_id', 'est_conducteur', 'modele_id', 'numero_serie', 'poids_vide_kg', 'poids_max_kg',
+    'categorie_permis', 'carburant_energie', 'cylindree_cm3', 'puissance_chevaux',
+    'puissance_administrative_cv', 'places_assises', 'places_debout', 'emission_co2_g_km',
+    'classe_environnementale', 'niveau_sonore_db', 'vitesse_max_moteur_rpm', 'couleur_principale',
+    'date_validite_certificat', 'date_prochain_controle', 'date_fin_validite', 'date_premier_controle',
+    'date_controle_2', 'date_controle_3', 'date_controle_4', 'date_controle_5', 'date_controle_6',
+    'date_controle_7', 'created_at', 'version',
+)
+
+# Même définition que setup_complete.sql
+SCHEMA_ARCHIVE = """
+CREATE TABLE IF NOT EXISTS cartes_grises_archive (
+    id INT PRIMARY KEY,
+    numero_carte_grise VARCHAR(20) NOT NULL,
+    numero_immatriculation VARCHAR(9) NOT NULL,
+    date_premiere_immat DATE NOT NULL,
+    date_immat_actuelle DATE NOT NULL,
+    proprietaire_id INT NOT NULL,
+    est_conducteur BOOLEAN DEFAULT TRUE,
+    modele_id INT NOT NULL,
+    numero_serie VARCHAR(30) NOT NULL,
+    poids_vide_kg INT NOT NULL,
+    poids_max_kg INT NOT NULL,
+    categorie_permis VARCHAR(5) NOT NULL,
+    carburant_energie VARCHAR(50) NOT NULL,
+    cylindree_cm3 INT NOT NULL,
+    puissance_chevaux INT NOT NULL,
+    puissance_administrative_cv INT,
+    places_assises INT NOT NULL,
+    places_debout INT DEFAULT 0,
+    emission_co2_g_km INT,
+    classe_environnementale VARCHAR(20),
+    niveau_sonore_db INT,
+    vitesse_max_moteur_rpm INT,
+    couleur_principale VARCHAR(50),
+    date_validite_certificat DATE,
+    date_prochain_controle DATE,
+    date_fin_validite DATE,
+    date_premier_controle DATE,
+    date_controle_2 DATE,
+    date_controle_3 DATE,
+    date_controle_4 DATE,
+    date_controle_5 DATE,
+    date_controle_6 DATE,
+    date_controle_7 DATE,
+    created_at TIMESTAMP NULL,
+    version INT NOT NULL DEFAULT 1,
+    archive_le TIMESTAMP NULL,
+    INDEX idx_archive_immat (numero_immatriculation),
+    INDEX idx_archive_numero_carte (numero_carte_grise),
+    INDEX idx_archive_serie (numero_serie),
+    INDEX idx_archive_proprietaire (proprietaire_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+"""
+
+# Colonne ajoutée à une table d'archive créée avant elle
+MIGRATION_VERSION_ARCHIVE = "ALTER TABLE cartes_grises_archive ADD COLUMN version INT NOT NULL DEFAULT 1"
+
+
+def migrer(db):
+    """
+    Crée la table cartes_grises_archive si elle n'existe pas, ajoute sa colonne version si elle manque
+
+    Returns:
+        bool: True si cartes_grises et cartes_grises_archive ont toutes deux les colonnes
+        COLONNES_ARCHIVEES (une colonne absente de l'archive serait perdue à l'archivage)
+    """
+    if db.backend == 'sqlite':
+        from base_sqlite import traduire_schema
+        instructions = traduire_schema(SCHEMA_ARCHIVE)
+    else:
+        instructions = [SCHEMA_ARCHIVE]
+    if not all(db.execute_query(instruction) for instruction in instructions):
+        return False
+    if 'version' not in db.colonnes('cartes_grises_archive'):
+        if not db.execute_query(MIGRATION_VERSION_ARCHIVE):
+            return False
+        logger.info("Colonne version ajoutée à cartes_grises_archive")
+
+    attendues = set(COLONNES_ARCHIVEES)
+    for table, colonnes in (('cartes_grises', set(db.colonnes('cartes_grises'))),
+                            ('cartes_grises_archive', set(db.colonnes('cartes_grises_archive')) - {'archive_le'})):
+        if colonnes != attendues:
+            ecarts = ', '.join(sorted(colonnes ^ attendues))
+            # version manquante dans cartes_grises : python modifications.py --migrer
+            logger.error(f"{table} : colonnes différentes de COLONNES_ARCHIVEES ({ecarts})")
+            return False
+    return True
+
+
+def condition_criteres(criteres):
+    """
+    Condition SQL et paramètres correspondant aux critères
+
+    Raises:
+        ValueError: Aucun critère, ou critère inconnu
+    """
+    if not criteres:
+        raise ValueError("Au moins un critère de sélection est obligatoire")
+    inconnus = set(criteres) - set(CRITERES)
+    if inconnus:
+        raise ValueError(f"Critère(s) inconnu(s) : {', '.join(sorted(inconnus))}")
+    noms = sorted(criteres)
+    return ' AND '.join(CRITERES[nom] for nom in noms), tuple(criteres[nom] for nom in noms)
+
+
+def _liste(valeurs):
+    return ', '.join(['%s'] * len(valeurs))
+
+
+def traiter_lot(db, identifiants, condition, parametres, mode):
+    """
+    Archive ou supprime, dans une transaction, les cartes du lot qui vérifient encore la condition
+
+    Les cartes sont relues et verrouillées par clé primaire au début de la transaction :
+    une carte modifiée depuis la sélection du lot n'est pas traitée à tort.
+
+    Returns:
+        tuple: Nombre de cartes archivées ou supprimées, leurs numéros d'immatriculation
+    """
+    with db.transaction() as tx:
+        requete = (f"SELECT id, numero_immatriculation FROM cartes_grises "
+                   f"WHERE id IN ({_liste(identifiants)}) AND {condition}")
+        if db.backend != 'sqlite':
+            requete += " FOR UPDATE"
+        lignes = tx.fetch_all(requete, tuple(identifiants) + parametres)
+        retenus = tuple(ligne['id'] for ligne in lignes)
+        if not retenus:
+            return 0, []
+        if mode == 'archiver':
+            liste_colonnes = ', '.join(COLONNES_ARCHIVEES)
+            tx.execute(f"INSERT INTO cartes_grises_archive ({liste_colonnes}, archive_le) "
+                       f"SELECT {liste_colonnes}, NOW() FROM cartes_grises WHERE id IN ({_liste(retenus)})",
+                       retenus)
+        nombre = tx.execute(f"DELETE FROM cartes_grises WHERE id IN ({_liste(retenus)})", retenus)
+    return nombre, [ligne['numero_immatriculation'] for ligne in lignes]
+
+
+def _lire_avancement(chemin):
+    if not chemin or not os.path.exists(chemin):
+        return None
+    with open(chemin, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _ecrire_avancement(chemin, avancement):
+    if chemin:
+        temporaire = chemin + '.tmp'
+        with open(temporaire, 'w', encoding='utf-8') as f:
+            json.dump(avancement, f, indent=2)
+        os.replace(temporaire, chemin)
+
+
+def compter(db, criteres):
+    """Nombre de cartes grises qui vérifient les critères, hors dernière carte (None en cas d'erreur)"""
+    condition, parametres = condition_criteres(criteres)
+    resultat = db.fetch_one(
+        f"SELECT COUNT(*) AS n FROM cartes_grises "
+        f"WHERE {condition} AND id < (SELECT MAX(id) FROM cartes_grises)", parametres)
+    return resultat['n'] if resultat else None
+
+
+def purger(db, criteres, mode='archiver', lot=500, pause_s=0.1, avancement=None, recommencer=False,
+           progression=None, invalider=None):
+    """
+    Archive ou supprime par lots les cartes grises qui vérifient les critères
+
+    Args:
+        db: Database
+        criteres (dict): Nom de critère (clé de CRITERES) -> valeur
+        mode (str): 'archiver' ou 'supprimer'
+        lot (int): Cartes par transaction
+        pause_s (float): Pause entre deux lots (laisse passer les autres écritures)
+        avancement (str): Fichier d'avancement pour reprendre une purge interrompue
+        recommencer (bool): Ignorer l'avancement enregistré
+        progression: Fonction appelée après chaque lot avec la fraction parcourue (0 à 1,
+            selon l'identifiant du dernier lot)
+        invalider: Fonction appelée après chaque lot validé avec les plaques des cartes traitées
+            (CachePlaques.invalider : les lots de plaques ne les trouvent plus)
+
+    Raises:
+        ValueError: Critères ou mode invalides, fichier d'avancement d'une autre purge
+        RuntimeError: Table d'archive impossible à créer, lecture d'un lot impossible
+        ConnectionError, erreur du moteur: échec d'un lot (les lots précédents restent validés)
+
+    Returns:
+        dict: Cartes traitées par cette exécution, dernier identifiant parcouru, durée
+    """
+    if mode not in MODES:
+        raise ValueError(f"Mode inconnu : {mode}")
+    condition, parametres = condition_criteres(criteres)
+    debut_chrono = time.perf_counter()
+    description = {'mode': mode, 'criteres': {nom: str(valeur) for nom, valeur in sorted(criteres.items())}}
+
+    etat = None if recommencer else _lire_avancement(avancement)
+    if etat and etat['parametres'] != description:
+        raise ValueError(f"{avancement} correspond à une autre purge ({etat['parametres']}) : "
+                         f"changer de fichier d'avancement ou utiliser --recommencer")
+    if etat is None or etat['termine']:
+        etat = {'parametres': description, 'dernier_id': 0, 'cartes': 0, 'termine': False}
+    elif etat['dernier_id']:
+        logger.info(f"Reprise après la carte grise {etat['dernier_id']}")
+
+    if mode == 'archiver' and not migrer(db):
+        raise RuntimeError("Création de la table cartes_grises_archive impossible")
+
+    # Cartes créées après le début de la purge ignorées : la purge se termine toujours
+    # La dernière carte porte les séquences de plaques et de numéros de carte grise
+    # (numero_generator) : archivée ou supprimée, ses numéros seraient réattribués. Elle reste dans
+    # la table, quel que soit le mode
+    id_max = ((db.fetch_one("SELECT MAX(id) AS id FROM cartes_grises") or {}).get('id') or 0) - 1
+    cartes = 0
+    while etat['dernier_id'] < id_max:
+        # Sélection hors transaction, sans verrou : seuls les lots retenus sont verrouillés
+        lignes = db.fetch_all(
+            f"SELECT id FROM cartes_grises WHERE id > %s AND id <= %s AND {condition} ORDER BY id LIMIT %s",
+            (etat['dernier_id'], id_max) + parametres + (lot,))
+        if db.derniere_erreur or db.connection is None:
+            raise RuntimeError(f"Lecture des cartes après {etat['dernier_id']} impossible")
+        if not lignes:
+            break
+        identifiants = [ligne['id'] for ligne in lignes]
+        nombre, plaques = traiter_lot(db, identifiants, condition, parametres, mode)
+        if invalider and plaques:
+            invalider(*plaques)
+        cartes += nombre
+        etat.update(dernier_id=identifiants[-1], cartes=etat['cartes'] + nombre)
+        _ecrire_avancement(avancement, etat)
+        logger.info(f"{etat['cartes']} cartes grises traitées ({mode}, jusqu'à la carte {identifiants[-1]})")
+        if progression:
+            progression(identifiants[-1] / id_max)
+        if pause_s:
+            time.sleep(pause_s)
+
+    etat.update(dernier_id=max(id_max, etat['dernier_id']), termine=True)
+    _ecrire_avancement(avancement, etat)
+    return {'cartes': cartes, 'dernier_id': etat['dernier_id'],
+            'duree_s': round(time.perf_counter() - debut_chrono, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    action = parser.add_mutually_exclusive_group(required=True)
+    action.add_argument('--archiver', action='store_true', help="Déplacer les cartes dans cartes_grises_archive")
+    action.add_argument('--supprimer', action='store_true', help="Supprimer les cartes")
+    action.add_argument('--compter', action='store_true', help="Compter les cartes concernées, sans rien modifier")
+    for nom in CRITERES:
+        parser.add_argument('--' + nom.replace('_', '-'), dest=nom, type=date.fromisoformat, metavar='AAAA-MM-JJ',
+                            help=f"Cartes dont {CRITERES[nom].split()[0]} est antérieure à cette date")
+    parser.add_argument('--lot', type=int, default=500, help="Cartes par transaction")
+    parser.add_argument('--pause', type=float, default=0.1, help="Pause entre deux lots (secondes)")
+    parser.add_argument('--avancement', help="Fichier d'avancement (reprise après interruption)")
+    parser.add_argument('--recommencer', action='store_true', help="Ignorer l'avancement enregistré")
+    args = parser.parse_args()
+    criteres = {nom: getattr(args, nom) for nom in CRITERES if getattr(args, nom)}
+    if not criteres:
+        parser.error("au moins un critère est obligatoire")
+
+    from config import charger_configuration, configurer_logging
+    from database import Database, Error
+    charger_configuration()
+    configurer_logging()
+    db = Database()
+    db.epingler_primaire(float('inf'))
+
+    if args.compter:
+        nombre = compter(db, criteres)
+        if nombre is None:
+            print("Comptage impossible (voir le journal)")
+            return 1
+        print(f"{nombre} cartes grises concernées")
+        return 0
+    mode = 'archiver' if args.archiver else 'supprimer'
+    from plaques import CachePlaques
+    try:
+        # Hors de l'application, seul le magasin partagé du cache de plaques est invalidé (Redis)
+        resultat = purger(db, criteres, mode, args.lot, args.pause, args.avancement, args.recommencer,
+                          invalider=CachePlaques().invalider)
+    except (RuntimeError, ValueError, ConnectionError) + Error as e:
+        print(f"Erreur : {e}")
+        return 1
+    print(f"{resultat['cartes']} cartes grises {'archivées' if mode == 'archiver' else 'supprimées'} "
+          f"en {resultat['duree_s']} s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
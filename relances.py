@@ -0,0 +1,268 @@
+"""
+Lettres de relance des propriétaires (contrôle technique, fin de validité)
+
+Pour une période donnée, une lettre par propriétaire dont au moins un véhicule a son
+prochain contrôle technique (date_prochain_controle) ou sa fin de validité
+(date_fin_validite) dans la période ; tous ses véhicules concernés y sont listés.
+
+Les cartes grises sont lues par lots dans l'ordre (proprietaire_id, id), en reprenant
+après la dernière ligne lue : aucun lot ne garde plus de --lot lignes en mémoire, quel
+que soit le nombre de véhicules concernés. Les lettres sont rédigées et écrites par un
+groupe de processus (templates/relance.txt), dans SORTIE/<département>/.
+
+L'avancement (dernier propriétaire dont la lettre est écrite) est enregistré dans
+SORTIE/avancement.json : relancée avec les mêmes paramètres, la commande reprend là où
+elle s'était arrêtée.
+
+Usage :
+    python relances.py --sortie relances_2026_11 --debut 2026-11-01 --fin 2026-11-30
+    python relances.py --sortie relances_2026_11 --debut 2026-11-01 --fin 2026-11-30 --motif controle
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from collections import deque
+from datetime import date
+from multiprocessing import get_context
+
+logger = logging.getLogger(__name__)
+
+FICHIER_AVANCEMENT = 'avancement.json'
+
+# Colonne de date de chaque motif de relance
+MOTIFS = {
+    'controle': 'date_prochain_controle',
+    'validite': 'date_fin_validite',
+}
+
+REQUETE_LOT = """
+    SELECT cg.id, cg.proprietaire_id, cg.numero_carte_grise, cg.numero_immatriculation,
+           cg.date_prochain_controle, cg.date_fin_validite,
+           p.nom, p.prenom, p.adresse, p.departement,
+           mo.modele, ma.nom as marque_nom
+    FROM cartes_grises cg
+    JOIN proprietaires p ON cg.proprietaire_id = p.id
+    JOIN modeles mo ON cg.modele_id = mo.id
+    JOIN marques ma ON mo.marque_id = ma.id
+    WHERE (cg.proprietaire_id > %s OR (cg.proprietaire_id = %s AND cg.id > %s))
+      AND ({condition})
+    ORDER BY cg.proprietaire_id, cg.id
+    LIMIT %s
+"""
+
+
+def _condition(motifs):
+    """Condition SQL de la période et ses paramètres (debut, fin) répétés par motif"""
+    return ' OR '.join(f"cg.{MOTIFS[motif]} BETWEEN %s AND %s" for motif in motifs)
+
+
+def lire_proprietaires(db, debut, fin, motifs, apres_proprietaire=0, lot=5000):
+    """
+    Propriétaires concernés et leurs véhicules, dans l'ordre des identifiants
+
+    Lecture par lots de cartes grises, en reprenant après la dernière carte lue. Les
+    cartes du dernier propriétaire d'un lot sont gardées jusqu'au lot suivant, qui peut
+    en contenir d'autres.
+
+    Yields:
+        dict: Propriétaire (id, nom, prenom, adresse, departement) et ses véhicules ('vehicules')
+    """
+    requete = REQUETE_LOT.format(condition=_condition(motifs))
+    periode = (debut, fin) * len(motifs)
+    # Reprise après (proprietaire_id, proprietaire_id, id) de la dernière carte lue ;
+    # au départ, toutes les cartes des propriétaires suivant apres_proprietaire
+    dernier = (apres_proprietaire, 0, 0)
+    en_cours = None
+    while True:
+        lignes = db.fetch_all(requete, dernier + periode + (lot,))
+        # Liste vide : fin des cartes, ou erreur (code de la requête, connexion impossible)
+        if not lignes and (db.derniere_erreur or db.connection is None):
+            raise RuntimeError(f"Échec de la lecture des cartes grises après le propriétaire {dernier[0]}")
+        for ligne in lignes:
+            if en_cours and en_cours['id'] != ligne['proprietaire_id']:
+                yield en_cours
+                en_cours = None
+            if en_cours is None:
+                en_cours = {'id': ligne['proprietaire_id'], 'nom': ligne['nom'], 'prenom': ligne['prenom'],
+                            'adresse': ligne['adresse'], 'departement': ligne['departement'], 'vehicules': []}
+            en_cours['vehicules'].append({cle: ligne[cle] for cle in (
+                'id', 'numero_carte_grise', 'numero_immatriculation', 'marque_nom', 'modele',
+                'date_prochain_controle', 'date_fin_validite')})
+        if len(lignes) < lot:
+            break
+        dernier = (lignes[-1]['proprietaire_id'], lignes[-1]['proprietaire_id'], lignes[-1]['id'])
+    if en_cours:
+        yield en_cours
+
+
+def _par_paquets(proprietaires, taille):
+    paquet = []
+    for proprietaire in proprietaires:
+        paquet.append(proprietaire)
+        if len(paquet) == taille:
+            yield paquet
+            paquet = []
+    if paquet:
+        yield paquet
+
+
+# Gabarit de lettre, chargé une fois par processus
+_gabarit = None
+
+
+def _charger_gabarit():
+    global _gabarit
+    if _gabarit is None:
+        from jinja2 import Environment, FileSystemLoader
+        dossier = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
+        _gabarit = Environment(loader=FileSystemLoader(dossier), keep_trailing_newline=True).get_template('relance.txt')
+    return _gabarit
+
+
+def _ecrire_atomique(chemin, contenu):
+    """Écrit un fichier sous un nom temporaire puis le renomme (jamais de fichier à moitié écrit)"""
+    temporaire = chemin + '.tmp'
+    with open(temporaire, 'w', encoding='utf-8') as f:
+        f.write(contenu)
+    os.replace(temporaire, chemin)
+
+
+def ecrire_lettres(arguments):
+    """Rédige et écrit les lettres d'un paquet de propriétaires (exécuté dans un processus du groupe)"""
+    paquet, sortie, debut, fin, date_lettre = arguments
+    gabarit = _charger_gabarit()
+    date_lettre = date.fromisoformat(date_lettre)
+    for proprietaire in paquet:
+        dossier = os.path.join(sortie, proprietaire['departement'] or 'inconnu')
+        os.makedirs(dossier, exist_ok=True)
+        _ecrire_atomique(os.path.join(dossier, f"relance_{proprietaire['id']}.txt"),
+                         gabarit.render(proprietaire=proprietaire, debut=debut, fin=fin, date_lettre=date_lettre))
+    return paquet[-1]['id'], len(paquet), sum(len(p['vehicules']) for p in paquet)
+
+
+def _lire_avancement(chemin):
+    if not os.path.exists(chemin):
+        return None
+    with open(chemin, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def generer_relances(db, sortie, debut, fin, motifs=('controle', 'validite'), lot=5000,
+                     processus=None, paquet=200, recommencer=False, progression=None):
+    """
+    Écrit les lettres de relance de la période, en reprenant après le dernier avancement enregistré
+
+    Args:
+        db: Database
+        sortie (str): Dossier des lettres et du fichier d'avancement
+        debut, fin (date): Période (incluse) des dates de contrôle / fin de validité
+        motifs: Motifs de relance (clés de MOTIFS)
+        lot (int): Cartes grises lues par requête
+        processus (int): Processus de rédaction (par défaut le nombre de CPU)
+        paquet (int): Propriétaires par tâche
+        recommencer (bool): Ignorer l'avancement enregistré
+        progression: Fonction appelée après chaque paquet avec la fraction traitée (0 à 1,
+            selon l'identifiant du dernier propriétaire écrit)
+
+    Returns:
+        dict: Lettres et véhicules traités par cette exécution, dernier propriétaire, durée
+    """
+    debut_chrono = time.perf_counter()
+    os.makedirs(sortie, exist_ok=True)
+    chemin_avancement = os.path.join(sortie, FICHIER_AVANCEMENT)
+    parametres = {'debut': debut.isoformat(), 'fin': fin.isoformat(), 'motifs': sorted(motifs)}
+
+    avancement = None if recommencer else _lire_avancement(chemin_avancement)
+    if avancement and avancement['parametres'] != parametres:
+        raise ValueError(f"{chemin_avancement} correspond à une autre campagne ({avancement['parametres']}) : "
+                         f"changer de dossier de sortie ou utiliser --recommencer")
+    if avancement is None:
+        avancement = {'parametres': parametres, 'date_lettre': date.today().isoformat(),
+                      'dernier_proprietaire': 0, 'lettres': 0, 'vehicules': 0, 'termine': False}
+    if avancement['termine']:
+        logger.info(f"Campagne déjà terminée ({avancement['lettres']} lettres)")
+        return {'lettres': 0, 'vehicules': 0, 'dernier_proprietaire': avancement['dernier_proprietaire'],
+                'duree_s': 0.0}
+    if avancement['dernier_proprietaire']:
+        logger.info(f"Reprise après le propriétaire {avancement['dernier_proprietaire']}")
+
+    proprietaires = lire_proprietaires(db, debut, fin, list(motifs), avancement['dernier_proprietaire'], lot)
+    taches = ((p, sortie, debut, fin, avancement['date_lettre']) for p in _par_paquets(proprietaires, paquet))
+    processus = processus or os.cpu_count()
+    id_max = None
+    if progression:
+        id_max = (db.fetch_one("SELECT MAX(id) AS id FROM proprietaires") or {}).get('id')
+    lettres = vehicules = 0
+
+    def terminer(tache):
+        nonlocal lettres, vehicules
+        lettres, vehicules = _enregistrer(tache.get(), avancement, chemin_avancement, lettres, vehicules)
+        if id_max:
+            progression(min(avancement['dernier_proprietaire'] / id_max, 1))
+
+    # Processus lancés par spawn (interpréteurs neufs) : generer_relances tourne aussi dans un
+    # exécutant de travaux à plusieurs threads, qu'un fork copierait avec des verrous tenus par ses threads
+    with get_context('spawn').Pool(processes=processus) as pool:
+        # Au plus deux tâches par processus en attente : la lecture suit le rythme de l'écriture.
+        # Les tâches sont attendues dans l'ordre, l'avancement ne dépasse jamais une lettre non écrite.
+        en_attente = deque()
+        for tache in taches:
+            en_attente.append(pool.apply_async(ecrire_lettres, (tache,)))
+            if len(en_attente) >= 2 * processus:
+                terminer(en_attente.popleft())
+        while en_attente:
+            terminer(en_attente.popleft())
+
+    avancement['termine'] = True
+    _ecrire_atomique(chemin_avancement, json.dumps(avancement, indent=2))
+    return {'lettres': lettres, 'vehicules': vehicules, 'dernier_proprietaire': avancement['dernier_proprietaire'],
+            'duree_s': round(time.perf_counter() - debut_chrono, 1)}
+
+
+def _enregistrer(resultat, avancement, chemin, lettres, vehicules):
+    """Enregistre l'avancement après un paquet de lettres écrit"""
+    dernier, nb_lettres, nb_vehicules = resultat
+    avancement.update(dernier_proprietaire=dernier, lettres=avancement['lettres'] + nb_lettres,
+                      vehicules=avancement['vehicules'] + nb_vehicules)
+    _ecrire_atomique(chemin, json.dumps(avancement, indent=2))
+    lettres, vehicules = lettres + nb_lettres, vehicules + nb_vehicules
+    logger.info(f"{avancement['lettres']} lettres écrites (propriétaire {dernier})")
+    return lettres, vehicules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sortie', required=True, help="Dossier des lettres")
+    parser.add_argument('--debut', type=date.fromisoformat, required=True, help="Début de la période (AAAA-MM-JJ)")
+    parser.add_argument('--fin', type=date.fromisoformat, required=True, help="Fin de la période, incluse")
+    parser.add_argument('--motif', choices=['controle', 'validite', 'tous'], default='tous',
+                        help="Prochain contrôle technique, fin de validité, ou les deux")
+    parser.add_argument('--lot', type=int, default=5000, help="Cartes grises lues par requête")
+    parser.add_argument('--processus', type=int, default=os.cpu_count(), help="Processus de rédaction")
+    parser.add_argument('--recommencer', action='store_true', help="Ignorer l'avancement enregistré")
+    args = parser.parse_args()
+    if args.fin < args.debut:
+        parser.error("--fin doit suivre --debut")
+
+    from config import charger_configuration, configurer_logging
+    from database import Database
+    charger_configuration()
+    configurer_logging()
+
+    motifs = tuple(MOTIFS) if args.motif == 'tous' else (args.motif,)
+    try:
+        resultat = generer_relances(Database(), args.sortie, args.debut, args.fin, motifs, args.lot,
+                                    args.processus, recommencer=args.recommencer)
+    except (RuntimeError, ValueError) as e:
+        print(f"Erreur : {e}")
+        return 1
+    print(f"{resultat['lettres']} lettres ({resultat['vehicules']} véhicules) écrites dans {args.sortie} "
+          f"en {resultat['duree_s']} s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
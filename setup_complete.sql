@@ -5,6 +5,9 @@ CREATE DATABASE carte_grise_db;
 USE carte_grise_db;
 
 -- Drop existing tables if they exist (in correct order due to foreign keys)
+DROP TABLE IF EXISTS travaux;
+DROP TABLE IF EXISTS cartes_grises_archive;
+DROP TABLE IF EXISTS controles_techniques;
 DROP TABLE IF EXISTS cartes_grises;
 DROP TABLE IF EXISTS modeles;
 DROP TABLE IF EXISTS marques;
@@ -47,12 +50,17 @@ CREATE TABLE proprietaires (
     nom VARCHAR(100) NOT NULL,
     prenom VARCHAR(100) NOT NULL,
     adresse VARCHAR(255) NOT NULL,
+    code_postal CHAR(5),
+    departement VARCHAR(3),
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     INDEX idx_nom_proprietaire (nom),
-    INDEX idx_prenom_proprietaire (prenom)
+    INDEX idx_prenom_proprietaire (prenom),
+    INDEX idx_proprietaire_code_postal (code_postal),
+    INDEX idx_proprietaire_departement (departement, nom, prenom)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
 -- Cartes grises
+-- version : augmentee a chaque modification, verifiee a l'enregistrement (voir modifications.py)
 CREATE TABLE cartes_grises (
     id INT AUTO_INCREMENT PRIMARY KEY,
     numero_carte_grise VARCHAR(20) NOT NULL UNIQUE,
@@ -88,6 +96,7 @@ CREATE TABLE cartes_grises (
     date_controle_6 DATE,
     date_controle_7 DATE,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    version INT NOT NULL DEFAULT 1,
     FOREIGN KEY (proprietaire_id) REFERENCES proprietaires(id) ON DELETE RESTRICT ON UPDATE CASCADE,
     FOREIGN KEY (modele_id) REFERENCES modeles(id) ON DELETE RESTRICT ON UPDATE CASCADE,
     INDEX idx_immat (numero_immatriculation),
@@ -103,6 +112,83 @@ CREATE TABLE cartes_grises (
     CHECK (emission_co2_g_km >= 0)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
+-- Dates de controle technique (une ligne par date et par vehicule, indexee par date)
+-- Copie des colonnes date_*_controle de cartes_grises, voir controles.py
+-- rang : 0 = prochain controle, 1 = premier controle, 2 a 7 = controles suivants
+CREATE TABLE controles_techniques (
+    carte_grise_id INT NOT NULL,
+    date_controle DATE NOT NULL,
+    rang TINYINT NOT NULL,
+    PRIMARY KEY (carte_grise_id, date_controle),
+    FOREIGN KEY (carte_grise_id) REFERENCES cartes_grises(id) ON DELETE CASCADE,
+    INDEX idx_controle_date (date_controle, carte_grise_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Cartes grises archivees (memes colonnes que cartes_grises, verifie par purge.migrer)
+-- Sans contrainte d'unicite ni cle etrangere : copie des lignes telles qu'elles etaient
+-- archive_le : date du deplacement
+CREATE TABLE cartes_grises_archive (
+    id INT PRIMARY KEY,
+    numero_carte_grise VARCHAR(20) NOT NULL,
+    numero_immatriculation VARCHAR(9) NOT NULL,
+    date_premiere_immat DATE NOT NULL,
+    date_immat_actuelle DATE NOT NULL,
+    proprietaire_id INT NOT NULL,
+    est_conducteur BOOLEAN DEFAULT TRUE,
+    modele_id INT NOT NULL,
+    numero_serie VARCHAR(30) NOT NULL,
+    poids_vide_kg INT NOT NULL,
+    poids_max_kg INT NOT NULL,
+    categorie_permis VARCHAR(5) NOT NULL,
+    carburant_energie VARCHAR(50) NOT NULL,
+    cylindree_cm3 INT NOT NULL,
+    puissance_chevaux INT NOT NULL,
+    puissance_administrative_cv INT,
+    places_assises INT NOT NULL,
+    places_debout INT DEFAULT 0,
+    emission_co2_g_km INT,
+    classe_environnementale VARCHAR(20),
+    niveau_sonore_db INT,
+    vitesse_max_moteur_rpm INT,
+    couleur_principale VARCHAR(50),
+    date_validite_certificat DATE,
+    date_prochain_controle DATE,
+    date_fin_validite DATE,
+    date_premier_controle DATE,
+    date_controle_2 DATE,
+    date_controle_3 DATE,
+    date_controle_4 DATE,
+    date_controle_5 DATE,
+    date_controle_6 DATE,
+    date_controle_7 DATE,
+    created_at TIMESTAMP NULL,
+    version INT NOT NULL DEFAULT 1,
+    archive_le TIMESTAMP NULL,
+    INDEX idx_archive_immat (numero_immatriculation),
+    INDEX idx_archive_numero_carte (numero_carte_grise),
+    INDEX idx_archive_serie (numero_serie),
+    INDEX idx_archive_proprietaire (proprietaire_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Travaux en arriere-plan (reconstructions, relances...), voir travaux.py
+-- statut : en_attente, en_cours, termine, echec, annule ; progression en pourcentage
+CREATE TABLE travaux (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    type_travail VARCHAR(50) NOT NULL,
+    parametres TEXT,
+    statut VARCHAR(20) NOT NULL DEFAULT 'en_attente',
+    progression TINYINT NOT NULL DEFAULT 0,
+    message VARCHAR(255),
+    resultat TEXT,
+    annulation_demandee BOOLEAN NOT NULL DEFAULT FALSE,
+    travailleur VARCHAR(100),
+    cree_le TIMESTAMP NULL,
+    demarre_le TIMESTAMP NULL,
+    termine_le TIMESTAMP NULL,
+    vu_le TIMESTAMP NULL,
+    INDEX idx_travaux_statut (statut, id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
 -- Insert initial categories
 INSERT INTO categories_vehicule (nom) VALUES 
 ('Deux roues'),
@@ -179,13 +265,13 @@ INSERT INTO modeles (modele, marque_id, categorie_id, type_vehicule) VALUES
 
 -- Insert proprietaires 
 
-INSERT INTO proprietaires (nom, prenom, adresse) VALUES 
-('Dupont', 'Jean', '12 Rue de Paris, 75001 Paris'),
-('Martin', 'Sophie', '45 Avenue des Champs, 69000 Lyon'),
-('Bernard', 'Pierre', '8 Boulevard Victor Hugo, 13001 Marseille'),
-('Dubois', 'Marie', '23 Rue de la République, 33000 Bordeaux'),
-('Thomas', 'Luc', '67 Avenue de la Liberté, 31000 Toulouse'),
-('Robert', 'Claire', '34 Rue Nationale, 59000 Lille');
+INSERT INTO proprietaires (nom, prenom, adresse, code_postal, departement) VALUES 
+('Dupont', 'Jean', '12 Rue de Paris, 75001 Paris', '75001', '75'),
+('Martin', 'Sophie', '45 Avenue des Champs, 69000 Lyon', '69000', '69'),
+('Bernard', 'Pierre', '8 Boulevard Victor Hugo, 13001 Marseille', '13001', '13'),
+('Dubois', 'Marie', '23 Rue de la République, 33000 Bordeaux', '33000', '33'),
+('Thomas', 'Luc', '67 Avenue de la Liberté, 31000 Toulouse', '31000', '31'),
+('Robert', 'Claire', '34 Rue Nationale, 59000 Lille', '59000', '59');
 
 
 -- Insert cartes grises
@@ -223,3 +309,18 @@ INSERT INTO cartes_grises (
 -- Ford Transit 470 (Camion léger - C) - ID Modele: 36
 ('2026AA00012', 'AA100AL', '2021-07-18', '2021-07-18', 6, TRUE, 36, 'WF0XXXTTFXGX00001', 2800, 4700, 'C', 'Diesel', 1995, 170, 11, 3, 0, 245, 'Euro 6d', 77, 4200, 'Bleu', '2031-07-18', '2024-07-18', '2031-07-18', '2025-07-18');
 
+
+-- Controles techniques des cartes grises ci-dessus
+INSERT INTO controles_techniques (carte_grise_id, date_controle, rang)
+SELECT carte_grise_id, date_controle, MIN(rang)
+FROM (
+    SELECT id AS carte_grise_id, date_prochain_controle AS date_controle, 0 AS rang FROM cartes_grises WHERE date_prochain_controle IS NOT NULL
+    UNION ALL SELECT id, date_premier_controle, 1 FROM cartes_grises WHERE date_premier_controle IS NOT NULL
+    UNION ALL SELECT id, date_controle_2, 2 FROM cartes_grises WHERE date_controle_2 IS NOT NULL
+    UNION ALL SELECT id, date_controle_3, 3 FROM cartes_grises WHERE date_controle_3 IS NOT NULL
+    UNION ALL SELECT id, date_controle_4, 4 FROM cartes_grises WHERE date_controle_4 IS NOT NULL
+    UNION ALL SELECT id, date_controle_5, 5 FROM cartes_grises WHERE date_controle_5 IS NOT NULL
+    UNION ALL SELECT id, date_controle_6, 6 FROM cartes_grises WHERE date_controle_6 IS NOT NULL
+    UNION ALL SELECT id, date_controle_7, 7 FROM cartes_grises WHERE date_controle_7 IS NOT NULL
+) dates
+GROUP BY carte_grise_id, date_controle;
@@ -0,0 +1,579 @@
+"""
+Répartition horizontale (sharding) des cartes grises par région
+
+Les tables cartes_grises et proprietaires sont réparties sur plusieurs bases selon
+le département de l'adresse du propriétaire : un propriétaire et tous ses véhicules
+sont sur la même base, les jointures restent locales. Les tables de référence
+(categories_vehicule, marques, modeles) sont recopiées à l'identique sur chaque base.
+
+Un annuaire global (table annuaire_cartes, sur sa propre base) associe chaque plaque,
+VIN et numéro de carte grise au shard qui porte la carte. Ses contraintes UNIQUE
+garantissent l'unicité nationale, et il porte les séquences (dernière plaque, dernier
+numéro de carte, VIN par fabricant/mois) à la place de cartes_grises.
+
+Configuration (fichier JSON désigné par DB_SHARDS_CONFIG) :
+    {
+      "annuaire": {"host": "annuaire.interne", "database": "carte_grise_annuaire"},
+      "shards": {
+        "nord": {"host": "shard-nord.interne", "departements": ["59", "62", "80"]},
+        "idf":  {"host": "shard-idf.interne", "departements": ["75", "77", "78", "91", "92", "93", "94", "95"]},
+        "reste": {"host": "shard-reste.interne", "departements": "*"}
+      }
+    }
+Chaque entrée accepte host, port, database, pool_size, backend et chemin_sqlite
+(mêmes paramètres que Database ; identifiants communs DB_USER / DB_PASSWORD).
+"*" désigne le shard des départements non listés.
+
+Usage :
+    python sharding.py initialiser --vider-exemples   # annuaire, catalogue recopié, shards vidés
+    python sharding.py repartir --lot 2000            # migration de la base unique (DB_*) vers les shards
+    python sharding.py etat
+"""
+import argparse
+import heapq
+import json
+import logging
+import os
+import sys
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from adresses import localiser_adresse
+from controles import remplir_plage, synchroniser_controles
+from database import Database
+from numero_generator import (
+    generer_numero_carte_grise_depuis_db,
+    generer_numero_plaque_unique_depuis_db,
+    generer_numero_serie_depuis_db,
+)
+
+logger = logging.getLogger(__name__)
+
+TABLE_ANNUAIRE = 'annuaire_cartes'
+
+SCHEMA_ANNUAIRE = """
+CREATE TABLE IF NOT EXISTS annuaire_cartes (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    numero_carte_grise VARCHAR(20) NOT NULL UNIQUE,
+    numero_immatriculation VARCHAR(9) NOT NULL UNIQUE,
+    numero_serie VARCHAR(30) NOT NULL UNIQUE,
+    shard VARCHAR(30) NOT NULL,
+    carte_id INT,
+    INDEX idx_annuaire_carte (shard, carte_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+"""
+
+# Tables de référence recopiées sur chaque shard, dans l'ordre des clés étrangères
+TABLES_CATALOGUE = (
+    ('categories_vehicule', ('id', 'nom')),
+    ('marques', ('id', 'nom', 'numero_fabricant')),
+    ('modeles', ('id', 'modele', 'marque_id', 'categorie_id', 'type_vehicule')),
+)
+
+# Même jointure que les pages de l'application (index, édition)
+REQUETE_CARTE = """
+    SELECT cg.*,
+           p.nom, p.prenom, p.adresse,
+           mo.modele, mo.type_vehicule,
+           ma.nom as marque_nom
+    FROM cartes_grises cg
+    JOIN proprietaires p ON cg.proprietaire_id = p.id
+    JOIN modeles mo ON cg.modele_id = mo.id
+    JOIN marques ma ON mo.marque_id = ma.id
+    WHERE cg.id = %s
+"""
+
+def _base(parametres):
+    """Instance Database d'une entrée de la configuration"""
+    return Database(pool_size=parametres.get('pool_size'), backend=parametres.get('backend'),
+                    chemin_sqlite=parametres.get('chemin_sqlite'), host=parametres.get('host'),
+                    port=parametres.get('port'), database=parametres.get('database'), replicas=[])
+
+
+def _cle_de_tri(colonnes):
+    """
+    Clé Python reproduisant un ORDER BY sur ces colonnes
+
+    NULL en premier (comme MySQL et SQLite en ordre croissant) ; le texte est comparé
+    sans tenir compte de la casse, comme la collation utf8mb4_unicode_ci.
+    """
+    def valeur(v):
+        if v is None:
+            return (0, '')
+        return (1, v.casefold() if isinstance(v, str) else v)
+    return lambda ligne: tuple(valeur(ligne[colonne]) for colonne in colonnes)
+
+
+class RouteurShards:
+    """Aiguillage des lectures et écritures vers le shard de chaque carte grise"""
+
+    def __init__(self, shards, annuaire, departements, shard_par_defaut=None):
+        """
+        Args:
+            shards: Dictionnaire nom -> Database
+            annuaire: Database portant l'annuaire global
+            departements: Dictionnaire département -> nom du shard
+            shard_par_defaut: Shard des départements non listés (None : refusés)
+        """
+        self.shards = shards
+        self.annuaire = annuaire
+        self.departements = departements
+        self.shard_par_defaut = shard_par_defaut
+        # Un thread par shard : les requêtes de diffusion partent en parallèle
+        self._executeur = ThreadPoolExecutor(max_workers=len(shards), thread_name_prefix='shard')
+
+    @classmethod
+    def depuis_configuration(cls, chemin=None):
+        """Construit le routeur depuis le fichier JSON (DB_SHARDS_CONFIG par défaut)"""
+        chemin = chemin or os.getenv('DB_SHARDS_CONFIG')
+        if not chemin:
+            raise ValueError("DB_SHARDS_CONFIG n'est pas défini")
+        with open(chemin, encoding='utf-8') as f:
+            config = json.load(f)
+
+        shards, departements, par_defaut = {}, {}, None
+        for nom, parametres in config['shards'].items():
+            shards[nom] = _base(parametres)
+            if parametres.get('departements') == '*':
+                par_defaut = nom
+                continue
+            for departement in parametres.get('departements', []):
+                if departement in departements:
+                    raise ValueError(f"Département {departement} attribué à {departements[departement]} et {nom}")
+                departements[departement] = nom
+        return cls(shards, _base(config['annuaire']), departements, par_defaut)
+
+    def shard_pour_adresse(self, adresse):
+        """Nom du shard d'un propriétaire, d'après le département de son adresse"""
+        _, departement = localiser_adresse(adresse)
+        nom = self.departements.get(departement, self.shard_par_defaut)
+        if nom is None:
+            raise ValueError(f"Aucun shard pour le département {departement} (adresse : {adresse})")
+        return nom
+
+    # --- Mise en place ---
+
+    def creer_annuaire(self):
+        """Crée la table annuaire_cartes si elle n'existe pas"""
+        if self.annuaire.backend == 'sqlite':
+            from base_sqlite import traduire_schema
+            instructions = traduire_schema(SCHEMA_ANNUAIRE)
+        else:
+            instructions = [SCHEMA_ANNUAIRE]
+        return all(self.annuaire.execute_query(instruction) for instruction in instructions)
+
+    def repliquer_catalogue(self, source=None):
+        """
+        Recopie les tables de référence de la source (l'annuaire par défaut) sur chaque shard
+
+        Les identifiants sont conservés : un modele_id désigne le même modèle partout.
+        Les lignes absentes sont insérées, les lignes différentes mises à jour.
+
+        Returns:
+            dict: Nombre de lignes insérées ou mises à jour par shard
+        """
+        source = source or self.annuaire
+        contenu = {table: source.fetch_all(f"SELECT {', '.join(colonnes)} FROM {table} ORDER BY id")
+                   for table, colonnes in TABLES_CATALOGUE}
+        modifiees = Counter()
+        for nom, base in self.shards.items():
+            for table, colonnes in TABLES_CATALOGUE:
+                existantes = {ligne['id']: ligne for ligne in
+                              base.fetch_all(f"SELECT {', '.join(colonnes)} FROM {table}")}
+                a_inserer = [tuple(ligne[c] for c in colonnes) for ligne in contenu[table]
+                             if ligne['id'] not in existantes]
+                a_modifier = [tuple(ligne[c] for c in colonnes[1:]) + (ligne['id'],) for ligne in contenu[table]
+                              if ligne['id'] in existantes and existantes[ligne['id']] != ligne]
+                if a_inserer:
+                    base.execute_many(f"INSERT INTO {table} ({', '.join(colonnes)}) "
+                                      f"VALUES ({', '.join(['%s'] * len(colonnes))})", a_inserer)
+                if a_modifier:
+                    base.execute_many(f"UPDATE {table} SET {', '.join(c + '=%s' for c in colonnes[1:])} "
+                                      f"WHERE id=%s", a_modifier)
+                modifiees[nom] += len(a_inserer) + len(a_modifier)
+        return dict(modifiees)
+
+    def shards_non_vides(self):
+        """Shards qui contiennent déjà des cartes ou des propriétaires"""
+        cartes, _ = self._diffuser('fetch_one', "SELECT COUNT(*) AS n FROM cartes_grises")
+        proprietaires, _ = self._diffuser('fetch_one', "SELECT COUNT(*) AS n FROM proprietaires")
+        return [nom for (nom, c), (_, p) in zip(cartes, proprietaires)
+                if (c or {}).get('n') or (p or {}).get('n')]
+
+    def vider_shards(self):
+        """
+        Supprime cartes et propriétaires des shards (exemples de setup_complete.sql)
+
+        Refusé si l'annuaire contient déjà des cartes : les shards sont alors en service.
+        """
+        entrees = self.annuaire.fetch_one(f"SELECT COUNT(*) AS n FROM {TABLE_ANNUAIRE}")
+        if entrees is None or entrees['n']:
+            raise RuntimeError("L'annuaire n'est pas vide : les shards sont en service")
+        for base in self.shards.values():
+            base.execute_query("DELETE FROM cartes_grises")
+            base.execute_query("DELETE FROM proprietaires")
+
+    # --- Écritures ---
+
+    def _reserver(self, nom_shard, numero_fabricant, date_premiere_immat, numero_serie=None, tentatives=5):
+        """
+        Réserve dans l'annuaire les prochains numéros (carte, plaque, VIN) pour une carte du shard
+
+        Deux réservations simultanées peuvent calculer les mêmes numéros : la contrainte
+        UNIQUE en refuse une, qui recalcule à partir de la nouvelle dernière ligne.
+
+        Returns:
+            dict: id de réservation et numéros, ou None (VIN fourni déjà enregistré, annuaire indisponible)
+        """
+        for _ in range(tentatives):
+            numero_carte = generer_numero_carte_grise_depuis_db(self.annuaire, table=TABLE_ANNUAIRE)
+            numero_plaque = generer_numero_plaque_unique_depuis_db(self.annuaire, table=TABLE_ANNUAIRE)
+            vin = numero_serie or generer_numero_serie_depuis_db(
+                self.annuaire, numero_fabricant, str(date_premiere_immat), table=TABLE_ANNUAIRE)
+            if not numero_plaque:
+                return None
+            reservation_id = self.annuaire.execute_query(
+                f"INSERT INTO {TABLE_ANNUAIRE} (numero_carte_grise, numero_immatriculation, numero_serie, shard) "
+                "VALUES (%s, %s, %s, %s)", (numero_carte, numero_plaque, vin, nom_shard))
+            if reservation_id:
+                return {'id': reservation_id, 'numero_carte_grise': numero_carte,
+                        'numero_immatriculation': numero_plaque, 'numero_serie': vin}
+            if numero_serie and self.localiser(vin=numero_serie):
+                return None
+        logger.error(f"Réservation de numéros impossible après {tentatives} tentatives")
+        return None
+
+    def inserer_carte(self, proprietaire, carte, numero_fabricant):
+        """
+        Enregistre une carte grise sur le shard de son propriétaire
+
+        Les numéros sont d'abord réservés dans l'annuaire, puis la carte est insérée sur
+        le shard. Si l'insertion échoue, la réservation est annulée. Si l'annuaire
+        devient indisponible juste après, la réservation reste sans carte_id :
+        reparer_annuaire() la complète.
+
+        Args:
+            proprietaire: Dictionnaire nom, prenom, adresse
+            carte: Colonnes de cartes_grises hors numéros et proprietaire_id
+                   (numero_serie facultatif : généré s'il est absent)
+            numero_fabricant: Code fabricant du modèle (génération du VIN)
+
+        Returns:
+            dict: shard, carte_id et numéros attribués, ou None en cas d'échec
+        """
+        nom_shard = self.shard_pour_adresse(proprietaire['adresse'])
+        base = self.shards[nom_shard]
+        carte = dict(carte)
+        reservation = self._reserver(nom_shard, numero_fabricant, carte['date_premiere_immat'],
+                                     carte.pop('numero_serie', None) or None)
+        if not reservation:
+            return None
+
+        identite = (proprietaire['nom'], proprietaire['prenom'], proprietaire['adresse'])
+        existant = base.fetch_one("SELECT id FROM proprietaires WHERE nom=%s AND prenom=%s AND adresse=%s", identite)
+        if existant:
+            proprietaire_id = existant['id']
+        else:
+            proprietaire_id = base.execute_query(
+                "INSERT INTO proprietaires (nom, prenom, adresse, code_postal, departement) VALUES (%s, %s, %s, %s, %s)",
+                identite + localiser_adresse(proprietaire['adresse']))
+
+        carte_id = None
+        if proprietaire_id:
+            carte.update(proprietaire_id=proprietaire_id,
+                         numero_carte_grise=reservation['numero_carte_grise'],
+                         numero_immatriculation=reservation['numero_immatriculation'],
+                         numero_serie=reservation['numero_serie'])
+            carte_id = base.execute_query(
+                f"INSERT INTO cartes_grises ({', '.join(carte)}) VALUES ({', '.join(['%s'] * len(carte))})",
+                tuple(carte.values()))
+        if not carte_id:
+            self.annuaire.execute_query(f"DELETE FROM {TABLE_ANNUAIRE} WHERE id=%s", (reservation['id'],))
+            return None
+
+        self.annuaire.execute_query(f"UPDATE {TABLE_ANNUAIRE} SET carte_id=%s WHERE id=%s",
+                                    (carte_id, reservation['id']))
+        synchroniser_controles(base, carte_id)
+        return {'shard': nom_shard, 'carte_id': carte_id,
+                'numero_carte_grise': reservation['numero_carte_grise'],
+                'numero_immatriculation': reservation['numero_immatriculation'],
+                'numero_serie': reservation['numero_serie']}
+
+    def supprimer_carte(self, nom_shard, carte_id):
+        """Supprime une carte de son shard, puis son entrée dans l'annuaire"""
+        # Dans cet ordre : en cas d'échec entre les deux, les numéros restent réservés
+        # (jamais réattribués), sans carte orpheline hors de l'annuaire
+        if not self.shards[nom_shard].execute_query("DELETE FROM cartes_grises WHERE id=%s", (carte_id,)):
+            return False
+        return self.annuaire.execute_query(f"DELETE FROM {TABLE_ANNUAIRE} WHERE shard=%s AND carte_id=%s",
+                                           (nom_shard, carte_id))
+
+    def reparer_annuaire(self):
+        """
+        Complète les réservations restées sans carte_id (annuaire indisponible après l'insertion)
+
+        La carte est recherchée par plaque sur son shard ; une réservation sans carte est supprimée.
+
+        Returns:
+            dict: Nombre d'entrées complétées et supprimées
+        """
+        bilan = Counter()
+        for entree in self.annuaire.fetch_all(
+                f"SELECT id, shard, numero_immatriculation FROM {TABLE_ANNUAIRE} WHERE carte_id IS NULL"):
+            carte = self.shards[entree['shard']].fetch_one(
+                "SELECT id FROM cartes_grises WHERE numero_immatriculation=%s", (entree['numero_immatriculation'],))
+            if carte:
+                self.annuaire.execute_query(f"UPDATE {TABLE_ANNUAIRE} SET carte_id=%s WHERE id=%s",
+                                            (carte['id'], entree['id']))
+                bilan['completees'] += 1
+            else:
+                self.annuaire.execute_query(f"DELETE FROM {TABLE_ANNUAIRE} WHERE id=%s", (entree['id'],))
+                bilan['supprimees'] += 1
+        return dict(bilan)
+
+    # --- Lectures ---
+
+    def localiser(self, plaque=None, vin=None, numero_carte=None):
+        """
+        Shard et identifiant d'une carte d'après sa plaque, son VIN ou son numéro de carte
+
+        Returns:
+            tuple: (nom du shard, carte_id), ou None si la carte est inconnue
+        """
+        if plaque:
+            compacte = plaque.replace(' ', '').replace('-', '').upper()
+            avec_tirets = f"{compacte[:2]}-{compacte[2:5]}-{compacte[5:]}"
+            condition, params = "numero_immatriculation IN (%s, %s)", (compacte, avec_tirets)
+        elif vin:
+            condition, params = "numero_serie = %s", (vin.replace(' ', '').upper(),)
+        elif numero_carte:
+            condition, params = "numero_carte_grise = %s", (numero_carte.strip(),)
+        else:
+            return None
+        entree = self.annuaire.fetch_one(
+            f"SELECT shard, carte_id FROM {TABLE_ANNUAIRE} WHERE {condition} AND carte_id IS NOT NULL", params)
+        return (entree['shard'], entree['carte_id']) if entree else None
+
+    def carte(self, nom_shard, carte_id):
+        """Carte grise complète (propriétaire, modèle, marque) lue sur son shard"""
+        ligne = self.shards[nom_shard].fetch_one(REQUETE_CARTE, (carte_id,))
+        if ligne:
+            ligne['shard'] = nom_shard
+        return ligne
+
+    def trouver_carte(self, plaque=None, vin=None, numero_carte=None):
+        """Carte grise d'après sa plaque, son VIN ou son numéro de carte (une seule base interrogée)"""
+        emplacement = self.localiser(plaque=plaque, vin=vin, numero_carte=numero_carte)
+        return self.carte(*emplacement) if emplacement else None
+
+    def _diffuser(self, methode, query, params=None, timeout_ms=None):
+        """
+        Exécute la même lecture sur tous les shards en parallèle
+
+        Returns:
+            tuple: (liste de (nom, résultat), dictionnaire nom -> erreur des shards en échec)
+        """
+        def interroger(nom):
+            base = self.shards[nom]
+            try:
+                resultat = getattr(base, methode)(query, params, timeout_ms)
+                # Code d'erreur de la requête, ou connexion impossible (disjoncteur ouvert...)
+                erreur = base.derniere_erreur or (None if base.connection is not None else 'indisponible')
+            finally:
+                # La connexion appartient au thread de diffusion : fermer() ne l'atteindrait pas,
+                # elle est donc rendue (au pool) dès la requête terminée
+                base.disconnect()
+            return nom, resultat, erreur
+
+        resultats, echecs = [], {}
+        for nom, resultat, erreur in self._executeur.map(interroger, self.shards):
+            if erreur is not None:
+                echecs[nom] = erreur
+                logger.warning(f"Shard {nom} en échec ({erreur}) : résultats partiels")
+            resultats.append((nom, resultat))
+        return resultats, echecs
+
+    def rechercher(self, query, params=None, tri=(), decroissant=False, timeout_ms=None, limite=None):
+        """
+        Recherche diffusée à tous les shards, résultats fusionnés dans l'ordre demandé
+
+        Chaque shard renvoie ses lignes déjà triées (ORDER BY de la requête) ; la fusion
+        (heapq.merge) conserve cet ordre sans retrier l'ensemble. Avec une limite, la
+        requête doit porter le même LIMIT : chaque shard n'en renvoie pas plus.
+
+        Args:
+            query: Requête SELECT exécutée telle quelle sur chaque shard
+            params: Paramètres de la requête
+            tri: Colonnes de l'ORDER BY de la requête, dans l'ordre
+            decroissant: True si l'ORDER BY est DESC
+            timeout_ms: Durée maximale d'exécution sur chaque shard
+            limite: Nombre maximal de lignes après fusion
+
+        Returns:
+            tuple: (lignes avec la colonne 'shard', dictionnaire des shards en échec)
+        """
+        resultats, echecs = self._diffuser('fetch_all', query, params, timeout_ms)
+        flux = []
+        for nom, lignes in resultats:
+            for ligne in lignes:
+                ligne['shard'] = nom
+            flux.append(lignes)
+        fusion = heapq.merge(*flux, key=_cle_de_tri(tri), reverse=decroissant) if tri else (
+            ligne for lignes in flux for ligne in lignes)
+        return list(islice(fusion, limite)), echecs
+
+    def compter(self, query, params=None, cle='marque_nom', valeur='count', timeout_ms=None):
+        """
+        Agrégat GROUP BY ... COUNT(*) diffusé à tous les shards, comptes additionnés
+
+        Returns:
+            tuple: (lignes {cle, valeur} par valeur décroissante, dictionnaire des shards en échec)
+        """
+        resultats, echecs = self._diffuser('fetch_all', query, params, timeout_ms)
+        totaux = Counter()
+        for _, lignes in resultats:
+            for ligne in lignes:
+                totaux[ligne[cle]] += ligne[valeur]
+        return [{cle: groupe, valeur: total} for groupe, total in totaux.most_common()], echecs
+
+    def statistiques(self):
+        """Nombre de cartes et de propriétaires par shard, et taille de l'annuaire"""
+        cartes, _ = self._diffuser('fetch_one', "SELECT COUNT(*) AS n FROM cartes_grises")
+        proprietaires, _ = self._diffuser('fetch_one', "SELECT COUNT(*) AS n FROM proprietaires")
+        annuaire = self.annuaire.fetch_one(f"SELECT COUNT(*) AS n FROM {TABLE_ANNUAIRE}")
+        return {
+            'shards': {nom: {'cartes_grises': (c or {}).get('n'), 'proprietaires': (p or {}).get('n')}
+                       for (nom, c), (_, p) in zip(cartes, proprietaires)},
+            'annuaire': (annuaire or {}).get('n'),
+        }
+
+    def fermer(self):
+        """Arrête les threads de diffusion et ferme les connexions du thread appelant
+        (celles des threads de diffusion sont rendues après chaque requête)"""
+        self._executeur.shutdown(wait=True)
+        for base in self.shards.values():
+            base.disconnect()
+        self.annuaire.disconnect()
+
+
+def repartir(routeur, source, lot=2000):
+    """
+    Migre une base unique vers les shards
+
+    Les identifiants de la source sont conservés (propriétaires, cartes, et ordre des
+    séquences dans l'annuaire). Propriétaires puis cartes sont lus par lots en suivant
+    la clé primaire.
+
+    Args:
+        routeur: RouteurShards (annuaire créé, catalogue recopié)
+        source: Database de la base unique (colonnes code_postal / departement présentes, voir adresses.py)
+        lot: Lignes lues et écrites par lot
+
+    Returns:
+        Counter: Cartes migrées par shard
+    """
+    deja = routeur.annuaire.fetch_one(f"SELECT COUNT(*) AS n FROM {TABLE_ANNUAIRE}")
+    if deja is None or deja['n']:
+        raise RuntimeError("L'annuaire doit être vide (et joignable) avant une migration")
+    non_vides = routeur.shards_non_vides()
+    if non_vides:
+        raise RuntimeError(f"Shards non vides : {', '.join(non_vides)} (voir initialiser --vider-exemples)")
+
+    # Propriétaires d'abord (clé étrangère des cartes grises), y compris ceux sans véhicule
+    dernier_id = 0
+    while True:
+        proprietaires = source.fetch_all(
+            "SELECT id, nom, prenom, adresse, code_postal, departement FROM proprietaires "
+            "WHERE id > %s ORDER BY id LIMIT %s",
+            (dernier_id, lot))
+        if not proprietaires:
+            break
+        dernier_id = proprietaires[-1]['id']
+        par_shard = defaultdict(list)
+        for p in proprietaires:
+            par_shard[routeur.shard_pour_adresse(p['adresse'])].append(
+                (p['id'], p['nom'], p['prenom'], p['adresse'], p['code_postal'], p['departement']))
+        for nom, lignes in par_shard.items():
+            if routeur.shards[nom].execute_many(
+                    "INSERT INTO proprietaires (id, nom, prenom, adresse, code_postal, departement) "
+                    "VALUES (%s, %s, %s, %s, %s, %s)", lignes) is False:
+                raise RuntimeError(f"Échec de l'insertion des propriétaires sur le shard {nom}")
+
+    migrees = Counter()
+    dernier_id = 0
+    while True:
+        cartes = source.fetch_all("""
+            SELECT cg.*, p.adresse AS proprietaire_adresse
+            FROM cartes_grises cg
+            JOIN proprietaires p ON cg.proprietaire_id = p.id
+            WHERE cg.id > %s
+            ORDER BY cg.id
+            LIMIT %s
+        """, (dernier_id, lot))
+        if not cartes:
+            break
+        id_apres, dernier_id = dernier_id, cartes[-1]['id']
+
+        par_shard, annuaire = defaultdict(list), []
+        for carte in cartes:
+            nom = routeur.shard_pour_adresse(carte.pop('proprietaire_adresse'))
+            par_shard[nom].append(carte)
+            annuaire.append((carte['id'], carte['numero_carte_grise'], carte['numero_immatriculation'],
+                             carte['numero_serie'], nom, carte['id']))
+
+        colonnes = list(cartes[0])
+        for nom, lignes in par_shard.items():
+            if routeur.shards[nom].execute_many(
+                    f"INSERT INTO cartes_grises ({', '.join(colonnes)}) VALUES ({', '.join(['%s'] * len(colonnes))})",
+                    [tuple(ligne[c] for c in colonnes) for ligne in lignes]) is False:
+                raise RuntimeError(f"Échec de l'insertion des cartes grises sur le shard {nom}")
+            if not remplir_plage(routeur.shards[nom], id_apres, dernier_id):
+                raise RuntimeError(f"Échec de l'insertion des contrôles techniques sur le shard {nom}")
+            migrees[nom] += len(lignes)
+        if routeur.annuaire.execute_many(
+                f"INSERT INTO {TABLE_ANNUAIRE} (id, numero_carte_grise, numero_immatriculation, numero_serie, "
+                "shard, carte_id) VALUES (%s, %s, %s, %s, %s, %s)", annuaire) is False:
+            raise RuntimeError("Échec de l'insertion dans l'annuaire")
+        logger.info(f"{sum(migrees.values())} cartes migrées (dernier id {dernier_id})")
+    return migrees
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('commande', choices=['initialiser', 'repartir', 'reparer', 'etat'])
+    parser.add_argument('--config', default=None, help="Fichier de configuration (défaut : DB_SHARDS_CONFIG)")
+    parser.add_argument('--lot', type=int, default=2000, help="Cartes par lot (repartir)")
+    parser.add_argument('--vider-exemples', action='store_true',
+                        help="Supprimer des shards les cartes et propriétaires d'exemple (initialiser)")
+    args = parser.parse_args()
+
+    from config import charger_configuration, configurer_logging
+    charger_configuration()
+    configurer_logging()
+
+    routeur = RouteurShards.depuis_configuration(args.config)
+    try:
+        if args.commande == 'initialiser':
+            if not routeur.creer_annuaire():
+                print("Création de l'annuaire impossible")
+                return 1
+            print(f"Catalogue recopié : {routeur.repliquer_catalogue()}")
+            if args.vider_exemples:
+                routeur.vider_shards()
+        elif args.commande == 'repartir':
+            migrees = repartir(routeur, Database(), args.lot)
+            print(f"{sum(migrees.values())} cartes migrées : {dict(migrees)}")
+        elif args.commande == 'reparer':
+            print(f"Annuaire : {routeur.reparer_annuaire()}")
+        print(json.dumps(routeur.statistiques(), indent=2, ensure_ascii=False))
+    except (RuntimeError, ValueError) as e:
+        print(f"Erreur : {e}")
+        return 1
+    finally:
+        routeur.fermer()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,440 @@
+"""
+Test de charge HTTP des routes Flask sur une base amorcée
+
+1. Amorçage (--amorcer N) : insère N cartes grises synthétiques dans la base
+   configurée par .env avec generateur_flotte. Avec --graine, les données sont reproductibles.
+2. Rejeu : des clients concurrents (une session et un jeton CSRF chacun) envoient
+   un mélange pondéré de requêtes pendant --duree secondes : index, recherche par
+   chaque type, ajout et modification (ouverture du formulaire puis POST d'une valeur
+   changée : chaque modification écrit, avec contrôle de version).
+3. Rapport : débit, latences p50/p95/p99, taux d'erreur, refus (503) et conflits de
+   version (409, comptés à part), global et par opération,
+   écrits dans un fichier JSON (--sortie) comparable d'une version à l'autre
+   (--comparer ancien.json).
+
+Usage :
+    python tests_visuels/benchmark_charge.py --amorcer 10000 --graine 42
+    python tests_visuels/benchmark_charge.py --url http://127.0.0.1:8000 --clients 16 --duree 60 \\
+        --sortie resultats_charge.json
+    python tests_visuels/benchmark_charge.py --lancer gunicorn --duree 30 --comparer resultats_v1.json
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import re
+import subprocess
+import sys
+import threading
+import time
+from datetime import date, timedelta
+from urllib.parse import urlencode, urlsplit
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(RACINE)
+
+from benchmark_serveur import attendre_port
+from generateur_flotte import NOMS, PRENOMS, RUES, VILLES, generer_flotte
+
+# Mélange par défaut (poids relatifs) : majoritairement des lectures
+MELANGE_DEFAUT = ('index=10,search_nom=20,search_plaque=20,search_vin=10,'
+                  'search_marque=5,search_critere_complexe=5,add=5,edit=5')
+
+MOTIF_CSRF = re.compile(r'name="csrf_token" value="([^"]+)"')
+# Formulaire de modification : version de la carte et émission de CO2 actuelles
+MOTIF_VERSION = re.compile(r'name="version" value="(\d+)"')
+MOTIF_EMISSION = re.compile(r'name="emission_co2" value="(\d*)"')
+
+
+# =========================
+# Amorçage de la base
+# =========================
+
+def date_aleatoire(generateur, annee_min=2005):
+    """Date de première immatriculation entre annee_min et aujourd'hui"""
+    debut = date(annee_min, 1, 1)
+    return debut + timedelta(days=generateur.randrange((date.today() - debut).days))
+
+
+def echantillonner(db, taille=500):
+    """Cartes grises existantes servant de valeurs de recherche et de cibles de modification"""
+    return db.fetch_all("""
+        SELECT cg.*, p.nom, p.prenom, p.adresse, p.departement
+        FROM cartes_grises cg
+        JOIN proprietaires p ON cg.proprietaire_id = p.id
+        ORDER BY cg.id DESC
+        LIMIT %s
+    """, (taille,))
+
+
+# =========================
+# Rejeu de la charge
+# =========================
+
+def analyser_melange(texte):
+    """'index=10,search_nom=20' -> ([opérations], [poids])"""
+    operations, poids = [], []
+    for element in texte.split(','):
+        nom, _, valeur = element.partition('=')
+        if nom.strip() not in OPERATIONS:
+            raise ValueError(f"opération inconnue : {nom.strip()} (connues : {', '.join(OPERATIONS)})")
+        operations.append(nom.strip())
+        poids.append(float(valeur or 1))
+    return operations, poids
+
+
+def formulaire_depuis_carte(carte):
+    """
+    Champs du formulaire de modification reconstruits depuis une ligne de la base
+
+    Tous les champs que /edit écrit, avec la version lue : le formulaire renvoyé tel quel
+    ne modifie rien (un champ absent serait une colonne vidée, une version absente est refusée).
+    _modification y change l'émission de CO2 et la version avant de l'envoyer.
+    """
+    def valeur(cle):
+        v = carte.get(cle)
+        return '' if v is None else str(v)
+    return {
+        'nom': carte['nom'], 'prenom': carte['prenom'], 'adresse': carte['adresse'],
+        'modele_id': valeur('modele_id'), 'date_premiere_immat': valeur('date_premiere_immat'),
+        'numero_serie': valeur('numero_serie'), 'categorie_permis': valeur('categorie_permis'),
+        'carburant_energie': valeur('carburant_energie'), 'poids_vide': valeur('poids_vide_kg'),
+        'poids_max': valeur('poids_max_kg'), 'places_assises': valeur('places_assises'),
+        'places_debout': valeur('places_debout'), 'cylindree': valeur('cylindree_cm3'),
+        'puissance_chevaux': valeur('puissance_chevaux'),
+        'puissance_administrative_cv': valeur('puissance_administrative_cv'),
+        'emission_co2': valeur('emission_co2_g_km'),
+        'classe_environnementale': valeur('classe_environnementale'),
+        'niveau_sonore_db': valeur('niveau_sonore_db'),
+        'vitesse_max_moteur_rpm': valeur('vitesse_max_moteur_rpm'),
+        'date_fin_validite': valeur('date_fin_validite'), 'date_premier_controle': valeur('date_premier_controle'),
+        'date_controle_2': valeur('date_controle_2'), 'date_controle_3': valeur('date_controle_3'),
+        'date_prochain_controle': valeur('date_prochain_controle'),
+        'version': valeur('version'),
+    }
+
+
+class Client:
+    """Client HTTP keep-alive avec son propre cookie de session (et donc son jeton CSRF)"""
+
+    def __init__(self, host, port, delai=30):
+        self.host, self.port, self.delai = host, port, delai
+        self.connexion = None
+        self.cookie = None
+        self.jeton_csrf = None
+        self.redirection = None
+
+    def requete(self, methode, chemin, champs=None):
+        """Retourne (statut, corps) ; lève OSError/HTTPException en cas d'échec réseau"""
+        if self.connexion is None:
+            self.connexion = http.client.HTTPConnection(self.host, self.port, timeout=self.delai)
+        entetes = {}
+        corps = None
+        if self.cookie:
+            entetes['Cookie'] = self.cookie
+        if champs is not None:
+            corps = urlencode(champs)
+            entetes['Content-Type'] = 'application/x-www-form-urlencoded'
+        try:
+            self.connexion.request(methode, chemin, body=corps, headers=entetes)
+            reponse = self.connexion.getresponse()
+            contenu = reponse.read()
+        except (OSError, http.client.HTTPException):
+            self.connexion.close()
+            self.connexion = None
+            raise
+        self.redirection = reponse.getheader('Location')
+        cookie = reponse.getheader('Set-Cookie')
+        if cookie:
+            self.cookie = cookie.split(';', 1)[0]
+        return reponse.status, contenu
+
+    def preparer(self):
+        """Ouvre la session et récupère le jeton CSRF"""
+        statut, contenu = self.requete('GET', '/search')
+        correspondance = MOTIF_CSRF.search(contenu.decode('utf-8', 'replace'))
+        if statut != 200 or not correspondance:
+            raise RuntimeError(f"impossible d'obtenir un jeton CSRF (statut {statut})")
+        self.jeton_csrf = correspondance.group(1)
+
+    def redirige_vers_accueil(self, statut):
+        """Un ajout ou une modification réussi redirige vers l'accueil (sinon vers le formulaire)"""
+        return statut == 302 and urlsplit(self.redirection or '').path == '/'
+
+    def fermer(self):
+        if self.connexion:
+            self.connexion.close()
+
+
+def _recherche(search_type, valeur):
+    def operation(client, echantillon, generateur):
+        champs = {'csrf_token': client.jeton_csrf, 'search_type': search_type, 'search_value': valeur(echantillon, generateur)}
+        statut, _ = client.requete('POST', '/search', champs)
+        return statut, statut == 200
+    return operation
+
+
+def _valeur_echantillon(cle, longueur=None):
+    def valeur(echantillon, generateur):
+        if not echantillon:
+            return ''
+        texte = str(generateur.choice(echantillon).get(cle) or '')
+        if longueur:
+            # Fragment de la valeur (recherche partielle, comme un utilisateur)
+            debut = generateur.randrange(max(1, len(texte) - longueur + 1))
+            return texte[debut:debut + longueur]
+        return texte
+    return valeur
+
+
+def _index(client, echantillon, generateur):
+    statut, _ = client.requete('GET', '/')
+    return statut, statut == 200
+
+
+def _ajout(client, echantillon, generateur):
+    from catalogue import DONNEES_TECHNIQUES_REF
+    modele_id = generateur.choice(list(DONNEES_TECHNIQUES_REF))
+    ref = DONNEES_TECHNIQUES_REF[modele_id]
+    code_postal, ville, _poids = generateur.choice(VILLES)
+    champs = {
+        'csrf_token': client.jeton_csrf, 'btn_save': '1',
+        'nom': generateur.choice(NOMS), 'prenom': generateur.choice(PRENOMS),
+        'adresse': f"{generateur.randint(1, 200)} {generateur.choice(RUES)}, {code_postal} {ville}",
+        'modele_id': modele_id, 'date_premiere_immat': date_aleatoire(generateur, 2020).isoformat(),
+        'numero_serie': '', 'poids_vide': ref['pv'], 'poids_max': ref['pm'],
+        'categorie_permis': ref['permis'], 'carburant_energie': ref.get('carburant', ''),
+        'cylindree': ref['cyl'], 'puissance_chevaux': ref['cv'], 'puissance_administrative_cv': ref.get('cv_admin', ''),
+        'places_assises': ref['pl'], 'places_debout': ref.get('pl_debout', 0), 'emission_co2': ref.get('co2', ''),
+        'classe_environnementale': ref.get('classe', ''), 'niveau_sonore_db': ref.get('db', ''),
+        'vitesse_max_moteur_rpm': ref.get('rpm', ''), 'couleur_principale': ref.get('couleur', ''),
+    }
+    statut, _ = client.requete('POST', '/add', champs)
+    return statut, client.redirige_vers_accueil(statut)
+
+
+def _modification(client, echantillon, generateur):
+    if not echantillon:
+        return None, False
+    carte = generateur.choice(echantillon)
+    # Comme un agent : ouverture du formulaire (version et valeurs actuelles), puis enregistrement
+    statut, contenu = client.requete('GET', f"/edit/{carte['id']}")
+    page = contenu.decode('utf-8', 'replace')
+    version, emission = MOTIF_VERSION.search(page), MOTIF_EMISSION.search(page)
+    if statut != 200 or not version or not emission:
+        return statut, False
+    # Une colonne changée à chaque fois : la modification passe par l'UPDATE versionné
+    actuelle = int(emission.group(1) or 100)
+    champs = formulaire_depuis_carte(carte)
+    champs.update(csrf_token=client.jeton_csrf, version=version.group(1),
+                  emission_co2=str(actuelle + 1 if actuelle % 2 == 0 else actuelle - 1))
+    statut, _ = client.requete('POST', f"/edit/{carte['id']}", champs)
+    return statut, client.redirige_vers_accueil(statut)
+
+
+OPERATIONS = {
+    'index': _index,
+    'search_nom': _recherche('nom', _valeur_echantillon('nom')),
+    'search_plaque': _recherche('plaque', _valeur_echantillon('numero_immatriculation', 5)),
+    'search_vin': _recherche('vin', _valeur_echantillon('numero_serie', 8)),
+    'search_marque': _recherche('marque', lambda echantillon, generateur: ''),
+    'search_critere_complexe': _recherche('critere_complexe', lambda echantillon, generateur:
+                                          f"{generateur.randint(3, 15)}, {generateur.randint(90, 200)}"),
+    'search_departement': _recherche('departement', _valeur_echantillon('departement')),
+    'search_departements': _recherche('departements', lambda echantillon, generateur: ''),
+    'add': _ajout,
+    'edit': _modification,
+}
+
+
+def centile(valeurs_triees, p):
+    if not valeurs_triees:
+        return 0.0
+    return valeurs_triees[min(len(valeurs_triees) - 1, int(len(valeurs_triees) * p))] * 1000
+
+
+def rejouer(host, port, operations, poids, echantillon, clients, duree, echauffement, graine):
+    """Exécute la charge ; retourne les mesures brutes par opération"""
+    mesures = {nom: {'latences': [], 'erreurs': 0, 'refusees': 0, 'conflits': 0, 'statuts': {}} for nom in operations}
+    verrou = threading.Lock()
+    debut_mesure = time.time() + echauffement
+    fin = debut_mesure + duree
+    erreurs_preparation = []
+
+    def executer(numero):
+        generateur = random.Random(None if graine is None else graine + numero)
+        client = Client(host, port)
+        locales = {nom: {'latences': [], 'erreurs': 0, 'refusees': 0, 'conflits': 0, 'statuts': {}}
+                   for nom in operations}
+        try:
+            client.preparer()
+        except (OSError, http.client.HTTPException, RuntimeError) as e:
+            with verrou:
+                erreurs_preparation.append(str(e))
+            return
+        while time.time() < fin:
+            nom = generateur.choices(operations, poids)[0]
+            debut = time.perf_counter()
+            try:
+                statut, reussi = OPERATIONS[nom](client, echantillon, generateur)
+            except (OSError, http.client.HTTPException):
+                statut, reussi = 'reseau', False
+            latence = time.perf_counter() - debut
+            if time.time() < debut_mesure or statut is None:
+                continue
+            mesure = locales[nom]
+            mesure['latences'].append(latence)
+            mesure['statuts'][str(statut)] = mesure['statuts'].get(str(statut), 0) + 1
+            if statut == 503:
+                # Refus du contrôle d'admission : compté à part
+                mesure['refusees'] += 1
+            elif statut == 409:
+                # Modification concurrente de la même carte (contrôle de version) : compté à part
+                mesure['conflits'] += 1
+            elif not reussi:
+                mesure['erreurs'] += 1
+        client.fermer()
+        with verrou:
+            for nom, locale in locales.items():
+                mesures[nom]['latences'].extend(locale['latences'])
+                mesures[nom]['erreurs'] += locale['erreurs']
+                mesures[nom]['refusees'] += locale['refusees']
+                mesures[nom]['conflits'] += locale['conflits']
+                for statut, nombre in locale['statuts'].items():
+                    mesures[nom]['statuts'][statut] = mesures[nom]['statuts'].get(statut, 0) + nombre
+
+    threads = [threading.Thread(target=executer, args=(i,)) for i in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    if erreurs_preparation:
+        print(f"  {len(erreurs_preparation)} client(s) sans session : {erreurs_preparation[0]}")
+    return mesures
+
+
+def resumer(latences, erreurs, refusees, conflits, duree):
+    latences = sorted(latences)
+    total = len(latences)
+    return {
+        'requetes': total,
+        'requetes_par_seconde': round(total / duree, 1),
+        'p50_ms': round(centile(latences, 0.50), 1),
+        'p95_ms': round(centile(latences, 0.95), 1),
+        'p99_ms': round(centile(latences, 0.99), 1),
+        'erreurs': erreurs,
+        'taux_erreur': round(erreurs / total, 4) if total else 0.0,
+        'refusees': refusees,
+        'conflits': conflits,
+    }
+
+
+def afficher(resultats, precedent=None):
+    print(f"\n{'opération':<26}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'erreurs':>9}{'refus':>7}"
+          f"{'conflits':>9}")
+    lignes = list(resultats['operations'].items()) + [('TOTAL', resultats['global'])]
+    for nom, r in lignes:
+        ligne = (f"{nom:<26}{r['requetes_par_seconde']:>9.1f}{r['p50_ms']:>9.1f}{r['p95_ms']:>9.1f}"
+                 f"{r['p99_ms']:>9.1f}{r['taux_erreur']:>8.1%}{r['refusees']:>7}{r.get('conflits', 0):>9}")
+        ancien = (precedent or {}).get('global' if nom == 'TOTAL' else 'operations', {})
+        ancien = ancien if nom == 'TOTAL' else ancien.get(nom)
+        if ancien and ancien.get('requetes_par_seconde'):
+            ecart = r['requetes_par_seconde'] / ancien['requetes_par_seconde'] - 1
+            ligne += f"   débit {ecart:+.0%}, p95 {ancien['p95_ms']:.1f} -> {r['p95_ms']:.1f} ms"
+        print(ligne)
+
+
+def version_code():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=RACINE,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://127.0.0.1:5000', help="Adresse de l'application")
+    parser.add_argument('--amorcer', type=int, default=0, help="Cartes grises synthétiques à insérer avant la charge")
+    parser.add_argument('--graine', type=int, default=None, help="Graine aléatoire (données et rejeu reproductibles)")
+    parser.add_argument('--melange', default=MELANGE_DEFAUT, help="Poids des opérations (nom=poids,...)")
+    parser.add_argument('--clients', type=int, default=8, help="Clients concurrents")
+    parser.add_argument('--duree', type=float, default=30.0, help="Durée de mesure (secondes)")
+    parser.add_argument('--echauffement', type=float, default=3.0, help="Durée non mesurée au début (secondes)")
+    parser.add_argument('--lancer', choices=['flask', 'gunicorn'], default=None,
+                        help="Démarrer l'application avant la charge (sinon elle doit déjà tourner)")
+    parser.add_argument('--sortie', default=None, help="Fichier JSON de résultats")
+    parser.add_argument('--comparer', default=None, help="Fichier JSON d'une exécution précédente")
+    args = parser.parse_args()
+
+    operations, poids = analyser_melange(args.melange)
+    cible = urlsplit(args.url)
+    host, port = cible.hostname, cible.port or 80
+
+    from config import charger_configuration
+    from database import Database
+    charger_configuration()
+    db = Database()
+    if args.amorcer:
+        print(f"Amorçage de {args.amorcer} cartes grises...")
+        resultat = generer_flotte(db, args.amorcer, graine=args.graine)
+        print(f"  {resultat['cartes_grises']} cartes grises et {resultat['proprietaires']} propriétaires "
+              f"insérés en {resultat['duree_s']} s")
+    echantillon = echantillonner(db)
+    nb_cartes = (db.fetch_one("SELECT COUNT(*) AS count FROM cartes_grises") or {}).get('count')
+    db.disconnect()
+    if not echantillon:
+        print("Attention : base vide ou injoignable, les recherches et modifications n'auront pas de cible")
+
+    processus = None
+    if args.lancer:
+        env = dict(os.environ, FLASK_HOST=host, FLASK_PORT=str(port), FLASK_DEBUG='False',
+                   SECRET_KEY=os.getenv('SECRET_KEY', 'benchmark'))
+        commande = ([sys.executable, 'app.py'] if args.lancer == 'flask' else
+                    [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app'])
+        processus = subprocess.Popen(commande, cwd=RACINE, env=env,
+                                     stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not attendre_port(host, port):
+            print(f"L'application ne répond pas sur {host}:{port}")
+            return 1
+        print(f"{args.clients} clients - {args.duree:.0f} s - {nb_cartes} cartes grises en base - {args.melange}")
+        mesures = rejouer(host, port, operations, poids, echantillon, args.clients,
+                          args.duree, args.echauffement, args.graine)
+    finally:
+        if processus:
+            processus.terminate()
+            processus.wait(timeout=30)
+
+    toutes = [latence for m in mesures.values() for latence in m['latences']]
+    resultats = {
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'version': version_code(),
+        'environnement': {'python': platform.python_version(), 'cpu': os.cpu_count(), 'machine': platform.node()},
+        'parametres': {'url': args.url, 'clients': args.clients, 'duree_s': args.duree, 'melange': args.melange,
+                       'graine': args.graine, 'cartes_en_base': nb_cartes, 'serveur': args.lancer},
+        'global': resumer(toutes, sum(m['erreurs'] for m in mesures.values()),
+                          sum(m['refusees'] for m in mesures.values()),
+                          sum(m['conflits'] for m in mesures.values()), args.duree),
+        'operations': {nom: dict(resumer(m['latences'], m['erreurs'], m['refusees'], m['conflits'], args.duree),
+                                 statuts=m['statuts'])
+                       for nom, m in mesures.items()},
+    }
+
+    precedent = None
+    if args.comparer:
+        with open(args.comparer, encoding='utf-8') as f:
+            precedent = json.load(f)
+    afficher(resultats, precedent)
+
+    if args.sortie:
+        with open(args.sortie, 'w', encoding='utf-8') as f:
+            json.dump(resultats, f, indent=2, ensure_ascii=False)
+        print(f"\nRésultats écrits dans {args.sortie}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,153 @@
+"""
+Mesure du temps de démarrage d'un worker (python -X importtime)
+
+Chaque scénario est exécuté dans un interpréteur neuf, plusieurs fois ; on
+garde la médiane du temps d'import cumulé et du temps total du processus.
+Chaque exécution est suivie d'un import étalon (modules de la bibliothèque
+standard) : le temps d'import relatif à l'étalon ne dépend pas de la machine.
+Il est comparé à tests_visuels/reference_demarrage.json : le script échoue
+(code de sortie 1) si un scénario régresse au-delà de la tolérance ou si un
+module interdit est importé.
+
+Usage :
+    python tests_visuels/benchmark_demarrage.py              # comparer à la référence
+    python tests_visuels/benchmark_demarrage.py --enregistrer # mettre à jour la référence
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FICHIER_REFERENCE = os.path.join(RACINE, 'tests_visuels', 'reference_demarrage.json')
+
+# Scénarios mesurés : code exécuté et modules qui ne doivent PAS être importés
+SCENARIOS = {
+    # Démarrage d'un worker : import + création de l'application, sans aucun thread de fond.
+    # Préchauffage, exécuteur de travaux et construction des filtres d'unicité se connectent
+    # à la base (donc importent mysql.connector) : ils sont désactivés explicitement, sinon
+    # le contrôle ne passerait que parce que l'interpréteur s'arrête avant eux.
+    # Le préchauffage est mesuré à part par /readyz.
+    'worker': {
+        'code': "from app import create_app; "
+                "create_app({'WARMUP': False, 'TRAVAUX_THREADS': 0, 'FILTRES_UNICITE': False})",
+        'interdits': ['mysql.connector'],
+    },
+    # Script qui n'utilise que les générateurs de numéros
+    'numero_generator': {
+        'code': "import numero_generator",
+        'interdits': ['flask', 'dotenv', 'mysql.connector', 'database'],
+    },
+    # Couche base de données seule, sans connexion
+    'database': {
+        'code': "from database import Database; Database()",
+        'interdits': ['flask', 'mysql.connector'],
+    },
+}
+
+# Import étalon : modules de la bibliothèque standard absents du démarrage de l'interpréteur
+CODE_ETALON = "import argparse, decimal, email.message, http.client, json, logging, sqlite3, unittest"
+
+LIGNE_IMPORTTIME = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)')
+
+
+def executer(code):
+    """Exécute le code dans un nouvel interpréteur et analyse la sortie de -X importtime"""
+    debut = time.perf_counter()
+    resultat = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        cwd=RACINE, capture_output=True, text=True,
+        # Clé fixe : évite de tirer une clé aléatoire à chaque mesure
+        env=dict(os.environ, SECRET_KEY='benchmark'),
+    )
+    duree_totale = (time.perf_counter() - debut) * 1000
+    if resultat.returncode != 0:
+        raise RuntimeError(resultat.stderr.strip().splitlines()[-1])
+
+    modules = {}
+    import_total_us = 0
+    for ligne in resultat.stderr.splitlines():
+        correspondance = LIGNE_IMPORTTIME.match(ligne)
+        if not correspondance:
+            continue
+        propre, cumule, indentation, nom = correspondance.groups()
+        modules[nom] = int(cumule)
+        # Les imports de premier niveau (indentation minimale) s'additionnent
+        if len(indentation) == 1:
+            import_total_us += int(cumule)
+    return import_total_us / 1000, duree_totale, modules
+
+
+def mesurer(nom, scenario, repetitions):
+    """Mesure un scénario et retourne la médiane des répétitions"""
+    imports, totaux, relatifs, modules = [], [], [], {}
+    for _ in range(repetitions):
+        import_ms, total_ms, modules = executer(scenario['code'])
+        # Étalon mesuré juste après : un ralentissement passager touche les deux
+        etalon_ms, _, _ = executer(CODE_ETALON)
+        imports.append(import_ms)
+        totaux.append(total_ms)
+        relatifs.append(import_ms / etalon_ms)
+    charges = [m for m in scenario['interdits'] if m in modules]
+    plus_lents = sorted(modules.items(), key=lambda item: item[1], reverse=True)[:5]
+    return {
+        'import_ms': round(statistics.median(imports), 1),
+        'import_relatif': round(statistics.median(relatifs), 3),
+        'processus_ms': round(statistics.median(totaux), 1),
+        'modules_interdits': charges,
+        'plus_lents': [(module, round(us / 1000, 1)) for module, us in plus_lents],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repetitions', type=int, default=7, help="Exécutions par scénario")
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help="Régression tolérée par rapport à la référence (0.25 = +25 %%)")
+    parser.add_argument('--marge', type=float, default=0.05,
+                        help="Marge ajoutée à la limite, en fraction de l'étalon (bruit sur les petits scénarios)")
+    parser.add_argument('--enregistrer', action='store_true', help="Enregistrer les mesures comme référence")
+    args = parser.parse_args()
+
+    reference = {}
+    if os.path.exists(FICHIER_REFERENCE):
+        with open(FICHIER_REFERENCE, encoding='utf-8') as f:
+            reference = json.load(f)
+
+    echec = False
+    mesures = {}
+    for nom, scenario in SCENARIOS.items():
+        mesure = mesurer(nom, scenario, args.repetitions)
+        mesures[nom] = {'import_relatif': mesure['import_relatif']}
+
+        ligne = (f"{nom:<18} imports {mesure['import_ms']:7.1f} ms   processus {mesure['processus_ms']:7.1f} ms"
+                 f"   relatif {mesure['import_relatif']:6.3f}")
+        ref = reference.get(nom, {}).get('import_relatif')
+        if ref:
+            limite = ref * (1 + args.tolerance) + args.marge
+            ligne += f"   (référence {ref:.3f}, limite {limite:.3f})"
+            if mesure['import_relatif'] > limite:
+                ligne += "  RÉGRESSION"
+                echec = True
+        print(ligne)
+        print("    plus lents : " + ", ".join(f"{m} {ms} ms" for m, ms in mesure['plus_lents']))
+        if mesure['modules_interdits']:
+            print(f"    ERREUR : modules importés au démarrage : {', '.join(mesure['modules_interdits'])}")
+            echec = True
+
+    if args.enregistrer:
+        with open(FICHIER_REFERENCE, 'w', encoding='utf-8') as f:
+            json.dump(mesures, f, indent=2)
+            f.write('\n')
+        print(f"Référence enregistrée dans {os.path.relpath(FICHIER_REFERENCE, RACINE)}")
+        return 0
+
+    return 1 if echec else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,264 @@
+"""
+Benchmark et vérification exhaustive des algorithmes de numero_generator
+
+Version non interactive de test_algorithmes_generation.py, utilisable en CI :
+
+1. Contrôles de référence : exemples attendus des générateurs (échec si différence)
+2. Benchmark : opérations par seconde de chaque fonction, divisées par le débit
+   d'une boucle d'étalonnage mesurée dans le même processus, et comparées à
+   tests_visuels/reference_generateurs.json (échec si régression). Le débit relatif
+   ne dépend pas de la vitesse de la machine : la référence vaut pour toutes.
+3. Parcours exhaustif (--exhaustif) : toutes les plaques de AA100AA à ZZ999ZZ
+   sont générées une à une avec generer_prochain_numero_plaque. On vérifie que
+   la séquence est strictement croissante (donc sans doublon), qu'elle suit
+   exactement le rang attendu (numero_plaque_depuis_rang) et qu'elle se termine
+   par None après ZZ999ZZ. Le parcours est découpé par série de lettres de
+   gauche et réparti sur plusieurs processus, dans un budget de temps borné.
+
+Usage :
+    python tests_visuels/benchmark_generateurs.py
+    python tests_visuels/benchmark_generateurs.py --enregistrer
+    python tests_visuels/benchmark_generateurs.py --exhaustif --budget 900 --processus 8
+    python tests_visuels/benchmark_generateurs.py --exhaustif --series AA,AB,ZZ
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import timeit
+from multiprocessing import Pool, TimeoutError as DelaiDepasse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from numero_generator import (
+    generer_prochain_numero_plaque,
+    generer_prochain_numero_carte_grise,
+    formater_numero_plaque,
+    generer_numero_serie,
+    rang_numero_plaque,
+    numero_plaque_depuis_rang,
+    NOMBRE_PLAQUES
+)
+
+FICHIER_REFERENCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'reference_generateurs.json')
+
+# Exemples attendus (mêmes cas que les tests visuels)
+CAS_ATTENDUS = [
+    (generer_prochain_numero_plaque, ('AB977GH',), 'AB977GI'),
+    (generer_prochain_numero_plaque, ('AB977ZZ',), 'AB978AA'),
+    (generer_prochain_numero_plaque, ('AB999ZZ',), 'AC010AA'),
+    (generer_prochain_numero_plaque, ('AA 100-AZ',), 'AA100BA'),
+    (generer_prochain_numero_plaque, ('ZZ999ZZ',), None),
+    (generer_prochain_numero_plaque, ('',), 'AA100AA'),
+    (generer_prochain_numero_carte_grise, ('2026AA00010',), '2026AA00011'),
+    (generer_prochain_numero_carte_grise, ('2026AA99999',), '2026AB00000'),
+    (generer_prochain_numero_carte_grise, ('2026AZ99999',), '2026BA00000'),
+    (generer_prochain_numero_carte_grise, ('2026ZZ99999',), '2027AA00000'),
+    (formater_numero_plaque, ('AB123CD',), 'AB 123 CD'),
+    (generer_numero_serie, ('PEU', 2026, 1, 1), 'PEU2026M01000001'),
+    (generer_numero_serie, ('REN', 2026, 12, 157), 'REN2026M12000157'),
+]
+
+# Fonctions mesurées : cas courant (sans retenue) et cas avec retenues
+BENCHMARKS = {
+    'generer_prochain_numero_plaque': lambda: generer_prochain_numero_plaque('AB977GH'),
+    'generer_prochain_numero_plaque (retenue)': lambda: generer_prochain_numero_plaque('AB999ZZ'),
+    'generer_prochain_numero_carte_grise': lambda: generer_prochain_numero_carte_grise('2026AA00010'),
+    'generer_prochain_numero_carte_grise (retenue)': lambda: generer_prochain_numero_carte_grise('2026AZ99999'),
+    'formater_numero_plaque': lambda: formater_numero_plaque('AB123CD'),
+    'generer_numero_serie': lambda: generer_numero_serie('PEU', 2026, 1, 157),
+}
+
+
+def _boucle_etalon(numero='AB977GH'):
+    """Travail de référence : mêmes opérations que les générateurs (tranches, int, ord/chr, f-string)"""
+    chiffres = int(numero[2:5]) + 1
+    lettre = chr(ord(numero[6]) + 1)
+    return f"{numero[:2]}{chiffres:03d}{numero[5]}{lettre}"
+
+
+def verifier_cas_attendus():
+    """Vérifie les exemples de référence, retourne la liste des écarts"""
+    ecarts = []
+    for fonction, arguments, attendu in CAS_ATTENDUS:
+        obtenu = fonction(*arguments)
+        if obtenu != attendu:
+            ecarts.append(f"{fonction.__name__}{arguments} = {obtenu!r}, attendu {attendu!r}")
+    return ecarts
+
+
+def mesurer_ops_par_seconde(fonction, duree_min=0.2, repetitions=5):
+    """Meilleur débit (opérations/s) sur plusieurs répétitions"""
+    chronometre = timeit.Timer(fonction)
+    nombre, _ = chronometre.autorange()
+    nombre = max(nombre, int(nombre * duree_min / 0.2))
+    meilleur = min(chronometre.repeat(repeat=repetitions, number=nombre))
+    return nombre / meilleur
+
+
+def mesurer_relatif(fonction, repetitions=9):
+    """
+    Débit d'une fonction relatif à la boucle d'étalonnage
+
+    Fonction et étalon sont mesurés tour à tour, chaque tour donne un rapport de débits :
+    un ralentissement passager de la machine touche les deux mesures d'un même tour.
+
+    Returns:
+        (débit relatif médian, meilleur débit en opérations/s)
+    """
+    chronometres = [timeit.Timer(fonction), timeit.Timer(_boucle_etalon)]
+    nombres = [chronometre.autorange()[0] for chronometre in chronometres]
+    rapports, meilleur = [], 0.0
+    for _ in range(repetitions):
+        debit, debit_etalon = (nombre / chronometre.timeit(nombre)
+                               for chronometre, nombre in zip(chronometres, nombres))
+        rapports.append(debit / debit_etalon)
+        meilleur = max(meilleur, debit)
+    return statistics.median(rapports), meilleur
+
+
+def parcourir_serie(serie):
+    """
+    Parcourt toutes les plaques d'une série de lettres de gauche (ex: 'AB')
+
+    Returns:
+        (serie, nombre de plaques parcourues, erreur ou None, durée en secondes)
+    """
+    debut_chrono = time.perf_counter()
+    index = (ord(serie[0]) - ord('A')) * 26 + (ord(serie[1]) - ord('A'))
+    premiere = f"{serie}100AA" if index == 0 else f"{serie}010AA"
+    rang = rang_numero_plaque(premiere)
+    if numero_plaque_depuis_rang(rang) != premiere:
+        return serie, 0, f"rang incohérent pour {premiere}", 0.0
+
+    numero = premiere
+    compte = 1
+    while True:
+        suivant = generer_prochain_numero_plaque(numero)
+        if suivant is None or suivant[:2] != serie:
+            break
+        # Ordre strict (donc unicité) ; la comparaison de chaînes suffit :
+        # les chiffres sont sur 3 positions et les lettres dans l'ordre alphabétique
+        if not suivant > numero:
+            return serie, compte, f"ordre non respecté : {numero} -> {suivant}", time.perf_counter() - debut_chrono
+        numero = suivant
+        compte += 1
+
+    # Passage à la série suivante (ou fin de l'espace) conforme au rang attendu
+    attendu = numero_plaque_depuis_rang(rang + compte)
+    if suivant != attendu:
+        return serie, compte, f"après {numero} : {suivant!r}, attendu {attendu!r}", time.perf_counter() - debut_chrono
+    # Plaques de la série : 900 chiffres pour AA (100-999), 990 pour les autres (010-999)
+    attendu_compte = (900 if index == 0 else 990) * 26 * 26
+    if compte != attendu_compte:
+        return serie, compte, f"{compte} plaques, attendu {attendu_compte}", time.perf_counter() - debut_chrono
+    return serie, compte, None, time.perf_counter() - debut_chrono
+
+
+def verification_exhaustive(series, processus, budget):
+    """Parcourt les séries demandées en parallèle dans le budget de temps (secondes)"""
+    debut = time.perf_counter()
+    limite = debut + budget
+    total, erreurs, terminees = 0, [], 0
+    pool = Pool(processes=processus)
+    try:
+        resultats = pool.imap_unordered(parcourir_serie, series)
+        for _ in series:
+            try:
+                serie, compte, erreur, _duree = resultats.next(timeout=max(0.0, limite - time.perf_counter()))
+            except DelaiDepasse:
+                erreurs.append(f"budget de {budget:.0f} s dépassé : {terminees}/{len(series)} séries vérifiées")
+                break
+            total += compte
+            terminees += 1
+            if erreur:
+                erreurs.append(f"{serie} : {erreur}")
+    finally:
+        # Arrête les processus encore en cours si le budget est dépassé
+        pool.terminate()
+        pool.join()
+    duree = time.perf_counter() - debut
+    return total, erreurs, duree
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tolerance', type=float, default=0.30,
+                        help="Baisse de débit tolérée par rapport à la référence (0.30 = -30 %%)")
+    parser.add_argument('--enregistrer', action='store_true', help="Enregistrer les débits comme référence")
+    parser.add_argument('--exhaustif', action='store_true', help="Parcourir tout l'espace des plaques")
+    parser.add_argument('--series', default=None,
+                        help="Séries de lettres de gauche à parcourir (ex: AA,AB,ZZ ; défaut : toutes)")
+    parser.add_argument('--processus', type=int, default=os.cpu_count(), help="Processus pour le parcours")
+    parser.add_argument('--budget', type=float, default=1800.0, help="Budget du parcours exhaustif (secondes)")
+    parser.add_argument('--sortie', default=None, help="Fichier JSON de résultats")
+    args = parser.parse_args()
+    echec = False
+    resultats = {}
+
+    print("=== Contrôles de référence ===")
+    ecarts = verifier_cas_attendus()
+    for ecart in ecarts:
+        print(f"  ÉCART : {ecart}")
+    print(f"  {len(CAS_ATTENDUS) - len(ecarts)}/{len(CAS_ATTENDUS)} cas conformes")
+    echec |= bool(ecarts)
+
+    print("\n=== Benchmark (opérations par seconde, débit relatif à l'étalon) ===")
+    reference = {}
+    if os.path.exists(FICHIER_REFERENCE):
+        with open(FICHIER_REFERENCE, encoding='utf-8') as f:
+            reference = json.load(f).get('debits_relatifs', {})
+    etalon = mesurer_ops_par_seconde(_boucle_etalon)
+    print(f"  {'étalon':<48} {etalon:>12,.0f} ops/s")
+    debits, relatifs = {}, {}
+    for nom, fonction in BENCHMARKS.items():
+        relatif, debit = mesurer_relatif(fonction)
+        debits[nom] = round(debit)
+        relatifs[nom] = round(relatif, 3)
+        ligne = f"  {nom:<48} {debit:>12,.0f} ops/s   relatif {relatifs[nom]:6.3f}"
+        if nom in reference:
+            plancher = reference[nom] * (1 - args.tolerance)
+            ligne += f"   (référence {reference[nom]:.3f})"
+            if relatifs[nom] < plancher:
+                ligne += "  RÉGRESSION"
+                echec = True
+        print(ligne)
+    resultats['etalon_ops_s'] = round(etalon)
+    resultats['debits_ops_s'] = debits
+    resultats['debits_relatifs'] = relatifs
+
+    if args.enregistrer:
+        with open(FICHIER_REFERENCE, 'w', encoding='utf-8') as f:
+            json.dump({'unite': "débit de la fonction / débit de la boucle d'étalonnage",
+                       'debits_relatifs': relatifs}, f, indent=2, ensure_ascii=False)
+            f.write('\n')
+        print(f"  Référence enregistrée dans {os.path.basename(FICHIER_REFERENCE)}")
+
+    if args.exhaustif:
+        lettres = [chr(ord('A') + i) for i in range(26)]
+        series = args.series.split(',') if args.series else [a + b for a in lettres for b in lettres]
+        print(f"\n=== Parcours exhaustif : {len(series)} série(s), {args.processus} processus, "
+              f"budget {args.budget:.0f} s ===")
+        total, erreurs, duree = verification_exhaustive(series, args.processus, args.budget)
+        for erreur in erreurs:
+            print(f"  ERREUR : {erreur}")
+        print(f"  {total:,} plaques vérifiées en {duree:.1f} s ({total / duree:,.0f} plaques/s)")
+        if not args.series:
+            couverture = total / NOMBRE_PLAQUES
+            print(f"  Couverture : {couverture:.2%} de {NOMBRE_PLAQUES:,} plaques")
+        resultats['exhaustif'] = {'series': len(series), 'plaques': total, 'duree_s': round(duree, 1),
+                                  'erreurs': erreurs}
+        echec |= bool(erreurs)
+
+    if args.sortie:
+        with open(args.sortie, 'w', encoding='utf-8') as f:
+            json.dump(resultats, f, indent=2)
+
+    print("\nRÉSULTAT :", "ÉCHEC" if echec else "OK")
+    return 1 if echec else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,135 @@
+"""
+Mémoire et durée des listes de résultats : cg.* en dictionnaires, colonnes projetées, lignes compactes
+
+La page d'accueil et les recherches lisaient toutes les colonnes de cartes_grises (cg.*),
+une ligne par dictionnaire. Ce banc compare, sur la requête de la page d'accueil :
+1. cg.* en dictionnaires (requête d'avant la projection)
+2. colonnes du gabarit (COLONNES_ACCUEIL) en dictionnaires
+3. colonnes du gabarit en lignes compactes (fetch_all(..., compact=True), ce que fait index())
+
+Pour chacune : durée de lecture (médiane de --repetitions), mémoire gardée par le résultat
+et pic pendant la lecture (tracemalloc), et avec --rendu la durée du rendu de index.html.
+
+Usage :
+    python tests_visuels/benchmark_lignes.py --amorcer 100000 --graine 42
+    python tests_visuels/benchmark_lignes.py --lignes 100000 --rendu --sortie resultats_lignes.json
+"""
+import argparse
+import gc
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(RACINE)
+
+from app import COLONNES_ACCUEIL, create_app
+from generateur_flotte import generer_flotte
+
+JOINTURES = """
+    FROM cartes_grises cg
+    JOIN proprietaires p ON cg.proprietaire_id = p.id
+    JOIN modeles mo ON cg.modele_id = mo.id
+    JOIN marques ma ON mo.marque_id = ma.id
+    ORDER BY cg.date_immat_actuelle DESC
+    LIMIT %s
+"""
+
+# Nom -> (colonnes, lignes compactes)
+VARIANTES = {
+    'cg.* (dictionnaires)': ("""cg.*, p.nom, p.prenom, p.adresse, mo.modele, mo.type_vehicule,
+                                ma.nom as marque_nom""", False),
+    'projection (dictionnaires)': (COLONNES_ACCUEIL, False),
+    'projection (lignes compactes)': (COLONNES_ACCUEIL, True),
+}
+
+
+def lire(db, colonnes, compact, nb_lignes):
+    return db.fetch_all(f"SELECT {colonnes} {JOINTURES}", (nb_lignes,), compact=compact)
+
+
+def mesurer(db, colonnes, compact, nb_lignes, repetitions):
+    """Durée médiane de lecture (ms), mémoire gardée et pic de lecture (Mo)"""
+    lire(db, colonnes, compact, nb_lignes)  # Échauffement (cache de pages, types de lignes)
+    durees = []
+    for _ in range(repetitions):
+        gc.collect()
+        debut = time.perf_counter()
+        lignes = lire(db, colonnes, compact, nb_lignes)
+        durees.append((time.perf_counter() - debut) * 1000)
+        del lignes
+    gc.collect()
+    tracemalloc.start()
+    lignes = lire(db, colonnes, compact, nb_lignes)
+    gardee, pic = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return lignes, {
+        'lignes': len(lignes),
+        'lecture_ms': round(statistics.median(durees), 1),
+        'memoire_gardee_mo': round(gardee / 1e6, 1),
+        'pic_lecture_mo': round(pic / 1e6, 1),
+    }
+
+
+def mesurer_rendu(app, lignes, repetitions):
+    """Durée médiane du rendu de index.html (ms)"""
+    from flask import render_template
+    durees = []
+    with app.test_request_context('/'):
+        render_template('index.html', cartes=lignes)
+        for _ in range(repetitions):
+            debut = time.perf_counter()
+            render_template('index.html', cartes=lignes)
+            durees.append((time.perf_counter() - debut) * 1000)
+    return round(statistics.median(durees), 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--amorcer', type=int, default=0, help="Cartes grises synthétiques à insérer avant la mesure")
+    parser.add_argument('--graine', type=int, default=None, help="Graine aléatoire de l'amorçage")
+    parser.add_argument('--lignes', type=int, default=100000, help="Nombre de lignes lues par requête")
+    parser.add_argument('--repetitions', type=int, default=5, help="Lectures mesurées par variante")
+    parser.add_argument('--rendu', action='store_true', help="Mesurer aussi le rendu de index.html")
+    parser.add_argument('--sortie', default=None, help="Fichier JSON de résultats")
+    args = parser.parse_args()
+
+    # Ni préchauffage ni filtres ni travaux : seules les lectures mesurées touchent la base
+    app = create_app({'WARMUP': False, 'FILTRES_UNICITE': False, 'TRAVAUX_THREADS': 0})
+    db = app.extensions['database']
+    if args.amorcer:
+        print(f"Amorçage de {args.amorcer} cartes grises...")
+        resultat = generer_flotte(db, args.amorcer, graine=args.graine)
+        print(f"  {resultat['cartes_grises']} cartes grises insérées en {resultat['duree_s']} s")
+    nb_cartes = (db.fetch_one("SELECT COUNT(*) AS count FROM cartes_grises") or {}).get('count')
+    if not nb_cartes:
+        print("Base vide ou injoignable : utilisez --amorcer N")
+        return 1
+    print(f"{min(nb_cartes, args.lignes)} lignes lues par requête ({nb_cartes} cartes grises en base)\n")
+
+    resultats = {}
+    for nom, (colonnes, compact) in VARIANTES.items():
+        lignes, mesure = mesurer(db, colonnes, compact, args.lignes, args.repetitions)
+        if args.rendu:
+            mesure['rendu_ms'] = mesurer_rendu(app, lignes, args.repetitions)
+        del lignes
+        resultats[nom] = mesure
+        ligne = (f"  {nom:<32} lecture {mesure['lecture_ms']:>8.1f} ms   gardée {mesure['memoire_gardee_mo']:>7.1f} Mo"
+                 f"   pic {mesure['pic_lecture_mo']:>7.1f} Mo")
+        if args.rendu:
+            ligne += f"   rendu {mesure['rendu_ms']:>8.1f} ms"
+        print(ligne)
+    db.disconnect()
+
+    if args.sortie:
+        with open(args.sortie, 'w', encoding='utf-8') as f:
+            json.dump({'backend': db.backend, 'cartes_grises': nb_cartes, 'resultats': resultats}, f, indent=2)
+        print(f"\nRésultats écrits dans {args.sortie}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,126 @@
+"""
+Comparaison de débit : serveur de développement Flask (app.run) contre gunicorn (préfork)
+
+Lance successivement les deux serveurs sur le même port, envoie des requêtes
+concurrentes pendant une durée fixe et affiche requêtes/s et latences.
+
+Usage :
+    python tests_visuels/benchmark_serveur.py --url /static/style.css --clients 16 --duree 10
+"""
+import argparse
+import http.client
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def attendre_port(host, port, delai=15.0):
+    """Attend que le serveur accepte les connexions"""
+    limite = time.time() + delai
+    while time.time() < limite:
+        try:
+            with socket.create_connection((host, port), timeout=0.5):
+                return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+def charge(host, port, chemin, clients, duree):
+    """Envoie des requêtes GET concurrentes (une connexion keep-alive par client)"""
+    latences = []
+    erreurs = [0]
+    verrou = threading.Lock()
+    fin = time.time() + duree
+
+    def client():
+        locales = []
+        nb_erreurs = 0
+        connexion = http.client.HTTPConnection(host, port, timeout=10)
+        while time.time() < fin:
+            debut = time.perf_counter()
+            try:
+                connexion.request('GET', chemin)
+                reponse = connexion.getresponse()
+                reponse.read()
+                if reponse.status >= 500:
+                    nb_erreurs += 1
+            except (OSError, http.client.HTTPException):
+                nb_erreurs += 1
+                connexion.close()
+                connexion = http.client.HTTPConnection(host, port, timeout=10)
+                continue
+            locales.append(time.perf_counter() - debut)
+        connexion.close()
+        with verrou:
+            latences.extend(locales)
+            erreurs[0] += nb_erreurs
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    latences.sort()
+
+    def centile(p):
+        return latences[min(len(latences) - 1, int(len(latences) * p))] * 1000 if latences else 0.0
+
+    return {
+        'requetes_par_seconde': len(latences) / duree,
+        'p50_ms': centile(0.50),
+        'p95_ms': centile(0.95),
+        'p99_ms': centile(0.99),
+        'erreurs': erreurs[0],
+    }
+
+
+def mesurer(nom, commande, env, args):
+    """Démarre un serveur, mesure son débit puis l'arrête"""
+    processus = subprocess.Popen(commande, cwd=RACINE, env=env,
+                                 stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not attendre_port(args.host, args.port):
+            print(f"{nom:<28} : le serveur n'a pas démarré")
+            return None
+        # Échauffement
+        charge(args.host, args.port, args.url, args.clients, 1)
+        resultat = charge(args.host, args.port, args.url, args.clients, args.duree)
+        print(f"{nom:<28} : {resultat['requetes_par_seconde']:8.1f} req/s   "
+              f"p50 {resultat['p50_ms']:6.1f} ms   p95 {resultat['p95_ms']:6.1f} ms   "
+              f"p99 {resultat['p99_ms']:6.1f} ms   erreurs {resultat['erreurs']}")
+        return resultat
+    finally:
+        processus.terminate()
+        processus.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='/static/style.css', help="Chemin demandé")
+    parser.add_argument('--clients', type=int, default=16, help="Clients concurrents")
+    parser.add_argument('--duree', type=float, default=10.0, help="Durée de mesure (secondes)")
+    parser.add_argument('--workers', type=int, default=4, help="Workers gunicorn")
+    parser.add_argument('--threads', type=int, default=4, help="Threads par worker gunicorn")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5099)
+    args = parser.parse_args()
+
+    env = dict(os.environ, FLASK_HOST=args.host, FLASK_PORT=str(args.port), FLASK_DEBUG='False',
+               SECRET_KEY=os.getenv('SECRET_KEY', 'benchmark'),
+               WEB_WORKERS=str(args.workers), WEB_THREADS=str(args.threads))
+
+    print(f"GET {args.url} - {args.clients} clients - {args.duree:.0f} s - {os.cpu_count()} CPU")
+    mesurer("app.run (développement)", [sys.executable, 'app.py'], env, args)
+    mesurer(f"gunicorn {args.workers}x{args.threads} threads",
+            [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app'], env, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+"""
+Code postal et département extraits des adresses (adresses.py)
+
+Usage :
+    python -m pytest tests_visuels/test_adresses.py
+"""
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from adresses import code_postal_depuis_adresse, departement_depuis_code_postal, est_departement, localiser_adresse
+
+
+def test_code_postal_depuis_adresse():
+    assert code_postal_depuis_adresse("12 Rue de Paris, 75001 Paris") == "75001"
+    # Le dernier groupe de 5 chiffres est le code postal (un numéro de rue peut en avoir 5)
+    assert code_postal_depuis_adresse("10000 Route de Lyon, 69003 Lyon") == "69003"
+    assert code_postal_depuis_adresse("Lieu-dit sans code, 123456 Ville") is None
+    assert code_postal_depuis_adresse("") is None
+    assert code_postal_depuis_adresse(None) is None
+
+
+def test_departement_depuis_code_postal():
+    assert departement_depuis_code_postal("75001") == "75"
+    assert departement_depuis_code_postal("01000") == "01"
+    # Corse : 2A jusqu'à 20199, 2B au-delà
+    assert departement_depuis_code_postal("20000") == "2A"
+    assert departement_depuis_code_postal("20199") == "2A"
+    assert departement_depuis_code_postal("20200") == "2B"
+    assert departement_depuis_code_postal("20600") == "2B"
+    # Outre-mer : trois chiffres
+    assert departement_depuis_code_postal("97100") == "971"
+    assert departement_depuis_code_postal("97400") == "974"
+    assert departement_depuis_code_postal("98800") == "988"
+    assert departement_depuis_code_postal(None) is None
+    assert localiser_adresse("3 Cours Napoléon, 20000 Ajaccio") == ("20000", "2A")
+    assert localiser_adresse("Adresse incomplète") == (None, None)
+
+
+def test_est_departement():
+    for valeur in ("75", "01", "2A", "2B", "971", "989"):
+        assert est_departement(valeur), valeur
+    # "20" n'est pas un département (Corse : 2A et 2B), "00" non plus ; au-delà, un début de code postal
+    for valeur in ("20", "00", "750", "75011", "2C", "a1", "7"):
+        assert not est_departement(valeur), valeur
@@ -6,7 +6,10 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from numero_generator import (
     generer_prochain_numero_plaque, 
     generer_prochain_numero_carte_grise,
-    formater_numero_plaque
+    formater_numero_plaque,
+    rang_numero_plaque,
+    numero_plaque_depuis_rang,
+    NOMBRE_PLAQUES
 )
 
 def demonstration_generation_sequentielle():
@@ -281,6 +284,22 @@ def test_formatage():
         plaque_formatee = formater_numero_plaque(plaque)
         print(f"{plaque:<10} → {plaque_formatee:<12}")
 
+def test_rangs_plaques():
+    """Rang d'une plaque dans la séquence : bornes, décalage de la série AA (100 au lieu de 010)"""
+    assert rang_numero_plaque("AA100AA") == 0
+    assert numero_plaque_depuis_rang(0) == "AA100AA"
+    # La série AA commence à 100, les suivantes à 010
+    assert rang_numero_plaque("AA999ZZ") == 900 * 26 * 26 - 1
+    assert numero_plaque_depuis_rang(900 * 26 * 26) == "AB010AA"
+    assert numero_plaque_depuis_rang(NOMBRE_PLAQUES - 1) == "ZZ999ZZ"
+    assert numero_plaque_depuis_rang(-1) is None
+    assert numero_plaque_depuis_rang(NOMBRE_PLAQUES) is None
+    # Même ordre que generer_prochain_numero_plaque, passages de série compris
+    for numero in ["AA100AA", "AA100AZ", "AA100ZZ", "AA999ZZ", "AB977ZZ", "AB999ZZ", "AZ999ZZ", "ZZ999ZY"]:
+        suivant = generer_prochain_numero_plaque(numero)
+        assert rang_numero_plaque(suivant) == rang_numero_plaque(numero) + 1
+        assert numero_plaque_depuis_rang(rang_numero_plaque(numero)) == numero
+
 def afficher_menu():
     """Affiche le menu principal"""
     print("\n" + "╔" + "═" * 58 + "╗")
@@ -0,0 +1,30 @@
+"""
+Colonnes de cartes_grises_archive (purge.COLONNES_ARCHIVEES)
+
+Usage :
+    python -m pytest tests_visuels/test_archive.py
+"""
+import os
+import sqlite3
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from base_sqlite import SCHEMA_PAR_DEFAUT, traduire_schema
+from purge import COLONNES_ARCHIVEES, SCHEMA_ARCHIVE
+
+
+def _colonnes(script, table):
+    base = sqlite3.connect(':memory:')
+    for instruction in traduire_schema(script):
+        base.execute(instruction)
+    return [ligne[1] for ligne in base.execute(f"PRAGMA table_info({table})")]
+
+
+def test_archive_memes_colonnes_que_cartes_grises():
+    with open(SCHEMA_PAR_DEFAUT, encoding='utf-8') as f:
+        script = f.read()
+    assert set(_colonnes(script, 'cartes_grises')) == set(COLONNES_ARCHIVEES)
+    assert set(_colonnes(script, 'cartes_grises_archive')) == set(COLONNES_ARCHIVEES) | {'archive_le'}
+    # purge.py crée la même table que setup_complete.sql
+    assert _colonnes(SCHEMA_ARCHIVE, 'cartes_grises_archive') == _colonnes(script, 'cartes_grises_archive')
@@ -0,0 +1,36 @@
+"""
+Traduction des requêtes MySQL pour le moteur SQLite (base_sqlite.traduire_requete)
+
+Usage :
+    python -m pytest tests_visuels/test_base_sqlite.py
+"""
+import os
+import sqlite3
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from base_sqlite import traduire_requete
+
+
+def test_parametres_et_delai():
+    requete, delai = traduire_requete("SELECT /*+ MAX_EXECUTION_TIME(2000) */ id FROM t WHERE a = %s AND b LIKE %s")
+    assert requete == "SELECT id FROM t WHERE a = ? AND b LIKE ?"
+    assert delai == 2000
+    assert traduire_requete("SELECT 1")[1] is None
+
+
+def test_fonctions_mysql():
+    requete, _ = traduire_requete("SELECT YEAR(CURDATE()) - YEAR(d), NOW() FROM t")
+    assert requete == ("SELECT CAST(strftime('%Y', CURRENT_DATE) AS INTEGER) - "
+                       "CAST(strftime('%Y', d) AS INTEGER), CURRENT_TIMESTAMP FROM t")
+    # La traduction s'exécute telle quelle dans SQLite
+    annee, = sqlite3.connect(':memory:').execute(traduire_requete("SELECT YEAR(%s)")[0], ('2024-05-01',)).fetchone()
+    assert annee == 2024
+
+
+def test_chaines_litterales_preservees():
+    requete, _ = traduire_requete("SELECT 'YEAR(x) %s NOW()', 'l''an %s' FROM t WHERE a = %s")
+    assert requete == "SELECT 'YEAR(x) %s NOW()', 'l''an %s' FROM t WHERE a = ?"
+    # Hors chaîne, %% (échappement de mysql.connector) redevient %
+    assert traduire_requete("SELECT a %% 2 FROM t")[0] == "SELECT a % 2 FROM t"
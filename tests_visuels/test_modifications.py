@@ -0,0 +1,47 @@
+"""
+Colonnes modifiées d'une carte grise (modifications.calculer_modifications)
+
+Usage :
+    python -m pytest tests_visuels/test_modifications.py
+"""
+import os
+import sys
+from datetime import date
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modifications import calculer_modifications, convertir
+
+CARTE = {
+    'modele_id': 3, 'poids_vide_kg': 1200, 'numero_serie': 'VF1AB000123456789',
+    'date_premiere_immat': date(2020, 5, 4), 'date_controle_2': None, 'classe_environnementale': 'Crit\'Air 1',
+}
+
+
+def test_formulaire_inchange():
+    # Texte du formulaire converti dans le type lu en base : rien ne diffère
+    assert calculer_modifications(CARTE, {
+        'modele_id': '3', 'poids_vide_kg': ' 1200 ', 'numero_serie': 'VF1AB000123456789',
+        'date_premiere_immat': '2020-05-04', 'date_controle_2': '', 'classe_environnementale': 'Crit\'Air 1',
+    }) == {}
+
+
+def test_colonnes_modifiees():
+    assert calculer_modifications(CARTE, {
+        'modele_id': '4', 'poids_vide_kg': '1200', 'date_premiere_immat': '2020-05-05',
+        'date_controle_2': '2024-05-04', 'classe_environnementale': '',
+    }) == {'modele_id': 4, 'date_premiere_immat': date(2020, 5, 5), 'date_controle_2': date(2024, 5, 4),
+           'classe_environnementale': None}
+
+
+def test_conversion():
+    assert convertir('poids_vide_kg', None) is None
+    assert convertir('date_fin_validite', date(2030, 1, 1)) == date(2030, 1, 1)
+    # Texte gardé tel quel, même s'il ressemble à un nombre
+    assert convertir('numero_serie', '0123') == '0123'
+    with pytest.raises(ValueError):
+        convertir('poids_max_kg', '12a')
+    with pytest.raises(ValueError):
+        convertir('date_controle_3', '31/12/2030')
@@ -0,0 +1,118 @@
+"""
+Transfert de propriété d'un lot de cartes grises (vente d'une flotte)
+
+Les cartes sont désignées par leur plaque ou leur numéro de carte grise. Elles sont
+retrouvées en une requête (listes IN sur les deux colonnes indexées), le nouveau
+propriétaire est retrouvé ou créé une fois, puis toutes les cartes transférables sont
+mises à jour par une seule requête, dans une transaction : le lot est transféré en
+entier ou pas du tout.
+"""
+import logging
+from datetime import date
+
+from adresses import localiser_adresse
+
+logger = logging.getLogger(__name__)
+
+# Nombre maximal de cartes par transfert (taille des listes IN)
+TRANSFERT_MAX = 1000
+
+
+def normaliser_identifiant(identifiant):
+    """Plaque ou numéro de carte grise sans séparateurs, en majuscules ("ab-123-cd" -> "AB123CD")"""
+    return ''.join(c for c in str(identifiant).upper() if c.isalnum())
+
+
+def _liste(valeurs):
+    return ', '.join(['%s'] * len(valeurs))
+
+
+def transferer_cartes(db, identifiants, proprietaire, date_immat=None):
+    """
+    Transfère des cartes grises à un nouveau propriétaire
+
+    Une carte n'est pas transférée si elle est introuvable, désignée deux fois, déjà au
+    nouveau propriétaire ou immatriculée pour la première fois après la date du transfert ;
+    les autres le sont toutes ensemble.
+
+    Args:
+        db: Database
+        identifiants: Plaques et/ou numéros de carte grise
+        proprietaire: dict nom, prenom, adresse du nouveau propriétaire
+        date_immat: Date de la nouvelle immatriculation (aujourd'hui par défaut)
+
+    Raises:
+        ValueError: Lot vide ou trop grand, propriétaire incomplet
+        ConnectionError, erreur du moteur: la transaction est annulée, rien n'est transféré
+
+    Returns:
+        tuple: (identifiant du propriétaire, ou None s'il n'existait pas et ne reçoit rien ;
+                liste d'un résultat par identifiant, dans l'ordre reçu)
+    """
+    if not identifiants:
+        raise ValueError("Aucune carte grise à transférer")
+    if len(identifiants) > TRANSFERT_MAX:
+        raise ValueError(f"Au plus {TRANSFERT_MAX} cartes grises par transfert")
+    if not all(proprietaire.get(champ) for champ in ('nom', 'prenom', 'adresse')):
+        raise ValueError("Les champs nom, prénom et adresse du propriétaire sont obligatoires")
+    date_immat = date_immat or date.today()
+    normalises = [normaliser_identifiant(i) for i in identifiants]
+    distincts = list(dict.fromkeys(n for n in normalises if n))
+
+    with db.transaction() as tx:
+        # Une seule lecture pour tout le lot ; FOR UPDATE : les cartes ne changent pas
+        # de propriétaire entre cette lecture et la mise à jour
+        # (SQLite : la transaction a déjà le verrou d'écriture de toute la base)
+        requete = f"""
+            SELECT id, numero_carte_grise, numero_immatriculation, proprietaire_id, date_premiere_immat
+            FROM cartes_grises
+            WHERE numero_immatriculation IN ({_liste(distincts)}) OR numero_carte_grise IN ({_liste(distincts)})
+        """
+        if db.backend != 'sqlite':
+            requete += "FOR UPDATE"
+        cartes = tx.fetch_all(requete, tuple(distincts) * 2) if distincts else []
+        par_identifiant = {}
+        for carte in cartes:
+            par_identifiant[carte['numero_immatriculation']] = carte
+            par_identifiant[carte['numero_carte_grise']] = carte
+
+        # Propriétaire : recherché une seule fois pour tout le lot
+        existant = tx.fetch_one("SELECT id FROM proprietaires WHERE nom=%s AND prenom=%s AND adresse=%s",
+                                (proprietaire['nom'], proprietaire['prenom'], proprietaire['adresse']))
+        proprietaire_id = existant['id'] if existant else None
+
+        resultats, a_transferer, vues = [], [], set()
+        for identifiant, normalise in zip(identifiants, normalises):
+            carte = par_identifiant.get(normalise)
+            resultat = {'identifiant': identifiant}
+            if carte is None:
+                resultat['statut'] = 'introuvable'
+            else:
+                resultat.update(carte_id=carte['id'], numero_carte_grise=carte['numero_carte_grise'],
+                                numero_immatriculation=carte['numero_immatriculation'])
+                if carte['id'] in vues:
+                    resultat['statut'] = 'doublon'
+                elif carte['proprietaire_id'] == proprietaire_id:
+                    resultat['statut'] = 'deja_proprietaire'
+                elif carte['date_premiere_immat'] > date_immat:
+                    resultat['statut'] = 'date_invalide'
+                else:
+                    resultat['statut'] = 'transferee'
+                    a_transferer.append(carte['id'])
+                vues.add(carte['id'])
+            resultats.append(resultat)
+
+        if a_transferer:
+            # Nouveau propriétaire créé seulement si au moins une carte lui est transférée
+            if proprietaire_id is None:
+                tx.execute("INSERT INTO proprietaires (nom, prenom, adresse, code_postal, departement) "
+                           "VALUES (%s, %s, %s, %s, %s)",
+                           (proprietaire['nom'], proprietaire['prenom'], proprietaire['adresse'])
+                           + localiser_adresse(proprietaire['adresse']))
+                proprietaire_id = tx.lastrowid
+            # version : un formulaire de modification ouvert avant le transfert est refusé
+            tx.execute(f"UPDATE cartes_grises SET proprietaire_id=%s, date_immat_actuelle=%s, version=version+1 "
+                       f"WHERE id IN ({_liste(a_transferer)})",
+                       (proprietaire_id, date_immat) + tuple(a_transferer))
+    logger.info(f"{len(a_transferer)} cartes grises transférées au propriétaire {proprietaire_id}")
+    return proprietaire_id, resultats
@@ -0,0 +1,492 @@
+"""
+Travaux en arrière-plan (reconstructions, recalculs, lettres de relance)
+
+Les opérations longues ne s'exécutent pas pendant la requête HTTP : la requête enregistre
+un travail dans la table travaux et répond tout de suite. Le travail est exécuté par les
+threads d'un ExecuteurTravaux, démarré dans chaque worker de l'application (TRAVAUX_THREADS,
+1 par défaut, 0 pour aucun) ou par un processus dédié. Les travaux qui lancent un groupe de
+processus (lettres de relance) ne sont exécutés que par le processus dédié, jamais dans un
+worker web :
+    python travaux.py migrer                          # crée la table si elle manque
+    python travaux.py travailleur --threads 2         # exécute les travaux en attente
+    python travaux.py creer controles --parametres '{"lot": 20000}'
+    python travaux.py etat 12
+    python travaux.py annuler 12
+
+Chaque exécutant réserve un travail en attente par une mise à jour conditionnelle (un
+travail n'est exécuté qu'une fois), enregistre sa progression (0 à 100) et vérifie à chaque
+fois si une annulation a été demandée. Un travail dont l'exécutant a disparu (plus de
+nouvelles depuis TRAVAUX_ABANDON_S secondes) est remis en attente : les opérations
+enregistrées ici peuvent être relancées sans effet de bord. Les exécutants enregistrent
+aussi les travaux périodiques (archivage toutes les ARCHIVAGE_INTERVALLE_H heures).
+"""
+import argparse
+import json
+import logging
+import os
+import socket
+import sys
+import threading
+import time
+import uuid
+from datetime import date, datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+# Même définition que setup_complete.sql
+SCHEMA_TRAVAUX = """
+CREATE TABLE IF NOT EXISTS travaux (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    type_travail VARCHAR(50) NOT NULL,
+    parametres TEXT,
+    statut VARCHAR(20) NOT NULL DEFAULT 'en_attente',
+    progression TINYINT NOT NULL DEFAULT 0,
+    message VARCHAR(255),
+    resultat TEXT,
+    annulation_demandee BOOLEAN NOT NULL DEFAULT FALSE,
+    travailleur VARCHAR(100),
+    cree_le TIMESTAMP NULL,
+    demarre_le TIMESTAMP NULL,
+    termine_le TIMESTAMP NULL,
+    vu_le TIMESTAMP NULL,
+    INDEX idx_travaux_statut (statut, id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+"""
+
+STATUTS_FINAUX = ('termine', 'echec', 'annule')
+
+# Intervalle minimal entre deux enregistrements de progression d'un travail (secondes)
+INTERVALLE_PROGRESSION_S = 1.0
+
+
+class TravailAnnule(Exception):
+    """Levée dans un travail dont l'annulation a été demandée"""
+
+
+# Types de travaux : nom -> (libellé, fonction(db, parametres, progression) -> résultat JSON,
+# paramètres obligatoires)
+TYPES_TRAVAUX = {}
+# Types qui lancent un groupe de processus : exécutés seulement par "python travaux.py travailleur"
+TYPES_PROCESSUS = set()
+# Types qui retirent des cartes grises : leur fonction reçoit aussi le cache de plaques à invalider
+TYPES_PLAQUES = set()
+
+
+def type_travail(nom, libelle, obligatoires=(), processus=False, plaques=False):
+    """Enregistre une fonction comme type de travail"""
+    def enregistrer(fonction):
+        TYPES_TRAVAUX[nom] = (libelle, fonction, obligatoires)
+        if processus:
+            TYPES_PROCESSUS.add(nom)
+        if plaques:
+            TYPES_PLAQUES.add(nom)
+        return fonction
+    return enregistrer
+
+
+@type_travail('controles', "Reconstruire la table des contrôles techniques")
+def _travail_controles(db, parametres, progression):
+    from controles import remplir
+    return {'controles': remplir(db, int(parametres.get('lot', 20000)), progression)}
+
+
+@type_travail('adresses', "Recalculer code postal et département des propriétaires")
+def _travail_adresses(db, parametres, progression):
+    from adresses import remplir
+    return {'proprietaires': remplir(db, int(parametres.get('lot', 5000)),
+                                     bool(parametres.get('seulement_vides')), progression)}
+
+
+@type_travail('relances', "Lettres de relance (contrôle technique, fin de validité)", ('debut', 'fin'), processus=True)
+def _travail_relances(db, parametres, progression):
+    from relances import MOTIFS, generer_relances
+    debut = date.fromisoformat(parametres['debut'])
+    fin = date.fromisoformat(parametres['fin'])
+    motif = parametres.get('motif', 'tous')
+    if fin < debut or (motif != 'tous' and motif not in MOTIFS):
+        raise ValueError("Période ou motif de relance invalide")
+    motifs = tuple(MOTIFS) if motif == 'tous' else (motif,)
+    # Dossier déduit de la campagne : une reprise après abandon repart de son avancement
+    sortie = os.path.join(os.getenv('RELANCES_DOSSIER', 'relances'), f"{debut}_{fin}_{motif}")
+    # Groupe de processus borné : plusieurs travaux peuvent tourner en même temps
+    processus = int(parametres.get('processus') or os.getenv('TRAVAUX_PROCESSUS', '2'))
+    resultat = generer_relances(db, sortie, debut, fin, motifs, int(parametres.get('lot', 5000)),
+                                max(processus, 1), progression=progression)
+    return dict(resultat, sortie=sortie)
+
+
+@type_travail('purge', "Archiver ou supprimer des cartes grises selon des critères", ('mode',), plaques=True)
+def _travail_purge(db, parametres, progression, cache_plaques):
+    from purge import CRITERES, purger
+    criteres = {nom: date.fromisoformat(parametres[nom]) for nom in CRITERES if parametres.get(nom)}
+    # Sans fichier d'avancement : une reprise après abandon repart du début de la table,
+    # où les cartes déjà traitées ne sont plus
+    return purger(db, criteres, parametres['mode'], int(parametres.get('lot', 500)),
+                  float(parametres.get('pause_s', 0.1)), progression=progression,
+                  invalider=cache_plaques.invalider)
+
+
+@type_travail('archivage', "Archiver les cartes grises expirées", plaques=True)
+def _travail_archivage(db, parametres, progression, cache_plaques):
+    from archivage import archiver_historique
+    conservation_j = parametres.get('conservation_j')
+    return archiver_historique(db, int(conservation_j) if conservation_j else None,
+                               int(parametres.get('lot', 500)), progression=progression,
+                               invalider=cache_plaques.invalider)
+
+
+def migrer(db):
+    """Crée la table travaux si elle n'existe pas"""
+    if db.backend == 'sqlite':
+        from base_sqlite import traduire_schema
+        instructions = traduire_schema(SCHEMA_TRAVAUX)
+    else:
+        instructions = [SCHEMA_TRAVAUX]
+    return all(db.execute_query(instruction) for instruction in instructions)
+
+
+def _decoder(travail):
+    if travail:
+        for colonne in ('parametres', 'resultat'):
+            travail[colonne] = json.loads(travail[colonne]) if travail[colonne] else None
+        travail['annulation_demandee'] = bool(travail['annulation_demandee'])
+    return travail
+
+
+def creer_travail(db, nom_type, parametres=None):
+    """
+    Enregistre un travail en attente
+
+    Raises:
+        ValueError: Type inconnu ou paramètre obligatoire manquant
+
+    Returns:
+        int: Identifiant du travail, ou None si l'enregistrement a échoué
+    """
+    if nom_type not in TYPES_TRAVAUX:
+        raise ValueError(f"Type de travail inconnu : {nom_type}")
+    manquants = [nom for nom in TYPES_TRAVAUX[nom_type][2] if not (parametres or {}).get(nom)]
+    if manquants:
+        raise ValueError(f"Paramètres manquants : {', '.join(manquants)}")
+    travail_id = db.execute_query(
+        "INSERT INTO travaux (type_travail, parametres, statut, cree_le) VALUES (%s, %s, 'en_attente', %s)",
+        (nom_type, json.dumps(parametres or {}), datetime.now()))
+    return travail_id or None
+
+
+def planifier_travail(db, nom_type, parametres=None, intervalle_s=86400):
+    """
+    Enregistre un travail périodique s'il n'a pas été enregistré depuis intervalle_s secondes
+
+    Aucun travail n'est ajouté tant qu'un travail du même type attend ou s'exécute. Deux
+    exécutants qui planifient en même temps peuvent enregistrer chacun le travail : les
+    travaux planifiés doivent pouvoir s'exécuter deux fois sans effet de bord.
+
+    Returns:
+        int: Identifiant du travail enregistré, ou None
+    """
+    recent = db.fetch_one(
+        "SELECT id FROM travaux WHERE type_travail=%s "
+        "AND (statut IN ('en_attente', 'en_cours') OR cree_le > %s) LIMIT 1",
+        (nom_type, datetime.now() - timedelta(seconds=intervalle_s)))
+    if recent or db.derniere_erreur or db.connection is None:
+        return None
+    travail_id = creer_travail(db, nom_type, parametres)
+    if travail_id:
+        logger.info(f"Travail périodique {nom_type} planifié ({travail_id})")
+    return travail_id
+
+
+def lire_travail(db, travail_id):
+    """Travail (paramètres et résultat décodés), ou None"""
+    return _decoder(db.fetch_one("SELECT * FROM travaux WHERE id=%s", (travail_id,)))
+
+
+def lister_travaux(db, limite=50):
+    """Derniers travaux enregistrés, du plus récent au plus ancien"""
+    return [_decoder(t) for t in db.fetch_all("SELECT * FROM travaux ORDER BY id DESC LIMIT %s", (limite,))]
+
+
+def annuler_travail(db, travail_id):
+    """
+    Annule un travail en attente, ou demande l'arrêt d'un travail en cours
+
+    Le travail en cours s'arrête au prochain enregistrement de sa progression.
+
+    Returns:
+        dict: Travail après la demande, ou None s'il n'existe pas
+    """
+    maintenant = datetime.now()
+    db.execute_query("UPDATE travaux SET statut='annule', termine_le=%s WHERE id=%s AND statut='en_attente'",
+                     (maintenant, travail_id))
+    db.execute_query("UPDATE travaux SET annulation_demandee=TRUE WHERE id=%s AND statut='en_cours'",
+                     (travail_id,))
+    return lire_travail(db, travail_id)
+
+
+def reserver_travail(db, travailleur, exclus=()):
+    """
+    Réserve le plus ancien travail en attente pour cet exécutant
+
+    La mise à jour ne réussit que si le travail est encore en attente : entre deux
+    exécutants qui visent le même travail, seul celui dont le nom est enregistré l'exécute.
+
+    Args:
+        exclus: Types de travaux que cet exécutant ne prend pas (laissés aux autres)
+
+    Returns:
+        dict: Travail réservé, ou None s'il n'y en a pas
+    """
+    filtre = f" AND type_travail NOT IN ({', '.join(['%s'] * len(exclus))})" if exclus else ""
+    for _tentative in range(3):
+        candidat = db.fetch_one(f"SELECT id FROM travaux WHERE statut='en_attente'{filtre} ORDER BY id LIMIT 1",
+                                tuple(exclus))
+        if not candidat:
+            return None
+        maintenant = datetime.now()
+        db.execute_query(
+            "UPDATE travaux SET statut='en_cours', travailleur=%s, demarre_le=%s, vu_le=%s "
+            "WHERE id=%s AND statut='en_attente'",
+            (travailleur, maintenant, maintenant, candidat['id']))
+        travail = lire_travail(db, candidat['id'])
+        if travail and travail['statut'] == 'en_cours' and travail['travailleur'] == travailleur:
+            return travail
+    return None
+
+
+def reprendre_abandonnes(db, delai_s):
+    """Remet en attente les travaux en cours sans nouvelles depuis delai_s secondes (exécutant arrêté)"""
+    limite = datetime.now() - timedelta(seconds=delai_s)
+    db.execute_query("UPDATE travaux SET statut='annule', termine_le=%s "
+                     "WHERE statut='en_cours' AND vu_le < %s AND annulation_demandee", (datetime.now(), limite))
+    db.execute_query("UPDATE travaux SET statut='en_attente', travailleur=NULL "
+                     "WHERE statut='en_cours' AND vu_le < %s", (limite,))
+
+
+class Progression:
+    """
+    Fonction de progression passée aux travaux : progression(fraction, message=None)
+
+    Enregistre le pourcentage (au plus une fois par INTERVALLE_PROGRESSION_S) et lève
+    TravailAnnule si une annulation a été demandée entre-temps, ou si le travail a été
+    remis en attente puis réservé par un autre exécutant (cet exécutant semblait arrêté).
+    """
+
+    def __init__(self, db, travail):
+        self.db = db
+        self.travail_id = travail['id']
+        self.travailleur = travail['travailleur']
+        self._dernier_enregistrement = 0.0
+
+    def __call__(self, fraction, message=None):
+        if time.monotonic() - self._dernier_enregistrement < INTERVALLE_PROGRESSION_S:
+            return
+        self._dernier_enregistrement = time.monotonic()
+        pourcentage = max(0, min(99, int(fraction * 100)))
+        self.db.execute_query("UPDATE travaux SET progression=%s, message=%s, vu_le=%s "
+                              "WHERE id=%s AND travailleur=%s",
+                              (pourcentage, message, datetime.now(), self.travail_id, self.travailleur))
+        etat = self.db.fetch_one("SELECT annulation_demandee, travailleur FROM travaux WHERE id=%s",
+                                 (self.travail_id,))
+        if etat and (etat['annulation_demandee'] or etat['travailleur'] != self.travailleur):
+            raise TravailAnnule()
+
+
+def executer_travail(db, travail, cache_plaques=None):
+    """
+    Exécute un travail réservé et enregistre son issue (termine, annule ou echec)
+
+    cache_plaques (CachePlaques) est passé aux types de TYPES_PLAQUES : celui du worker web,
+    ou un cache propre à l'exécutant dédié (qui n'invalide alors que le magasin partagé).
+    """
+    fonction = TYPES_TRAVAUX[travail['type_travail']][1] if travail['type_travail'] in TYPES_TRAVAUX else None
+    debut = time.perf_counter()
+    # Progression : 100 si terminé, sinon la dernière enregistrée
+    statut, progression, message, resultat = 'echec', None, None, None
+    try:
+        if fonction is None:
+            raise ValueError(f"Type de travail inconnu : {travail['type_travail']}")
+        logger.info(f"Travail {travail['id']} ({travail['type_travail']}) démarré")
+        arguments = (db, travail['parametres'] or {}, Progression(db, travail))
+        if travail['type_travail'] in TYPES_PLAQUES:
+            if cache_plaques is None:
+                from plaques import CachePlaques
+                cache_plaques = CachePlaques()
+            arguments += (cache_plaques,)
+        resultat = fonction(*arguments)
+        statut, progression = 'termine', 100
+    except TravailAnnule:
+        statut, message = 'annule', "Annulé à la demande"
+    except Exception as e:
+        logger.exception(f"Travail {travail['id']} ({travail['type_travail']}) en échec")
+        message = str(e)[:255]
+    # Sans effet si le travail a été repris par un autre exécutant entre-temps
+    maintenant = datetime.now()
+    db.execute_query(
+        "UPDATE travaux SET statut=%s, progression=COALESCE(%s, progression), message=%s, resultat=%s, "
+        "termine_le=%s, vu_le=%s WHERE id=%s AND travailleur=%s",
+        (statut, progression, message, json.dumps(resultat, default=str) if resultat is not None else None,
+         maintenant, maintenant, travail['id'], travail['travailleur']))
+    logger.info(f"Travail {travail['id']} : {statut} en {time.perf_counter() - debut:.1f} s")
+    return statut
+
+
+class ExecuteurTravaux:
+    """
+    Threads qui exécutent les travaux en attente
+
+    Le nombre de threads borne le nombre de travaux exécutés en même temps par ce
+    processus. Sans travail en attente, chaque thread consulte la table toutes les
+    intervalle_s secondes. Les travaux périodiques (planifications : liste de
+    (type, paramètres, intervalle en secondes)) sont enregistrés au besoin, au plus
+    une vérification par minute. Les types exclus sont laissés aux autres exécutants.
+    """
+
+    def __init__(self, db, threads=1, intervalle_s=2.0, abandon_s=600, planifications=(), exclus=(),
+                 cache_plaques=None):
+        self.db = db
+        self.cache_plaques = cache_plaques
+        self.threads = threads
+        self.exclus = tuple(sorted(exclus))
+        self.intervalle_s = intervalle_s
+        self.abandon_s = abandon_s
+        self.planifications = list(planifications)
+        self._prochaine_planification = 0.0
+        self._arret = threading.Event()
+        self._en_cours = {}
+        self._verrou = threading.Lock()
+        self._threads = []
+        self._prefixe = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    def demarrer(self):
+        for numero in range(self.threads):
+            thread = threading.Thread(target=self._boucle, args=(f"{self._prefixe}:{numero}",),
+                                      name=f'travaux-{numero}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def arreter(self, attendre_s=None):
+        """Arrête les threads après leur travail en cours"""
+        self._arret.set()
+        for thread in self._threads:
+            thread.join(attendre_s)
+
+    def _boucle(self, travailleur):
+        # Réservation et annulations se lisent sur le primaire, jamais sur une réplique en retard
+        self.db.epingler_primaire(float('inf'))
+        while not self._arret.is_set():
+            travail = None
+            try:
+                reprendre_abandonnes(self.db, self.abandon_s)
+                self._planifier()
+                travail = reserver_travail(self.db, travailleur, self.exclus)
+                if travail:
+                    with self._verrou:
+                        self._en_cours[travailleur] = travail['id']
+                    executer_travail(self.db, travail, self.cache_plaques)
+            except Exception:
+                logger.exception("Erreur de l'exécutant de travaux")
+            finally:
+                with self._verrou:
+                    self._en_cours.pop(travailleur, None)
+                # Rend la connexion entre deux travaux
+                self.db.disconnect()
+            if not travail:
+                self._arret.wait(self.intervalle_s)
+
+    def _planifier(self):
+        with self._verrou:
+            if not self.planifications or time.monotonic() < self._prochaine_planification:
+                return
+            self._prochaine_planification = time.monotonic() + 60
+        for nom_type, parametres, intervalle_s in self.planifications:
+            planifier_travail(self.db, nom_type, parametres, intervalle_s)
+
+    def etat(self):
+        """Threads et travaux en cours (métriques)"""
+        with self._verrou:
+            return {'threads': self.threads, 'en_cours': sorted(self._en_cours.values()), 'exclus': list(self.exclus)}
+
+
+def demarrer_executeur(threads=None, processus=False, cache_plaques=None):
+    """
+    Démarre un exécutant de travaux sur sa propre base (pool de connexions séparé du worker web)
+
+    Args:
+        threads: Travaux exécutés en même temps (TRAVAUX_THREADS par défaut)
+        processus: Exécuter aussi les types de TYPES_PROCESSUS (processus dédié seulement : un worker
+            web ne lance pas de groupe de processus)
+        cache_plaques: Cache de plaques du worker web, invalidé par les purges et archivages
+
+    Returns:
+        ExecuteurTravaux, ou None si TRAVAUX_THREADS vaut 0
+    """
+    from database import Database
+    threads = int(os.getenv('TRAVAUX_THREADS', '1')) if threads is None else threads
+    if threads <= 0:
+        return None
+    planifications = []
+    intervalle_archivage_h = float(os.getenv('ARCHIVAGE_INTERVALLE_H', '24'))
+    if intervalle_archivage_h > 0:
+        planifications.append(('archivage', {}, intervalle_archivage_h * 3600))
+    return ExecuteurTravaux(Database(pool_size=threads), threads,
+                            float(os.getenv('TRAVAUX_INTERVALLE_S', '2')),
+                            float(os.getenv('TRAVAUX_ABANDON_S', '600')), planifications,
+                            exclus=() if processus else TYPES_PROCESSUS,
+                            cache_plaques=cache_plaques).demarrer()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('commande', choices=['migrer', 'travailleur', 'creer', 'etat', 'annuler'])
+    parser.add_argument('argument', nargs='?', help="Type de travail (creer) ou identifiant (etat, annuler)")
+    parser.add_argument('--parametres', default='{}', help="Paramètres du travail en JSON (creer)")
+    parser.add_argument('--threads', type=int, default=1, help="Travaux exécutés en même temps (travailleur)")
+    args = parser.parse_args()
+
+    from config import charger_configuration, configurer_logging
+    from database import Database
+    charger_configuration()
+    configurer_logging()
+    db = Database()
+    db.epingler_primaire(float('inf'))
+
+    if args.commande == 'migrer':
+        if not migrer(db):
+            print("Création de la table impossible (voir le journal)")
+            return 1
+        print("Table travaux prête")
+    elif args.commande == 'travailleur':
+        executeur = demarrer_executeur(max(args.threads, 1), processus=True)
+        print(f"Exécution des travaux ({args.threads} thread(s)), Ctrl+C pour arrêter")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            print("Arrêt après les travaux en cours...")
+            executeur.arreter()
+    elif args.commande == 'creer':
+        try:
+            travail_id = creer_travail(db, args.argument, json.loads(args.parametres))
+        except ValueError as e:
+            print(f"Erreur : {e} (types : {', '.join(TYPES_TRAVAUX)})")
+            return 1
+        if not travail_id:
+            print("Enregistrement du travail impossible (voir le journal)")
+            return 1
+        print(f"Travail {travail_id} en attente")
+    else:
+        if not (args.argument or '').isdigit():
+            parser.error("identifiant du travail attendu")
+        travail_id = int(args.argument)
+        travail = annuler_travail(db, travail_id) if args.commande == 'annuler' else lire_travail(db, travail_id)
+        if not travail:
+            print(f"Travail {travail_id} introuvable")
+            return 1
+        print(json.dumps(travail, indent=2, default=str, ensure_ascii=False))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,213 @@
+"""
+Filtres de Bloom des plaques et VIN existants (vérifications d'unicité)
+
+L'ajout d'une carte grise vérifie que la plaque générée et le VIN saisi n'existent
+pas encore (SELECT id ... WHERE numero_immatriculation=%s / numero_serie=%s) ; c'est
+presque toujours le cas. Chaque worker garde un filtre de Bloom par colonne : une
+valeur absente du filtre n'existe pas en base et la requête est évitée, une valeur
+présente (ou un filtre pas encore construit) est vérifiée en base comme avant.
+
+Les filtres sont construits au démarrage du worker par un parcours par lots de
+cartes_grises, complétés à chaque ajout du worker, et reconstruits toutes les
+BLOOM_RECONSTRUCTION_H heures (6 par défaut) ou dès qu'ils dépassent leur capacité :
+la reconstruction oublie les cartes supprimées ou archivées. Les contraintes UNIQUE
+restent l'arbitre : une valeur ajoutée par un autre worker depuis la dernière
+construction fait échouer l'insertion au lieu d'être signalée par la vérification.
+
+Le taux de faux positifs visé est BLOOM_TAUX_FAUX_POSITIFS (0.01) ; le taux mesuré
+(valeurs présentes dans le filtre mais absentes de la base) est dans /metriques.
+"""
+import hashlib
+import logging
+import math
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Filtres : nom -> colonne de cartes_grises
+COLONNES_UNICITE = {
+    'plaques': 'numero_immatriculation',
+    'vins': 'numero_serie',
+}
+
+# Capacité minimale d'un filtre (base vide ou presque)
+CAPACITE_MIN = 10000
+# Marge de capacité au-dessus du nombre de cartes lors de la construction
+MARGE_CAPACITE = 1.25
+
+
+class FiltreBloom:
+    """Filtre de Bloom de chaînes : faux positifs possibles, jamais de faux négatif"""
+
+    def __init__(self, capacite, taux_faux_positifs=0.01):
+        self.capacite = max(1, int(capacite))
+        # Taille optimale : m = -n ln p / (ln 2)², k = m/n ln 2
+        self.taille_bits = max(8, int(-self.capacite * math.log(taux_faux_positifs) / math.log(2) ** 2))
+        self.nb_hachages = max(1, round(self.taille_bits / self.capacite * math.log(2)))
+        self.nombre = 0
+        self._bits = bytearray((self.taille_bits + 7) // 8)
+
+    def _positions(self, valeur):
+        # Double hachage : h1 + i * h2 sur une seule empreinte blake2b
+        empreinte = hashlib.blake2b(valeur.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(empreinte[:8], 'little')
+        h2 = int.from_bytes(empreinte[8:], 'little') | 1
+        return [(h1 + i * h2) % self.taille_bits for i in range(self.nb_hachages)]
+
+    def ajouter(self, valeur):
+        for position in self._positions(valeur):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.nombre += 1
+
+    def __contains__(self, valeur):
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(valeur))
+
+    def taux_theorique(self):
+        """Taux de faux positifs attendu pour le nombre de valeurs ajoutées"""
+        return (1 - math.exp(-self.nb_hachages * self.nombre / self.taille_bits)) ** self.nb_hachages
+
+
+class FiltresUnicite:
+    """Filtres de Bloom d'un worker sur les colonnes de COLONNES_UNICITE"""
+
+    def __init__(self, taux_faux_positifs=None, intervalle_h=None):
+        self.taux_faux_positifs = float(taux_faux_positifs if taux_faux_positifs is not None
+                                        else os.getenv('BLOOM_TAUX_FAUX_POSITIFS', '0.01'))
+        self.intervalle_h = float(intervalle_h if intervalle_h is not None
+                                  else os.getenv('BLOOM_RECONSTRUCTION_H', '6'))
+        self._lock = threading.Lock()
+        # Vides tant que la première construction n'est pas terminée : tout est vérifié en base
+        self._filtres = {}
+        # Ajouts pendant une construction, rejoués dans les nouveaux filtres
+        self._ajouts_en_cours = None
+        self._reconstruire = threading.Event()
+        self.construit_le = None
+        self.duree_construction_s = None
+        self._compteurs = {genre: {'evitees': 0, 'verifiees': 0, 'faux_positifs': 0} for genre in COLONNES_UNICITE}
+
+    def construire(self, db, lot=5000):
+        """
+        Construit de nouveaux filtres par un parcours de cartes_grises par lots, puis les met en service
+
+        Returns:
+            bool: False si la lecture a échoué (les filtres en service sont gardés)
+        """
+        debut = time.perf_counter()
+        with self._lock:
+            self._ajouts_en_cours = []
+        try:
+            dernier = db.fetch_one("SELECT MAX(id) AS id_max FROM cartes_grises")
+            if dernier is None:
+                return False
+            capacite = max(CAPACITE_MIN, int((dernier['id_max'] or 0) * MARGE_CAPACITE))
+            filtres = {genre: FiltreBloom(capacite, self.taux_faux_positifs) for genre in COLONNES_UNICITE}
+            colonnes = ', '.join(COLONNES_UNICITE.values())
+            dernier_id = 0
+            while True:
+                lignes = db.fetch_all(f"SELECT id, {colonnes} FROM cartes_grises WHERE id > %s ORDER BY id LIMIT %s",
+                                      (dernier_id, lot))
+                if db.derniere_erreur or db.connection is None:
+                    return False
+                if not lignes:
+                    break
+                for ligne in lignes:
+                    for genre, colonne in COLONNES_UNICITE.items():
+                        if ligne[colonne]:
+                            filtres[genre].ajouter(ligne[colonne])
+                dernier_id = lignes[-1]['id']
+            with self._lock:
+                for genre, valeur in self._ajouts_en_cours:
+                    filtres[genre].ajouter(valeur)
+                self._filtres = filtres
+        finally:
+            with self._lock:
+                self._ajouts_en_cours = None
+        self.construit_le = time.time()
+        self.duree_construction_s = round(time.perf_counter() - debut, 2)
+        logger.info(f"Filtres d'unicité construits en {self.duree_construction_s} s "
+                    f"({filtres['plaques'].nombre} plaques, capacité {capacite})")
+        return True
+
+    def existe(self, genre, valeur, lire):
+        """
+        Indique si une valeur existe déjà, sans requête quand le filtre l'exclut
+
+        Args:
+            genre: Nom du filtre (plaques ou vins)
+            valeur: Plaque ou VIN
+            lire: Fonction sans argument qui cherche la valeur en base (résultat vrai si elle existe)
+
+        Returns:
+            bool: True si la valeur existe en base
+        """
+        filtre = self._filtres.get(genre)
+        compteurs = self._compteurs[genre]
+        if filtre is not None and valeur not in filtre:
+            with self._lock:
+                compteurs['evitees'] += 1
+            return False
+        existe = bool(lire())
+        if filtre is not None:
+            with self._lock:
+                compteurs['verifiees'] += 1
+                compteurs['faux_positifs'] += not existe
+        return existe
+
+    def ajouter(self, genre, valeur):
+        """Ajoute au filtre une valeur enregistrée par ce worker"""
+        if not valeur:
+            return
+        with self._lock:
+            filtre = self._filtres.get(genre)
+            if filtre is not None:
+                filtre.ajouter(valeur)
+                if filtre.nombre > filtre.capacite:
+                    # Filtre saturé : son taux de faux positifs dépasse l'objectif
+                    self._reconstruire.set()
+            if self._ajouts_en_cours is not None:
+                self._ajouts_en_cours.append((genre, valeur))
+
+    def statistiques(self):
+        with self._lock:
+            resultat = {'pret': bool(self._filtres), 'construit_le': self.construit_le,
+                        'duree_construction_s': self.duree_construction_s}
+            for genre, compteurs in self._compteurs.items():
+                filtre = self._filtres.get(genre)
+                # Parmi les valeurs absentes de la base, part que le filtre n'a pas exclue
+                absentes = compteurs['evitees'] + compteurs['faux_positifs']
+                resultat[genre] = dict(
+                    compteurs,
+                    valeurs=filtre.nombre if filtre else 0,
+                    octets=len(filtre._bits) if filtre else 0,
+                    taux_faux_positifs_mesure=round(compteurs['faux_positifs'] / absentes, 4) if absentes else None,
+                    taux_faux_positifs_theorique=round(filtre.taux_theorique(), 4) if filtre else None,
+                )
+            return resultat
+
+    def demarrer(self, app):
+        """Construit les filtres en arrière-plan, puis les reconstruit périodiquement"""
+        def boucle():
+            delai = 1
+            while True:
+                with app.app_context():
+                    db = app.extensions['database']
+                    # Une réplique en retard oublierait les dernières cartes
+                    db.epingler_primaire(float('inf'))
+                    try:
+                        reussi = self.construire(db)
+                    finally:
+                        db.disconnect()
+                if not reussi:
+                    logger.warning(f"Construction des filtres d'unicité impossible, nouvelle tentative dans {delai} s")
+                    time.sleep(delai)
+                    delai = min(delai * 2, 300)
+                    continue
+                delai = 1
+                self._reconstruire.wait(self.intervalle_h * 3600 if self.intervalle_h > 0 else None)
+                self._reconstruire.clear()
+
+        thread = threading.Thread(target=boucle, name='filtres-unicite', daemon=True)
+        thread.start()
+        return thread
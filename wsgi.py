@@ -0,0 +1,6 @@
+# Point d'entrée WSGI pour le serveur de production (gunicorn)
+# Usage : gunicorn -c gunicorn.conf.py wsgi:app
+from app import create_app
+
+# Chaque worker importe ce module après le fork et crée sa propre application
+app = create_app()